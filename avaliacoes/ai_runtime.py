@@ -1,13 +1,55 @@
+"""
+Cliente do Gemini compartilhado pelo processo.
+
+Antes cada chamada (OCR de comprovante, legenda, descricao de anuncio...) criava um
+genai.Client novo: cliente httpx novo, conexao TCP/TLS nova e o cliente antigo largado
+para o GC. Agora o cliente fica num registro por processo, indexado por (api_key,
+modelo), e as chamadas seguintes reaproveitam o pool de conexoes dele. O httpx.Client
+e thread-safe, entao o mesmo cliente atende as threads do gunicorn e dos workers.
+
+A configuracao continua vindo de ConfiguracaoIA.load() (copia por processo, validada
+por uma leitura do django_cache por request); trocar a chave ou o modelo no Admin cai
+noutra entrada do registro em todos os processos, e o post_save/post_delete
+(avaliacoes.signals) esvazia o registro do processo que salvou.
+"""
+import threading
+
 from django.conf import settings
 
 from .models import ConfiguracaoIA
 
+_clientes = {}
+_lock = threading.Lock()
+
+
+def _cliente_gemini(api_key, model_name):
+    chave = (api_key, model_name)
+    client = _clientes.get(chave)
+    if client is None:
+        with _lock:
+            client = _clientes.get(chave)
+            if client is None:
+                from google import genai
+
+                client = genai.Client(api_key=api_key)
+                # Chave/modelo antigos nao voltam: libera as conexoes deles pro GC
+                # (sem close(), que derrubaria uma chamada ainda em andamento).
+                _clientes.clear()
+                _clientes[chave] = client
+    return client
+
+
+def limpar_runtime_gemini():
+    """Esvazia o registro de clientes do processo (a proxima chamada cria um novo)."""
+    with _lock:
+        _clientes.clear()
+
 
 def get_gemini_runtime():
     """
     Resolve chave/modelo com prioridade para Admin (ConfiguracaoIA),
     com fallback para settings (.env).
-    Retorna (client, model_name, error_message_or_none).
+    Retorna (client, model_name, error_message_or_none); o client e compartilhado.
     """
     cfg = ConfiguracaoIA.load()
     if not cfg.ativo:
@@ -20,9 +62,6 @@ def get_gemini_runtime():
         return None, model_name, 'API Key do Gemini não configurada (Admin/.env).'
 
     try:
-        from google import genai
-
-        client = genai.Client(api_key=api_key)
-        return client, model_name, None
+        return _cliente_gemini(api_key, model_name), model_name, None
     except Exception as exc:
         return None, model_name, f'Falha ao inicializar cliente Gemini: {type(exc).__name__}'
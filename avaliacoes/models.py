@@ -4,6 +4,7 @@ from datetime import timedelta
 from django.utils.timezone import is_aware, make_aware
 import uuid
 import os
+from core.singleton import CachedSingletonMixin
 from crmspagi.storage_backends import PublicMediaStorage
 from django.contrib.auth.models import User
 
@@ -73,7 +74,7 @@ class AvaliacaoFoto(models.Model):
         return f"Foto de {self.avaliacao.modelo}"
 
 
-class ConfiguracaoIA(models.Model):
+class ConfiguracaoIA(CachedSingletonMixin, models.Model):
     provider = models.CharField(
         max_length=20,
         default='GEMINI',
@@ -106,8 +107,7 @@ class ConfiguracaoIA(models.Model):
 
     @classmethod
     def load(cls):
-        obj, _ = cls.objects.get_or_create(pk=1)
-        return obj
+        return cls.carregar_singleton()
 
     def __str__(self):
         return f'IA ({self.provider}) - {self.modelo}'
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .ai_runtime import limpar_runtime_gemini
+from .models import ConfiguracaoIA
+
+
+@receiver([post_save, post_delete], sender=ConfiguracaoIA)
+def limpar_cliente_gemini(sender, **kwargs):
+    """Configuracao de IA mudou: o proximo get_gemini_runtime() cria o cliente de novo."""
+    limpar_runtime_gemini()
@@ -1,3 +1,161 @@
-from django.test import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import threading
+import time
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from .ai_runtime import get_gemini_runtime, limpar_runtime_gemini
+from .models import ConfiguracaoIA
+
+
+class _GeminiFalso(BaseHTTPRequestHandler):
+    """generateContent servido localmente; `conexoes` conta as conexoes TCP abertas."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    conexoes = 0
+
+    def setup(self):
+        super().setup()
+        type(self).conexoes += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        corpo = json.dumps({
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': 'ok'}]}, 'finishReason': 'STOP'}],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ComGeminiFalso:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _GeminiFalso)
+        cls.base_url = f'http://127.0.0.1:{cls.servidor.server_port}/'
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        from google import genai
+
+        cliente_original = genai.Client
+        base_url = self.base_url
+
+        def cliente_local(**kwargs):
+            return cliente_original(http_options={'base_url': base_url}, **kwargs)
+
+        # O SDK e o httpx logam cada chamada em INFO.
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        _GeminiFalso.conexoes = 0
+        limpar_runtime_gemini()
+        self.addCleanup(limpar_runtime_gemini)
+        patcher = patch.object(genai, 'Client', side_effect=cliente_local)
+        self.criar_cliente = patcher.start()
+        self.addCleanup(patcher.stop)
+        ConfiguracaoIA.objects.update_or_create(pk=1, defaults={'api_key': 'chave-1', 'modelo': 'gemini-teste', 'ativo': True})
+
+
+class GeminiRuntimeTests(_ComGeminiFalso, TestCase):
+    def test_reaproveita_cliente_e_conexao(self):
+        for _ in range(5):
+            client, modelo, erro = get_gemini_runtime()
+            self.assertIsNone(erro)
+            self.assertEqual(client.models.generate_content(model=modelo, contents='oi').text, 'ok')
+
+        self.assertEqual(self.criar_cliente.call_count, 1)
+        self.assertEqual(_GeminiFalso.conexoes, 1)
+
+    def test_troca_de_chave_ou_modelo_no_admin_cria_outro_cliente(self):
+        primeiro, _, _ = get_gemini_runtime()
+
+        cfg = ConfiguracaoIA.load()
+        cfg.modelo = 'gemini-outro'
+        cfg.save()
+        segundo, modelo, _ = get_gemini_runtime()
+
+        self.assertIsNot(segundo, primeiro)
+        self.assertEqual(modelo, 'gemini-outro')
+
+        # Alteracao que nao passa pelo save(): a chave nova ja cai noutra entrada.
+        ConfiguracaoIA.objects.filter(pk=1).update(api_key='chave-2')
+        ConfiguracaoIA.invalidar_cache_singleton()
+        terceiro, _, _ = get_gemini_runtime()
+
+        self.assertIsNot(terceiro, segundo)
+        self.assertIs(get_gemini_runtime()[0], terceiro)
+
+    @override_settings(GEMINI_API_KEY='')
+    def test_desativada_ou_sem_chave_nao_cria_cliente(self):
+        ConfiguracaoIA.objects.filter(pk=1).update(ativo=False)
+        self.assertEqual(get_gemini_runtime(), (None, None, 'Integração de IA está desativada no Admin.'))
+
+        ConfiguracaoIA.objects.filter(pk=1).update(ativo=True, api_key='')
+        client, _, erro = get_gemini_runtime()
+
+        self.assertIsNone(client)
+        self.assertIn('API Key', erro)
+        self.criar_cliente.assert_not_called()
+
+    def test_cliente_compartilhado_entre_threads(self):
+        clientes = []
+
+        def chamar():
+            client, modelo, _ = get_gemini_runtime()
+            client.models.generate_content(model=modelo, contents='oi')
+            clientes.append(client)
+
+        # Config no cache de antes: as threads nao abrem conexao propria com o banco.
+        with patch.object(ConfiguracaoIA, 'load', return_value=ConfiguracaoIA.load()):
+            threads = [threading.Thread(target=chamar) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len({id(client) for client in clientes}), 1)
+        self.assertEqual(self.criar_cliente.call_count, 1)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class GeminiRuntimeBenchmark(_ComGeminiFalso, TestCase):
+    CHAMADAS = 200
+
+    def _medir(self, obter_cliente):
+        _GeminiFalso.conexoes = 0
+        inicio = time.perf_counter()
+        for _ in range(self.CHAMADAS):
+            client, modelo = obter_cliente()
+            client.models.generate_content(model=modelo, contents='oi')
+        return (time.perf_counter() - inicio) / self.CHAMADAS * 1000, _GeminiFalso.conexoes
+
+    def test_cliente_novo_x_registro(self):
+        from google import genai
+
+        cfg = ConfiguracaoIA.load()
+        # Caminho anterior: um genai.Client novo por chamada.
+        antes = self._medir(lambda: (genai.Client(api_key=cfg.api_key), cfg.modelo))
+        depois = self._medir(lambda: get_gemini_runtime()[:2])
+
+        print(
+            f"\n[benchmark] {self.CHAMADAS} generate_content no endpoint local: "
+            f"cliente novo por chamada {antes[0]:.2f}ms/chamada ({antes[1]} conexoes); "
+            f"registro {depois[0]:.2f}ms/chamada ({depois[1]} conexoes)"
+        )
@@ -6,4 +6,5 @@ class ClientesConfig(AppConfig):
 
     # ADICIONE ESTA FUNÇÃO
     def ready(self):
-        import clientes.signals
\ No newline at end of file
+        import clientes.signals
+        import clientes.relatorios_pdf  # noqa: F401
\ No newline at end of file
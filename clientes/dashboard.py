@@ -0,0 +1,122 @@
+"""
+Metricas do dashboard de clientes (relatorio_dashboard) e do PDF de leads.
+
+As duas telas liam o mesmo periodo com ~8 consultas cada (count, aggregate e um
+GROUP BY por grafico). Aqui sai uma consulta so: um GROUP BY por status, tipo,
+vendedor e fonte com as contagens condicionais (Count/Sum com filter=Q(...)), e os
+totais e graficos sao montados em Python a partir dessas linhas. O resultado fica num
+CacheVersionado (core/cache_versionado.py) por periodo; qualquer save/delete de Cliente
+troca a versao das chaves (signals em clientes/signals.py).
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from core.cache_versionado import CacheVersionado
+
+from .models import Cliente
+
+CLOSED_STATUSES = [Cliente.StatusNegociacao.FINALIZADO, Cliente.StatusNegociacao.VENDIDO]
+
+_cache_metricas = CacheVersionado('clientes:dashboard')
+
+
+def periodo_do_filtro(start_date_str, end_date_str):
+    """Periodo (inicio, fim) dos filtros da tela; padrao: ultimos 30 dias."""
+    if start_date_str and end_date_str:
+        try:
+            return (
+                datetime.strptime(start_date_str, '%Y-%m-%d').date(),
+                datetime.strptime(end_date_str, '%Y-%m-%d').date(),
+            )
+        except ValueError:
+            pass
+    end_date = timezone.now().date()
+    return end_date - timedelta(days=30), end_date
+
+
+def invalidar_metricas_dashboard():
+    """Descarta as metricas em cache. Chamar apos alteracoes em Cliente fora do save()/delete()."""
+    _cache_metricas.invalidar()
+
+
+def _ordenar(contador):
+    return sorted(contador.items(), key=lambda item: (-item[1], str(item[0])))
+
+
+def _calcular(start_date, end_date):
+    vendido = Q(status_negociacao=Cliente.StatusNegociacao.VENDIDO)
+    duracao = ExpressionWrapper(F('data_ultimo_contato') - F('data_primeiro_contato'), output_field=DurationField())
+    linhas = (
+        Cliente.objects.filter(data_primeiro_contato__date__range=[start_date, end_date])
+        .values('status_negociacao', 'tipo_negociacao', 'vendedor__username', 'fonte_cliente')
+        .annotate(
+            total=Count('id'),
+            duracao_vendidos=Sum(duracao, filter=vendido),
+            vendidos_com_duracao=Count(duracao, filter=vendido),
+        )
+        .order_by()
+    )
+
+    total_clientes = 0
+    total_ativos = 0
+    total_vendidos = 0
+    duracao_total = timedelta()
+    vendidos_com_duracao = 0
+    por_status, por_tipo, por_vendedor, por_fonte = Counter(), Counter(), Counter(), Counter()
+    vendas_por_vendedor, consignacao_por_vendedor = Counter(), Counter()
+
+    for linha in linhas:
+        total = linha['total']
+        status = linha['status_negociacao']
+        tipo = linha['tipo_negociacao']
+        vendedor = linha['vendedor__username']
+
+        total_clientes += total
+        por_tipo[Cliente.TipoNegociacao(tipo).label] += total
+        por_vendedor[vendedor] += total
+        por_fonte[linha['fonte_cliente'] or 'Nao informado'] += total
+        if status not in CLOSED_STATUSES:
+            total_ativos += total
+            por_status[Cliente.StatusNegociacao(status).label] += total
+        if status == Cliente.StatusNegociacao.VENDIDO:
+            total_vendidos += total
+            if tipo == Cliente.TipoNegociacao.VENDA:
+                vendas_por_vendedor[vendedor] += total
+            elif tipo == Cliente.TipoNegociacao.CONSIGNACAO:
+                consignacao_por_vendedor[vendedor] += total
+        if linha['duracao_vendidos'] is not None:
+            duracao_total += linha['duracao_vendidos']
+            vendidos_com_duracao += linha['vendidos_com_duracao']
+
+    taxa_conversao = (total_vendidos / total_clientes) * 100 if total_clientes > 0 else 0
+    tempo_medio = duracao_total / vendidos_com_duracao if vendidos_com_duracao else None
+
+    return {
+        'total_clientes': total_clientes,
+        'total_clientes_ativos': total_ativos,
+        'taxa_conversao': round(taxa_conversao, 2),
+        'tempo_medio_fechamento_dias': tempo_medio.days if tempo_medio else 0,
+        'status': _ordenar(por_status),
+        'tipo_negociacao': _ordenar(por_tipo),
+        'vendedor': _ordenar(por_vendedor),
+        'fonte': _ordenar(por_fonte),
+        'vendas_por_vendedor': _ordenar(vendas_por_vendedor),
+        'consignacao_por_vendedor': _ordenar(consignacao_por_vendedor),
+    }
+
+
+def metricas_dashboard(start_date, end_date):
+    """
+    Contadores e series dos graficos de clientes captados entre start_date e end_date
+    (datas, inclusivo). As series sao listas de (rotulo, total) em ordem decrescente;
+    o dicionario e compartilhado pelo processo, entao nao deve ser alterado.
+    """
+    return _cache_metricas.obter(
+        f'{start_date.isoformat()}:{end_date.isoformat()}',
+        lambda: _calcular(start_date, end_date),
+        settings.CLIENTES_DASHBOARD_CACHE_SEGUNDOS,
+    )
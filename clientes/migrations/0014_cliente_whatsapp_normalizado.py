@@ -0,0 +1,40 @@
+import re
+
+from django.db import migrations, models
+
+_TAMANHO_LOTE = 2000
+
+
+def preencher_whatsapp_normalizado(apps, schema_editor):
+    # Funcao propria (e nao clientes.models.normalizar_whatsapp): migrations nao devem
+    # depender do codigo atual do app, que pode mudar depois.
+    Cliente = apps.get_model('clientes', 'Cliente')
+    lote = []
+    for cliente in Cliente.objects.only('pk', 'whatsapp').iterator(chunk_size=_TAMANHO_LOTE):
+        cliente.whatsapp_normalizado = re.sub(r'\D', '', cliente.whatsapp or '')
+        lote.append(cliente)
+        if len(lote) >= _TAMANHO_LOTE:
+            Cliente.objects.bulk_update(lote, ['whatsapp_normalizado'])
+            lote = []
+    if lote:
+        Cliente.objects.bulk_update(lote, ['whatsapp_normalizado'])
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0013_alter_cliente_vendedor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='whatsapp_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(preencher_whatsapp_normalizado, noop_reverse),
+    ]
@@ -1,8 +1,16 @@
+import re
+
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.models import User
 
+
+def normalizar_whatsapp(valor):
+    """Reduz o whatsapp digitado (com mascara, espacos, etc.) apenas aos digitos."""
+    return re.sub(r"\D", "", valor or "")
+
+
 class Cliente(models.Model):
     class TipoContato(models.TextChoices):
         MENSAGEM = 'Mensagem', 'Mensagem'
@@ -66,6 +74,9 @@ class Cliente(models.Model):
     # PROTECT: excluir um vendedor nao pode apagar silenciosamente os leads dele.
     vendedor = models.ForeignKey(User, on_delete=models.PROTECT, related_name='clientes')
     whatsapp = models.CharField(max_length=20)
+    # Copia so com os digitos de `whatsapp`, mantida pelo save(). Indexada para a checagem
+    # de duplicidade da distribuicao virar um lookup por igualdade em vez de varrer a tabela.
+    whatsapp_normalizado = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
     nome_cliente = models.CharField(max_length=255)
     email = models.EmailField(blank=True, null=True, verbose_name="Email")
     tipo_veiculo = models.CharField(max_length=10, choices=TIPO_VEICULO_CHOICES, default='carros', verbose_name="Tipo de Veículo")
@@ -117,6 +128,11 @@ class Cliente(models.Model):
         # Se for um cliente novo, define uma data de próximo contato padrão
         if self._state.adding:
             self.data_proximo_contato = timezone.now() + timedelta(days=5)
+
+        self.whatsapp_normalizado = normalizar_whatsapp(self.whatsapp)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'whatsapp' in update_fields and 'whatsapp_normalizado' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'whatsapp_normalizado']
         
         # Salva o objeto
         super().save(*args, **kwargs)
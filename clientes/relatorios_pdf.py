@@ -0,0 +1,84 @@
+"""
+Relatorios PDF de clientes gerados em segundo plano (ver core/relatorios_pdf.py).
+As views so validam o acesso e montam os parametros; o contexto e montado aqui,
+no worker, na hora de renderizar.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.utils import timezone
+
+from core.relatorios_pdf import registrar_relatorio
+
+from .dashboard import CLOSED_STATUSES, metricas_dashboard
+from .models import Cliente
+
+RELATORIO_LEADS = 'clientes.relatorio_leads'
+RELATORIO_ATRASADOS = 'clientes.relatorio_atrasados'
+
+
+def pode_acessar_relatorios(user, parametros=None):
+    profile = getattr(user, 'profile', None)
+    return user.is_superuser or getattr(profile, 'nivel_acesso', '') == 'ADMIN'
+
+
+def contexto_relatorio_leads(parametros):
+    start_date = date.fromisoformat(parametros['start_date'])
+    end_date = date.fromisoformat(parametros['end_date'])
+    metricas = metricas_dashboard(start_date, end_date)
+
+    return {
+        'total_clientes': metricas['total_clientes'],
+        'total_clientes_ativos': metricas['total_clientes_ativos'],
+        'taxa_conversao': metricas['taxa_conversao'],
+        'tempo_medio_fechamento_dias': metricas['tempo_medio_fechamento_dias'],
+        'status_data': dict(metricas['status']),
+        'tipo_negociacao_data': dict(metricas['tipo_negociacao']),
+        'vendedor_data': dict(metricas['vendedor']),
+        'fonte_data': dict(metricas['fonte']),
+        'start_date': start_date,
+        'end_date': end_date,
+        'vendas_por_vendedor_data': dict(metricas['vendas_por_vendedor']),
+        'consignacao_por_vendedor_data': dict(metricas['consignacao_por_vendedor']),
+    }
+
+
+def contexto_relatorio_atrasados(parametros):
+    clientes_atrasados_qs = Cliente.objects.filter(
+        data_proximo_contato__lte=timezone.now()
+    ).exclude(
+        status_negociacao__in=CLOSED_STATUSES
+    ).select_related('vendedor').order_by('vendedor__username', 'data_proximo_contato')
+
+    if parametros.get('vendedores'):
+        clientes_atrasados_qs = clientes_atrasados_qs.filter(vendedor_id__in=parametros['vendedores'])
+
+    relatorio_agrupado = defaultdict(list)
+    for cliente in clientes_atrasados_qs:
+        nome_vendedor = "Sem Vendedor"
+        if cliente.vendedor:
+            nome_vendedor = cliente.vendedor.username
+
+        relatorio_agrupado[nome_vendedor].append(cliente)
+
+    return {
+        'relatorio_agrupado': dict(relatorio_agrupado),
+        'data_geracao': timezone.now(),
+    }
+
+
+registrar_relatorio(
+    RELATORIO_LEADS,
+    template='clientes/relatorio_pdf.html',
+    contexto=contexto_relatorio_leads,
+    nome_arquivo=lambda parametros: 'relatorio_leads.pdf',
+    pode_acessar=pode_acessar_relatorios,
+)
+
+registrar_relatorio(
+    RELATORIO_ATRASADOS,
+    template='clientes/relatorio_atrasados_pdf.html',
+    contexto=contexto_relatorio_atrasados,
+    nome_arquivo=lambda parametros: 'relatorio_atrasados_por_vendedor.pdf',
+    pode_acessar=pode_acessar_relatorios,
+)
@@ -1,5 +1,6 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from .dashboard import invalidar_metricas_dashboard
 from .models import Cliente, Historico
 
 # Usamos o 'pre_save' para ter acesso ao estado ANTES e DEPOIS da alteração
@@ -33,4 +34,11 @@ def criar_historico_mudanca_status(sender, instance, **kwargs):
             Historico.objects.create(
                 cliente=instance,
                 motivacao=f"Status alterado de '{original.get_status_negociacao_display()}' para '{instance.get_status_negociacao_display()}'."
-            )
\ No newline at end of file
+            )
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidar_dashboard_clientes(sender, **kwargs):
+    """Qualquer escrita em Cliente descarta as metricas do dashboard em cache."""
+    invalidar_metricas_dashboard()
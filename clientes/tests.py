@@ -1,16 +1,24 @@
+from datetime import timedelta
 from decimal import Decimal
 from unittest.mock import patch
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.db import IntegrityError, transaction
 from django.db.models import ProtectedError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 from configuracoes.models import ModuloSistema, PermissaoModulo
 
+from core.cache_versionado import encerrar_escopo_request, iniciar_escopo_request
+
+from .dashboard import _calcular, metricas_dashboard
 from .forms import ClienteForm
 from .models import Cliente
+from .relatorios_pdf import contexto_relatorio_leads
 from .views import _mapear_status_negociacao_por_andamento
 
 
@@ -280,3 +288,79 @@ class N8nWebhookUrlSettingTests(TestCase):
     def test_settings_expõe_n8n_webhook_url(self):
         from django.conf import settings
         self.assertTrue(hasattr(settings, 'N8N_WEBHOOK_URL'))
+
+
+# Mesmo backend de producao: cada leitura do django_cache entra na contagem de queries.
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}})
+class MetricasDashboardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('createcachetable', verbosity=0)
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='admin_dash', password='123456', email='d@teste.com')
+        self.ana = User.objects.create_user(username='ana', password='123456')
+        self.bruno = User.objects.create_user(username='bruno', password='123456')
+        StatusN, TipoN = Cliente.StatusNegociacao, Cliente.TipoNegociacao
+        _criar_cliente(self.ana, status_negociacao=StatusN.VENDIDO, tipo_negociacao=TipoN.VENDA, fonte_cliente='Instagram')
+        _criar_cliente(self.ana, status_negociacao=StatusN.VENDIDO, tipo_negociacao=TipoN.CONSIGNACAO)
+        _criar_cliente(self.bruno, status_negociacao=StatusN.VENDIDO, tipo_negociacao=TipoN.VENDA, fonte_cliente='Instagram')
+        _criar_cliente(self.bruno, status_negociacao=StatusN.NOVO, tipo_negociacao=TipoN.VENDA)
+        _criar_cliente(self.bruno, status_negociacao=StatusN.AGENDADO, tipo_negociacao=TipoN.OUTRO)
+        _criar_cliente(self.bruno, status_negociacao=StatusN.FINALIZADO, tipo_negociacao=TipoN.VENDA)
+        # Vendidos fechados em 2, 4 e ~0 dias (a consignacao): media de 2.
+        agora = timezone.now()
+        for dias, cliente in zip((2, 4), Cliente.objects.filter(status_negociacao=StatusN.VENDIDO, tipo_negociacao=TipoN.VENDA)):
+            Cliente.objects.filter(pk=cliente.pk).update(
+                data_primeiro_contato=agora - timedelta(days=dias), data_ultimo_contato=agora,
+            )
+        self.inicio = timezone.localdate() - timedelta(days=30)
+        self.fim = timezone.localdate()
+
+    def test_metricas_saem_de_uma_consulta(self):
+        with self.assertNumQueries(1):
+            metricas = _calcular(self.inicio, self.fim)
+
+        self.assertEqual(metricas['total_clientes'], 6)
+        self.assertEqual(metricas['total_clientes_ativos'], 2)
+        self.assertEqual(metricas['taxa_conversao'], 50.0)
+        self.assertEqual(metricas['tempo_medio_fechamento_dias'], 2)
+        self.assertEqual(metricas['status'], [('Agendado', 1), ('Novo', 1)])
+        self.assertEqual(metricas['tipo_negociacao'], [('Venda', 4), ('Consignação', 1), ('Outro', 1)])
+        self.assertEqual(metricas['vendedor'], [('bruno', 4), ('ana', 2)])
+        self.assertEqual(metricas['fonte'], [('Nao informado', 4), ('Instagram', 2)])
+        self.assertEqual(metricas['vendas_por_vendedor'], [('ana', 1), ('bruno', 1)])
+        self.assertEqual(metricas['consignacao_por_vendedor'], [('ana', 1)])
+
+    def test_dashboard_e_pdf_leem_o_mesmo_cache(self):
+        self.client.force_login(self.admin)
+        url = reverse('relatorios') + f'?start_date={self.inicio}&end_date={self.fim}'
+
+        resposta = self.client.get(url)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['total_clientes'], 6)
+        self.assertEqual(resposta.context['vendedor_labels'], ['bruno', 'ana'])
+        # Fora de request (worker do PDF) o processo so confere a versao no django_cache.
+        with self.assertNumQueries(1):
+            contexto = contexto_relatorio_leads({'start_date': str(self.inicio), 'end_date': str(self.fim)})
+        self.assertEqual(contexto['vendedor_data'], {'bruno': 4, 'ana': 2})
+
+    def test_leitura_aquecida_dentro_do_request_nao_consulta_o_banco(self):
+        metricas_dashboard(self.inicio, self.fim)
+        iniciar_escopo_request()
+        self.addCleanup(encerrar_escopo_request)
+
+        with self.assertNumQueries(1):
+            metricas_dashboard(self.inicio, self.fim)
+        with self.assertNumQueries(0):
+            metricas_dashboard(self.inicio, self.fim)
+
+    def test_escrita_em_cliente_invalida_o_cache(self):
+        metricas_dashboard(self.inicio, self.fim)
+
+        _criar_cliente(self.ana, status_negociacao=Cliente.StatusNegociacao.NOVO)
+
+        self.assertEqual(metricas_dashboard(self.inicio, self.fim)['total_clientes'], 7)
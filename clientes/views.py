@@ -6,23 +6,22 @@ from .forms import ClienteForm, HistoricoForm, LeadAndamentoForm
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
-from datetime import timedelta, datetime
-from django.db.models import Avg, Count, F, ExpressionWrapper, fields, Q
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+from datetime import timedelta
+from django.db.models import Q
 import json
 from django.contrib.auth.models import User
 from collections import defaultdict
 from django.contrib import messages
 from core.audit import create_audit_log, get_client_ip
+from core.views import responder_relatorio_pdf
 from configuracoes.access import ModuleActionRequiredMixin, require_module_action
 from distribuicao.logic import enviar_webhook_n8n
 import logging
 
-logger = logging.getLogger(__name__)
+from .dashboard import CLOSED_STATUSES, metricas_dashboard, periodo_do_filtro
+from .relatorios_pdf import RELATORIO_ATRASADOS, RELATORIO_LEADS
 
-CLOSED_STATUSES = [Cliente.StatusNegociacao.FINALIZADO, Cliente.StatusNegociacao.VENDIDO]
+logger = logging.getLogger(__name__)
 
 
 def _mapear_status_negociacao_por_andamento(status_contato, etapa_funil):
@@ -498,83 +497,34 @@ def relatorio_dashboard(request):
     if not (request.user.is_superuser or (hasattr(request.user, 'profile') and request.user.profile.nivel_acesso == 'ADMIN')):
         raise PermissionDenied("Você não tem permissão para acessar esta página.")
 
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-
-    if start_date_str and end_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            end_date = timezone.now().date()
-            start_date = end_date - timedelta(days=30)
-    else:
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=30)
-
-    clientes_todos = Cliente.objects.filter(data_primeiro_contato__date__range=[start_date, end_date])
-    total_clientes = clientes_todos.count()
-    clientes_ativos = clientes_todos.exclude(status_negociacao__in=CLOSED_STATUSES)
-    
-    clientes_concluidos = clientes_todos.filter(status_negociacao=Cliente.StatusNegociacao.VENDIDO)
-
-    taxa_conversao = (clientes_concluidos.count() / total_clientes) * 100 if total_clientes > 0 else 0
+    start_date, end_date = periodo_do_filtro(request.GET.get('start_date'), request.GET.get('end_date'))
+    metricas = metricas_dashboard(start_date, end_date)
 
-    tempo_medio_fechamento_delta = clientes_concluidos.annotate(
-        duracao=ExpressionWrapper(F('data_ultimo_contato') - F('data_primeiro_contato'), output_field=fields.DurationField())
-    ).aggregate(tempo_medio=Avg('duracao'))['tempo_medio']
-    
-    tempo_medio_fechamento_dias = tempo_medio_fechamento_delta.days if tempo_medio_fechamento_delta else 0
-
-    status_data = clientes_ativos.values('status_negociacao').annotate(total=Count('id')).order_by('-total')
-    status_labels = [Cliente.StatusNegociacao(item['status_negociacao']).label for item in status_data]
-    status_values = [item['total'] for item in status_data]
-    
-    tipo_negociacao_data = clientes_todos.values('tipo_negociacao').annotate(total=Count('id')).order_by('-total')
-    tipo_negociacao_labels = [Cliente.TipoNegociacao(item['tipo_negociacao']).label for item in tipo_negociacao_data]
-    tipo_negociacao_values = [item['total'] for item in tipo_negociacao_data]
+    def rotulos(serie):
+        return [rotulo for rotulo, _ in metricas[serie]]
 
-    vendedor_data = clientes_todos.values('vendedor__username').annotate(total=Count('id')).order_by('-total')
-    vendedor_labels = [item['vendedor__username'] for item in vendedor_data]
-    vendedor_values = [item['total'] for item in vendedor_data]
-
-    fonte_data = clientes_todos.values('fonte_cliente').annotate(total=Count('id')).order_by('-total')
-    fonte_labels = json.dumps([item['fonte_cliente'] or 'Nao informado' for item in fonte_data], ensure_ascii=False)
-    fonte_values = json.dumps([item['total'] for item in fonte_data])
-
-    vendas_data = clientes_concluidos.filter(
-        tipo_negociacao=Cliente.TipoNegociacao.VENDA
-    ).values('vendedor__username').annotate(total=Count('id')).order_by('-total')
-    
-    vendas_por_vendedor_labels = [item['vendedor__username'] for item in vendas_data]
-    vendas_por_vendedor_values = [item['total'] for item in vendas_data]
-
-    consignacao_data = clientes_concluidos.filter(
-        tipo_negociacao=Cliente.TipoNegociacao.CONSIGNACAO
-    ).values('vendedor__username').annotate(total=Count('id')).order_by('-total')
-
-    consignacao_por_vendedor_labels = [item['vendedor__username'] for item in consignacao_data]
-    consignacao_por_vendedor_values = [item['total'] for item in consignacao_data]
+    def valores(serie):
+        return [total for _, total in metricas[serie]]
 
     context = {
-        'total_clientes': total_clientes,
-        'total_clientes_ativos': clientes_ativos.count(),
-        'taxa_conversao': round(taxa_conversao, 2),
-        'tempo_medio_fechamento_dias': tempo_medio_fechamento_dias,
-        'status_labels': status_labels,
-        'status_values': status_values,
-        'tipo_negociacao_labels': tipo_negociacao_labels,
-        'tipo_negociacao_values': tipo_negociacao_values,
-        'vendedor_labels': vendedor_labels,
-        'vendedor_values': vendedor_values,
-        'fonte_labels': fonte_labels,
-        'fonte_values': fonte_values,
+        'total_clientes': metricas['total_clientes'],
+        'total_clientes_ativos': metricas['total_clientes_ativos'],
+        'taxa_conversao': metricas['taxa_conversao'],
+        'tempo_medio_fechamento_dias': metricas['tempo_medio_fechamento_dias'],
+        'status_labels': rotulos('status'),
+        'status_values': valores('status'),
+        'tipo_negociacao_labels': rotulos('tipo_negociacao'),
+        'tipo_negociacao_values': valores('tipo_negociacao'),
+        'vendedor_labels': rotulos('vendedor'),
+        'vendedor_values': valores('vendedor'),
+        'fonte_labels': json.dumps(rotulos('fonte'), ensure_ascii=False),
+        'fonte_values': json.dumps(valores('fonte')),
         'start_date': start_date,
         'end_date': end_date,
-        'vendas_por_vendedor_labels': vendas_por_vendedor_labels,
-        'vendas_por_vendedor_values': vendas_por_vendedor_values,
-        'consignacao_por_vendedor_labels': consignacao_por_vendedor_labels,
-        'consignacao_por_vendedor_values': consignacao_por_vendedor_values,
+        'vendas_por_vendedor_labels': rotulos('vendas_por_vendedor'),
+        'vendas_por_vendedor_values': valores('vendas_por_vendedor'),
+        'consignacao_por_vendedor_labels': rotulos('consignacao_por_vendedor'),
+        'consignacao_por_vendedor_values': valores('consignacao_por_vendedor'),
     }
     
     return render(request, 'clientes/relatorios.html', context)
@@ -584,84 +534,11 @@ def exportar_relatorio_pdf(request):
     if not (request.user.is_superuser or (hasattr(request.user, 'profile') and request.user.profile.nivel_acesso == 'ADMIN')):
         raise PermissionDenied("Você não tem permissão para acessar esta página.")
 
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-
-    if start_date_str and end_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            end_date = timezone.now().date()
-            start_date = end_date - timedelta(days=30)
-    else:
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=30)
-
-    clientes_todos = Cliente.objects.filter(data_primeiro_contato__date__range=[start_date, end_date])
-    total_clientes = clientes_todos.count()
-    clientes_ativos = clientes_todos.exclude(status_negociacao__in=CLOSED_STATUSES)
-    
-    clientes_concluidos = clientes_todos.filter(status_negociacao=Cliente.StatusNegociacao.VENDIDO)
-
-    taxa_conversao = (clientes_concluidos.count() / total_clientes) * 100 if total_clientes > 0 else 0
-
-    tempo_medio_fechamento_delta = clientes_concluidos.annotate(
-        duracao=ExpressionWrapper(F('data_ultimo_contato') - F('data_primeiro_contato'), output_field=fields.DurationField())
-    ).aggregate(tempo_medio=Avg('duracao'))['tempo_medio']
-    
-    tempo_medio_fechamento_dias = tempo_medio_fechamento_delta.days if tempo_medio_fechamento_delta else 0
-
-    status_data_list = clientes_ativos.values('status_negociacao').annotate(total=Count('id')).order_by('-total')
-    status_data_dict = {Cliente.StatusNegociacao(item['status_negociacao']).label: item['total'] for item in status_data_list}
-
-    tipo_negociacao_list = clientes_todos.values('tipo_negociacao').annotate(total=Count('id')).order_by('-total')
-    tipo_negociacao_dict = {Cliente.TipoNegociacao(item['tipo_negociacao']).label: item['total'] for item in tipo_negociacao_list}
-
-    vendedor_list = clientes_todos.values('vendedor__username').annotate(total=Count('id')).order_by('-total')
-    vendedor_dict = {item['vendedor__username']: item['total'] for item in vendedor_list}
-
-    fonte_list = clientes_todos.values('fonte_cliente').annotate(total=Count('id')).order_by('-total')
-    fonte_dict = {item['fonte_cliente'] or 'Nao informado': item['total'] for item in fonte_list}
-
-    vendas_list = clientes_concluidos.filter(
-        tipo_negociacao=Cliente.TipoNegociacao.VENDA
-    ).values('vendedor__username').annotate(total=Count('id')).order_by('-total')
-    vendas_por_vendedor_dict = {item['vendedor__username']: item['total'] for item in vendas_list}
-
-    consignacao_list = clientes_concluidos.filter(
-        tipo_negociacao=Cliente.TipoNegociacao.CONSIGNACAO
-    ).values('vendedor__username').annotate(total=Count('id')).order_by('-total')
-    consignacao_por_vendedor_dict = {item['vendedor__username']: item['total'] for item in consignacao_list}
-
-    context = {
-        'total_clientes': total_clientes,
-        'total_clientes_ativos': clientes_ativos.count(),
-        'taxa_conversao': round(taxa_conversao, 2),
-        'tempo_medio_fechamento_dias': tempo_medio_fechamento_dias,
-        'status_data': status_data_dict,
-        'tipo_negociacao_data': tipo_negociacao_dict,
-        'vendedor_data': vendedor_dict,
-        'fonte_data': fonte_dict,
-        'start_date': start_date,
-        'end_date': end_date,
-        'vendas_por_vendedor_data': vendas_por_vendedor_dict,
-        'consignacao_por_vendedor_data': consignacao_por_vendedor_dict,
-    }
-    
-    template_path = 'clientes/relatorio_pdf.html'
-    template = get_template(template_path)
-    html = template.render(context)
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_leads.pdf"'
-
-    pisa_status = pisa.CreatePDF(
-       html, dest=response)
+    start_date, end_date = periodo_do_filtro(request.GET.get('start_date'), request.GET.get('end_date'))
 
-    if pisa_status.err:
-       return HttpResponse('Ocorreram alguns erros <pre>' + html + '</pre>')
-    return response
+    # O PDF e gerado pelo worker (clientes/relatorios_pdf.py); aqui so entra o pedido.
+    parametros = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+    return responder_relatorio_pdf(request, RELATORIO_LEADS, parametros)
 
 class ClienteDeleteView(ModuleActionRequiredMixin, DeleteView):
     module_key = 'clientes'
@@ -719,44 +596,7 @@ def exportar_relatorio_atrasados_pdf(request):
     if not (request.user.is_superuser or (hasattr(request.user, 'profile') and request.user.profile.nivel_acesso == 'ADMIN')):
         raise PermissionDenied("Você não tem permissão para acessar esta página.")
 
-    clientes_atrasados_qs = Cliente.objects.filter(
-        data_proximo_contato__lte=timezone.now()
-    ).exclude(
-        status_negociacao__in=CLOSED_STATUSES
-    ).select_related('vendedor').order_by('vendedor__username', 'data_proximo_contato')
-
-    selected_vendedores_ids_str = request.GET.getlist('vendedores')
-    if selected_vendedores_ids_str:
-        try:
-            selected_vendedores_ids = [int(id_str) for id_str in selected_vendedores_ids_str if id_str.isdigit()]
-            if selected_vendedores_ids:
-                clientes_atrasados_qs = clientes_atrasados_qs.filter(vendedor_id__in=selected_vendedores_ids)
-        except ValueError:
-            pass 
-
-    relatorio_agrupado = defaultdict(list)
-    for cliente in clientes_atrasados_qs:
-        nome_vendedor = "Sem Vendedor"
-        if cliente.vendedor:
-            nome_vendedor = cliente.vendedor.username
-        
-        relatorio_agrupado[nome_vendedor].append(cliente)
-
-    context = {
-        'relatorio_agrupado': dict(relatorio_agrupado),
-        'data_geracao': timezone.now(),
-    }
-    
-    template_path = 'clientes/relatorio_atrasados_pdf.html'
-    template = get_template(template_path)
-    html = template.render(context)
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_atrasados_por_vendedor.pdf"'
-
-    pisa_status = pisa.CreatePDF(
-       html, dest=response)
-
-    if pisa_status.err:
-       return HttpResponse('Ocorreram alguns erros <pre>' + html + '</pre>')
-    return response
+    selected_vendedores_ids = sorted({
+        int(id_str) for id_str in request.GET.getlist('vendedores') if id_str.isdigit()
+    })
+    return responder_relatorio_pdf(request, RELATORIO_ATRASADOS, {'vendedores': selected_vendedores_ids})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ConfiguracoesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'configuracoes'
+
+    def ready(self):
+        import configuracoes.signals  # noqa: F401
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from configuracoes.outbox import limpar_entregas_antigas, processar_entregas_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia os webhooks pendentes do outbox (EntregaWebhook), em paralelo e com retry. '
+        'Sem opcoes processa o que estiver vencido e sai; com --duracao/--loop continua '
+        'consultando a fila. Varios workers podem rodar ao mesmo tempo (SKIP LOCKED).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Roda ate ser interrompido.')
+        parser.add_argument(
+            '--duracao', type=float, default=0,
+            help='Continua consultando a fila por N segundos (ex: 55 no cron de minuto em minuto).',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help='Pausa em segundos quando a fila esta vazia (padrao: 1).',
+        )
+        parser.add_argument('--lote', type=int, default=None, help='Entregas reivindicadas por ciclo.')
+        parser.add_argument('--concorrencia', type=int, default=None, help='POSTs simultaneos por ciclo.')
+
+    def handle(self, *args, **options):
+        apagadas = limpar_entregas_antigas()
+        if apagadas:
+            self.stdout.write(f'{apagadas} entrega(s) antiga(s) removida(s) do outbox.')
+
+        fim = time.monotonic() + options['duracao']
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                processadas = processar_entregas_pendentes(options['lote'], options['concorrencia'])
+                total += processadas
+                if processadas:
+                    continue
+                if not options['loop'] and time.monotonic() >= fim:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        # Roda a cada minuto no cron: so escreve no log quando houve trabalho.
+        if total or options['verbosity'] > 1:
+            self.stdout.write(self.style.SUCCESS(f'Concluido: {total} entrega(s) processada(s).'))
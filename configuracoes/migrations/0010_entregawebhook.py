@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuracoes', '0009_configuracaointegracoes_notificar_leads_atrasados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntregaWebhook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('servico', models.CharField(blank=True, help_text='Slug do WebhookIntegracao de origem.', max_length=50)),
+                ('url', models.URLField(max_length=500)),
+                ('payload', models.JSONField(default=dict)),
+                ('timeout', models.PositiveSmallIntegerField(default=3)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=10)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('max_tentativas', models.PositiveSmallIntegerField(default=8)),
+                ('disponivel_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reservado_ate', models.DateTimeField(blank=True, null=True)),
+                ('reserva', models.CharField(blank=True, editable=False, max_length=32)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('ultimo_erro', models.CharField(blank=True, max_length=255)),
+                ('origem', models.CharField(blank=True, max_length=50)),
+                ('origem_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+                ('criado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('webhook', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='configuracoes.webhookintegracao')),
+            ],
+            options={
+                'verbose_name': 'Entrega de Webhook',
+                'verbose_name_plural': 'Entregas de Webhook',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'disponivel_em'], name='entregawebhook_fila_idx'), models.Index(fields=['origem', 'origem_id'], name='entregawebhook_origem_idx')],
+            },
+        ),
+    ]
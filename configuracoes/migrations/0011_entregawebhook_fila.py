@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuracoes', '0010_entregawebhook'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entregawebhook',
+            name='fila',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='entregawebhook',
+            index=models.Index(fields=['fila', 'status'], name='entregawebhook_serial_idx'),
+        ),
+    ]
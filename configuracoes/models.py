@@ -1,5 +1,8 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from core.singleton import CachedSingletonMixin
 
 
 class WebhookIntegracao(models.Model):
@@ -43,6 +46,59 @@ class ServicoWebhook:
     WHATSAPP_VENDA_REJEITADA = 'WHATSAPP_VENDA_REJEITADA'
 
 
+class EntregaWebhook(models.Model):
+    """Outbox dos webhooks de saída: enviar_webhook() só grava a linha (na mesma
+    transação do chamador) e o worker `manage.py processar_webhooks` faz o POST,
+    com retry e backoff. Nada se perde se o n8n estiver fora ou o processo reiniciar."""
+
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Pendente'
+        ENVIANDO = 'ENVIANDO', 'Enviando'
+        ENVIADO = 'ENVIADO', 'Enviado'
+        FALHOU = 'FALHOU', 'Falhou'
+
+    servico = models.CharField(max_length=50, blank=True, help_text="Slug do WebhookIntegracao de origem.")
+    webhook = models.ForeignKey(WebhookIntegracao, null=True, blank=True, on_delete=models.SET_NULL)
+    url = models.URLField(max_length=500)
+    payload = models.JSONField(default=dict)
+    timeout = models.PositiveSmallIntegerField(default=3)
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    max_tentativas = models.PositiveSmallIntegerField(default=8)
+    disponivel_em = models.DateTimeField(default=timezone.now)
+    reservado_ate = models.DateTimeField(null=True, blank=True)
+    reserva = models.CharField(max_length=32, blank=True, editable=False)
+
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    ultimo_erro = models.CharField(max_length=255, blank=True)
+
+    # Quem precisa registrar o resultado (ex: marketing_ia -> EnvioWebhook) escuta o
+    # sinal entrega_webhook_finalizada e filtra por origem/origem_id.
+    origem = models.CharField(max_length=50, blank=True)
+    origem_id = models.PositiveBigIntegerField(null=True, blank=True)
+    criado_por = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    # Entregas com a mesma fila saem uma de cada vez, na ordem em que foram gravadas
+    # (ex: posts do marketing pro mesmo fluxo do n8n). Vazia = sem ordem, em paralelo.
+    fila = models.CharField(max_length=100, blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Entrega de Webhook"
+        verbose_name_plural = "Entregas de Webhook"
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'disponivel_em'], name='entregawebhook_fila_idx'),
+            models.Index(fields=['origem', 'origem_id'], name='entregawebhook_origem_idx'),
+            models.Index(fields=['fila', 'status'], name='entregawebhook_serial_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.servico or self.url} #{self.pk} ({self.get_status_display()})"
+
+
 PROMPT_IMAGEM_PADRAO = (
     "Use a foto enviada como referência do veículo real (mantenha a carroceria, cor e "
     "detalhes fiéis ao original, sem alterar o veículo). Recrie a cena colocando o "
@@ -63,7 +119,7 @@ PROMPT_IMAGEM_LEONARDO_PADRAO = (
 )
 
 
-class ConfiguracaoIntegracoes(models.Model):
+class ConfiguracaoIntegracoes(CachedSingletonMixin, models.Model):
     """Singleton (get_solo) para credenciais externas hoje só disponíveis via env var."""
 
     evolution_api_url = models.CharField(max_length=255, blank=True, verbose_name="Evolution API - URL")
@@ -197,8 +253,7 @@ class ConfiguracaoIntegracoes(models.Model):
 
     @classmethod
     def get_solo(cls):
-        obj, _ = cls.objects.get_or_create(pk=1)
-        return obj
+        return cls.carregar_singleton()
 
 
 class ModuloSistema(models.Model):
@@ -0,0 +1,174 @@
+"""
+Outbox dos webhooks de saida (configuracoes.EntregaWebhook).
+
+Quem dispara um webhook so grava a linha (`enfileirar_entrega`, usado por
+resolver.enviar_webhook e pelo marketing_ia); o POST acontece no worker
+`manage.py processar_webhooks`, fora do request. O worker reivindica um lote de
+linhas vencidas com SELECT ... FOR UPDATE SKIP LOCKED (Postgres; no SQLite, que nao
+tem lock de linha, com um UPDATE condicional), envia o lote em paralelo numa
+ThreadPoolExecutor e reagenda as falhas com backoff exponencial.
+
+Entregas com `fila` preenchida sao serializadas: so a mais antiga ainda aberta
+(PENDENTE ou ENVIANDO) de cada fila pode ser reivindicada, entao a seguinte so sai
+depois que a anterior terminar (ENVIADO ou FALHOU), mesmo com o worker atrasado ou
+dois workers rodando juntos.
+
+Uma linha reivindicada fica ENVIANDO ate `reservado_ate`: se o worker morrer no meio,
+ela volta a ser elegivel quando a reserva expira (entrega pelo menos uma vez).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import uuid
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Min, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import EntregaWebhook
+
+
+logger = logging.getLogger(__name__)
+
+# Disparado quando a entrega termina (ENVIADO, ou FALHOU sem mais tentativas).
+# kwargs: entrega (EntregaWebhook).
+entrega_webhook_finalizada = Signal()
+
+# 4xx que valem retry; os demais 4xx indicam payload/URL errados e falham de vez.
+_STATUS_4XX_TRANSITORIOS = {408, 409, 425, 429}
+
+
+def enfileirar_entrega(url, payload, *, timeout=3, servico='', webhook=None, origem='', origem_id=None,
+                       criado_por=None, disponivel_em=None, fila=''):
+    """Grava a entrega no outbox, na transacao corrente do chamador (se houver).
+    Entregas com a mesma `fila` sao enviadas uma de cada vez, em ordem."""
+    return EntregaWebhook.objects.create(
+        url=url,
+        payload=payload,
+        timeout=timeout,
+        servico=servico,
+        webhook=webhook,
+        origem=origem,
+        origem_id=origem_id,
+        criado_por=criado_por,
+        fila=fila,
+        max_tentativas=settings.WEBHOOK_OUTBOX_MAX_TENTATIVAS,
+        disponivel_em=disponivel_em or timezone.now(),
+    )
+
+
+def calcular_backoff(tentativas):
+    """Segundos ate a proxima tentativa: base * 2^(n-1), limitado a WEBHOOK_OUTBOX_BACKOFF_MAX."""
+    base = settings.WEBHOOK_OUTBOX_BACKOFF_BASE
+    return min(base * (2 ** max(tentativas - 1, 0)), settings.WEBHOOK_OUTBOX_BACKOFF_MAX)
+
+
+def _filtro_elegiveis(agora):
+    # Numa fila serializada so a primeira entrega ainda aberta e candidata; se ela
+    # estiver ENVIANDO (reserva valida), a fila inteira espera.
+    primeiras_das_filas = (
+        EntregaWebhook.objects.exclude(fila='')
+        .filter(status__in=[EntregaWebhook.Status.PENDENTE, EntregaWebhook.Status.ENVIANDO])
+        .values('fila')
+        .annotate(primeira=Min('pk'))
+        .values('primeira')
+    )
+    return (
+        Q(status=EntregaWebhook.Status.PENDENTE, disponivel_em__lte=agora)
+        | Q(status=EntregaWebhook.Status.ENVIANDO, reservado_ate__lt=agora)
+    ) & (Q(fila='') | Q(pk__in=primeiras_das_filas))
+
+
+def reivindicar_entregas(limite):
+    """Marca ate `limite` entregas vencidas como ENVIANDO para este worker e as retorna."""
+    agora = timezone.now()
+    reserva = uuid.uuid4().hex
+    filtro = _filtro_elegiveis(agora)
+
+    with transaction.atomic():
+        candidatas = EntregaWebhook.objects.filter(filtro).order_by('disponivel_em', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            # Linhas travadas por outro worker sao puladas, entao varios workers dividem a fila.
+            candidatas = candidatas.select_for_update(skip_locked=True)
+        ids = list(candidatas.values_list('pk', flat=True)[:limite])
+        if not ids:
+            return []
+        # Sem lock de linha (SQLite), repetir o filtro no UPDATE garante que uma linha
+        # ja reivindicada por outro processo entre o SELECT e aqui nao seja pega de novo.
+        EntregaWebhook.objects.filter(filtro, pk__in=ids).update(
+            status=EntregaWebhook.Status.ENVIANDO,
+            reserva=reserva,
+            reservado_ate=agora + timedelta(seconds=settings.WEBHOOK_OUTBOX_RESERVA_SEGUNDOS),
+            tentativas=F('tentativas') + 1,
+        )
+    return list(EntregaWebhook.objects.filter(reserva=reserva, status=EntregaWebhook.Status.ENVIANDO))
+
+
+def _enviar(entrega):
+    """Faz o POST (roda nas threads do pool, sem tocar no banco). Retorna (status_code, erro)."""
+    try:
+        response = requests.post(entrega.url, json=entrega.payload, timeout=entrega.timeout)
+    except requests.exceptions.RequestException as exc:
+        return None, str(exc)
+    if 200 <= response.status_code < 300:
+        return response.status_code, ''
+    return response.status_code, f'HTTP {response.status_code}: {response.text[:200]}'
+
+
+def _registrar_resultado(entrega, status_code, erro):
+    agora = timezone.now()
+    entrega.status_code = status_code
+    entrega.ultimo_erro = (erro or '')[:255]
+    entrega.reserva = ''
+    entrega.reservado_ate = None
+
+    definitivo = status_code is not None and 400 <= status_code < 500 and status_code not in _STATUS_4XX_TRANSITORIOS
+    if not erro:
+        entrega.status = EntregaWebhook.Status.ENVIADO
+        entrega.enviado_em = agora
+    elif definitivo or entrega.tentativas >= entrega.max_tentativas:
+        entrega.status = EntregaWebhook.Status.FALHOU
+        logger.warning("Webhook '%s' (entrega %s) falhou de vez: %s", entrega.servico or entrega.url, entrega.pk, erro)
+    else:
+        entrega.status = EntregaWebhook.Status.PENDENTE
+        entrega.disponivel_em = agora + timedelta(seconds=calcular_backoff(entrega.tentativas))
+        logger.info("Webhook '%s' (entrega %s) reagendado: %s", entrega.servico or entrega.url, entrega.pk, erro)
+
+    entrega.save(update_fields=[
+        'status', 'status_code', 'ultimo_erro', 'reserva', 'reservado_ate', 'enviado_em', 'disponivel_em',
+    ])
+    if entrega.status != EntregaWebhook.Status.PENDENTE:
+        try:
+            entrega_webhook_finalizada.send(sender=EntregaWebhook, entrega=entrega)
+        except Exception:
+            logger.exception("Falha em receiver de entrega_webhook_finalizada (entrega %s).", entrega.pk)
+
+
+def processar_entregas_pendentes(limite=None, concorrencia=None):
+    """Um ciclo do worker: reivindica, envia em paralelo e grava o resultado. Retorna quantas processou."""
+    limite = limite or settings.WEBHOOK_OUTBOX_LOTE
+    concorrencia = concorrencia or settings.WEBHOOK_OUTBOX_CONCORRENCIA
+
+    entregas = reivindicar_entregas(limite)
+    if not entregas:
+        return 0
+
+    # So o HTTP vai para as threads; o resultado e gravado aqui, na conexao do worker.
+    with ThreadPoolExecutor(max_workers=min(concorrencia, len(entregas))) as pool:
+        resultados = list(pool.map(_enviar, entregas))
+    for entrega, (status_code, erro) in zip(entregas, resultados):
+        _registrar_resultado(entrega, status_code, erro)
+    return len(entregas)
+
+
+def limpar_entregas_antigas(dias=None):
+    """Apaga entregas ja ENVIADAS ha mais de `dias` (WEBHOOK_OUTBOX_RETENCAO_DIAS)."""
+    dias = settings.WEBHOOK_OUTBOX_RETENCAO_DIAS if dias is None else dias
+    limite = timezone.now() - timedelta(days=dias)
+    apagadas, _ = EntregaWebhook.objects.filter(
+        status=EntregaWebhook.Status.ENVIADO, enviado_em__lt=limite,
+    ).delete()
+    return apagadas
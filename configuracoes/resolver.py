@@ -1,6 +1,9 @@
 import logging
 
 from django.conf import settings
+from django.db import transaction
+
+from core.cache_versionado import CacheVersionado
 
 logger = logging.getLogger(__name__)
 
@@ -29,16 +32,20 @@ def obter_webhook_url(servico):
 
 
 def enviar_webhook(servico, payload, timeout=3):
-    """POST fire-and-forget: nunca lança exceção pro chamador."""
-    import requests
+    """Enfileira o POST no outbox (EntregaWebhook); quem envia e o worker
+    `manage.py processar_webhooks`, com retry. Nunca lança exceção pro chamador."""
+    from .outbox import enfileirar_entrega
 
     url = obter_webhook_url(servico)
     if not url:
-        return
+        return None
     try:
-        requests.post(url, json=payload, timeout=timeout)
+        # Savepoint proprio: uma falha aqui nao pode invalidar a transacao do chamador.
+        with transaction.atomic():
+            return enfileirar_entrega(url, payload, timeout=timeout, servico=servico)
     except Exception as e:
-        logger.warning("Falha no webhook '%s': %s", servico, e)
+        logger.warning("Falha ao enfileirar webhook '%s': %s", servico, e)
+        return None
 
 
 def obter_integracao(campo):
@@ -53,42 +60,44 @@ def obter_integracao(campo):
     return getattr(settings, campo.upper(), '')
 
 
+def _tem_acesso_total(user):
+    if user.is_superuser:
+        return True
+    profile = getattr(user, 'profile', None)
+    return getattr(profile, 'nivel_acesso', '') == 'ADMIN'
+
+
 def has_module_action(user, module_slug, action):
     """action em {'visualizar', 'criar', 'editar', 'excluir'}."""
     if not getattr(user, 'is_authenticated', False):
         return False
-    if user.is_superuser:
+    if _tem_acesso_total(user):
         return True
 
-    profile = getattr(user, 'profile', None)
-    if getattr(profile, 'nivel_acesso', '') == 'ADMIN':
-        return True
-
-    from .models import PermissaoModulo
-
-    perm = PermissaoModulo.objects.filter(user=user, modulo__slug=module_slug).first()
-    if perm is None:
+    acoes = obter_matriz_permissoes(user).get(module_slug)
+    if acoes is None:
         return False
-    return getattr(perm, f'pode_{action}', False)
+    return acoes.get(action, False)
 
 
 ACOES = ('visualizar', 'criar', 'editar', 'excluir')
 
+# A matriz de cada usuario fica num CacheVersionado (core/cache_versionado.py): copia por
+# processo na frente do cache compartilhado, com a versao lida do django_cache no maximo
+# uma vez por request. Qualquer alteracao em PermissaoModulo ou ModuloSistema
+# (configuracoes/signals.py) troca a versao, e as matrizes antigas deixam de ser lidas.
+_cache_permissoes = CacheVersionado('permissoes')
 
-def obter_matriz_permissoes(user):
-    """Matriz {modulo_slug: {'visualizar':bool,'criar':bool,'editar':bool,'excluir':bool}}
-    pra todos os modulos, em no maximo 2 queries (evita N+1 nos templates/nav)."""
-    from .models import ModuloSistema, PermissaoModulo
 
-    modulos = list(ModuloSistema.objects.all())
+def invalidar_cache_permissoes():
+    """Descarta as matrizes de permissao cacheadas de todos os usuarios."""
+    _cache_permissoes.invalidar()
 
-    if not getattr(user, 'is_authenticated', False):
-        return {m.slug: {acao: False for acao in ACOES} for m in modulos}
 
-    acesso_total = user.is_superuser
-    if not acesso_total:
-        profile = getattr(user, 'profile', None)
-        acesso_total = getattr(profile, 'nivel_acesso', '') == 'ADMIN'
+def _montar_matriz_permissoes(user, acesso_total):
+    from .models import ModuloSistema, PermissaoModulo
+
+    modulos = list(ModuloSistema.objects.all())
 
     if acesso_total:
         return {m.slug: {acao: True for acao in ACOES} for m in modulos}
@@ -102,3 +111,18 @@ def obter_matriz_permissoes(user):
             for acao in ACOES
         }
     return resultado
+
+
+def obter_matriz_permissoes(user):
+    """Matriz {modulo_slug: {'visualizar':bool,'criar':bool,'editar':bool,'excluir':bool}}
+    pra todos os modulos. Servida do cache (chave por usuario, ou unica pra quem tem
+    acesso total); no miss custa no maximo 2 queries (evita N+1 nos templates/nav).
+    A matriz e compartilhada pelo processo: so leitura."""
+    if not getattr(user, 'is_authenticated', False):
+        from .models import ModuloSistema
+
+        return {m.slug: {acao: False for acao in ACOES} for m in ModuloSistema.objects.all()}
+
+    acesso_total = _tem_acesso_total(user)
+    escopo = 'total' if acesso_total else f'user:{user.pk}'
+    return _cache_permissoes.obter(f'matriz:{escopo}', lambda: _montar_matriz_permissoes(user, acesso_total))
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ModuloSistema, PermissaoModulo
+from .resolver import invalidar_cache_permissoes
+
+
+@receiver(post_save, sender=PermissaoModulo)
+@receiver(post_delete, sender=PermissaoModulo)
+@receiver(post_save, sender=ModuloSistema)
+@receiver(post_delete, sender=ModuloSistema)
+def invalidar_matriz_permissoes(sender, **kwargs):
+    """Qualquer alteracao na matriz usuario x modulo descarta as matrizes cacheadas."""
+    invalidar_cache_permissoes()
@@ -1,9 +1,20 @@
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+import json
+import threading
 from unittest.mock import patch
 
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase, override_settings
+from django.utils import timezone
 
-from .models import ConfiguracaoIntegracoes, ModuloSistema, PermissaoModulo, WebhookIntegracao
+from .models import ConfiguracaoIntegracoes, EntregaWebhook, ModuloSistema, PermissaoModulo, WebhookIntegracao
+from .outbox import (
+    calcular_backoff, enfileirar_entrega, entrega_webhook_finalizada, processar_entregas_pendentes,
+    reivindicar_entregas,
+)
 from .resolver import enviar_webhook, has_module_action, obter_integracao, obter_webhook_url
 
 
@@ -36,20 +47,213 @@ class ObterWebhookUrlTests(TestCase):
 
 class EnviarWebhookTests(TestCase):
     @patch('requests.post')
-    def test_nao_chama_requests_se_sem_url(self, mock_post):
-        enviar_webhook('SERVICO_SEM_URL', {'a': 1})
+    def test_nao_enfileira_se_sem_url(self, mock_post):
+        self.assertIsNone(enviar_webhook('SERVICO_SEM_URL', {'a': 1}))
+        self.assertFalse(EntregaWebhook.objects.exists())
         mock_post.assert_not_called()
 
     @patch('requests.post')
-    def test_chama_requests_quando_ha_url(self, mock_post):
+    def test_enfileira_no_outbox_sem_chamar_requests(self, mock_post):
         WebhookIntegracao.objects.create(nome='Teste', slug='TESTE', url='https://painel.exemplo/webhook', ativo=True)
-        enviar_webhook('TESTE', {'a': 1}, timeout=5)
-        mock_post.assert_called_once_with('https://painel.exemplo/webhook', json={'a': 1}, timeout=5)
+        entrega = enviar_webhook('TESTE', {'a': 1}, timeout=5)
+        mock_post.assert_not_called()
+        entrega.refresh_from_db()
+        self.assertEqual(entrega.url, 'https://painel.exemplo/webhook')
+        self.assertEqual(entrega.payload, {'a': 1})
+        self.assertEqual(entrega.timeout, 5)
+        self.assertEqual(entrega.servico, 'TESTE')
+        self.assertEqual(entrega.status, EntregaWebhook.Status.PENDENTE)
 
-    @patch('requests.post', side_effect=Exception('falhou'))
-    def test_excecao_de_rede_nao_propaga(self, mock_post):
+    @patch('configuracoes.outbox.enfileirar_entrega', side_effect=Exception('falhou'))
+    def test_excecao_ao_enfileirar_nao_propaga(self, mock_enfileirar):
         WebhookIntegracao.objects.create(nome='Teste', slug='TESTE', url='https://painel.exemplo/webhook', ativo=True)
-        enviar_webhook('TESTE', {'a': 1})  # nao deve lancar
+        self.assertIsNone(enviar_webhook('TESTE', {'a': 1}))  # nao deve lancar
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.recebidos.append((self.path, json.loads(corpo or b'null')))
+        status = self.server.respostas.get(self.path, 200)
+        self.send_response(status)
+        self.end_headers()
+        self.wfile.write(b'ok' if status < 300 else b'erro')
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    WEBHOOK_OUTBOX_BACKOFF_BASE=30, WEBHOOK_OUTBOX_BACKOFF_MAX=3600, WEBHOOK_OUTBOX_MAX_TENTATIVAS=3,
+)
+class OutboxWebhookTests(TestCase):
+    """Worker do outbox contra um servidor HTTP local (sem rede externa)."""
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.servidor.recebidos = []
+        self.servidor.respostas = {}
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.base_url = f'http://127.0.0.1:{self.servidor.server_address[1]}'
+
+    def _enfileirar(self, caminho='/ok', payload=None, **kwargs):
+        return enfileirar_entrega(f'{self.base_url}{caminho}', payload or {'n': caminho}, **kwargs)
+
+    def test_envia_em_paralelo_e_marca_como_enviado(self):
+        entregas = [self._enfileirar(f'/ok{i}') for i in range(5)]
+
+        self.assertEqual(processar_entregas_pendentes(concorrencia=4), 5)
+
+        self.assertEqual(len(self.servidor.recebidos), 5)
+        for entrega in entregas:
+            entrega.refresh_from_db()
+            self.assertEqual(entrega.status, EntregaWebhook.Status.ENVIADO)
+            self.assertEqual(entrega.status_code, 200)
+            self.assertEqual(entrega.tentativas, 1)
+            self.assertIsNotNone(entrega.enviado_em)
+        self.assertIn(('/ok0', {'n': '/ok0'}), self.servidor.recebidos)
+
+    def test_erro_5xx_reagenda_com_backoff_exponencial(self):
+        self.servidor.respostas['/instavel'] = 503
+        entrega = self._enfileirar('/instavel')
+
+        processar_entregas_pendentes()
+        entrega.refresh_from_db()
+        self.assertEqual(entrega.status, EntregaWebhook.Status.PENDENTE)
+        self.assertEqual(entrega.status_code, 503)
+        self.assertIn('HTTP 503', entrega.ultimo_erro)
+        atraso = (entrega.disponivel_em - timezone.now()).total_seconds()
+        self.assertTrue(25 < atraso <= 30, atraso)
+
+        # Ainda nao venceu: o proximo ciclo nao pega a entrega.
+        self.assertEqual(processar_entregas_pendentes(), 0)
+
+        EntregaWebhook.objects.filter(pk=entrega.pk).update(disponivel_em=timezone.now())
+        self.servidor.respostas['/instavel'] = 200
+        processar_entregas_pendentes()
+        entrega.refresh_from_db()
+        self.assertEqual(entrega.status, EntregaWebhook.Status.ENVIADO)
+        self.assertEqual(entrega.tentativas, 2)
+        self.assertEqual(entrega.ultimo_erro, '')
+
+    def test_backoff_dobra_e_respeita_o_teto(self):
+        self.assertEqual([calcular_backoff(n) for n in (1, 2, 3)], [30, 60, 120])
+        self.assertEqual(calcular_backoff(20), 3600)
+
+    def test_esgota_tentativas_e_dispara_sinal(self):
+        self.servidor.respostas['/fora'] = 500
+        entrega = self._enfileirar('/fora')
+        finalizadas = []
+        receiver = lambda sender, entrega, **kw: finalizadas.append(entrega.pk)  # noqa: E731
+        entrega_webhook_finalizada.connect(receiver)
+        self.addCleanup(entrega_webhook_finalizada.disconnect, receiver)
+
+        for _ in range(3):
+            EntregaWebhook.objects.filter(pk=entrega.pk).update(disponivel_em=timezone.now())
+            processar_entregas_pendentes()
+
+        entrega.refresh_from_db()
+        self.assertEqual(entrega.status, EntregaWebhook.Status.FALHOU)
+        self.assertEqual(entrega.tentativas, 3)
+        self.assertEqual(finalizadas, [entrega.pk])
+
+    def test_4xx_definitivo_falha_sem_retry(self):
+        self.servidor.respostas['/invalido'] = 404
+        entrega = self._enfileirar('/invalido')
+        processar_entregas_pendentes()
+        entrega.refresh_from_db()
+        self.assertEqual(entrega.status, EntregaWebhook.Status.FALHOU)
+        self.assertEqual(entrega.tentativas, 1)
+
+    def test_erro_de_conexao_reagenda(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        entrega = self._enfileirar('/qualquer')
+        processar_entregas_pendentes()
+        entrega.refresh_from_db()
+        self.assertEqual(entrega.status, EntregaWebhook.Status.PENDENTE)
+        self.assertIsNone(entrega.status_code)
+        self.assertTrue(entrega.ultimo_erro)
+
+    def test_reivindicacao_nao_pega_a_mesma_linha_duas_vezes(self):
+        for i in range(3):
+            self._enfileirar(f'/ok{i}')
+        primeiras = reivindicar_entregas(2)
+        restantes = reivindicar_entregas(10)
+        self.assertEqual(len(primeiras), 2)
+        self.assertEqual(len(restantes), 1)
+        self.assertFalse({e.pk for e in primeiras} & {e.pk for e in restantes})
+        self.assertEqual(reivindicar_entregas(10), [])
+
+    def test_reserva_expirada_volta_para_a_fila(self):
+        entrega = self._enfileirar('/ok')
+        reivindicar_entregas(10)  # worker "morreu" sem registrar o resultado
+        self.assertEqual(processar_entregas_pendentes(), 0)
+
+        EntregaWebhook.objects.filter(pk=entrega.pk).update(reservado_ate=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(processar_entregas_pendentes(), 1)
+        entrega.refresh_from_db()
+        self.assertEqual(entrega.status, EntregaWebhook.Status.ENVIADO)
+        self.assertEqual(entrega.tentativas, 2)
+
+    def test_fila_serializada_envia_uma_de_cada_vez_em_ordem(self):
+        serializadas = [self._enfileirar(f'/fila{i}', fila='destino') for i in range(3)]
+        for i in range(2):
+            self._enfileirar(f'/livre{i}')
+
+        # Worker atrasado: tudo ja venceu, mas da fila so sai a primeira.
+        self.assertEqual(processar_entregas_pendentes(), 3)
+        self.assertEqual(processar_entregas_pendentes(), 1)
+        self.assertEqual(processar_entregas_pendentes(), 1)
+        self.assertEqual(processar_entregas_pendentes(), 0)
+
+        caminhos = [caminho for caminho, _ in self.servidor.recebidos if caminho.startswith('/fila')]
+        self.assertEqual(caminhos, ['/fila0', '/fila1', '/fila2'])
+        self.assertEqual(
+            set(EntregaWebhook.objects.filter(pk__in=[e.pk for e in serializadas]).values_list('status', flat=True)),
+            {EntregaWebhook.Status.ENVIADO},
+        )
+
+    def test_fila_espera_a_entrega_em_andamento_e_a_reagendada(self):
+        self.servidor.respostas['/fila0'] = 503
+        primeira = self._enfileirar('/fila0', fila='destino')
+        self._enfileirar('/fila1', fila='destino')
+        self._enfileirar('/outra', fila='outro-destino')
+
+        # Outro worker esta com a primeira em maos: a segunda nao pode sair junto.
+        em_andamento = reivindicar_entregas(10)
+        self.assertEqual(sorted(e.url[len(self.base_url):] for e in em_andamento), ['/fila0', '/outra'])
+        self.assertEqual(reivindicar_entregas(10), [])
+
+        # Reagendada com backoff, a primeira continua segurando a fila.
+        EntregaWebhook.objects.filter(pk=primeira.pk).update(reservado_ate=timezone.now() - timedelta(seconds=1))
+        processar_entregas_pendentes()
+        primeira.refresh_from_db()
+        self.assertEqual(primeira.status, EntregaWebhook.Status.PENDENTE)
+        self.assertEqual(processar_entregas_pendentes(), 0)
+
+        self.servidor.respostas['/fila0'] = 200
+        EntregaWebhook.objects.filter(pk=primeira.pk).update(disponivel_em=timezone.now())
+        self.assertEqual(processar_entregas_pendentes(), 1)
+        self.assertEqual(processar_entregas_pendentes(), 1)
+        self.assertEqual(self.servidor.recebidos[-1][0], '/fila1')
+
+    def test_comando_processa_e_limpa_entregas_antigas(self):
+        antiga = self._enfileirar('/ok-antiga')
+        EntregaWebhook.objects.filter(pk=antiga.pk).update(
+            status=EntregaWebhook.Status.ENVIADO, enviado_em=timezone.now() - timedelta(days=60),
+        )
+        nova = self._enfileirar('/ok-nova')
+
+        saida = StringIO()
+        call_command('processar_webhooks', stdout=saida)
+
+        self.assertFalse(EntregaWebhook.objects.filter(pk=antiga.pk).exists())
+        nova.refresh_from_db()
+        self.assertEqual(nova.status, EntregaWebhook.Status.ENVIADO)
+        self.assertIn('1 entrega(s) processada(s)', saida.getvalue())
 
 
 class ObterIntegracaoTests(TestCase):
@@ -65,3 +65,7 @@ class RegistroPontoAdmin(admin.ModelAdmin):
     search_fields = ('funcionario__user__first_name', 'funcionario__user__last_name', 'ip_registrado', 'justificativa_atraso')
     autocomplete_fields = ('funcionario', 'homologado_por')
     date_hierarchy = 'data'
+
+    def get_queryset(self, request):
+        # A listagem nao precisa das fotos em base64 das linhas ainda nao migradas.
+        return super().get_queryset(request).sem_fotos_legado()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ControlePontoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'controle_ponto'
+
+    def ready(self):
+        import controle_ponto.signals  # noqa: F401
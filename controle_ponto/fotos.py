@@ -0,0 +1,64 @@
+"""
+Fotos das batidas de ponto no storage (FotoRegistroPonto).
+
+O relogio de ponto manda a foto como data URL base64; aqui ela e decodificada e
+gravada como arquivo, e a linha do RegistroPonto fica so com os horarios.
+"""
+import base64
+import binascii
+import logging
+
+from django.core.files.base import ContentFile
+
+from .models import FotoRegistroPonto
+
+
+logger = logging.getLogger(__name__)
+
+EXTENSOES_IMAGEM = {
+    'jpeg': 'jpg',
+    'jpg': 'jpg',
+    'png': 'png',
+    'webp': 'webp',
+}
+
+
+def decodificar_foto_base64(foto_base64):
+    """'data:image/<tipo>;base64,<dados>' -> (bytes, extensao). None se nao for uma imagem valida."""
+    if not foto_base64 or ';base64,' not in foto_base64:
+        return None
+
+    header, encoded = foto_base64.split(';base64,', 1)
+    if not header.startswith('data:image/'):
+        return None
+
+    mime = header.replace('data:image/', '').lower()
+    try:
+        conteudo = base64.b64decode(encoded)
+    except (binascii.Error, ValueError):
+        return None
+    if not conteudo:
+        return None
+    return conteudo, EXTENSOES_IMAGEM.get(mime, 'jpg')
+
+
+def salvar_foto_batida(registro, tipo, foto_base64):
+    """Grava (ou substitui) a foto `tipo` do registro no storage. Retorna a FotoRegistroPonto,
+    ou None se o base64 nao for uma imagem valida. Erros do storage sobem para o chamador."""
+    decodificada = decodificar_foto_base64(foto_base64)
+    if decodificada is None:
+        return None
+    conteudo, extensao = decodificada
+
+    foto = FotoRegistroPonto.objects.filter(registro=registro, tipo=tipo).first()
+    arquivo_antigo = foto.imagem.name if foto else ''
+    if foto is None:
+        foto = FotoRegistroPonto(registro=registro, tipo=tipo)
+    foto.imagem.save(f'{tipo}.{extensao}', ContentFile(conteudo), save=True)
+
+    if arquivo_antigo and arquivo_antigo != foto.imagem.name:
+        try:
+            foto.imagem.storage.delete(arquivo_antigo)
+        except Exception:
+            logger.warning('Falha ao remover foto de ponto substituida: %s', arquivo_antigo, exc_info=True)
+    return foto
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from controle_ponto.fotos import salvar_foto_batida
+from controle_ponto.models import CAMPOS_FOTO_LEGADO, FotoRegistroPonto, RegistroPonto
+
+
+def _filtro_com_foto_legado():
+    filtro = Q()
+    for campo in CAMPOS_FOTO_LEGADO:
+        filtro |= Q(**{f'{campo}__isnull': False}) & ~Q(**{campo: ''})
+    return filtro
+
+
+class Command(BaseCommand):
+    help = (
+        'Move as fotos em base64 das linhas antigas de RegistroPonto para o storage '
+        '(FotoRegistroPonto) e esvazia as colunas legadas. Processa em lotes por id e '
+        'pode ser interrompido e executado de novo: so pega linhas que ainda tem foto '
+        'em base64.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100, help='Ids de RegistroPonto por lote (padrao: 100).')
+        parser.add_argument('--limite', type=int, default=0, help='Para depois de N registros (padrao: todos).')
+        parser.add_argument('--desde-id', type=int, default=0, help='Comeca a partir deste id de RegistroPonto.')
+        parser.add_argument('--dry-run', action='store_true', help='So conta o que seria migrado.')
+
+    def handle(self, *args, **options):
+        lote = max(1, options['lote'])
+        limite = options['limite']
+        pendentes = RegistroPonto.objects.filter(_filtro_com_foto_legado())
+
+        if options['dry_run']:
+            total = pendentes.filter(pk__gt=options['desde_id']).count()
+            self.stdout.write(f'{total} registro(s) de ponto com foto em base64 para migrar.')
+            return
+
+        ultimo_id = options['desde_id']
+        registros = fotos = invalidas = 0
+        while not limite or registros < limite:
+            # Paginacao por id (keyset): cada lote le so os ids, sem as fotos.
+            ids = list(
+                pendentes.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            for registro_id in ids:
+                movidas, descartadas = self._migrar_registro(registro_id)
+                fotos += movidas
+                invalidas += descartadas
+                registros += 1
+                ultimo_id = registro_id
+                if limite and registros >= limite:
+                    break
+            self.stdout.write(f'... {registros} registro(s), {fotos} foto(s) movida(s) (ultimo id: {ultimo_id})')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Concluido: {registros} registro(s), {fotos} foto(s) movida(s) para o storage, '
+            f'{invalidas} foto(s) invalida(s) mantida(s) na linha. Ultimo id: {ultimo_id}.'
+        ))
+
+    def _migrar_registro(self, registro_id):
+        """Carrega uma linha por vez (as fotos pesam centenas de KB cada)."""
+        registro = (
+            RegistroPonto.objects.only('pk', 'data', 'funcionario_id', *CAMPOS_FOTO_LEGADO)
+            .filter(pk=registro_id)
+            .first()
+        )
+        if registro is None:
+            return 0, 0
+
+        ja_no_storage = set(registro.fotos.values_list('tipo', flat=True))
+        movidas = descartadas = 0
+        limpar = []
+        for tipo in FotoRegistroPonto.Tipo.values:
+            campo = f'foto_{tipo}'
+            foto_base64 = getattr(registro, campo)
+            if not foto_base64:
+                continue
+            if tipo in ja_no_storage or salvar_foto_batida(registro, tipo, foto_base64):
+                limpar.append(campo)
+                movidas += tipo not in ja_no_storage
+            else:
+                descartadas += 1
+                self.stdout.write(self.style.WARNING(f'Registro {registro_id}: {campo} nao e uma imagem base64 valida.'))
+
+        if limpar:
+            # So esvazia depois que o arquivo foi gravado: se cair no meio, a proxima
+            # execucao retoma deste registro.
+            RegistroPonto.objects.filter(pk=registro_id).update(**{campo: None for campo in limpar})
+        return movidas, descartadas
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:33
+
+import controle_ponto.models
+import crmspagi.storage_backends
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controle_ponto', '0008_alter_configuracaoponto_ip_permitido'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroponto',
+            name='foto_entrada',
+            field=models.TextField(blank=True, null=True, verbose_name='Foto Entrada (Base64, legado)'),
+        ),
+        migrations.AlterField(
+            model_name='registroponto',
+            name='foto_retorno_almoco',
+            field=models.TextField(blank=True, null=True, verbose_name='Foto Retorno Almoço (legado)'),
+        ),
+        migrations.AlterField(
+            model_name='registroponto',
+            name='foto_saida',
+            field=models.TextField(blank=True, null=True, verbose_name='Foto Saída (legado)'),
+        ),
+        migrations.AlterField(
+            model_name='registroponto',
+            name='foto_saida_almoco',
+            field=models.TextField(blank=True, null=True, verbose_name='Foto Saída Almoço (legado)'),
+        ),
+        migrations.CreateModel(
+            name='FotoRegistroPonto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('saida_almoco', 'Saída Almoço'), ('retorno_almoco', 'Retorno Almoço'), ('saida', 'Saída')], max_length=20)),
+                ('imagem', models.ImageField(storage=crmspagi.storage_backends.fotos_ponto_storage, upload_to=controle_ponto.models.caminho_foto_ponto)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('registro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fotos', to='controle_ponto.registroponto')),
+            ],
+            options={
+                'verbose_name': 'Foto de Registro de Ponto',
+                'verbose_name_plural': 'Fotos de Registro de Ponto',
+                'unique_together': {('registro', 'tipo')},
+            },
+        ),
+    ]
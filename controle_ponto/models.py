@@ -1,9 +1,21 @@
-﻿from django.db import models
+﻿import os
+import uuid
+
+from django.db import models
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q
 from django.contrib.auth.models import User
+from core.singleton import CachedSingletonMixin
+from crmspagi.storage_backends import fotos_ponto_storage
 from funcionarios.models import Funcionario
 
 
-class ConfiguracaoPonto(models.Model):
+# Colunas antigas com a foto em base64 (data URL) dentro da propria linha. As batidas
+# novas vao para FotoRegistroPonto (storage); o comando migrar_fotos_ponto esvazia
+# essas colunas nas linhas antigas.
+CAMPOS_FOTO_LEGADO = ('foto_entrada', 'foto_saida_almoco', 'foto_retorno_almoco', 'foto_saida')
+
+
+class ConfiguracaoPonto(CachedSingletonMixin, models.Model):
     """Tabela de configuração única para as regras do Ponto Eletrônico."""
     ip_permitido = models.CharField(
         max_length=50,
@@ -56,13 +68,28 @@ class ConfiguracaoPonto(models.Model):
 
     @classmethod
     def load(cls):
-        obj, _ = cls.objects.get_or_create(pk=1)
-        return obj
+        return cls.carregar_singleton()
 
     def __str__(self):
         return "Regras de Segurança de Ponto"
 
 
+class RegistroPontoQuerySet(models.QuerySet):
+    def sem_fotos_legado(self):
+        """Nao traz as colunas de foto em base64 (centenas de KB por linha nao migrada)."""
+        return self.defer(*CAMPOS_FOTO_LEGADO)
+
+    def com_indicadores_foto(self):
+        """Anota teve_foto_<tipo> (storage ou coluna legada) sem carregar as fotos."""
+        anotacoes = {}
+        for tipo in FotoRegistroPonto.Tipo.values:
+            campo = f'foto_{tipo}'
+            no_storage = Exists(FotoRegistroPonto.objects.filter(registro=OuterRef('pk'), tipo=tipo))
+            no_legado = Q(**{f'{campo}__isnull': False}) & ~Q(**{campo: ''})
+            anotacoes[f'teve_{campo}'] = ExpressionWrapper(Q(no_storage) | no_legado, output_field=BooleanField())
+        return self.annotate(**anotacoes)
+
+
 class RegistroPonto(models.Model):
     class StatusHomologacao(models.TextChoices):
         NAO_APLICA = 'NAO_APLICA', 'Não se aplica'
@@ -74,16 +101,16 @@ class RegistroPonto(models.Model):
     data = models.DateField(auto_now_add=True, verbose_name="Data do Ponto")
 
     entrada = models.TimeField(null=True, blank=True, verbose_name="Entrada")
-    foto_entrada = models.TextField(null=True, blank=True, verbose_name="Foto Entrada (Base64)")
+    foto_entrada = models.TextField(null=True, blank=True, verbose_name="Foto Entrada (Base64, legado)")
 
     saida_almoco = models.TimeField(null=True, blank=True, verbose_name="Saída Almoço")
-    foto_saida_almoco = models.TextField(null=True, blank=True, verbose_name="Foto Saída Almoço")
+    foto_saida_almoco = models.TextField(null=True, blank=True, verbose_name="Foto Saída Almoço (legado)")
 
     retorno_almoco = models.TimeField(null=True, blank=True, verbose_name="Retorno Almoço")
-    foto_retorno_almoco = models.TextField(null=True, blank=True, verbose_name="Foto Retorno Almoço")
+    foto_retorno_almoco = models.TextField(null=True, blank=True, verbose_name="Foto Retorno Almoço (legado)")
 
     saida = models.TimeField(null=True, blank=True, verbose_name="Saída")
-    foto_saida = models.TextField(null=True, blank=True, verbose_name="Foto Saída")
+    foto_saida = models.TextField(null=True, blank=True, verbose_name="Foto Saída (legado)")
 
     # Dados de segurança e localização
     ip_registrado = models.GenericIPAddressField(null=True, blank=True, verbose_name="IP da Máquina")
@@ -141,6 +168,8 @@ class RegistroPonto(models.Model):
         verbose_name="Data/Hora da Validação Facial",
     )
 
+    objects = RegistroPontoQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Registro de Ponto"
         verbose_name_plural = "Registros de Ponto"
@@ -149,6 +178,48 @@ class RegistroPonto(models.Model):
     def __str__(self):
         return f"Ponto: {self.funcionario.nome_completo} - {self.data.strftime('%d/%m/%Y')}"
 
+    def urls_fotos(self):
+        """{tipo: url} das fotos da batida. Linhas ainda nao migradas usam o data URL legado."""
+        urls = {foto.tipo: foto.imagem.url for foto in self.fotos.all()}
+        for tipo in FotoRegistroPonto.Tipo.values:
+            legado = getattr(self, f'foto_{tipo}')
+            if tipo not in urls and legado:
+                urls[tipo] = legado
+        return urls
+
+
+def caminho_foto_ponto(instance, filename):
+    registro = instance.registro
+    extensao = os.path.splitext(filename)[1].lower() or '.jpg'
+    # uuid no nome: o bucket e publico, a URL nao pode ser adivinhada a partir do id.
+    return (
+        f"ponto/{registro.data:%Y/%m}/{registro.funcionario_id}/"
+        f"{registro.pk}-{instance.tipo}-{uuid.uuid4().hex}{extensao}"
+    )
+
+
+class FotoRegistroPonto(models.Model):
+    """Foto de uma batida, no storage (MinIO) em vez de base64 na linha do RegistroPonto."""
+
+    class Tipo(models.TextChoices):
+        ENTRADA = 'entrada', 'Entrada'
+        SAIDA_ALMOCO = 'saida_almoco', 'Saída Almoço'
+        RETORNO_ALMOCO = 'retorno_almoco', 'Retorno Almoço'
+        SAIDA = 'saida', 'Saída'
+
+    registro = models.ForeignKey(RegistroPonto, on_delete=models.CASCADE, related_name='fotos')
+    tipo = models.CharField(max_length=20, choices=Tipo.choices)
+    imagem = models.ImageField(upload_to=caminho_foto_ponto, storage=fotos_ponto_storage)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Foto de Registro de Ponto"
+        verbose_name_plural = "Fotos de Registro de Ponto"
+        unique_together = ('registro', 'tipo')
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.registro}"
+
 
 class FechamentoFolhaPonto(models.Model):
     funcionario = models.ForeignKey(Funcionario, on_delete=models.CASCADE, related_name='fechamentos_ponto')
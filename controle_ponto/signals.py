@@ -0,0 +1,20 @@
+import logging
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import FotoRegistroPonto
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_delete, sender=FotoRegistroPonto)
+def remover_arquivo_foto_ponto(sender, instance, **kwargs):
+    """Apaga o arquivo no storage junto com a linha (inclusive via cascade do RegistroPonto)."""
+    if not instance.imagem.name:
+        return
+    try:
+        instance.imagem.storage.delete(instance.imagem.name)
+    except Exception:
+        logger.warning('Falha ao remover foto de ponto do storage: %s', instance.imagem.name, exc_info=True)
@@ -1,3 +1,163 @@
+import base64
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from funcionarios.models import Funcionario
+
+from .fotos import decodificar_foto_base64, salvar_foto_batida
+from .models import FotoRegistroPonto, RegistroPonto
+from .views import _salvar_foto_da_batida
+
+
+FOTO_PNG = 'data:image/png;base64,' + base64.b64encode(b'\x89PNG\r\n\x1a\nfoto-de-teste').decode()
+
+
+def _criar_funcionario(username='func_ponto'):
+    user = User(username=username, is_superuser=True, is_staff=True)
+    user.set_password('123456')
+    user._skip_funcionario_signal = True
+    user.save()
+    return Funcionario.objects.create(
+        user=user,
+        cpf=f"111.111.111-{str(user.id).zfill(2)}",
+        telefone='41999999999',
+        endereco='Rua Teste, 123',
+        cargo='Vendedor',
+        data_admissao=timezone.localdate(),
+        salario_base=Decimal('2500.00'),
+        banco='Banco Teste',
+        agencia='0001',
+        conta=f'{user.id}2345',
+        tipo_conta='CORRENTE',
+    )
+
+
+class _FotosPontoTestCase(TestCase):
+    def setUp(self):
+        self.funcionario = _criar_funcionario()
+        self.registro = RegistroPonto.objects.create(funcionario=self.funcionario)
+
+    def tearDown(self):
+        # Os arquivos ficam no FileSystemStorage temporario da suite: remove o que o teste gravou.
+        for foto in FotoRegistroPonto.objects.all():
+            foto.delete()
+
+
+class FotoRegistroPontoTests(_FotosPontoTestCase):
+    def test_decodifica_data_url(self):
+        conteudo, extensao = decodificar_foto_base64(FOTO_PNG)
+        self.assertTrue(conteudo.startswith(b'\x89PNG'))
+        self.assertEqual(extensao, 'png')
+        self.assertIsNone(decodificar_foto_base64('nao-e-data-url'))
+        self.assertIsNone(decodificar_foto_base64('data:image/png;base64,@@@'))
+
+    def test_salva_no_storage_e_substitui_a_anterior(self):
+        primeira = salvar_foto_batida(self.registro, 'entrada', FOTO_PNG)
+        arquivo_antigo = primeira.imagem.name
+        self.assertTrue(primeira.imagem.storage.exists(arquivo_antigo))
+
+        segunda = salvar_foto_batida(self.registro, 'entrada', FOTO_PNG)
+
+        self.assertEqual(segunda.pk, primeira.pk)
+        self.assertFalse(segunda.imagem.storage.exists(arquivo_antigo))
+        self.assertEqual(self.registro.fotos.count(), 1)
+        self.assertIsNone(RegistroPonto.objects.get(pk=self.registro.pk).foto_entrada)
+
+    def test_falha_no_storage_mantem_base64_na_linha(self):
+        with patch('controle_ponto.views.salvar_foto_batida', side_effect=OSError('storage fora')):
+            _salvar_foto_da_batida(self.registro, 'saida', FOTO_PNG)
+
+        self.assertEqual(RegistroPonto.objects.get(pk=self.registro.pk).foto_saida, FOTO_PNG)
+        self.assertFalse(self.registro.fotos.exists())
+
+    def test_excluir_registro_apaga_arquivo(self):
+        foto = salvar_foto_batida(self.registro, 'entrada', FOTO_PNG)
+        storage, nome = foto.imagem.storage, foto.imagem.name
+
+        self.registro.delete()
+
+        self.assertFalse(storage.exists(nome))
+
+    def test_detalhe_usa_url_do_storage_e_cai_no_legado(self):
+        foto = salvar_foto_batida(self.registro, 'entrada', FOTO_PNG)
+        RegistroPonto.objects.filter(pk=self.registro.pk).update(foto_saida=FOTO_PNG)
+        self.client.force_login(self.funcionario.user)
+
+        resp = self.client.get(reverse('controle_ponto:detalhe_ponto', args=[self.registro.pk]))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['fotos']['entrada'], foto.imagem.url)
+        self.assertEqual(resp.context['fotos']['saida'], FOTO_PNG)
+        self.assertNotIn('saida_almoco', resp.context['fotos'])
+
+    def test_relatorio_spagiid_indica_fotos_sem_carregar_base64(self):
+        salvar_foto_batida(self.registro, 'entrada', FOTO_PNG)
+        RegistroPonto.objects.filter(pk=self.registro.pk).update(foto_saida=FOTO_PNG)
+        self.client.force_login(self.funcionario.user)
+
+        resp = self.client.get(reverse('controle_ponto:relatorio_spagiid'))
+
+        self.assertEqual(resp.status_code, 200)
+        item = resp.context['pontos_view'][0]
+        self.assertTrue(item['teve_foto_entrada'])
+        self.assertTrue(item['teve_foto_saida'])
+        self.assertFalse(item['teve_foto_saida_almoco'])
+        self.assertEqual(resp.context['total_com_foto'], 1)
+        self.assertIn('foto_saida', item['obj'].get_deferred_fields())
+
+
+class MigrarFotosPontoCommandTests(_FotosPontoTestCase):
+    def _criar_registro_legado(self, username, **fotos):
+        registro = RegistroPonto.objects.create(funcionario=_criar_funcionario(username))
+        RegistroPonto.objects.filter(pk=registro.pk).update(**fotos)
+        return registro
+
+    def test_move_fotos_para_o_storage_e_esvazia_colunas(self):
+        registro = self._criar_registro_legado('legado1', foto_entrada=FOTO_PNG, foto_saida=FOTO_PNG)
+
+        call_command('migrar_fotos_ponto', stdout=StringIO())
+
+        registro.refresh_from_db()
+        self.assertIsNone(registro.foto_entrada)
+        self.assertIsNone(registro.foto_saida)
+        self.assertEqual(set(registro.fotos.values_list('tipo', flat=True)), {'entrada', 'saida'})
+
+    def test_retoma_de_onde_parou(self):
+        primeiro = self._criar_registro_legado('legado2', foto_entrada=FOTO_PNG)
+        segundo = self._criar_registro_legado('legado3', foto_entrada=FOTO_PNG)
+
+        call_command('migrar_fotos_ponto', limite=1, stdout=StringIO())
+        self.assertTrue(primeiro.fotos.exists())
+        self.assertFalse(segundo.fotos.exists())
+
+        call_command('migrar_fotos_ponto', stdout=StringIO())
+        self.assertTrue(segundo.fotos.exists())
+        self.assertEqual(FotoRegistroPonto.objects.count(), 2)
+
+    def test_foto_invalida_fica_na_linha(self):
+        registro = self._criar_registro_legado('legado4', foto_entrada='lixo', foto_saida=FOTO_PNG)
+        saida = StringIO()
+
+        call_command('migrar_fotos_ponto', stdout=saida)
+
+        registro.refresh_from_db()
+        self.assertEqual(registro.foto_entrada, 'lixo')
+        self.assertIsNone(registro.foto_saida)
+        self.assertIn('1 foto(s) invalida(s)', saida.getvalue())
+
+    def test_dry_run_nao_altera_nada(self):
+        registro = self._criar_registro_legado('legado5', foto_entrada=FOTO_PNG)
+        saida = StringIO()
+
+        call_command('migrar_fotos_ponto', dry_run=True, stdout=saida)
 
-# Create your tests here.
+        registro.refresh_from_db()
+        self.assertEqual(registro.foto_entrada, FOTO_PNG)
+        self.assertIn('1 registro(s)', saida.getvalue())
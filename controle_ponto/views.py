@@ -1,5 +1,4 @@
 ﻿import json
-import threading
 import base64
 import logging
 from datetime import datetime
@@ -26,6 +25,7 @@ from funcionarios.models import Funcionario
 from vendas_produtos.models import VendaProduto
 
 from .forms import RegistroPontoForm
+from .fotos import decodificar_foto_base64, salvar_foto_batida
 from .models import ConfiguracaoPonto, FechamentoFolhaPonto, RegistroPonto
 
 TOKEN_PONTO_TTL_SECONDS = 120
@@ -179,26 +179,10 @@ def _atualizar_avatar_com_foto_ponto(user, foto_base64):
         except Exception:
             return
 
-    if ';base64,' not in foto_base64:
-        return
-
-    header, encoded = foto_base64.split(';base64,', 1)
-    if not header.startswith('data:image/'):
-        return
-
-    mime = header.replace('data:image/', '').lower()
-    extensao = {
-        'jpeg': 'jpg',
-        'jpg': 'jpg',
-        'png': 'png',
-        'webp': 'webp',
-    }.get(mime, 'jpg')
-
-    try:
-        imagem_bytes = base64.b64decode(encoded)
-    except Exception:
-        logger.warning('Falha ao decodificar foto_base64 do ponto para avatar.', exc_info=True)
+    decodificada = decodificar_foto_base64(foto_base64)
+    if decodificada is None:
         return
+    imagem_bytes, extensao = decodificada
 
     nome_arquivo = f"ponto_avatar_{user.id}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{extensao}"
 
@@ -208,6 +192,20 @@ def _atualizar_avatar_com_foto_ponto(user, foto_base64):
         logger.exception('Falha ao salvar avatar do usuário a partir da foto do ponto.')
         return
 
+def _salvar_foto_da_batida(ponto, tipo_batida, foto_base64):
+    """Foto vai para o storage (FotoRegistroPonto). Se o storage falhar ou o base64 vier
+    fora do formato, guarda na coluna legada para nao perder a foto; o comando
+    migrar_fotos_ponto tenta mover de novo depois."""
+    try:
+        if salvar_foto_batida(ponto, tipo_batida, foto_base64):
+            return
+    except Exception:
+        logger.exception('Falha ao gravar foto do ponto %s no storage; mantendo base64 na linha.', ponto.pk)
+    campo = f'foto_{tipo_batida}'
+    setattr(ponto, campo, foto_base64)
+    ponto.save(update_fields=[campo])
+
+
 @login_required
 def relogio_ponto(request):
     funcionario = getattr(request.user, 'dados_funcionais', None)
@@ -314,7 +312,6 @@ def relogio_ponto(request):
                 return redirect('controle_ponto:relogio')
 
             ponto.entrada = agora
-            ponto.foto_entrada = foto_base64
             ponto.horario_escala_entrada = config.horario_escala_entrada
             ponto.tolerancia_entrada_minutos = int(config.tolerancia_atraso_minutos or 5)
             ponto.atraso_minutos = atraso_minutos
@@ -344,19 +341,16 @@ def relogio_ponto(request):
 
         elif tipo_batida == 'saida_almoco' and not ponto.saida_almoco:
             ponto.saida_almoco = agora
-            ponto.foto_saida_almoco = foto_base64
             evento_registrado = 'Saída Almoço'
             messages.success(request, f'Saída para almoço às {agora.strftime("%H:%M")}.')
 
         elif tipo_batida == 'retorno_almoco' and not ponto.retorno_almoco:
             ponto.retorno_almoco = agora
-            ponto.foto_retorno_almoco = foto_base64
             evento_registrado = 'Retorno Almoço'
             messages.success(request, f'Retorno do almoço às {agora.strftime("%H:%M")}.')
 
         elif tipo_batida == 'saida' and not ponto.saida:
             ponto.saida = agora
-            ponto.foto_saida = foto_base64
             evento_registrado = 'Saída Final'
             messages.success(request, f'Fim de expediente às {agora.strftime("%H:%M")}. Bom descanso!')
         else:
@@ -386,11 +380,9 @@ def relogio_ponto(request):
             ponto.face_validado_em = timezone.now()
 
         ponto.save()
+        _salvar_foto_da_batida(ponto, tipo_batida, foto_base64)
         _atualizar_avatar_com_foto_ponto(request.user, foto_base64)
 
-        def disparar_webhook(dados_webhook):
-            enviar_webhook(ServicoWebhook.CONTROLE_PONTO, dados_webhook, timeout=5)
-
         payload = {
             'evento': 'novo_ponto',
             'funcionario_id': funcionario.id,
@@ -404,7 +396,7 @@ def relogio_ponto(request):
             'atraso_minutos': ponto.atraso_minutos,
             'status_homologacao': ponto.status_homologacao,
         }
-        threading.Thread(target=disparar_webhook, args=(payload,), daemon=True).start()
+        enviar_webhook(ServicoWebhook.CONTROLE_PONTO, payload, timeout=5)
 
         return redirect('controle_ponto:relogio')
 
@@ -444,7 +436,13 @@ def mapa_pontos(request):
     else:
         data_filtro = timezone.now().date()
 
-    pontos = RegistroPonto.objects.filter(data=data_filtro).exclude(latitude__isnull=True).exclude(latitude__exact='')
+    pontos = (
+        RegistroPonto.objects.filter(data=data_filtro)
+        .exclude(latitude__isnull=True)
+        .exclude(latitude__exact='')
+        .select_related('funcionario__user')
+        .sem_fotos_legado()
+    )
 
     pontos_json = []
     for p in pontos:
@@ -483,6 +481,7 @@ def relatorio_mensal(request):
     pontos = (
         RegistroPonto.objects.filter(data__month=mes, data__year=ano)
         .select_related('funcionario', 'homologado_por')
+        .sem_fotos_legado()
         .order_by('data', 'funcionario__user__first_name')
     )
     if funcionario_id:
@@ -597,6 +596,7 @@ def ocorrencias_mensais(request):
     ocorrencias = (
         RegistroPonto.objects.filter(data__month=mes, data__year=ano)
         .select_related('funcionario', 'homologado_por')
+        .sem_fotos_legado()
         .order_by('-data', 'funcionario__user__first_name')
     )
     if funcionario_id:
@@ -673,7 +673,7 @@ def pendencias_admin_modal_api(request):
             status_homologacao=RegistroPonto.StatusHomologacao.PENDENTE,
             data__year=hoje.year,
             data__month=hoje.month,
-        ).select_related('funcionario').order_by('-data', '-id')
+        ).select_related('funcionario').sem_fotos_legado().order_by('-data', '-id')
         paginator = Paginator(qs, per_page)
         page_obj = paginator.get_page(page)
         items = [
@@ -746,6 +746,7 @@ def relatorio_entradas(request):
     entradas = (
         RegistroPonto.objects.filter(data__month=mes, data__year=ano, entrada__isnull=False)
         .select_related('funcionario')
+        .sem_fotos_legado()
         .order_by('funcionario__user__first_name', 'data')
     )
     if funcionario_id:
@@ -879,6 +880,8 @@ def relatorio_spagiid(request):
     pontos_qs = (
         RegistroPonto.objects.filter(data__month=mes, data__year=ano)
         .select_related('funcionario')
+        .sem_fotos_legado()
+        .com_indicadores_foto()
         .order_by('-data', 'funcionario__user__first_name')
     )
     if funcionario_id:
@@ -894,7 +897,7 @@ def relatorio_spagiid(request):
     total_face_aprovado = sum(1 for p in pontos if p.face_match_aprovado)
     total_com_foto = sum(
         1 for p in pontos
-        if p.foto_entrada or p.foto_saida_almoco or p.foto_retorno_almoco or p.foto_saida
+        if p.teve_foto_entrada or p.teve_foto_saida_almoco or p.teve_foto_retorno_almoco or p.teve_foto_saida
     )
     distancias = [p.face_distance for p in pontos if p.face_distance is not None]
     distancia_media = (sum(distancias) / len(distancias)) if distancias else None
@@ -908,10 +911,10 @@ def relatorio_spagiid(request):
             {
                 'obj': p,
                 'similaridade': similaridade,
-                'teve_foto_entrada': bool(p.foto_entrada),
-                'teve_foto_saida_almoco': bool(p.foto_saida_almoco),
-                'teve_foto_retorno_almoco': bool(p.foto_retorno_almoco),
-                'teve_foto_saida': bool(p.foto_saida),
+                'teve_foto_entrada': p.teve_foto_entrada,
+                'teve_foto_saida_almoco': p.teve_foto_saida_almoco,
+                'teve_foto_retorno_almoco': p.teve_foto_retorno_almoco,
+                'teve_foto_saida': p.teve_foto_saida,
             }
         )
 
@@ -1005,7 +1008,7 @@ def detalhe_ponto(request, pk):
         return redirect('/')
 
     ponto = get_object_or_404(RegistroPonto, pk=pk)
-    return render(request, 'controle_ponto/detalhe_ponto.html', {'ponto': ponto})
+    return render(request, 'controle_ponto/detalhe_ponto.html', {'ponto': ponto, 'fotos': ponto.urls_fotos()})
 
 
 @login_required
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import BannerSistema, AuditLog
+from .models import BannerSistema, AuditLog, RelatorioPDF
 
 @admin.register(BannerSistema)
 class BannerSistemaAdmin(admin.ModelAdmin):
@@ -46,3 +46,24 @@ class AuditLogAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(RelatorioPDF)
+class RelatorioPDFAdmin(admin.ModelAdmin):
+    list_display = ("criado_em", "tipo", "status", "tentativas", "solicitado_por", "concluido_em")
+    list_filter = ("status", "tipo")
+    ordering = ("-criado_em",)
+    readonly_fields = (
+        "token",
+        "tipo",
+        "chave",
+        "parametros",
+        "arquivo",
+        "nome_arquivo",
+        "erro",
+        "tentativas",
+        "reservado_ate",
+        "solicitado_por",
+        "criado_em",
+        "concluido_em",
+    )
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.cache_versionado import encerrar_escopo_request, iniciar_escopo_request
+        from core.singleton import conectar_sinais_singletons
+
+        conectar_sinais_singletons()
+        request_started.connect(iniciar_escopo_request, dispatch_uid='core:cache_versionado_inicio')
+        request_finished.connect(encerrar_escopo_request, dispatch_uid='core:cache_versionado_fim')
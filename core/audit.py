@@ -2,6 +2,9 @@ from __future__ import annotations
 
 from typing import Any
 
+from django.conf import settings
+from django.utils import timezone
+
 from core.models import AuditLog
 
 
@@ -61,22 +64,31 @@ def create_audit_log(
 ) -> None:
     try:
         profile = getattr(user, "profile", None) if user else None
-        AuditLog.objects.create(
-            user=user if getattr(user, "is_authenticated", False) else None,
-            username_snapshot=(getattr(user, "username", "") or "") if user else "",
-            nivel_acesso_snapshot=getattr(profile, "nivel_acesso", "") if profile else "",
-            module=_safe_text(module, 80) or "sistema",
-            action=_safe_text(action, 160) or "acao_nao_informada",
-            method=_safe_text(method, 10),
-            path=_safe_text(path, 500),
-            status_code=status_code,
-            ip_address=_safe_text(ip_address, 45) or None,
-            user_agent=_safe_text(user_agent, 300),
-            object_repr=_safe_text(object_repr, 255),
-            payload=sanitize_payload(payload),
-            success=bool(success),
-            severity=severity if severity in dict(AuditLog.SEVERITY_CHOICES) else AuditLog.SEVERITY_INFO,
-        )
+        registro = {
+            "created_at": timezone.now().isoformat(),
+            "user_id": user.pk if getattr(user, "is_authenticated", False) else None,
+            "username_snapshot": (getattr(user, "username", "") or "") if user else "",
+            "nivel_acesso_snapshot": getattr(profile, "nivel_acesso", "") if profile else "",
+            "module": _safe_text(module, 80) or "sistema",
+            "action": _safe_text(action, 160) or "acao_nao_informada",
+            "method": _safe_text(method, 10),
+            "path": _safe_text(path, 500),
+            "status_code": status_code,
+            "ip_address": _safe_text(ip_address, 45) or None,
+            "user_agent": _safe_text(user_agent, 300),
+            "object_repr": _safe_text(object_repr, 255),
+            "payload": sanitize_payload(payload),
+            "success": bool(success),
+            "severity": severity if severity in dict(AuditLog.SEVERITY_CHOICES) else AuditLog.SEVERITY_INFO,
+        }
+        if getattr(settings, "AUDIT_LOG_BUFFERED", False):
+            # Fora do caminho do request: a thread de core.audit_buffer grava em lote.
+            from core.audit_buffer import get_audit_buffer
+
+            get_audit_buffer().enfileirar(registro)
+        else:
+            registro["created_at"] = timezone.now()
+            AuditLog.objects.create(**registro)
     except Exception:
         # Nunca interrompe fluxo principal por erro de auditoria.
         pass
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import AuditLog
+
+
+logger = logging.getLogger(__name__)
+
+# Arquivos de spill: audit-<pid>-<etiqueta>.jsonl. Cada entrada e gravada no arquivo
+# "atual" do processo antes de entrar na fila em memoria; quando a thread drena a fila,
+# o arquivo atual vira um "lote" (mesmo conteudo da fila drenada) e so e apagado depois
+# do bulk_create. Se o worker morrer no meio, o proximo buffer que subir reivindica os
+# arquivos de pids que nao existem mais (so um rename) e a thread de escrita os reimporta
+# antes de drenar a fila (entrega pelo menos uma vez).
+_PREFIXO_SPILL = "audit-"
+_SUFIXO_SPILL = ".jsonl"
+# Registros que o banco recusa um a um (ex: user_id de usuario apagado, valor grande demais)
+# vao para este arquivo, fora do padrao do spill, em vez de travar a fila para sempre.
+ARQUIVO_DESCARTADOS = "descartados-auditoria.jsonl"
+
+
+def _pid_ativo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _pid_do_arquivo(caminho: str) -> int | None:
+    nome = os.path.basename(caminho)[len(_PREFIXO_SPILL):]
+    try:
+        return int(nome.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def _banco_disponivel() -> bool:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Exception:
+        return False
+    return True
+
+
+def _registro_para_model(registro: dict[str, Any]) -> AuditLog:
+    dados = dict(registro)
+    dados["created_at"] = parse_datetime(dados.get("created_at") or "") or timezone.now()
+    return AuditLog(**dados)
+
+
+class AuditLogBuffer:
+    """
+    Pipeline de auditoria fora do caminho do request: `enfileirar()` so grava uma linha
+    no arquivo de spill local e coloca o registro numa fila limitada; uma thread em
+    segundo plano drena a fila em lotes com bulk_create. Com a fila cheia (banco lento
+    ou fora do ar), o registro e gravado de forma sincrona, como antes.
+
+    Um lote que falha `max_tentativas` vezes seguidas e gravado registro a registro: os que
+    o banco recusar vao para ARQUIVO_DESCARTADOS e a fila segue. Se o banco estiver fora
+    do ar (nao e o registro), o lote continua pendente e volta a ser tentado.
+    """
+
+    def __init__(
+        self,
+        *,
+        spill_dir: str,
+        max_pendentes: int = 10000,
+        tamanho_lote: int = 200,
+        intervalo_flush: float = 1.0,
+        max_tentativas: int = 5,
+        iniciar_thread: bool = True,
+    ):
+        self.spill_dir = spill_dir
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.intervalo_flush = intervalo_flush
+        self.max_tentativas = max(1, max_tentativas)
+        self.iniciar_thread = iniciar_thread
+
+        self._fila: queue.Queue[dict[str, Any]] = queue.Queue(maxsize=max(1, max_pendentes))
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._seq = 0
+        self._orfaos: list[str] = []
+
+    def _caminho(self, etiqueta: str) -> str:
+        return os.path.join(self.spill_dir, f"{_PREFIXO_SPILL}{os.getpid()}-{etiqueta}{_SUFIXO_SPILL}")
+
+    def _proxima_etiqueta(self, tipo: str) -> str:
+        self._seq += 1
+        return f"{tipo}{self._seq}"
+
+    def _garantir_iniciado(self) -> None:
+        # Comparando o pid, um buffer herdado via fork (gunicorn --preload) reinicia a
+        # thread e os arquivos de spill no processo filho.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.spill_dir, exist_ok=True)
+            # Dentro do request so os renames; o banco fica para a thread (ou o flush).
+            self._orfaos = self._reivindicar_spill()
+            self._pid = os.getpid()
+            self._fila = queue.Queue(maxsize=self._fila.maxsize)
+            self._parar.clear()
+            if self.iniciar_thread:
+                self._thread = threading.Thread(target=self._loop, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    def enfileirar(self, registro: dict[str, Any]) -> None:
+        self._garantir_iniciado()
+        linha = json.dumps(registro, ensure_ascii=False, default=str)
+        with self._lock:
+            try:
+                self._fila.put_nowait(registro)
+            except queue.Full:
+                cheia = True
+            else:
+                cheia = False
+                with open(self._caminho("atual"), "a", encoding="utf-8") as arquivo:
+                    arquivo.write(linha + "\n")
+        if cheia:
+            logger.warning("Fila de auditoria cheia; gravando registro de forma sincrona.")
+            _registro_para_model(registro).save()
+
+    def flush(self) -> int:
+        """Grava no banco tudo o que estiver na fila. Retorna quantos registros gravou."""
+        self._recuperar_orfaos()
+        registros, caminho_lote = self._retirar_tudo()
+        if registros and not self._gravar(registros, caminho_lote):
+            return 0
+        return len(registros)
+
+    def parar(self, timeout: float = 5.0) -> None:
+        self._parar.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        if self._pid == os.getpid():
+            self.flush()
+
+    def recuperar_spill(self) -> int:
+        """Reimporta arquivos de spill deixados por processos que morreram sem drenar a fila."""
+        return self._recuperar(self._reivindicar_spill())
+
+    def _reivindicar_spill(self) -> list[str]:
+        """Renomeia para este processo os arquivos de spill de pids mortos (sem tocar no banco)."""
+        reivindicados = []
+        padrao = os.path.join(self.spill_dir, f"{_PREFIXO_SPILL}*{_SUFIXO_SPILL}")
+        for caminho in sorted(glob.glob(padrao)):
+            pid = _pid_do_arquivo(caminho)
+            if pid is None or (pid != os.getpid() and _pid_ativo(pid)):
+                continue
+
+            destino = self._caminho(self._proxima_etiqueta("recuperando"))
+            try:
+                os.rename(caminho, destino)
+            except FileNotFoundError:
+                continue  # outro processo reivindicou o arquivo primeiro
+            reivindicados.append(destino)
+        return reivindicados
+
+    def _recuperar_orfaos(self) -> int:
+        with self._lock:
+            orfaos, self._orfaos = self._orfaos, []
+        return self._recuperar(orfaos)
+
+    def _recuperar(self, caminhos: list[str]) -> int:
+        """Grava os arquivos reivindicados. Retorna quantos registros entraram no banco."""
+        total = 0
+        for caminho in caminhos:
+            with open(caminho, encoding="utf-8") as arquivo:
+                registros = [json.loads(linha) for linha in arquivo if linha.strip()]
+            if self._gravar(registros, caminho):
+                total += len(registros)
+            else:
+                # Recusados vao para ARQUIVO_DESCARTADOS e pendentes ficam no arquivo: nao contam.
+                total += self._gravar_um_a_um(registros, caminho)[1]
+        if total:
+            logger.info("Auditoria: %s registro(s) recuperado(s) do spill local.", total)
+        return total
+
+    def _retirar_tudo(self, primeiro: dict[str, Any] | None = None) -> tuple[list[dict[str, Any]], str]:
+        registros = [primeiro] if primeiro is not None else []
+        with self._lock:
+            while True:
+                try:
+                    registros.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            if not registros:
+                return [], ""
+            # Sob o lock, o arquivo atual tem exatamente as linhas dos registros retirados.
+            caminho_lote = self._caminho(self._proxima_etiqueta("lote"))
+            try:
+                os.rename(self._caminho("atual"), caminho_lote)
+            except FileNotFoundError:
+                caminho_lote = ""
+        return registros, caminho_lote
+
+    def _gravar(self, registros: list[dict[str, Any]], caminho_lote: str) -> bool:
+        try:
+            for inicio in range(0, len(registros), self.tamanho_lote):
+                AuditLog.objects.bulk_create(
+                    [_registro_para_model(r) for r in registros[inicio:inicio + self.tamanho_lote]]
+                )
+        except Exception:
+            # O arquivo do lote fica no disco: e reimportado quando este processo terminar.
+            logger.exception("Falha ao gravar %s registro(s) de auditoria.", len(registros))
+            return False
+        if caminho_lote:
+            os.remove(caminho_lote)
+        return True
+
+    def _gravar_um_a_um(
+        self, registros: list[dict[str, Any]], caminho_lote: str,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """
+        Grava registro a registro e manda os recusados para ARQUIVO_DESCARTADOS. Retorna os
+        registros que ainda faltam (vazio quando terminou, ou o resto do lote, ja regravado
+        em `caminho_lote`, se o banco caiu no meio) e quantos foram gravados.
+        """
+        recusados = []
+        gravados = 0
+        for indice, registro in enumerate(registros):
+            try:
+                # Savepoint por registro: o erro de um nao invalida a transacao dos outros.
+                with transaction.atomic():
+                    _registro_para_model(registro).save()
+            except Exception as exc:
+                if not _banco_disponivel():
+                    pendentes = registros[indice:]
+                    self._descartar(recusados)
+                    if caminho_lote:
+                        self._reescrever(caminho_lote, pendentes)
+                    return pendentes, gravados
+                recusados.append({"registro": registro, "erro": f"{type(exc).__name__}: {exc}"})
+            else:
+                gravados += 1
+        self._descartar(recusados)
+        if caminho_lote:
+            os.remove(caminho_lote)
+        return [], gravados
+
+    def _descartar(self, recusados: list[dict[str, Any]]) -> None:
+        if not recusados:
+            return
+        logger.error(
+            "Auditoria: %s registro(s) recusado(s) pelo banco movido(s) para %s.",
+            len(recusados), ARQUIVO_DESCARTADOS,
+        )
+        with open(os.path.join(self.spill_dir, ARQUIVO_DESCARTADOS), "a", encoding="utf-8") as arquivo:
+            for item in recusados:
+                arquivo.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+
+    def _reescrever(self, caminho: str, registros: list[dict[str, Any]]) -> None:
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            for registro in registros:
+                arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+        os.replace(temporario, caminho)
+
+    def _gravar_com_tentativas(self, registros: list[dict[str, Any]], caminho_lote: str) -> bool:
+        """Tenta o lote ate gravar; False se o buffer foi parado antes (o lote fica no disco)."""
+        falhas = 0
+        while not self._gravar(registros, caminho_lote):
+            falhas += 1
+            if falhas >= self.max_tentativas:
+                registros, _ = self._gravar_um_a_um(registros, caminho_lote)
+                if not registros:
+                    return True
+                falhas = 0
+            if self._parar.wait(self.intervalo_flush):
+                return False
+        return True
+
+    def _loop(self) -> None:
+        close_old_connections()
+        self._recuperar_orfaos()
+        while not self._parar.is_set():
+            try:
+                primeiro = self._fila.get(timeout=self.intervalo_flush)
+            except queue.Empty:
+                continue
+            registros, caminho_lote = self._retirar_tudo(primeiro)
+            close_old_connections()
+            if not self._gravar_com_tentativas(registros, caminho_lote):
+                return
+
+
+_buffer: AuditLogBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+def get_audit_buffer() -> AuditLogBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AuditLogBuffer(
+                    spill_dir=str(settings.AUDIT_LOG_SPILL_DIR),
+                    max_pendentes=settings.AUDIT_LOG_BUFFER_MAX,
+                    tamanho_lote=settings.AUDIT_LOG_BATCH_SIZE,
+                    intervalo_flush=settings.AUDIT_LOG_FLUSH_INTERVAL,
+                    max_tentativas=settings.AUDIT_LOG_MAX_TENTATIVAS,
+                )
+                atexit.register(_buffer.parar)
+    return _buffer
@@ -1,85 +1,171 @@
 from __future__ import annotations
 
 import json
-import shutil
-import tempfile
+import logging
 from pathlib import Path
+from typing import Iterator
 from zipfile import ZIP_DEFLATED, ZipFile
 
+from django.apps import apps
 from django.conf import settings
-from django.core.management import call_command
+from django.core import serializers
+from django.core.files.storage import storages
+from django.db import DEFAULT_DB_ALIAS, router
 from django.utils import timezone
 
-
-def _dump_database(temp_dir: Path) -> dict:
-    db_info = settings.DATABASES.get("default", {})
-    engine = (db_info.get("ENGINE") or "").lower()
-    dump_file = temp_dir / "database_dump.json"
-
-    call_command(
-        "dumpdata",
-        "--natural-foreign",
-        "--natural-primary",
-        "--indent",
-        "2",
-        "--output",
-        str(dump_file),
+logger = logging.getLogger(__name__)
+
+# Objetos serializados por vez (e por query do .iterator()) no dump do banco.
+BACKUP_LOTE_OBJETOS = 500
+# Tamanho dos blocos lidos dos arquivos (SQLite e midia) ao copiar para o zip.
+BACKUP_BLOCO_BYTES = 1024 * 1024
+
+
+class _SaidaZip:
+    """
+    Destino do ZipFile sem seek: so acumula o que o zip escreve ate alguem drenar.
+    O zipfile detecta a falta de tell()/seek() e grava os tamanhos em data
+    descriptors, entao cada arquivo vai para a saida a medida que e comprimido.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, dados):
+        self._buffer += dados
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self) -> bytes:
+        dados = bytes(self._buffer)
+        self._buffer.clear()
+        return dados
+
+
+def backup_filename(generated_at=None) -> str:
+    generated_at = generated_at or timezone.now()
+    return f"backup_sistema_{generated_at.strftime('%Y%m%d_%H%M%S')}.zip"
+
+
+def _modelos_do_dump(using: str = DEFAULT_DB_ALIAS):
+    """Mesmos modelos e ordem do `dumpdata --natural-foreign --natural-primary`."""
+    app_list = [(app_config, None) for app_config in apps.get_app_configs() if app_config.models_module is not None]
+    for model in serializers.sort_dependencies(app_list, allow_cycles=True):
+        if not model._meta.proxy and router.allow_migrate_model(using, model):
+            yield model
+
+
+def _escrever_dump(zip_file: ZipFile, saida: _SaidaZip, lote: int, info: dict) -> Iterator[bytes]:
+    """Serializa o banco em lotes direto na entrada database_dump.json do zip."""
+    total = 0
+    with zip_file.open("database_dump.json", "w", force_zip64=True) as entrada:
+        entrada.write(b"[")
+        primeiro = True
+        for model in _modelos_do_dump():
+            queryset = model._base_manager.using(DEFAULT_DB_ALIAS).order_by(model._meta.pk.name)
+            objetos = []
+            for obj in queryset.iterator(chunk_size=lote):
+                objetos.append(obj)
+                if len(objetos) >= lote:
+                    primeiro = _escrever_lote(entrada, objetos, primeiro)
+                    total += len(objetos)
+                    objetos = []
+                    dados = saida.drenar()
+                    if dados:
+                        yield dados
+            if objetos:
+                primeiro = _escrever_lote(entrada, objetos, primeiro)
+                total += len(objetos)
+        entrada.write(b"]")
+    info["object_count"] = total
+    yield saida.drenar()
+
+
+def _escrever_lote(entrada, objetos, primeiro: bool) -> bool:
+    texto = serializers.serialize(
+        "json",
+        objetos,
+        use_natural_foreign_keys=True,
+        use_natural_primary_keys=True,
     )
-
-    database_meta = {
-        "engine": engine,
-        "dump_file": dump_file.name,
-        "dump_size_bytes": dump_file.stat().st_size if dump_file.exists() else 0,
-    }
-
-    if "sqlite" in engine:
-        sqlite_path = Path(str(db_info.get("NAME") or ""))
-        if sqlite_path.exists():
-            sqlite_copy = temp_dir / "database.sqlite3"
-            shutil.copy2(sqlite_path, sqlite_copy)
-            database_meta["sqlite_file"] = sqlite_copy.name
-            database_meta["sqlite_size_bytes"] = sqlite_copy.stat().st_size
-
-    return database_meta
-
-
-def _copy_local_media(temp_dir: Path) -> dict:
-    media_root = getattr(settings, "MEDIA_ROOT", None)
-    if not media_root:
-        return {"included": False, "reason": "MEDIA_ROOT nao configurado"}
-
-    media_path = Path(str(media_root))
-    if not media_path.exists():
-        return {"included": False, "reason": "MEDIA_ROOT inexistente no servidor"}
-
-    if not media_path.is_dir():
-        return {"included": False, "reason": "MEDIA_ROOT nao e diretorio"}
-
-    target = temp_dir / "media"
-    shutil.copytree(media_path, target)
-    file_count = sum(1 for item in target.rglob("*") if item.is_file())
-    return {
+    # Cada lote sai como "[...]": tira os colchetes e emenda no array unico do arquivo.
+    conteudo = texto.strip()[1:-1].strip()
+    if conteudo:
+        if not primeiro:
+            entrada.write(b",\n")
+        entrada.write(conteudo.encode("utf-8"))
+        return False
+    return primeiro
+
+
+def _copiar_arquivo(zip_file: ZipFile, saida: _SaidaZip, arcname: str, origem) -> Iterator[bytes]:
+    with zip_file.open(arcname, "w", force_zip64=True) as entrada:
+        while True:
+            bloco = origem.read(BACKUP_BLOCO_BYTES)
+            if not bloco:
+                break
+            entrada.write(bloco)
+            dados = saida.drenar()
+            if dados:
+                yield dados
+    yield saida.drenar()
+
+
+def _listar_arquivos(storage, pasta: str = "") -> Iterator[str]:
+    diretorios, arquivos = storage.listdir(pasta)
+    for nome in arquivos:
+        yield f"{pasta}/{nome}" if pasta else nome
+    for diretorio in diretorios:
+        yield from _listar_arquivos(storage, f"{pasta}/{diretorio}" if pasta else diretorio)
+
+
+def _escrever_midia(zip_file: ZipFile, saida: _SaidaZip, storage, info: dict) -> Iterator[bytes]:
+    """Copia os arquivos do storage direto para media/ no zip, um de cada vez."""
+    arquivos = 0
+    falhas = []
+    try:
+        for nome in _listar_arquivos(storage):
+            try:
+                with storage.open(nome, "rb") as origem:
+                    yield from _copiar_arquivo(zip_file, saida, f"media/{nome}", origem)
+                arquivos += 1
+            except Exception as exc:
+                logger.warning("Backup: falha ao copiar '%s' do storage: %s", nome, exc)
+                falhas.append(nome)
+    except Exception as exc:
+        logger.warning("Backup: nao foi possivel listar o storage de midia: %s", exc)
+        info.update({"included": False, "reason": f"Falha ao listar o storage: {exc}"})
+        return
+    info.update({
         "included": True,
-        "path": str(media_path),
-        "copied_folder": target.name,
-        "file_count": file_count,
-    }
+        "storage": type(storage).__name__,
+        "copied_folder": "media",
+        "file_count": arquivos,
+        "failed_files": falhas,
+    })
 
 
-def create_system_backup(output_dir: str | Path | None = None) -> Path:
-    base_dir = Path(getattr(settings, "BASE_DIR"))
-    backups_dir = Path(output_dir) if output_dir else (base_dir / "backups")
-    backups_dir.mkdir(parents=True, exist_ok=True)
+def _gerar_zip(incluir_midia: bool, storage, lote: int, generated_at) -> Iterator[bytes]:
+    db_info = settings.DATABASES.get("default", {})
+    engine = (db_info.get("ENGINE") or "").lower()
+    database_meta = {"engine": engine, "dump_file": "database_dump.json"}
+    media_meta = {"included": False, "reason": "Midia desativada (BACKUP_INCLUIR_MIDIA)"}
 
-    generated_at = timezone.now()
-    timestamp = generated_at.strftime("%Y%m%d_%H%M%S")
-    backup_name = f"backup_sistema_{timestamp}.zip"
-    final_zip = backups_dir / backup_name
+    saida = _SaidaZip()
+    with ZipFile(saida, "w", compression=ZIP_DEFLATED) as zip_file:
+        yield from _escrever_dump(zip_file, saida, lote, database_meta)
+
+        if "sqlite" in engine:
+            sqlite_path = Path(str(db_info.get("NAME") or ""))
+            if sqlite_path.is_file():
+                with sqlite_path.open("rb") as origem:
+                    yield from _copiar_arquivo(zip_file, saida, "database.sqlite3", origem)
+                database_meta["sqlite_file"] = "database.sqlite3"
 
-    with tempfile.TemporaryDirectory(prefix="backup_spagi_") as tmp:
-        temp_dir = Path(tmp)
-        database_meta = _dump_database(temp_dir)
-        media_meta = _copy_local_media(temp_dir)
+        if incluir_midia:
+            yield from _escrever_midia(zip_file, saida, storage or storages["default"], media_meta)
 
         metadata = {
             "generated_at": generated_at.isoformat(),
@@ -91,16 +177,47 @@ def create_system_backup(output_dir: str | Path | None = None) -> Path:
                 "Para SQLite, opcionalmente substitua o arquivo database.sqlite3.",
             ],
         }
+        zip_file.writestr("metadata.json", json.dumps(metadata, indent=2, ensure_ascii=False))
+    yield saida.drenar()
+
+
+def iter_system_backup(
+    incluir_midia: bool | None = None,
+    storage=None,
+    lote: int = BACKUP_LOTE_OBJETOS,
+    generated_at=None,
+) -> Iterator[bytes]:
+    """
+    Gera o .zip do backup em pedacos (bytes), sem pasta temporaria nem dump inteiro
+    em memoria: o banco e serializado em lotes direto no zip e a midia e lida do
+    storage arquivo por arquivo. Serve tanto para gravar em disco
+    (create_system_backup) quanto para StreamingHttpResponse.
+    """
+    if incluir_midia is None:
+        incluir_midia = getattr(settings, "BACKUP_INCLUIR_MIDIA", True)
+    try:
+        yield from _gerar_zip(incluir_midia, storage, lote, generated_at or timezone.now())
+    except Exception:
+        # Em streaming o 200 ja foi enviado ao navegador: o erro so aparece no log.
+        logger.exception("Falha ao gerar backup do sistema.")
+        raise
+
+
+def create_system_backup(output_dir: str | Path | None = None, **kwargs) -> Path:
+    base_dir = Path(getattr(settings, "BASE_DIR"))
+    backups_dir = Path(output_dir) if output_dir else (base_dir / "backups")
+    backups_dir.mkdir(parents=True, exist_ok=True)
 
-        metadata_file = temp_dir / "metadata.json"
-        metadata_file.write_text(
-            json.dumps(metadata, indent=2, ensure_ascii=False),
-            encoding="utf-8",
-        )
-
-        with ZipFile(final_zip, "w", compression=ZIP_DEFLATED) as zip_file:
-            for file_path in temp_dir.rglob("*"):
-                if file_path.is_file():
-                    zip_file.write(file_path, arcname=file_path.relative_to(temp_dir))
+    generated_at = timezone.now()
+    final_zip = backups_dir / backup_filename(generated_at)
+    parcial = final_zip.with_suffix(".zip.part")
+
+    try:
+        with parcial.open("wb") as destino:
+            for pedaco in iter_system_backup(generated_at=generated_at, **kwargs):
+                destino.write(pedaco)
+        parcial.replace(final_zip)
+    finally:
+        parcial.unlink(missing_ok=True)
 
     return final_zip
@@ -0,0 +1,106 @@
+"""
+Metadados de build exibidos no rodape (numero da build, commit e data do commit).
+
+Resolvido uma unica vez por processo: le o arquivo gerado no build da imagem
+(`manage.py gerar_build_info`, caminho em settings.APP_BUILD_INFO_FILE) e, se ele
+nao existir, cai para o git local e depois para as variaveis APP_BUILD_*. Antes isso
+rodava dois subprocessos de git a cada template renderizado.
+"""
+from datetime import datetime
+from functools import lru_cache
+import json
+import logging
+import subprocess
+
+from django.conf import settings
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_BUILD_INFO = ('app_build_number', 'app_build_sha', 'app_build_datetime')
+
+
+def _formatar_data_commit(git_iso):
+    try:
+        dt = datetime.fromisoformat(git_iso.strip().replace('Z', '+00:00'))
+        return dt.strftime('%d/%m/%Y %H:%M')
+    except Exception:
+        return git_iso.strip()
+
+
+def _ler_arquivo_build_info():
+    caminho = getattr(settings, 'APP_BUILD_INFO_FILE', '')
+    if not caminho:
+        return None
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("Arquivo de build info invalido (%s): %s", caminho, exc)
+        return None
+    if not isinstance(dados, dict):
+        return None
+    return {campo: str(dados.get(campo) or '').strip() for campo in CAMPOS_BUILD_INFO}
+
+
+def _executar_git(*args):
+    return subprocess.check_output(
+        ['git', *args],
+        cwd=str(settings.BASE_DIR),
+        stderr=subprocess.DEVNULL,
+        text=True,
+        timeout=1.5,
+    ).strip()
+
+
+def ler_build_info_do_git():
+    """Le sha/data do ultimo commit e a contagem de commits direto do git local."""
+    commit_sha = getattr(settings, 'APP_BUILD_SHA_SHORT', '') or ''
+    commit_dt = ''
+    build_number = str(getattr(settings, 'APP_BUILD_NUMBER', '0') or '0').strip()
+    try:
+        output = _executar_git('log', '-1', '--format=%h|%cI')
+        if output and '|' in output:
+            git_sha, git_iso = output.split('|', 1)
+            if git_sha:
+                commit_sha = git_sha.strip()
+            commit_dt = _formatar_data_commit(git_iso)
+        # Se APP_BUILD_NUMBER vier vazio/0, usa contagem de commits como fallback.
+        if build_number in {'', '0'}:
+            try:
+                build_number = _executar_git('rev-list', '--count', 'HEAD') or '0'
+            except Exception:
+                build_number = '0'
+    except Exception:
+        pass
+
+    return {
+        'app_build_number': build_number,
+        'app_build_sha': commit_sha,
+        'app_build_datetime': commit_dt,
+    }
+
+
+@lru_cache(maxsize=None)
+def obter_build_info():
+    """Dicionario com as variaveis de template da build. Cacheado pelo resto do processo."""
+    info = _ler_arquivo_build_info() or ler_build_info_do_git()
+    build_number = info['app_build_number']
+
+    if build_number in {'', '0'}:
+        env_build = (
+            getattr(settings, 'APP_BUILD_SHA', '')
+            or getattr(settings, 'APP_BUILD_SHA_SHORT', '')
+            or getattr(settings, 'RENDER_GIT_COMMIT', '')
+            or ''
+        ).strip()
+        if env_build:
+            build_number = env_build[:8]
+
+    if build_number in {'', '0'}:
+        build_number = timezone.now().strftime('%Y%m%d%H%M')
+
+    return {**info, 'app_build_number': build_number}
@@ -0,0 +1,94 @@
+"""
+Cache em dois niveis para leituras quentes que mudam pouco: singletons de configuracao
+(core/singleton.py), matriz de permissoes (configuracoes/resolver.py) e metricas do
+dashboard de clientes (clientes/dashboard.py).
+
+O cache compartilhado (settings.CACHES['default']) e um DatabaseCache: cada get e um
+SELECT em django_cache. Na frente dele fica um dicionario por processo, e cada entrada
+guarda a versao do seu namespace. A versao e uma chave no cache compartilhado, lida no
+maximo uma vez por request (o request_started, ligado em CoreConfig.ready(), zera as
+versoes memorizadas da thread); fora de request (cron, workers) ela e lida a cada chamada.
+Invalidar apaga a chave da versao: as entradas antigas deixam de valer em todos os
+processos a partir do proximo request.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+_escopo = threading.local()
+
+
+def iniciar_escopo_request(**kwargs):
+    _escopo.versoes = {}
+
+
+def encerrar_escopo_request(**kwargs):
+    _escopo.versoes = None
+
+
+class CacheVersionado:
+    """Namespace de chaves invalidadas em bloco. Os valores devolvidos sao os mesmos
+    objetos guardados no processo: quem for alterar o retorno precisa copiar antes."""
+
+    # Passou disso (ex: muitos periodos diferentes no dashboard), o nivel local recomeca vazio.
+    MAX_ENTRADAS_LOCAIS = 500
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.chave_versao = f"{namespace}:versao"
+        self._locais = {}
+
+    def versao(self):
+        versoes = getattr(_escopo, "versoes", None)
+        if versoes is not None and self.namespace in versoes:
+            return versoes[self.namespace]
+
+        versao = cache.get(self.chave_versao)
+        if versao is None:
+            versao = uuid.uuid4().hex
+            cache.add(self.chave_versao, versao, None)
+            versao = cache.get(self.chave_versao, versao)
+        if versoes is not None:
+            versoes[self.namespace] = versao
+        return versao
+
+    def obter(self, chave, calcular, timeout=DEFAULT_TIMEOUT):
+        """Valor de `chave` na versao atual: processo > cache compartilhado > calcular()."""
+        versao = self.versao()
+        local = self._locais.get(chave)
+        if local is not None and local[0] == versao and local[1] > time.monotonic():
+            return local[2]
+
+        chave_compartilhada = f"{self.namespace}:{versao}:{chave}"
+        valor = cache.get(chave_compartilhada)
+        if valor is None:
+            valor = calcular()
+            cache.set(chave_compartilhada, valor, timeout)
+
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = cache.default_timeout
+        if len(self._locais) >= self.MAX_ENTRADAS_LOCAIS:
+            self._locais.clear()
+        expira = float("inf") if timeout is None else time.monotonic() + timeout
+        self._locais[chave] = (versao, expira, valor)
+        return valor
+
+    def invalidar(self):
+        """Descarta as entradas do namespace em todos os processos."""
+        if transaction.get_connection().in_atomic_block:
+            # Outro processo pode recolocar o valor antigo enquanto a transacao nao
+            # commita: apaga agora e de novo no commit. Fora de transacao o on_commit
+            # ja roda na hora.
+            self._apagar_versao()
+        transaction.on_commit(self._apagar_versao)
+
+    def _apagar_versao(self):
+        cache.delete(self.chave_versao)
+        versoes = getattr(_escopo, "versoes", None)
+        if versoes is not None:
+            versoes.pop(self.namespace, None)
+        self._locais.clear()
@@ -15,11 +15,20 @@ class Command(BaseCommand):
             default=None,
             help="Diretorio de saida do backup (padrao: ./backups)",
         )
+        parser.add_argument(
+            "--sem-midia",
+            dest="sem_midia",
+            action="store_true",
+            help="Nao inclui os arquivos do storage de midia (so banco e metadata)",
+        )
 
     def handle(self, *args, **options):
         output_dir = options.get("output_dir")
         try:
-            backup_path = create_system_backup(output_dir=output_dir)
+            backup_path = create_system_backup(
+                output_dir=output_dir,
+                incluir_midia=False if options.get("sem_midia") else None,
+            )
         except Exception as exc:  # pragma: no cover - erro operacional
             raise CommandError(f"Falha ao gerar backup: {exc}") from exc
 
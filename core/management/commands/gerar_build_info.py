@@ -0,0 +1,34 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.build_info import CAMPOS_BUILD_INFO, ler_build_info_do_git
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava os metadados de build (numero, commit e data) em settings.APP_BUILD_INFO_FILE, "
+        "para o rodape nao precisar consultar o git em runtime. Rodar no pipeline de build, "
+        "onde o repositorio git esta disponivel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            dest="output",
+            default=None,
+            help="Arquivo de saida (padrao: settings.APP_BUILD_INFO_FILE)",
+        )
+
+    def handle(self, *args, **options):
+        destino = options.get("output") or getattr(settings, "APP_BUILD_INFO_FILE", "")
+        if not destino:
+            raise CommandError("Defina APP_BUILD_INFO_FILE ou informe --output.")
+
+        info = ler_build_info_do_git()
+        dados = {campo: info.get(campo, "") for campo in CAMPOS_BUILD_INFO}
+        Path(destino).write_text(json.dumps(dados, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        self.stdout.write(self.style.SUCCESS(f"Build info gravado em {destino}: {dados}"))
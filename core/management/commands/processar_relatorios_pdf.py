@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.relatorios_pdf import limpar_relatorios_antigos, processar_relatorios_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os relatorios PDF pedidos pelas telas (core.RelatorioPDF) e apaga os '
+        'antigos. Sem opcoes processa o que estiver na fila e sai; com --duracao/--loop '
+        'continua consultando. Varios workers podem rodar ao mesmo tempo (SKIP LOCKED).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Roda ate ser interrompido.')
+        parser.add_argument(
+            '--duracao', type=float, default=0,
+            help='Continua consultando a fila por N segundos (ex: 55 no cron de minuto em minuto).',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help='Pausa em segundos quando a fila esta vazia (padrao: 1).',
+        )
+        parser.add_argument('--lote', type=int, default=None, help='Relatorios reivindicados por ciclo.')
+
+    def handle(self, *args, **options):
+        removidos = limpar_relatorios_antigos()
+        fim = time.monotonic() + options['duracao']
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                processados = processar_relatorios_pendentes(options['lote'])
+                total += processados
+                if processados:
+                    continue
+                if not options['loop'] and time.monotonic() >= fim:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        if total or removidos or options['verbosity'] > 1:
+            self.stdout.write(self.style.SUCCESS(
+                f'Concluido: {total} relatorio(s) gerado(s), {removidos} antigo(s) removido(s).'
+            ))
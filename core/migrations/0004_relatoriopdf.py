@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:03
+
+import core.models
+import crmspagi.storage_backends
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_auditlog_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(editable=False, unique=True)),
+                ('tipo', models.CharField(max_length=60)),
+                ('chave', models.CharField(max_length=64)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Na fila'), ('PROCESSANDO', 'Gerando'), ('PRONTO', 'Pronto'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=12)),
+                ('arquivo', models.FileField(blank=True, max_length=255, storage=crmspagi.storage_backends.relatorios_pdf_storage, upload_to=core.models.caminho_relatorio_pdf)),
+                ('nome_arquivo', models.CharField(blank=True, default='', max_length=255)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('reservado_ate', models.DateTimeField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='relatorios_pdf', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Relatório PDF',
+                'verbose_name_plural': 'Relatórios PDF',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['chave', 'status'], name='relatoriopdf_chave_idx'), models.Index(fields=['status', 'criado_em'], name='relatoriopdf_fila_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
-from crmspagi.storage_backends import PublicMediaStorage # Sua classe do MinIO
+from django.utils import timezone
+from crmspagi.storage_backends import PublicMediaStorage, relatorios_pdf_storage # Sua classe do MinIO
 
 class BannerSistema(models.Model):
     titulo = models.CharField(max_length=100, default="Logo Principal")
@@ -38,7 +41,9 @@ class AuditLog(models.Model):
         (SEVERITY_ERROR, "Erro"),
     ]
 
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # default (e nao auto_now_add): o registro chega ao banco em lote pelo core.audit_buffer,
+    # entao a data tem que ser a do request, nao a do bulk_create.
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -79,3 +84,60 @@ class AuditLog(models.Model):
     def __str__(self):
         actor = self.username_snapshot or (self.user.username if self.user_id else "anonimo")
         return f"[{self.created_at:%d/%m/%Y %H:%M}] {actor} - {self.module}:{self.action}"
+
+
+def caminho_relatorio_pdf(instance, filename):
+    # uuid no caminho: o bucket e publico e a `chave` sai de parametros adivinhaveis
+    # (ids, datas); o download passa pela view, que confere a permissao do tipo.
+    return f"relatorios_pdf/{instance.tipo}/{uuid.uuid4().hex}/{filename}"
+
+
+class RelatorioPDF(models.Model):
+    """
+    PDF gerado em segundo plano (core/relatorios_pdf.py + manage.py processar_relatorios_pdf).
+    `chave` identifica tipo + parametros: um pedido igual reaproveita o arquivo ja gerado
+    (ou o job ainda em andamento) em vez de renderizar de novo.
+    """
+
+    class Status(models.TextChoices):
+        PENDENTE = "PENDENTE", "Na fila"
+        PROCESSANDO = "PROCESSANDO", "Gerando"
+        PRONTO = "PRONTO", "Pronto"
+        FALHOU = "FALHOU", "Falhou"
+
+    token = models.UUIDField(unique=True, editable=False)
+    tipo = models.CharField(max_length=60)
+    chave = models.CharField(max_length=64)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=12, choices=Status.choices, default=Status.PENDENTE)
+    arquivo = models.FileField(
+        upload_to=caminho_relatorio_pdf,
+        storage=relatorios_pdf_storage,
+        blank=True,
+        max_length=255,
+    )
+    nome_arquivo = models.CharField(max_length=255, blank=True, default="")
+    erro = models.TextField(blank=True, default="")
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    reservado_ate = models.DateTimeField(null=True, blank=True)
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="relatorios_pdf",
+    )
+    criado_em = models.DateTimeField(default=timezone.now, db_index=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Relatório PDF"
+        verbose_name_plural = "Relatórios PDF"
+        ordering = ["-criado_em"]
+        indexes = [
+            models.Index(fields=["chave", "status"], name="relatoriopdf_chave_idx"),
+            models.Index(fields=["status", "criado_em"], name="relatoriopdf_fila_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} ({self.get_status_display()})"
@@ -0,0 +1,229 @@
+"""
+Relatorios PDF gerados em segundo plano (core.RelatorioPDF).
+
+Cada app registra seus relatorios com `registrar_relatorio` (template, funcao que
+monta o contexto a partir dos parametros, nome do arquivo e regra de acesso). A view
+so chama `solicitar_relatorio`: se ja existe um PDF pronto para o mesmo tipo +
+parametros (dentro da validade do tipo) ele e reaproveitado; se ja ha um job igual na
+fila, o pedido se junta a ele; senao entra um job novo. O xhtml2pdf roda no worker
+`manage.py processar_relatorios_pdf`, e o arquivo vai para o storage "relatorios_pdf".
+
+`invalidar_relatorios` (chamado pelos signals de quem usa validade=None) apaga os PDFs
+prontos e devolve para a fila os jobs que estao sendo gerados: o worker so grava o
+resultado se o job ainda estiver reservado para ele, entao um PDF montado com os dados
+de antes da alteracao e descartado e o job e gerado de novo.
+"""
+from datetime import timedelta
+from io import BytesIO
+import hashlib
+import json
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.template.loader import get_template
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from .models import RelatorioPDF
+
+logger = logging.getLogger(__name__)
+
+_TIPOS = {}
+
+STATUS_EM_ANDAMENTO = (RelatorioPDF.Status.PENDENTE, RelatorioPDF.Status.PROCESSANDO)
+
+
+class ErroRelatorioPDF(Exception):
+    """Falha de renderizacao que nao adianta repetir (template/HTML invalido)."""
+
+
+class TipoRelatorio:
+    def __init__(self, tipo, template, contexto, nome_arquivo, pode_acessar, validade=None, link_callback=None):
+        self.tipo = tipo
+        self.template = template
+        self.contexto = contexto
+        self.nome_arquivo = nome_arquivo
+        self.pode_acessar = pode_acessar
+        # Segundos em que um PDF pronto ainda serve para um pedido igual; None = sem prazo
+        # (o tipo inclui nos parametros o que muda o conteudo, ou invalida por signal).
+        self.validade = validade
+        self.link_callback = link_callback
+
+
+def registrar_relatorio(tipo, *, template, contexto, nome_arquivo, pode_acessar, validade=0, link_callback=None):
+    """
+    Registra um tipo de relatorio. `contexto(parametros)` e `nome_arquivo(parametros)`
+    recebem o dict de parametros (JSON); `pode_acessar(user, parametros)` decide quem
+    pode pedir e baixar. validade=0 usa RELATORIO_PDF_VALIDADE_SEGUNDOS.
+    """
+    _TIPOS[tipo] = TipoRelatorio(tipo, template, contexto, nome_arquivo, pode_acessar, validade, link_callback)
+
+
+def obter_tipo(tipo):
+    return _TIPOS[tipo]
+
+
+def calcular_chave(tipo, parametros):
+    base = json.dumps([tipo, parametros], sort_keys=True, default=str)
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+
+def _validade(definicao):
+    if definicao.validade == 0:
+        return settings.RELATORIO_PDF_VALIDADE_SEGUNDOS
+    return definicao.validade
+
+
+def solicitar_relatorio(tipo, parametros, usuario=None):
+    """Retorna o RelatorioPDF que atende o pedido: pronto reaproveitado, em andamento ou novo."""
+    definicao = obter_tipo(tipo)
+    chave = calcular_chave(tipo, parametros)
+
+    prontos = RelatorioPDF.objects.filter(chave=chave, status=RelatorioPDF.Status.PRONTO)
+    validade = _validade(definicao)
+    if validade is not None:
+        prontos = prontos.filter(concluido_em__gte=timezone.now() - timedelta(seconds=validade))
+    existente = (
+        prontos.order_by('-concluido_em').first()
+        or RelatorioPDF.objects.filter(chave=chave, status__in=STATUS_EM_ANDAMENTO).order_by('criado_em').first()
+    )
+    if existente:
+        return existente
+
+    return RelatorioPDF.objects.create(
+        token=uuid.uuid4(),
+        tipo=tipo,
+        chave=chave,
+        parametros=parametros,
+        solicitado_por=usuario if getattr(usuario, 'is_authenticated', False) else None,
+    )
+
+
+def invalidar_relatorios(tipo, **parametros):
+    """
+    Descarta os PDFs prontos do tipo (opcionalmente so os com esses parametros) e volta
+    para a fila os que estao sendo gerados, que podem ter lido os dados antigos.
+    """
+    filtro = {f'parametros__{campo}': valor for campo, valor in parametros.items()}
+    relatorios = RelatorioPDF.objects.filter(tipo=tipo, **filtro)
+    relatorios.filter(status=RelatorioPDF.Status.PROCESSANDO).update(
+        status=RelatorioPDF.Status.PENDENTE, reservado_ate=None, tentativas=0,
+    )
+    apagar_relatorios(relatorios.filter(status=RelatorioPDF.Status.PRONTO))
+
+
+def apagar_relatorios(queryset):
+    total = 0
+    for relatorio in queryset.iterator():
+        if relatorio.arquivo:
+            try:
+                relatorio.arquivo.delete(save=False)
+            except Exception as exc:
+                logger.warning("Falha ao apagar o PDF do relatorio %s: %s", relatorio.pk, exc)
+        relatorio.delete()
+        total += 1
+    return total
+
+
+def renderizar_pdf(tipo, parametros):
+    """Renderiza o PDF do relatorio e retorna os bytes."""
+    definicao = obter_tipo(tipo)
+    html = get_template(definicao.template).render(definicao.contexto(parametros))
+    destino = BytesIO()
+    status = pisa.CreatePDF(html, dest=destino, encoding='UTF-8', link_callback=definicao.link_callback)
+    if status.err:
+        raise ErroRelatorioPDF(f'xhtml2pdf retornou {status.err} erro(s) ao gerar o PDF.')
+    return destino.getvalue()
+
+
+def _filtro_elegiveis(agora):
+    return (
+        Q(status=RelatorioPDF.Status.PENDENTE)
+        | Q(status=RelatorioPDF.Status.PROCESSANDO, reservado_ate__lt=agora)
+    )
+
+
+def reivindicar_relatorios(limite):
+    """Marca ate `limite` jobs da fila como PROCESSANDO para este worker e os retorna."""
+    agora = timezone.now()
+    reservado_ate = agora + timedelta(seconds=settings.RELATORIO_PDF_RESERVA_SEGUNDOS)
+    filtro = _filtro_elegiveis(agora)
+
+    with transaction.atomic():
+        candidatos = RelatorioPDF.objects.filter(filtro).order_by('criado_em', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            candidatos = candidatos.select_for_update(skip_locked=True)
+        ids = list(candidatos.values_list('pk', flat=True)[:limite])
+        if not ids:
+            return []
+        RelatorioPDF.objects.filter(filtro, pk__in=ids).update(
+            status=RelatorioPDF.Status.PROCESSANDO,
+            reservado_ate=reservado_ate,
+            tentativas=F('tentativas') + 1,
+        )
+    return list(RelatorioPDF.objects.filter(
+        pk__in=ids, status=RelatorioPDF.Status.PROCESSANDO, reservado_ate=reservado_ate,
+    ))
+
+
+def _gravar(relatorio, **campos):
+    """Grava o resultado so se o job ainda for deste worker (invalidado ou reservado por outro: nao)."""
+    gravou = RelatorioPDF.objects.filter(
+        pk=relatorio.pk,
+        status=RelatorioPDF.Status.PROCESSANDO,
+        reservado_ate=relatorio.reservado_ate,
+    ).update(reservado_ate=None, **campos)
+    return bool(gravou)
+
+
+def processar_relatorio(relatorio):
+    """Gera o PDF de um job ja reivindicado e grava o arquivo no storage."""
+    try:
+        definicao = obter_tipo(relatorio.tipo)
+        conteudo = renderizar_pdf(relatorio.tipo, relatorio.parametros)
+        nome = definicao.nome_arquivo(relatorio.parametros)
+        relatorio.arquivo.save(nome, ContentFile(conteudo), save=False)
+    except Exception as exc:
+        definitivo = isinstance(exc, (ErroRelatorioPDF, KeyError))
+        if definitivo or relatorio.tentativas >= settings.RELATORIO_PDF_MAX_TENTATIVAS:
+            logger.exception("Relatorio PDF %s (%s) falhou.", relatorio.pk, relatorio.tipo)
+            status = RelatorioPDF.Status.FALHOU
+        else:
+            logger.warning("Relatorio PDF %s (%s) sera repetido: %s", relatorio.pk, relatorio.tipo, exc)
+            status = RelatorioPDF.Status.PENDENTE
+        _gravar(relatorio, status=status, erro=str(exc)[:1000])
+        return
+
+    gravou = _gravar(
+        relatorio,
+        arquivo=relatorio.arquivo.name,
+        nome_arquivo=nome,
+        status=RelatorioPDF.Status.PRONTO,
+        erro='',
+        concluido_em=timezone.now(),
+    )
+    if not gravou:
+        # Invalidado (ou retomado por outro worker) durante a geracao: o PDF pode estar velho.
+        logger.info("Relatorio PDF %s (%s) descartado: o job mudou durante a geracao.", relatorio.pk, relatorio.tipo)
+        relatorio.arquivo.delete(save=False)
+
+
+def processar_relatorios_pendentes(limite=None):
+    """Um ciclo do worker. Retorna quantos jobs processou."""
+    relatorios = reivindicar_relatorios(limite or settings.RELATORIO_PDF_LOTE)
+    for relatorio in relatorios:
+        processar_relatorio(relatorio)
+    return len(relatorios)
+
+
+def limpar_relatorios_antigos(horas=None):
+    """Apaga jobs concluidos (e seus arquivos) com mais de `horas` (RELATORIO_PDF_RETENCAO_HORAS)."""
+    horas = settings.RELATORIO_PDF_RETENCAO_HORAS if horas is None else horas
+    limite = timezone.now() - timedelta(hours=horas)
+    return apagar_relatorios(RelatorioPDF.objects.filter(
+        status__in=[RelatorioPDF.Status.PRONTO, RelatorioPDF.Status.FALHOU], criado_em__lt=limite,
+    ))
@@ -0,0 +1,56 @@
+"""
+Cache dos models de configuracao singleton (linha unica pk=1): ConfiguracaoIntegracoes,
+ParametrosComissao, ConfiguracaoPonto, ConfiguracaoIA e SincronizacaoEstoque.
+
+Antes cada leitura fazia um get_or_create(pk=1), inclusive em caminhos quentes como
+VendaProduto.save(). Agora a linha fica num CacheVersionado (core/cache_versionado.py):
+copia por processo na frente do cache compartilhado, validada pela versao do namespace,
+que e lida do django_cache no maximo uma vez por request (fora de request, a cada
+leitura). Os cinco models dividem o namespace: um save/delete em qualquer um deles
+(post_save/post_delete, ligados em CoreConfig.ready()) invalida todos.
+"""
+import copy
+
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from core.cache_versionado import CacheVersionado
+
+
+SINGLETON_PK = 1
+
+_cache_singletons = CacheVersionado("singleton")
+
+
+class CachedSingletonMixin:
+    """Mixin para models.Model de linha unica. Use `carregar_singleton()` no lugar
+    do get_or_create(pk=1). Cada chamada devolve uma copia, entao alterar e salvar a
+    instancia retornada e seguro (nao e compartilhada)."""
+
+    @classmethod
+    def singleton_cache_key(cls):
+        return cls._meta.label_lower
+
+    @classmethod
+    def carregar_singleton(cls):
+        obj = _cache_singletons.obter(
+            cls.singleton_cache_key(),
+            lambda: cls.objects.get_or_create(pk=SINGLETON_PK)[0],
+        )
+        return copy.deepcopy(obj)
+
+    @classmethod
+    def invalidar_cache_singleton(cls):
+        """Chamar apos alteracoes que nao passam por save()/delete() (ex: queryset.update())."""
+        _cache_singletons.invalidar()
+
+
+def _invalidar_singleton(sender, **kwargs):
+    sender.invalidar_cache_singleton()
+
+
+def conectar_sinais_singletons():
+    for model in apps.get_models():
+        if issubclass(model, CachedSingletonMixin):
+            post_save.connect(_invalidar_singleton, sender=model, dispatch_uid=f"{model._meta.label_lower}:singleton_save")
+            post_delete.connect(_invalidar_singleton, sender=model, dispatch_uid=f"{model._meta.label_lower}:singleton_delete")
@@ -1,7 +1,52 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from io import BytesIO
+from unittest import skipUnless
+from unittest.mock import patch
+from zipfile import ZipFile
+
+from decimal import Decimal
+
 from django.conf import settings
-from django.core.files.storage import default_storage
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
 from django.contrib.staticfiles.storage import staticfiles_storage
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from avaliacoes.models import ConfiguracaoIA
+from configuracoes.models import ConfiguracaoIntegracoes
+from controle_ponto.models import ConfiguracaoPonto
+from core import audit_buffer
+from core.audit import create_audit_log
+from core.audit_buffer import AuditLogBuffer
+from core.cache_versionado import encerrar_escopo_request, iniciar_escopo_request
+from core.backup_utils import BACKUP_LOTE_OBJETOS, create_system_backup, iter_system_backup
+from core.build_info import obter_build_info
+from core.context_processors import build_info_context
+from core.models import AuditLog, RelatorioPDF
+from core.relatorios_pdf import (
+    calcular_chave,
+    invalidar_relatorios,
+    limpar_relatorios_antigos,
+    processar_relatorio,
+    processar_relatorios_pendentes,
+    reivindicar_relatorios,
+    solicitar_relatorio,
+)
+from marketing_ia.models import SincronizacaoEstoque
+from vendas_produtos.models import ParametrosComissao
 
 
 class StorageConfigTests(TestCase):
@@ -51,3 +96,569 @@ class StorageConfigTests(TestCase):
         finally:
             if original is not None:
                 staticfiles_storage.hashed_files[hash_key] = original
+
+
+class BuildInfoContextTests(TestCase):
+    def setUp(self):
+        obter_build_info.cache_clear()
+        self.addCleanup(obter_build_info.cache_clear)
+        self.request = RequestFactory().get('/')
+
+    def test_le_arquivo_gerado_no_build_sem_chamar_git(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            caminho = os.path.join(tmp, 'build_info.json')
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump({
+                    'app_build_number': '321',
+                    'app_build_sha': 'abc12345',
+                    'app_build_datetime': '01/02/2026 10:00',
+                }, arquivo)
+
+            with override_settings(APP_BUILD_INFO_FILE=caminho), \
+                    patch('core.build_info.subprocess.check_output') as mock_git:
+                contexto = build_info_context(self.request)
+
+        mock_git.assert_not_called()
+        self.assertEqual(contexto, {
+            'app_build_number': '321',
+            'app_build_sha': 'abc12345',
+            'app_build_datetime': '01/02/2026 10:00',
+        })
+
+    @override_settings(APP_BUILD_INFO_FILE='/caminho/inexistente/build_info.json', APP_BUILD_NUMBER='0')
+    def test_fallback_para_git_roda_uma_vez_por_processo(self):
+        respostas = {'log': 'abc1234|2026-02-01T10:00:00-03:00', 'rev-list': '42'}
+
+        def fake_git(cmd, **kwargs):
+            return respostas[cmd[1]]
+
+        with patch('core.build_info.subprocess.check_output', side_effect=fake_git) as mock_git:
+            for _ in range(5):
+                contexto = build_info_context(self.request)
+
+        self.assertEqual(mock_git.call_count, 2)
+        self.assertEqual(contexto['app_build_number'], '42')
+        self.assertEqual(contexto['app_build_sha'], 'abc1234')
+        self.assertEqual(contexto['app_build_datetime'], '01/02/2026 10:00')
+
+
+# Mesmo backend de producao: cada leitura do django_cache entra na contagem de queries.
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}})
+class CachedSingletonTests(TestCase):
+    LOADERS = (
+        ConfiguracaoIntegracoes.get_solo,
+        ParametrosComissao.get_solo,
+        ConfiguracaoPonto.load,
+        ConfiguracaoIA.load,
+        SincronizacaoEstoque.load,
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('createcachetable', verbosity=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def _em_request(self):
+        iniciar_escopo_request()
+        self.addCleanup(encerrar_escopo_request)
+
+    def _aquecer(self):
+        # A primeira passada cria as linhas que faltam, e cada post_save troca a versao.
+        for _ in range(2):
+            for loader in self.LOADERS:
+                loader()
+
+    def test_leitura_aquecida_le_so_a_versao_uma_vez_por_request(self):
+        self._aquecer()
+        self._em_request()
+
+        with self.assertNumQueries(1):
+            for loader in self.LOADERS:
+                self.assertEqual(loader().pk, 1)
+
+    def test_fora_de_request_cada_leitura_confere_a_versao(self):
+        self._aquecer()
+
+        with self.assertNumQueries(1):
+            ConfiguracaoIA.load()
+
+    def test_invalidacao_de_outro_processo_vale_a_partir_do_proximo_request(self):
+        self._aquecer()
+        self._em_request()
+        self.assertEqual(ParametrosComissao.get_solo().comissao_moto, Decimal('150.00'))
+
+        # Outro processo: update() na linha e troca da versao so no cache compartilhado.
+        ParametrosComissao.objects.filter(pk=1).update(comissao_moto=Decimal('175.00'))
+        cache.delete('singleton:versao')
+        self.assertEqual(ParametrosComissao.get_solo().comissao_moto, Decimal('150.00'))
+
+        iniciar_escopo_request()
+        self.assertEqual(ParametrosComissao.get_solo().comissao_moto, Decimal('175.00'))
+
+    def test_instancia_retornada_nao_e_compartilhada(self):
+        config = ParametrosComissao.get_solo()
+        config.comissao_moto = Decimal('999.00')
+
+        self.assertNotEqual(ParametrosComissao.get_solo().comissao_moto, Decimal('999.00'))
+
+    def test_save_invalida_o_cache(self):
+        ConfiguracaoIntegracoes.get_solo()
+        config = ConfiguracaoIntegracoes.get_solo()
+        config.evo_crm_api_token = 'token-novo'
+        config.save()
+
+        self.assertEqual(ConfiguracaoIntegracoes.get_solo().evo_crm_api_token, 'token-novo')
+
+    def test_delete_invalida_o_cache(self):
+        ConfiguracaoIA.load().delete()
+
+        self.assertIsNone(cache.get('singleton:versao'))
+        # Versao nova: get_or_create recria a linha.
+        self.assertEqual(ConfiguracaoIA.load().pk, 1)
+        self.assertTrue(ConfiguracaoIA.objects.filter(pk=1).exists())
+
+    def test_edicao_pelo_admin_invalida_o_cache(self):
+        admin = User.objects.create_superuser(username='admin_singleton', password='123456', email='a@a.com')
+        self.client.force_login(admin)
+        config = ParametrosComissao.get_solo()
+        self.assertEqual(config.comissao_moto, Decimal('150.00'))
+
+        dados = {
+            field.name: getattr(config, field.name)
+            for field in ParametrosComissao._meta.fields
+            if field.name != 'id'
+        }
+        dados['comissao_moto'] = '175.00'
+        resposta = self.client.post(f'/admin/vendas_produtos/parametroscomissao/{config.pk}/change/', dados)
+
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(ParametrosComissao.get_solo().comissao_moto, Decimal('175.00'))
+
+
+@override_settings(AUDIT_LOG_BUFFERED=True)
+class AuditLogBufferTests(TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir, ignore_errors=True)
+        self.buffer = AuditLogBuffer(spill_dir=self.spill_dir, max_pendentes=3, iniciar_thread=False)
+        patcher = patch.object(audit_buffer, '_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='auditado', password='123456')
+
+    def _spill_files(self):
+        return sorted(os.listdir(self.spill_dir))
+
+    def _registrar(self, action='acao_teste'):
+        create_audit_log(user=self.user, module='testes', action=action, method='POST', path='/x/')
+
+    def test_request_so_enfileira_e_flush_grava_em_lote(self):
+        with self.assertNumQueries(0):
+            self._registrar('a')
+            self._registrar('b')
+
+        self.assertEqual(len(self._spill_files()), 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertEqual(
+            list(AuditLog.objects.order_by('action').values_list('action', 'user_id')),
+            [('a', self.user.pk), ('b', self.user.pk)],
+        )
+        self.assertEqual(self._spill_files(), [])
+
+    def test_preserva_data_do_request(self):
+        momento = timezone.now() - timedelta(minutes=10)
+        with patch('core.audit.timezone.now', return_value=momento):
+            self._registrar()
+        self.buffer.flush()
+
+        self.assertEqual(AuditLog.objects.get().created_at, momento)
+
+    def test_fila_cheia_grava_de_forma_sincrona(self):
+        for indice in range(3):
+            self._registrar(f'fila_{indice}')
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+        self._registrar('excedente')
+
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['excedente'])
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(AuditLog.objects.count(), 4)
+
+    def test_recupera_spill_de_processo_que_morreu(self):
+        processo = subprocess.Popen([sys.executable, '-c', 'pass'])
+        processo.wait()
+        registro = {
+            'created_at': timezone.now().isoformat(), 'user_id': self.user.pk, 'username_snapshot': 'auditado',
+            'nivel_acesso_snapshot': '', 'module': 'testes', 'action': 'recuperada', 'method': 'POST',
+            'path': '/x/', 'status_code': 200, 'ip_address': None, 'user_agent': '', 'object_repr': '',
+            'payload': {}, 'success': True, 'severity': 'INFO',
+        }
+        with open(os.path.join(self.spill_dir, f'audit-{processo.pid}-atual.jsonl'), 'w', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(registro) + '\n')
+
+        # O primeiro uso no processo so reivindica o arquivo: nada de banco dentro do request.
+        with self.assertNumQueries(0):
+            self._registrar('nova')
+        self.assertEqual(len(self._spill_files()), 2)  # o reivindicado + o spill atual
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(sorted(AuditLog.objects.values_list('action', flat=True)), ['nova', 'recuperada'])
+        self.assertEqual(self._spill_files(), [])
+
+
+@override_settings(AUDIT_LOG_BUFFERED=True)
+class AuditLogBufferDescarteTests(TransactionTestCase):
+    """Sem a transacao do TestCase: o erro de um lote nao pode contaminar as gravacoes seguintes,
+    como acontece na thread do buffer (autocommit)."""
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir, ignore_errors=True)
+        self.buffer = AuditLogBuffer(spill_dir=self.spill_dir, iniciar_thread=False)
+        patcher = patch.object(audit_buffer, '_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='auditado', password='123456')
+
+    def _spill_files(self):
+        return sorted(os.listdir(self.spill_dir))
+
+    def _registrar(self, action='acao_teste'):
+        create_audit_log(user=self.user, module='testes', action=action, method='POST', path='/x/')
+
+    def _descartados(self):
+        caminho = os.path.join(self.spill_dir, audit_buffer.ARQUIVO_DESCARTADOS)
+        with open(caminho, encoding='utf-8') as arquivo:
+            return [json.loads(linha) for linha in arquivo]
+
+    def test_lote_com_registro_invalido_nao_trava_a_fila(self):
+        self.buffer.max_tentativas = 3
+        self.buffer.intervalo_flush = 0
+        self._registrar('antes')
+        create_audit_log(user=self.user, module='testes', action='invalida', method='POST', path='/x/', status_code='abc')
+        self._registrar('depois')
+        registros, caminho_lote = self.buffer._retirar_tudo()
+
+        with patch.object(self.buffer, '_gravar', wraps=self.buffer._gravar) as gravar, \
+                self.assertLogs('core.audit_buffer', 'ERROR') as logs:
+            self.assertTrue(self.buffer._gravar_com_tentativas(registros, caminho_lote))
+
+        self.assertEqual(gravar.call_count, 3)
+        self.assertIn('movido(s) para', logs.output[-1])
+        self.assertEqual(sorted(AuditLog.objects.values_list('action', flat=True)), ['antes', 'depois'])
+        descartados = self._descartados()
+        self.assertEqual([item['registro']['action'] for item in descartados], ['invalida'])
+        self.assertIn('ValueError', descartados[0]['erro'])
+        self.assertEqual(self._spill_files(), [audit_buffer.ARQUIVO_DESCARTADOS])
+
+        self._registrar('seguinte')
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_recuperacao_conta_so_o_que_foi_gravado(self):
+        processo = subprocess.Popen([sys.executable, '-c', 'pass'])
+        processo.wait()
+        self._registrar('boa')
+        create_audit_log(user=self.user, module='testes', action='ruim', method='POST', path='/x/', status_code='abc')
+        registros, caminho_lote = self.buffer._retirar_tudo()
+        os.rename(caminho_lote, os.path.join(self.spill_dir, f'audit-{processo.pid}-lote1.jsonl'))
+
+        with self.assertLogs('core.audit_buffer', 'INFO') as logs:
+            self.assertEqual(self.buffer.recuperar_spill(), 1)
+
+        self.assertIn('1 registro(s) recuperado(s)', logs.output[-1])
+        self.assertEqual([item['registro']['action'] for item in self._descartados()], ['ruim'])
+
+    def test_banco_fora_do_ar_mantem_o_lote_pendente(self):
+        self.buffer.max_tentativas = 1
+        self._registrar('a')
+        self._registrar('b')
+        registros, caminho_lote = self.buffer._retirar_tudo()
+
+        with patch.object(AuditLog, 'save', side_effect=Exception('conexao perdida')), \
+                patch.object(audit_buffer, '_banco_disponivel', return_value=False):
+            pendentes, gravados = self.buffer._gravar_um_a_um(registros, caminho_lote)
+
+        self.assertEqual([registro['action'] for registro in pendentes], ['a', 'b'])
+        self.assertEqual(gravados, 0)
+        self.assertFalse(os.path.exists(os.path.join(self.spill_dir, audit_buffer.ARQUIVO_DESCARTADOS)))
+        with open(caminho_lote, encoding='utf-8') as arquivo:
+            self.assertEqual(len(arquivo.readlines()), 2)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class AuditLogLatenciaBenchmark(TestCase):
+    REQUISICOES = 300
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='bench_audit', password='123456', email='b@b.com'))
+
+    def _medir_ms(self):
+        inicio = time.perf_counter()
+        for _ in range(self.REQUISICOES):
+            self.client.post('/painel-admin/dispensar-pendencias/')
+        return (time.perf_counter() - inicio) * 1000 / self.REQUISICOES
+
+    def test_compara_auditoria_sincrona_e_em_buffer(self):
+        with override_settings(AUDIT_LOG_BUFFERED=False):
+            sincrono_ms = self._medir_ms()
+
+        spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spill_dir, ignore_errors=True)
+        buffer = AuditLogBuffer(spill_dir=spill_dir, max_pendentes=self.REQUISICOES, iniciar_thread=False)
+        with override_settings(AUDIT_LOG_BUFFERED=True), patch.object(audit_buffer, '_buffer', buffer):
+            buffer_ms = self._medir_ms()
+            inicio = time.perf_counter()
+            buffer.flush()
+            flush_ms = (time.perf_counter() - inicio) * 1000
+
+        print(
+            f"\n[benchmark] POST com auditoria: sincrona {sincrono_ms:.2f} ms/req | "
+            f"buffer {buffer_ms:.2f} ms/req | flush em lote de {self.REQUISICOES}: {flush_ms:.1f} ms"
+        )
+        self.assertEqual(AuditLog.objects.count(), 2 * self.REQUISICOES)
+
+
+class _ComBaseDeBackup:
+    def setUp(self):
+        self.pasta_midia = tempfile.mkdtemp(prefix='backup-midia-teste-')
+        self.addCleanup(shutil.rmtree, self.pasta_midia, ignore_errors=True)
+        self.storage = FileSystemStorage(location=self.pasta_midia)
+        self.storage.save('vendas/comprovante.txt', ContentFile(b'comprovante'))
+        self.storage.save('raiz.txt', ContentFile(b'x' * 3000))
+        self.admin = User.objects.create_superuser(username='admin_backup', password='123456', email='a@teste.com')
+
+    def _criar_logs(self, quantidade):
+        AuditLog.objects.bulk_create(
+            [
+                AuditLog(module='backup', action=f'acao {indice}', path='/x/' + 'p' * 400, user_agent='a' * 300)
+                for indice in range(quantidade)
+            ],
+            batch_size=1000,
+        )
+
+    def _pico_de_memoria(self, lote):
+        tracemalloc.start()
+        try:
+            total = sum(
+                len(pedaco) for pedaco in iter_system_backup(incluir_midia=True, storage=self.storage, lote=lote)
+            )
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return pico, total
+
+
+@override_settings(BACKUP_INCLUIR_MIDIA=False)
+class BackupStreamingTests(_ComBaseDeBackup, TestCase):
+    def test_zip_tem_dump_midia_e_metadata(self):
+        self._criar_logs(7)
+        pasta_saida = tempfile.mkdtemp(prefix='backup-saida-teste-')
+        self.addCleanup(shutil.rmtree, pasta_saida, ignore_errors=True)
+
+        caminho = create_system_backup(output_dir=pasta_saida, incluir_midia=True, storage=self.storage, lote=3)
+
+        self.assertEqual(os.listdir(pasta_saida), [caminho.name])
+        with ZipFile(caminho) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            dump = json.loads(zip_file.read('database_dump.json'))
+            metadata = json.loads(zip_file.read('metadata.json'))
+            self.assertEqual(zip_file.read('media/vendas/comprovante.txt'), b'comprovante')
+            self.assertEqual(zip_file.read('media/raiz.txt'), b'x' * 3000)
+
+        self.assertEqual(sum(1 for item in dump if item['model'] == 'core.auditlog'), 7)
+        self.assertEqual(metadata['database']['object_count'], len(dump))
+        self.assertEqual(metadata['media']['file_count'], 2)
+        # Chaves naturais, como no dumpdata --natural-primary/--natural-foreign.
+        usuario = next(item for item in dump if item['model'] == 'auth.user' and item['fields']['username'] == 'admin_backup')
+        self.assertNotIn('pk', usuario)
+
+    def test_view_responde_em_streaming(self):
+        self.client.force_login(self.admin)
+
+        resposta = self.client.post(reverse('gerar_backup_sistema'))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        self.assertIn('attachment; filename="backup_sistema_', resposta['Content-Disposition'])
+        with ZipFile(BytesIO(b''.join(resposta.streaming_content))) as zip_file:
+            self.assertEqual(set(zip_file.namelist()), {'database_dump.json', 'metadata.json'})
+            self.assertFalse(json.loads(zip_file.read('metadata.json'))['media']['included'])
+
+    def test_pico_de_memoria_nao_cresce_com_a_base(self):
+        # Lote pequeno para a base de teste ja passar de varios lotes (a medicao com a
+        # base maior e o lote padrao esta em BackupStreamingBenchmark).
+        self._pico_de_memoria(lote=50)
+
+        self._criar_logs(200)
+        pico_pequeno, _ = self._pico_de_memoria(lote=50)
+        self._criar_logs(800)
+        pico_grande, _ = self._pico_de_memoria(lote=50)
+
+        # Com o dump inteiro em memoria o pico dos 1000 logs passaria de 4x o dos 200.
+        self.assertLess(pico_grande, pico_pequeno * 1.5)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+@override_settings(BACKUP_INCLUIR_MIDIA=False)
+class BackupStreamingBenchmark(_ComBaseDeBackup, TestCase):
+    def test_pico_de_memoria_nao_cresce_com_a_base(self):
+        # Aquece imports/caches para nao contar na primeira medicao.
+        self._pico_de_memoria(lote=BACKUP_LOTE_OBJETOS)
+
+        self._criar_logs(1000)
+        pico_pequeno, zip_pequeno = self._pico_de_memoria(lote=BACKUP_LOTE_OBJETOS)
+        self._criar_logs(4000)
+        pico_grande, zip_grande = self._pico_de_memoria(lote=BACKUP_LOTE_OBJETOS)
+
+        print(
+            f"\n[benchmark] backup 1000 logs: pico {pico_pequeno / 1024:.0f} KiB (zip {zip_pequeno / 1024:.0f} KiB); "
+            f"5000 logs: pico {pico_grande / 1024:.0f} KiB (zip {zip_grande / 1024:.0f} KiB)"
+        )
+        # Base 5x maior; o pico de alocacao fica no tamanho de um lote, nao do dump.
+        self.assertGreater(zip_grande, zip_pequeno * 3)
+        self.assertLess(pico_grande, pico_pequeno * 1.5)
+
+
+class RelatorioPDFTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin_relatorio', password='123456', email='r@teste.com')
+        self.vendedor = User.objects.create_user(username='vendedor_relatorio', password='123456')
+        self.url = reverse('exportar_relatorio_pdf') + '?start_date=2026-01-01&end_date=2026-01-31'
+
+    def tearDown(self):
+        # Os PDFs ficam no FileSystemStorage temporario da suite: remove o que o teste gravou.
+        for relatorio in RelatorioPDF.objects.all():
+            if relatorio.arquivo:
+                relatorio.arquivo.delete(save=False)
+
+    def test_view_enfileira_e_mostra_tela_de_espera(self):
+        self.client.force_login(self.admin)
+
+        resposta = self.client.get(self.url)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTemplateUsed(resposta, 'core/relatorio_pdf_aguardando.html')
+        relatorio = RelatorioPDF.objects.get()
+        self.assertEqual(relatorio.status, RelatorioPDF.Status.PENDENTE)
+        self.assertEqual(relatorio.parametros, {'start_date': '2026-01-01', 'end_date': '2026-01-31'})
+        self.assertEqual(relatorio.solicitado_por, self.admin)
+
+        # Pedido igual enquanto o job esta na fila reaproveita o mesmo job.
+        self.client.get(self.url)
+        self.assertEqual(RelatorioPDF.objects.count(), 1)
+
+    def test_worker_gera_pdf_e_pedido_seguinte_vai_direto_ao_download(self):
+        self.client.force_login(self.admin)
+        self.client.get(self.url)
+
+        self.assertEqual(processar_relatorios_pendentes(), 1)
+
+        relatorio = RelatorioPDF.objects.get()
+        self.assertEqual(relatorio.status, RelatorioPDF.Status.PRONTO)
+        self.assertEqual(relatorio.nome_arquivo, 'relatorio_leads.pdf')
+        with relatorio.arquivo.open('rb') as arquivo:
+            self.assertTrue(arquivo.read().startswith(b'%PDF'))
+
+        status = self.client.get(reverse('relatorio_pdf_status', args=[relatorio.token])).json()
+        self.assertTrue(status['pronto'])
+        self.assertEqual(status['url_download'], reverse('relatorio_pdf_baixar', args=[relatorio.token]))
+
+        resposta = self.client.get(self.url)
+        self.assertRedirects(resposta, status['url_download'], fetch_redirect_response=False)
+        self.assertEqual(RelatorioPDF.objects.count(), 1)
+
+        download = self.client.get(status['url_download'])
+        self.assertEqual(download['Content-Type'], 'application/pdf')
+        self.assertIn('attachment; filename="relatorio_leads.pdf"', download['Content-Disposition'])
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+    @override_settings(RELATORIO_PDF_VALIDADE_SEGUNDOS=60)
+    def test_caminho_do_pdf_nao_sai_dos_parametros(self):
+        parametros = {'vendedores': [self.vendedor.pk]}
+        primeiro = solicitar_relatorio('clientes.relatorio_atrasados', parametros)
+        processar_relatorios_pendentes()
+        RelatorioPDF.objects.filter(pk=primeiro.pk).update(concluido_em=timezone.now() - timedelta(minutes=5))
+        segundo = solicitar_relatorio('clientes.relatorio_atrasados', parametros)
+        processar_relatorios_pendentes()
+
+        primeiro.refresh_from_db()
+        segundo.refresh_from_db()
+        # Mesmos parametros, mesma chave de busca; o caminho no bucket publico nao sai dela.
+        self.assertEqual(primeiro.chave, calcular_chave('clientes.relatorio_atrasados', parametros))
+        self.assertEqual(segundo.chave, primeiro.chave)
+        self.assertNotIn(primeiro.chave, primeiro.arquivo.name)
+        self.assertNotEqual(segundo.arquivo.name, primeiro.arquivo.name)
+
+    def test_status_e_download_respeitam_permissao_do_tipo(self):
+        relatorio = solicitar_relatorio('clientes.relatorio_atrasados', {'vendedores': []}, usuario=self.admin)
+        processar_relatorios_pendentes()
+        self.client.force_login(self.vendedor)
+
+        self.assertEqual(self.client.get(reverse('relatorio_pdf_status', args=[relatorio.token])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('relatorio_pdf_baixar', args=[relatorio.token])).status_code, 403)
+
+    def test_download_antes_de_ficar_pronto_e_404(self):
+        relatorio = solicitar_relatorio('clientes.relatorio_atrasados', {'vendedores': []}, usuario=self.admin)
+        self.client.force_login(self.admin)
+
+        self.assertEqual(self.client.get(reverse('relatorio_pdf_baixar', args=[relatorio.token])).status_code, 404)
+        self.assertFalse(self.client.get(reverse('relatorio_pdf_status', args=[relatorio.token])).json()['pronto'])
+
+    @override_settings(RELATORIO_PDF_VALIDADE_SEGUNDOS=60)
+    def test_pdf_vencido_gera_job_novo(self):
+        primeiro = solicitar_relatorio('clientes.relatorio_atrasados', {'vendedores': []})
+        processar_relatorios_pendentes()
+        RelatorioPDF.objects.filter(pk=primeiro.pk).update(concluido_em=timezone.now() - timedelta(minutes=5))
+
+        segundo = solicitar_relatorio('clientes.relatorio_atrasados', {'vendedores': []})
+
+        self.assertNotEqual(segundo.pk, primeiro.pk)
+        self.assertEqual(segundo.status, RelatorioPDF.Status.PENDENTE)
+
+    def test_invalidar_durante_a_geracao_descarta_o_pdf_e_gera_de_novo(self):
+        relatorio = solicitar_relatorio('clientes.relatorio_atrasados', {'vendedores': []})
+        em_geracao, = reivindicar_relatorios(1)
+
+        # Os dados mudaram enquanto o worker montava o PDF.
+        invalidar_relatorios('clientes.relatorio_atrasados')
+        with self.assertLogs('core.relatorios_pdf', level='INFO'):
+            processar_relatorio(em_geracao)
+
+        relatorio.refresh_from_db()
+        self.assertEqual(relatorio.status, RelatorioPDF.Status.PENDENTE)
+        self.assertFalse(relatorio.arquivo)
+        self.assertFalse(em_geracao.arquivo)  # o PDF velho saiu do storage
+
+        self.assertEqual(processar_relatorios_pendentes(), 1)
+        relatorio.refresh_from_db()
+        self.assertEqual(relatorio.status, RelatorioPDF.Status.PRONTO)
+        self.assertEqual(relatorio.tentativas, 1)
+
+    def test_erro_definitivo_marca_falhou(self):
+        relatorio = solicitar_relatorio('clientes.relatorio_atrasados', {'vendedores': []})
+        relatorio.tipo = 'tipo.inexistente'
+        relatorio.save(update_fields=['tipo'])
+
+        processar_relatorios_pendentes()
+
+        relatorio.refresh_from_db()
+        self.assertEqual(relatorio.status, RelatorioPDF.Status.FALHOU)
+        self.assertEqual(relatorio.tentativas, 1)
+
+    def test_limpeza_apaga_jobs_antigos_e_arquivos(self):
+        relatorio = solicitar_relatorio('clientes.relatorio_atrasados', {'vendedores': []})
+        processar_relatorios_pendentes()
+        relatorio.refresh_from_db()
+        storage, nome = relatorio.arquivo.storage, relatorio.arquivo.name
+        RelatorioPDF.objects.filter(pk=relatorio.pk).update(criado_em=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(limpar_relatorios_antigos(horas=24), 1)
+
+        self.assertFalse(RelatorioPDF.objects.exists())
+        self.assertFalse(storage.exists(nome))
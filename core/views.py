@@ -1,5 +1,8 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Sum
 
@@ -7,6 +10,9 @@ from django.db.models import Sum
 from financiamentos.models import Ficha
 from vendas_produtos.models import VendaProduto
 
+from .models import RelatorioPDF
+from .relatorios_pdf import obter_tipo, solicitar_relatorio
+
 @login_required
 def home(request):
     user = request.user
@@ -43,4 +49,64 @@ def home(request):
         'mes_atual_nome': hoje.strftime('%B'), # Nome do mês
     }
     
-    return render(request, 'home.html', context)
\ No newline at end of file
+    return render(request, 'home.html', context)
+
+
+def _url_download(relatorio, request):
+    url = reverse('relatorio_pdf_baixar', args=[relatorio.token])
+    if request.GET.get('target') == 'inline':
+        url += '?target=inline'
+    return url
+
+
+def responder_relatorio_pdf(request, tipo, parametros):
+    """
+    Resposta padrao das views de PDF: se o relatorio ja esta pronto, redireciona
+    para o download; senao mostra a tela de espera, que acompanha o job pelo status.
+    A view chamadora continua responsavel pela checagem de permissao.
+    """
+    relatorio = solicitar_relatorio(tipo, parametros, usuario=request.user)
+    if relatorio.status == RelatorioPDF.Status.PRONTO:
+        return redirect(_url_download(relatorio, request))
+    return render(request, 'core/relatorio_pdf_aguardando.html', {
+        'relatorio': relatorio,
+        'status_url': reverse('relatorio_pdf_status', args=[relatorio.token]),
+        'download_url': _url_download(relatorio, request),
+    })
+
+
+def _obter_relatorio(request, token):
+    relatorio = get_object_or_404(RelatorioPDF, token=token)
+    try:
+        definicao = obter_tipo(relatorio.tipo)
+    except KeyError:
+        raise Http404("Tipo de relatório desconhecido.")
+    if not definicao.pode_acessar(request.user, relatorio.parametros):
+        raise PermissionDenied("Você não tem permissão para acessar este relatório.")
+    return relatorio
+
+
+@login_required
+def relatorio_pdf_status(request, token):
+    relatorio = _obter_relatorio(request, token)
+    pronto = relatorio.status == RelatorioPDF.Status.PRONTO
+    return JsonResponse({
+        'status': relatorio.status,
+        'status_display': relatorio.get_status_display(),
+        'pronto': pronto,
+        'erro': relatorio.erro if relatorio.status == RelatorioPDF.Status.FALHOU else '',
+        'url_download': _url_download(relatorio, request) if pronto else None,
+    })
+
+
+@login_required
+def relatorio_pdf_baixar(request, token):
+    relatorio = _obter_relatorio(request, token)
+    if relatorio.status != RelatorioPDF.Status.PRONTO or not relatorio.arquivo:
+        raise Http404("Relatório ainda não está pronto.")
+    return FileResponse(
+        relatorio.arquivo.open('rb'),
+        content_type='application/pdf',
+        as_attachment=request.GET.get('target') != 'inline',
+        filename=relatorio.nome_arquivo or 'relatorio.pdf',
+    )
@@ -1,5 +1,7 @@
 from pathlib import Path
 import os
+import sys
+import tempfile
 from dotenv import load_dotenv
 
 # Carrega as variÃ¡veis de ambiente do arquivo .env
@@ -8,6 +10,9 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# `manage.py test`: alguns ajustes abaixo (cache, auditoria) mudam de default na suite.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 
 def _env_to_bool(name, default=False):
     value = os.getenv(name, str(default))
@@ -50,6 +55,9 @@ APP_BUILD_SHA = (
     or ''
 )
 APP_BUILD_SHA_SHORT = APP_BUILD_SHA[:8] if APP_BUILD_SHA else ''
+# JSON gerado no build da imagem (manage.py gerar_build_info). Se nao existir, o rodape
+# cai para o git local / variaveis acima, resolvido uma unica vez por processo.
+APP_BUILD_INFO_FILE = os.getenv('APP_BUILD_INFO_FILE', str(BASE_DIR / 'build_info.json'))
 
 # --- CONFIGURAÃ‡Ã•ES DE PRODUÃ‡ÃƒO (LIDAS DO .ENV) ---
 # A SECRET_KEY Ã© lida do ambiente. Use uma chave forte em produÃ§Ã£o!
@@ -227,7 +235,46 @@ STORAGES = {
         # arquivo em vez de derrubar a pagina inteira com 500.
         "BACKEND": "crmspagi.storage_backends.LenientManifestStaticFilesStorage",
     },
+    # Fotos das batidas de ponto (controle_ponto.FotoRegistroPonto).
+    "fotos_ponto": {
+        "BACKEND": "crmspagi.storage_backends.PublicMediaStorage",
+    },
+    # PDFs de relatorio gerados pelo worker (core.RelatorioPDF).
+    "relatorios_pdf": {
+        "BACKEND": "crmspagi.storage_backends.PublicMediaStorage",
+    },
+    # Imagens das previas de post do Marketing IA (marketing_ia.PreviewPost).
+    "previews_marketing": {
+        "BACKEND": "crmspagi.storage_backends.PublicMediaStorage",
+    },
 }
+# Na suite de testes as fotos de ponto, os PDFs e as previas vao para o disco local, sem depender do MinIO.
+if TESTING:
+    STORAGES["fotos_ponto"] = {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.path.join(tempfile.gettempdir(), "crmspagi-testes-fotos-ponto"),
+            "base_url": "/media-testes/fotos-ponto/",
+        },
+    }
+    STORAGES["relatorios_pdf"] = {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.path.join(tempfile.gettempdir(), "crmspagi-testes-relatorios-pdf"),
+            "base_url": "/media-testes/relatorios-pdf/",
+        },
+    }
+    STORAGES["previews_marketing"] = {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.path.join(tempfile.gettempdir(), "crmspagi-testes-previews-marketing"),
+            "base_url": "/media-testes/previews-marketing/",
+        },
+    }
+
+# Backup (core.backup_utils): inclui no zip os arquivos do storage "default" (MinIO),
+# lidos direto do bucket um a um. Desligue se o bucket tiver backup proprio.
+BACKUP_INCLUIR_MIDIA = _env_to_bool('BACKUP_INCLUIR_MIDIA', True)
 
 # --- ConfiguraÃ§Ãµes do django-webpush (LIDAS DO .ENV) ---
 WEBPUSH_SETTINGS = {
@@ -292,6 +339,140 @@ else:
         }
     }
 
+# --- Auditoria (core.audit / core.audit_buffer) ---
+# Com AUDIT_LOG_BUFFERED, o AuditLogMiddleware so enfileira o registro (e grava uma linha no
+# spill local, para sobreviver a um crash); uma thread grava em lote com bulk_create.
+# Na suite de testes o default e sincrono, para os testes enxergarem o log logo apos o request.
+AUDIT_LOG_BUFFERED = _env_to_bool('AUDIT_LOG_BUFFERED', not TESTING)
+AUDIT_LOG_SPILL_DIR = os.getenv('AUDIT_LOG_SPILL_DIR', str(BASE_DIR / '.audit_spill'))
+AUDIT_LOG_BUFFER_MAX = _env_to_int('AUDIT_LOG_BUFFER_MAX', 10000)
+AUDIT_LOG_BATCH_SIZE = _env_to_int('AUDIT_LOG_BATCH_SIZE', 200)
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '1.0'))
+# Falhas seguidas de um lote antes de gravar registro a registro (recusados vao para o arquivo de descartados).
+AUDIT_LOG_MAX_TENTATIVAS = _env_to_int('AUDIT_LOG_MAX_TENTATIVAS', 5)
+
+# --- Outbox de webhooks (configuracoes.outbox / manage.py processar_webhooks) ---
+# enviar_webhook so grava a entrega; o worker envia em lotes, em paralelo, com retry e
+# backoff exponencial (BASE * 2^(tentativa-1), limitado a BACKOFF_MAX segundos).
+WEBHOOK_OUTBOX_LOTE = _env_to_int('WEBHOOK_OUTBOX_LOTE', 50)
+WEBHOOK_OUTBOX_CONCORRENCIA = _env_to_int('WEBHOOK_OUTBOX_CONCORRENCIA', 8)
+WEBHOOK_OUTBOX_MAX_TENTATIVAS = _env_to_int('WEBHOOK_OUTBOX_MAX_TENTATIVAS', 8)
+WEBHOOK_OUTBOX_BACKOFF_BASE = _env_to_int('WEBHOOK_OUTBOX_BACKOFF_BASE', 30)
+WEBHOOK_OUTBOX_BACKOFF_MAX = _env_to_int('WEBHOOK_OUTBOX_BACKOFF_MAX', 3600)
+WEBHOOK_OUTBOX_RESERVA_SEGUNDOS = _env_to_int('WEBHOOK_OUTBOX_RESERVA_SEGUNDOS', 300)
+WEBHOOK_OUTBOX_RETENCAO_DIAS = _env_to_int('WEBHOOK_OUTBOX_RETENCAO_DIAS', 15)
+
+# --- Fila do push web (notificacoes.push / manage.py processar_push) ---
+# notificar_usuario(s) so enfileira; o worker envia em paralelo, com retry e backoff
+# exponencial, e apaga as inscricoes que o servico de push responde com 404/410.
+PUSH_LOTE = _env_to_int('PUSH_LOTE', 100)
+PUSH_CONCORRENCIA = _env_to_int('PUSH_CONCORRENCIA', 8)
+PUSH_TIMEOUT = _env_to_int('PUSH_TIMEOUT', 10)
+PUSH_MAX_TENTATIVAS = _env_to_int('PUSH_MAX_TENTATIVAS', 5)
+PUSH_BACKOFF_BASE = _env_to_int('PUSH_BACKOFF_BASE', 30)
+PUSH_BACKOFF_MAX = _env_to_int('PUSH_BACKOFF_MAX', 900)
+# RESERVA_SEGUNDOS e o minimo: o worker estende a reserva ate o pior caso do lote
+# (ceil(LOTE / CONCORRENCIA) envios por thread, cada um podendo levar 2x TIMEOUT).
+PUSH_RESERVA_SEGUNDOS = _env_to_int('PUSH_RESERVA_SEGUNDOS', 120)
+PUSH_RETENCAO_DIAS = _env_to_int('PUSH_RETENCAO_DIAS', 7)
+
+# --- Raspagem do estoque do site (marketing_ia.scraping) ---
+# MODO: "auto" (HTTP direto e Selenium so se a listagem precisar de JS), "http" ou "selenium".
+# CONCORRENCIA: paginas buscadas em paralelo (no Selenium, tamanho do pool de Chromes).
+# INTERVALO_HOST: segundos minimos entre duas requisicoes ao mesmo host.
+MARKETING_SCRAPING_MODO = os.getenv('MARKETING_SCRAPING_MODO', 'auto')
+MARKETING_SCRAPING_CONCORRENCIA = _env_to_int('MARKETING_SCRAPING_CONCORRENCIA', 4)
+MARKETING_SCRAPING_INTERVALO_HOST = float(os.getenv('MARKETING_SCRAPING_INTERVALO_HOST', '0.25'))
+MARKETING_SCRAPING_TIMEOUT = _env_to_int('MARKETING_SCRAPING_TIMEOUT', 15)
+# Validade das paginas de detalhe guardadas para revalidar com ETag/Last-Modified
+# (no cache proprio CACHES['paginas_estoque'], para o HTML nao disputar espaco com o default).
+MARKETING_SCRAPING_CACHE_SEGUNDOS = _env_to_int('MARKETING_SCRAPING_CACHE_SEGUNDOS', 7 * 24 * 3600)
+MARKETING_SCRAPING_CACHE_MAX_ENTRIES = _env_to_int('MARKETING_SCRAPING_CACHE_MAX_ENTRIES', 2000)
+
+# --- Cache em disco das fotos dos anuncios (marketing_ia.fotos_cache) ---
+# MB: tamanho maximo do diretorio (LRU; 0 desliga o cache).
+# VALIDADE_HORAS: por quanto tempo uma foto sai do disco sem nem revalidar no CDN.
+MARKETING_FOTOS_CACHE_DIR = os.getenv('MARKETING_FOTOS_CACHE_DIR', str(BASE_DIR / '.cache' / 'fotos'))
+MARKETING_FOTOS_CACHE_MB = _env_to_int('MARKETING_FOTOS_CACHE_MB', 500)
+MARKETING_FOTOS_CACHE_VALIDADE_HORAS = _env_to_int('MARKETING_FOTOS_CACHE_VALIDADE_HORAS', 24)
+
+# --- Cache de renderizacao do overlay (marketing_ia.image_overlay) ---
+# FUNDOS: fotos ja preparadas (blur + redimensionamento) guardadas por processo (0 desliga).
+# SEGUNDOS: validade do JPEG final no cache proprio CACHES['renders_overlay'] (0 desliga).
+# MAX_ENTRIES: JPEGs guardados nesse cache; passou disso, o Django descarta parte deles.
+MARKETING_OVERLAY_CACHE_FUNDOS = _env_to_int('MARKETING_OVERLAY_CACHE_FUNDOS', 16)
+MARKETING_OVERLAY_CACHE_SEGUNDOS = _env_to_int('MARKETING_OVERLAY_CACHE_SEGUNDOS', 24 * 3600)
+MARKETING_OVERLAY_CACHE_MAX_ENTRIES = _env_to_int('MARKETING_OVERLAY_CACHE_MAX_ENTRIES', 500)
+
+# --- Geracao de posts em lote (marketing_ia.services.gerar_posts_em_lote / marketing_ia.limites) ---
+# CONCORRENCIA: anuncios gerados ao mesmo tempo.
+# LIMITE_<PROVEDOR>_RPM: chamadas por minuto a cada provedor, por processo (0 = sem limite).
+# Na suite de testes o padrao e sem limite (os provedores sao mocks).
+MARKETING_IA_LOTE_CONCORRENCIA = _env_to_int('MARKETING_IA_LOTE_CONCORRENCIA', 4)
+MARKETING_IA_LIMITE_GEMINI_RPM = _env_to_int('MARKETING_IA_LIMITE_GEMINI_RPM', 0 if TESTING else 60)
+MARKETING_IA_LIMITE_OPENAI_RPM = _env_to_int('MARKETING_IA_LIMITE_OPENAI_RPM', 0 if TESTING else 20)
+MARKETING_IA_LIMITE_LEONARDO_RPM = _env_to_int('MARKETING_IA_LIMITE_LEONARDO_RPM', 0 if TESTING else 20)
+
+# --- Cache das respostas da IA (vendas_produtos.ai_cache / ResultadoIACache) ---
+# Dias que um resultado continua valido; a extracao de RG/CNH guarda dados pessoais e vence
+# antes. Vencido nao e mais servido e `manage.py limpar_cache_ia` (cron diario) apaga.
+IA_CACHE_VALIDADE_DIAS = _env_to_int('IA_CACHE_VALIDADE_DIAS', 30)
+IA_CACHE_VALIDADE_DOCUMENTOS_DIAS = _env_to_int('IA_CACHE_VALIDADE_DOCUMENTOS_DIAS', 7)
+
+# --- Validacao de comprovantes pela IA em segundo plano (manage.py processar_validacoes_comprovante) ---
+# O upload so marca a venda como PENDENTE; o worker chama o Gemini fora do request.
+# Falha/indisponibilidade da IA reagenda com espera de BACKOFF * tentativa segundos.
+VALIDACAO_COMPROVANTE_LOTE = _env_to_int('VALIDACAO_COMPROVANTE_LOTE', 10)
+VALIDACAO_COMPROVANTE_MAX_TENTATIVAS = _env_to_int('VALIDACAO_COMPROVANTE_MAX_TENTATIVAS', 3)
+VALIDACAO_COMPROVANTE_BACKOFF = _env_to_int('VALIDACAO_COMPROVANTE_BACKOFF', 60)
+VALIDACAO_COMPROVANTE_RESERVA_SEGUNDOS = _env_to_int('VALIDACAO_COMPROVANTE_RESERVA_SEGUNDOS', 300)
+
+# --- Relatorios PDF em segundo plano (manage.py processar_relatorios_pdf) ---
+# Um pedido igual (mesmo tipo + parametros) reaproveita o PDF gerado ha menos de
+# VALIDADE segundos (cada tipo pode definir a sua); depois de RETENCAO horas o arquivo e apagado.
+RELATORIO_PDF_VALIDADE_SEGUNDOS = _env_to_int('RELATORIO_PDF_VALIDADE_SEGUNDOS', 300)
+RELATORIO_PDF_RETENCAO_HORAS = _env_to_int('RELATORIO_PDF_RETENCAO_HORAS', 24)
+RELATORIO_PDF_LOTE = _env_to_int('RELATORIO_PDF_LOTE', 5)
+RELATORIO_PDF_MAX_TENTATIVAS = _env_to_int('RELATORIO_PDF_MAX_TENTATIVAS', 3)
+RELATORIO_PDF_RESERVA_SEGUNDOS = _env_to_int('RELATORIO_PDF_RESERVA_SEGUNDOS', 600)
+
+# --- Dashboard de clientes (clientes/dashboard.py) ---
+# Segundos que as metricas de um periodo ficam no cache; saves/deletes de Cliente invalidam antes.
+CLIENTES_DASHBOARD_CACHE_SEGUNDOS = _env_to_int('CLIENTES_DASHBOARD_CACHE_SEGUNDOS', 300)
+
+# --- Cache compartilhado entre os workers (LIDO DO .ENV) ---
+# DatabaseCache (tabela criada por `manage.py createcachetable` no entrypoint): o gunicorn
+# (appuser), os jobs do cron (root) e outras replicas enxergam as mesmas chaves (singletons
+# de configuracao, matriz de permissoes, etc.) sem depender de Redis/memcached nem de
+# permissao de arquivo. MAX_ENTRIES folgado: passar dele faz o Django descartar chaves.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "django_cache"),
+        "TIMEOUT": _env_to_int("DJANGO_CACHE_TIMEOUT", 3600),
+        "OPTIONS": {"MAX_ENTRIES": _env_to_int("DJANGO_CACHE_MAX_ENTRIES", 5000)},
+    },
+    # Entradas volumosas ficam em tabelas proprias, com limite proprio: encher uma delas
+    # descarta so as suas chaves, nunca os singletons/permissoes do default.
+    "paginas_estoque": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "cache_paginas_estoque",
+        "TIMEOUT": MARKETING_SCRAPING_CACHE_SEGUNDOS,
+        "OPTIONS": {"MAX_ENTRIES": MARKETING_SCRAPING_CACHE_MAX_ENTRIES},
+    },
+    "renders_overlay": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "cache_renders_overlay",
+        "TIMEOUT": MARKETING_OVERLAY_CACHE_SEGUNDOS,
+        "OPTIONS": {"MAX_ENTRIES": MARKETING_OVERLAY_CACHE_MAX_ENTRIES},
+    },
+}
+# Na suite de testes o rollback do TestCase desfaz os saves sem disparar os signals que
+# invalidam o cache, entao um cache persistente vazaria estado de um teste para o outro.
+# Testes que exercitam o cache ligam um LocMemCache explicitamente (override_settings).
+if TESTING:
+    CACHES = {alias: {"BACKEND": "django.core.cache.backends.dummy.DummyCache"} for alias in CACHES}
+
 # --- AutenticaÃ§Ã£o personalizada com OIDC ---
 
 AUTHENTICATION_BACKENDS = [
@@ -21,4 +21,26 @@ class LenientManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
     `manifest_strict` e atributo de classe (nao aceito via kwargs no __init__), por
     isso a subclasse em vez de configurar direto pelas OPTIONS do STORAGES.
     """
-    manifest_strict = False
\ No newline at end of file
+    manifest_strict = False
+
+def fotos_ponto_storage():
+    """Storage das fotos das batidas de ponto (alias "fotos_ponto" de settings.STORAGES).
+    Callable para o alias ser resolvido em runtime: o MinIO em producao e um
+    FileSystemStorage temporario na suite de testes."""
+    from django.core.files.storage import storages
+
+    return storages['fotos_ponto']
+
+
+def relatorios_pdf_storage():
+    """Storage dos PDFs gerados em segundo plano (alias "relatorios_pdf" de settings.STORAGES)."""
+    from django.core.files.storage import storages
+
+    return storages['relatorios_pdf']
+
+
+def previews_marketing_storage():
+    """Storage das imagens das previas de post (alias "previews_marketing" de settings.STORAGES)."""
+    from django.core.files.storage import storages
+
+    return storages['previews_marketing']
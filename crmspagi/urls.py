@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.views.generic import RedirectView, TemplateView
 from django.contrib.auth.decorators import login_required
 from crmspagi import views
+from core import views as core_views
 
 admin.site.site_header = 'Spagi CRM — Administração'
 admin.site.site_title = 'Spagi CRM Admin'
@@ -35,6 +36,8 @@ urlpatterns = [
     path('ponto/', include('controle_ponto.urls')),
     path('marketing-ia/', include('marketing_ia.urls')),
     path('configuracoes/', include('configuracoes.urls')),
+    path('relatorios-pdf/<uuid:token>/status/', core_views.relatorio_pdf_status, name='relatorio_pdf_status'),
+    path('relatorios-pdf/<uuid:token>/baixar/', core_views.relatorio_pdf_baixar, name='relatorio_pdf_baixar'),
     path('erro/503/', views.error_503, name='erro_503'),
 ]
 
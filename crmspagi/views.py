@@ -3,7 +3,7 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.db.models import Sum, Q
-from django.http import FileResponse, HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.staticfiles import finders
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
@@ -13,7 +13,7 @@ from django.contrib.auth import get_user_model
 from vendas_produtos.models import VendaProduto
 from financeiro.models import TransacaoFinanceira
 from controle_ponto.models import RegistroPonto
-from core.backup_utils import create_system_backup
+from core.backup_utils import backup_filename, iter_system_backup
 from core.models import AuditLog
 
 
@@ -99,15 +99,10 @@ def gerar_backup_sistema(request):
         messages.error(request, "Acesso negado para gerar backup.")
         return redirect('portal')
 
-    try:
-        backup_path = create_system_backup()
-    except Exception as exc:
-        messages.error(request, f"Falha ao gerar backup: {exc}")
-        return redirect('admin_dashboard')
-
-    response = FileResponse(open(backup_path, "rb"), as_attachment=True)
-    response["Content-Type"] = "application/zip"
-    response["Content-Disposition"] = f'attachment; filename="{backup_path.name}"'
+    # O zip e montado enquanto e enviado (banco em lotes, midia lida do storage), sem
+    # arquivo temporario: o download comeca na hora e a memoria nao cresce com a base.
+    response = StreamingHttpResponse(iter_system_backup(), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{backup_filename()}"'
     return response
 
 
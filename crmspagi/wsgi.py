@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crmspagi.settings')
 
 application = get_wsgi_application()
+
+# Resolve os metadados de build no boot do worker, fora do caminho da primeira requisicao.
+from core.build_info import obter_build_info  # noqa: E402
+
+obter_build_info()
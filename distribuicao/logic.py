@@ -1,10 +1,11 @@
-from datetime import datetime, time
+from datetime import time
 import logging
 import re
 
 import requests
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
 from django.utils import timezone
 
 from configuracoes.models import ServicoWebhook
@@ -20,92 +21,96 @@ def encontrar_cliente_por_whatsapp(whatsapp):
     """
     Procura um Cliente existente cujo whatsapp bata (por digitos) com o informado.
     Cliente.whatsapp e salvo com a formatacao digitada (nao normalizado), entao
-    comparamos os digitos extraidos dos dois lados para evitar falso positivo/negativo
-    por diferenca de formatacao.
+    comparamos pela coluna indexada whatsapp_normalizado (so digitos) para evitar
+    falso positivo/negativo por diferenca de formatacao sem varrer a tabela inteira.
     """
-    from clientes.models import Cliente
+    from clientes.models import Cliente, normalizar_whatsapp
 
-    numeros = re.sub(r"\D", "", whatsapp or "")
+    numeros = normalizar_whatsapp(whatsapp)
     if not numeros:
         return None
 
-    candidatos = Cliente.objects.exclude(whatsapp="").select_related("vendedor")
-    for candidato in candidatos:
-        if re.sub(r"\D", "", candidato.whatsapp or "") == numeros:
-            return candidato
-    return None
-
-
-def _listar_vendedores_disponiveis(agora_local=None, lock=False):
-    """Retorna lista de objetos VendedorRodizio elegiveis no rodizio."""
-    hoje = timezone.localdate()
-    agora_local = agora_local or timezone.localtime()
-    hora_atual = agora_local.time()
-
-    queryset = VendedorRodizio.objects.filter(ativo=True).select_related('vendedor', 'vendedor__dados_funcionais')
-    if lock:
-        # Serializa concorrentes na definicao do proximo vendedor (evita atribuir o mesmo vendedor duas vezes).
-        # of=('self',) restringe o lock so a tabela de VendedorRodizio: sem isso o Postgres
-        # rejeita com "FOR UPDATE cannot be applied to the nullable side of an outer join",
-        # porque vendedor__dados_funcionais e o lado reverso de um OneToOneField (nem todo
-        # User tem Funcionario), resolvido com LEFT OUTER JOIN.
-        queryset = queryset.select_for_update(of=('self',))
-    candidatos = list(queryset)
-    candidatos.sort(
-        key=lambda item: (
-            item.ultima_atribuicao is not None,
-            item.ultima_atribuicao or datetime.min,
-            item.ordem,
-        )
+    return (
+        Cliente.objects.filter(whatsapp_normalizado=numeros)
+        .select_related("vendedor")
+        .order_by("pk")
+        .first()
     )
 
-    elegiveis = []
-    for candidato in candidatos:
-        funcionario = getattr(candidato.vendedor, 'dados_funcionais', None)
-        if not funcionario:
-            continue
 
-        ponto_hoje = (
-            RegistroPonto.objects.filter(funcionario=funcionario, data=hoje)
-            .only('entrada', 'saida_almoco', 'retorno_almoco')
-            .first()
-        )
-        if not ponto_hoje or not ponto_hoje.entrada:
-            continue
+# Quantas vezes definir_proximo_vendedor recalcula a fila quando outro request
+# atribuiu o mesmo vendedor entre a leitura e o UPDATE.
+_TENTATIVAS_ATRIBUICAO = 5
+
 
+def _ponto_liberado(hoje, hora_atual):
+    """Exists() do ponto de hoje que libera o vendedor no rodizio (entrada batida, fora do almoco)."""
+    pontos = (
+        RegistroPonto.objects.filter(funcionario__user_id=OuterRef('vendedor_id'), data=hoje, entrada__isnull=False)
         # No almoço: saiu e ainda não retornou -> bloqueado.
-        if ponto_hoje.saida_almoco and not ponto_hoje.retorno_almoco:
-            continue
+        .exclude(saida_almoco__isnull=False, retorno_almoco__isnull=True)
+    )
+    # Até 13:59 livre sem saída de almoço; após 14:00 precisa ter saída.
+    if hora_atual >= time(14, 0):
+        pontos = pontos.filter(saida_almoco__isnull=False)
+    return Exists(pontos)
+
 
-        # Até 13:59 livre sem saída de almoço; após 14:00 precisa ter saída.
-        if hora_atual >= time(14, 0) and not ponto_hoje.saida_almoco:
-            continue
+def _vendedores_disponiveis(agora_local=None):
+    """
+    Queryset dos VendedorRodizio elegiveis, ja na ordem do rodizio: quem nunca recebeu
+    primeiro, depois quem recebeu ha mais tempo, e `ordem` no empate. As regras de ponto
+    viram um Exists() na mesma query (antes era uma query de RegistroPonto por candidato).
+    """
+    agora_local = agora_local or timezone.localtime()
+    return (
+        VendedorRodizio.objects.filter(ativo=True)
+        .filter(_ponto_liberado(agora_local.date(), agora_local.time()))
+        .select_related('vendedor')
+        .order_by(F('ultima_atribuicao').asc(nulls_first=True), 'ordem', 'pk')
+    )
 
-        elegiveis.append(candidato)
 
-    return elegiveis
+def _listar_vendedores_disponiveis(agora_local=None):
+    """Retorna lista de objetos VendedorRodizio elegiveis no rodizio."""
+    return list(_vendedores_disponiveis(agora_local))
 
 
 def vendedor_disponivel_no_rodizio(vendedor, agora_local=None):
-    return any(item.vendedor_id == vendedor.id for item in _listar_vendedores_disponiveis(agora_local=agora_local))
+    return _vendedores_disponiveis(agora_local).filter(vendedor_id=vendedor.id).exists()
 
 
 def definir_proximo_vendedor():
     """
     Retorna o User do proximo vendedor e atualiza o timestamp dele.
-    """
-    with transaction.atomic():
-        vendedores_elegiveis = _listar_vendedores_disponiveis(lock=True)
-        proximo = vendedores_elegiveis[0] if vendedores_elegiveis else None
-
-        if not proximo:
-            return None
-
-        # Atualiza o horario para o momento atual (fim da fila)
-        proximo.ultima_atribuicao = timezone.now()
-        proximo.save(update_fields=["ultima_atribuicao"])
 
-        return proximo.vendedor
+    A secao critica e so o SELECT do primeiro elegivel + o UPDATE dele. No Postgres o
+    SELECT trava apenas essa linha com SKIP LOCKED, entao requests simultaneos pegam o
+    proximo da fila em vez de esperar. O UPDATE so vale se ultima_atribuicao ainda for a
+    que foi lida; se outro request atribuiu o mesmo vendedor nesse meio tempo (SQLite, sem
+    lock de linha), a fila e recalculada.
+    """
+    for _ in range(_TENTATIVAS_ATRIBUICAO):
+        with transaction.atomic():
+            candidatos = _vendedores_disponiveis()
+            if connection.features.has_select_for_update_skip_locked:
+                candidatos = candidatos.select_for_update(of=('self',), skip_locked=True)
+            proximo = candidatos.first()
+            if not proximo:
+                return None
+
+            # Atualiza o horario para o momento atual (fim da fila)
+            agora = timezone.now()
+            if proximo.ultima_atribuicao:
+                lido = {'ultima_atribuicao': proximo.ultima_atribuicao}
+            else:
+                lido = {'ultima_atribuicao__isnull': True}
+            if VendedorRodizio.objects.filter(pk=proximo.pk, **lido).update(ultima_atribuicao=agora):
+                proximo.ultima_atribuicao = agora
+                return proximo.vendedor
+
+    logger.warning("Rodizio: nao foi possivel atribuir vendedor apos %s tentativas concorrentes.", _TENTATIVAS_ATRIBUICAO)
+    return None
 
 
 def enviar_webhook_n8n(cliente):
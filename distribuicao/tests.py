@@ -1,10 +1,17 @@
+import os
+import threading
+import time as time_mod
 from datetime import datetime, time
 from decimal import Decimal
-from unittest.mock import patch
+from unittest import skipUnless
+from unittest.mock import Mock, patch
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, TestCase, TransactionTestCase, skipUnlessDBFeature
 from django.test.utils import override_settings
+from django.urls import reverse
 from django.utils import timezone
 
 from clientes.models import Cliente
@@ -12,7 +19,13 @@ from configuracoes.models import ModuloSistema, PermissaoModulo
 from controle_ponto.models import RegistroPonto
 from funcionarios.models import Funcionario
 from distribuicao.forms import LeadEntradaForm
-from distribuicao.logic import criar_lead_evo_crm, definir_proximo_vendedor
+from distribuicao import logic
+from distribuicao.logic import (
+    _listar_vendedores_disponiveis,
+    criar_lead_evo_crm,
+    definir_proximo_vendedor,
+    encontrar_cliente_por_whatsapp,
+)
 from distribuicao.models import VendedorRodizio
 
 
@@ -137,6 +150,48 @@ class DistribuicaoRegrasPontoTests(TestCase):
         self.assertEqual(segundo, user_b)
         self.assertEqual(terceiro, user_a)
 
+    def test_elegibilidade_e_uma_unica_consulta(self):
+        for indice in range(4):
+            _, funcionario = self._criar_vendedor(f'vendedor_consulta_{indice}')
+            RegistroPonto.objects.create(funcionario=funcionario, entrada=time(8, 0))
+        # Sem ponto hoje: fica de fora pelo Exists(), sem query extra.
+        self._criar_vendedor('vendedor_sem_ponto')
+
+        with patch('distribuicao.logic.timezone.localtime', return_value=self._agora(10, 0)):
+            with self.assertNumQueries(1):
+                disponiveis = _listar_vendedores_disponiveis()
+                nomes = [item.vendedor.username for item in disponiveis]
+
+        self.assertEqual(len(nomes), 4)
+        self.assertNotIn('vendedor_sem_ponto', nomes)
+
+    def test_atribuicao_concorrente_recalcula_a_fila(self):
+        user_a, funcionario_a = self._criar_vendedor('vendedor_cas_a')
+        user_b, funcionario_b = self._criar_vendedor('vendedor_cas_b')
+        for funcionario in (funcionario_a, funcionario_b):
+            RegistroPonto.objects.create(funcionario=funcionario, entrada=time(8, 0))
+        VendedorRodizio.objects.filter(vendedor=user_b).update(ordem=2)
+
+        # Simula outro request: leu A como "nunca atribuido", mas A ja recebeu um lead
+        # antes deste UPDATE. O UPDATE condicional falha e a fila e lida de novo.
+        rodizio_a_desatualizado = VendedorRodizio.objects.get(vendedor=user_a)
+        VendedorRodizio.objects.filter(vendedor=user_a).update(ultima_atribuicao=timezone.now())
+        real = logic._vendedores_disponiveis
+        chamadas = []
+
+        def _primeira_leitura_desatualizada(*args, **kwargs):
+            chamadas.append(1)
+            if len(chamadas) == 1:
+                return Mock(first=Mock(return_value=rodizio_a_desatualizado))
+            return real(*args, **kwargs)
+
+        with patch('distribuicao.logic.timezone.localtime', return_value=self._agora(10, 0)), \
+                patch('distribuicao.logic._vendedores_disponiveis', side_effect=_primeira_leitura_desatualizada):
+            proximo = definir_proximo_vendedor()
+
+        self.assertEqual(proximo, user_b)
+        self.assertEqual(len(chamadas), 2)
+
 
 class LeadEntradaFormDedupTests(TestCase):
     def setUp(self):
@@ -184,6 +239,172 @@ class LeadEntradaFormDedupTests(TestCase):
         self.assertTrue(form.is_valid())
 
 
+class EncontrarClientePorWhatsappTests(TestCase):
+    def setUp(self):
+        self.vendedor = User.objects.create_user(username='vendedor_busca_whatsapp', password='123456')
+
+    def _criar_cliente(self, whatsapp):
+        return Cliente.objects.create(
+            vendedor=self.vendedor,
+            nome_cliente='Cliente Existente',
+            whatsapp=whatsapp,
+            tipo_contato=Cliente.TipoContato.MENSAGEM,
+            proximo_passo=Cliente.ProximoPasso.MENSAGEM,
+        )
+
+    def test_save_mantem_whatsapp_normalizado(self):
+        cliente = self._criar_cliente('(41) 99999-1111')
+        self.assertEqual(cliente.whatsapp_normalizado, '41999991111')
+
+        cliente.whatsapp = '+55 (41) 98888-2222'
+        cliente.save(update_fields=['whatsapp'])
+
+        cliente.refresh_from_db()
+        self.assertEqual(cliente.whatsapp_normalizado, '5541988882222')
+
+    def test_busca_e_uma_unica_consulta_por_igualdade(self):
+        existente = self._criar_cliente('(41) 99999-1111')
+        self._criar_cliente('(41) 98888-2222')
+
+        with self.assertNumQueries(1):
+            encontrado = encontrar_cliente_por_whatsapp('41 9 9999 1111')
+            # select_related: acessar o vendedor nao dispara outra consulta.
+            self.assertEqual(encontrado.vendedor, self.vendedor)
+
+        self.assertEqual(encontrado, existente)
+
+    def test_sem_digitos_nao_consulta_o_banco(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(encontrar_cliente_por_whatsapp('---'))
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class EncontrarClientePorWhatsappBenchmark(TestCase):
+    TOTAL_CLIENTES = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        vendedor = User.objects.create_user(username='vendedor_benchmark_whatsapp', password='123456')
+        agora = timezone.now()
+        # bulk_create nao passa pelo save(), entao o whatsapp_normalizado e preenchido aqui.
+        Cliente.objects.bulk_create(
+            [
+                Cliente(
+                    vendedor=vendedor,
+                    nome_cliente=f'Cliente {indice}',
+                    whatsapp=f'(41) 9{indice:04d}-{indice % 10000:04d}',
+                    whatsapp_normalizado=f'419{indice:04d}{indice % 10000:04d}',
+                    data_proximo_contato=agora,
+                    tipo_contato=Cliente.TipoContato.MENSAGEM,
+                    proximo_passo=Cliente.ProximoPasso.MENSAGEM,
+                )
+                for indice in range(cls.TOTAL_CLIENTES)
+            ],
+            batch_size=5000,
+        )
+
+    def test_tempo_de_busca_nao_cresce_com_a_base(self):
+        repeticoes = 200
+        inicio = time_mod.perf_counter()
+        for _ in range(repeticoes):
+            with self.assertNumQueries(1):
+                encontrar_cliente_por_whatsapp('41 9 9999 9999')
+        media_ms = (time_mod.perf_counter() - inicio) * 1000 / repeticoes
+
+        print(f"\n[benchmark] {self.TOTAL_CLIENTES} clientes: {media_ms:.3f} ms por busca")
+        self.assertLess(media_ms, 50)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class DistribuicaoConcorrenteBenchmark(TransactionTestCase):
+    """Varios operadores enviando leads ao mesmo tempo. So roda em banco com lock de
+    linha (Postgres): o SQLite em memoria dos testes nao aceita escritas concorrentes."""
+    TOTAL_VENDEDORES = 8
+    TOTAL_THREADS = 8
+    LEADS_POR_THREAD = 10
+
+    def setUp(self):
+        for indice in range(self.TOTAL_VENDEDORES):
+            user = User(username=f'vendedor_concorrente_{indice}')
+            user._skip_funcionario_signal = True
+            user.save()
+            funcionario = Funcionario.objects.create(
+                user=user,
+                cpf=f"222.222.222-{str(user.id).zfill(2)}",
+                telefone='41999999999',
+                endereco='Rua Teste, 123',
+                cargo='Vendedor',
+                data_admissao=timezone.localdate(),
+                salario_base=Decimal('2500.00'),
+                banco='Banco Teste',
+                agencia='0001',
+                conta=f'{user.id}2345',
+                tipo_conta='CORRENTE',
+            )
+            # Ja voltou do almoco: elegivel a qualquer hora do dia.
+            RegistroPonto.objects.create(
+                funcionario=funcionario, entrada=time(8, 0), saida_almoco=time(12, 0), retorno_almoco=time(13, 0),
+            )
+            VendedorRodizio.objects.create(vendedor=user, ativo=True, ordem=indice)
+        self.operador = User.objects.create_superuser(username='operador_concorrente', password='123456')
+
+    def _enviar_leads(self, indice_thread):
+        cliente_http = Client()
+        cliente_http.force_login(self.operador)
+        try:
+            for indice_lead in range(self.LEADS_POR_THREAD):
+                numero = indice_thread * 1000 + indice_lead
+                cliente_http.post(reverse('painel-distribuicao'), {
+                    'nome_cliente': f'Lead {numero}',
+                    'email': f'lead{numero}@teste.com',
+                    'whatsapp': f'(41) 9{numero:04d}-0000',
+                    'tipo_veiculo': 'carros',
+                    'marca_veiculo': 'Honda',
+                    'modelo_veiculo': 'Civic',
+                    'fonte_cliente': 'Instagram',
+                })
+        finally:
+            connection.close()
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_vazao_e_espera_na_atribuicao(self):
+        esperas = []
+        original = logic.definir_proximo_vendedor
+
+        def _cronometrado():
+            inicio = time_mod.perf_counter()
+            try:
+                return original()
+            finally:
+                esperas.append(time_mod.perf_counter() - inicio)
+
+        threads = [
+            threading.Thread(target=self._enviar_leads, args=(indice,))
+            for indice in range(self.TOTAL_THREADS)
+        ]
+        with patch('distribuicao.views.definir_proximo_vendedor', side_effect=_cronometrado):
+            inicio = time_mod.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duracao = time_mod.perf_counter() - inicio
+
+        total = self.TOTAL_THREADS * self.LEADS_POR_THREAD
+        self.assertEqual(Cliente.objects.count(), total)
+        por_vendedor = list(
+            Cliente.objects.values('vendedor').annotate(total=Count('pk')).values_list('total', flat=True)
+        )
+        esperas.sort()
+        print(
+            f"\n[benchmark] {total} leads / {self.TOTAL_THREADS} threads: {total / duracao:.1f} leads/s; "
+            f"atribuicao p50 {esperas[len(esperas) // 2] * 1000:.2f} ms, "
+            f"p95 {esperas[int(len(esperas) * 0.95)] * 1000:.2f} ms, max {esperas[-1] * 1000:.2f} ms"
+        )
+        # Rodizio continua justo sob concorrencia.
+        self.assertLessEqual(max(por_vendedor) - min(por_vendedor), 1)
+
+
 class VerificarDuplicidadeWhatsappViewTests(TestCase):
     def setUp(self):
         self.vendedor = User.objects.create_user(username='vendedor_ajax', password='123456')
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class DocumentosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'documentos'
\ No newline at end of file
+    name = 'documentos'
+
+    def ready(self):
+        import documentos.relatorios_pdf  # noqa: F401
+        import documentos.signals  # noqa: F401
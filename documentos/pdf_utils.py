@@ -1,8 +1,13 @@
 import base64
 import json
 import logging
+import os
 import re
 import time
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
 
 from avaliacoes.ai_runtime import get_gemini_runtime
 
@@ -87,3 +92,40 @@ def extract_crlv_data_with_gemini(pdf_file):
     except Exception as e:
         logger.warning("Erro ao processar PDF com Gemini: %s", e)
         return None
+
+
+def link_callback(uri, rel):
+    """
+    Converte um URI de HTML (como /static/images/logo.png ou http://.../static/...)
+    para um caminho absoluto no sistema de arquivos.
+    """
+    try:
+        # 1. Analisa a URL
+        parsed_uri = urlparse(uri)
+        
+        # 2. Obtém o caminho (ex: /static/images/detran_logo.png)
+        # Se for uma URL absoluta, isso remove o 'http://dominio.com'
+        path = parsed_uri.path
+        
+        # 3. Remove o STATIC_URL do início do caminho
+        # (ex: remove /static/ deixando 'images/detran_logo.png')
+        if path.startswith(settings.STATIC_URL):
+            path = path[len(settings.STATIC_URL):]
+        
+        # 4. Usa o 'finders' do Django para encontrar o caminho absoluto no sistema
+        # Isso procura em STATIC_ROOT e em todas as pastas 'static' dos apps
+        result = finders.find(path)
+        
+        # 5. Se não encontrar, tenta o caminho original (fallback)
+        if not result:
+            result = os.path.join(settings.STATIC_ROOT, path)
+
+        # 6. Verifica se o arquivo realmente existe
+        if not os.path.isfile(result):
+            logger.warning("link_callback: arquivo nao encontrado para URI=%s caminho=%s", uri, result)
+            return None
+
+        return result
+    except Exception as e:
+        logger.warning("Excecao no link_callback: %s - URI: %s", e, uri)
+        return None
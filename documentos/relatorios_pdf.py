@@ -0,0 +1,51 @@
+"""
+PDF da procuracao gerado em segundo plano (ver core/relatorios_pdf.py).
+O arquivo pronto e reaproveitado sem prazo: o signal de Procuracao/Outorgado
+descarta o PDF quando os dados mudam, e a data do documento entra nos parametros.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from configuracoes.resolver import has_module_action
+from core.relatorios_pdf import registrar_relatorio
+
+from .models import Outorgado, Procuracao
+from .pdf_utils import link_callback
+
+RELATORIO_PROCURACAO = 'documentos.procuracao'
+
+
+def pode_acessar_procuracao(user, parametros):
+    if not has_module_action(user, 'documentos', 'visualizar'):
+        return False
+    if user.is_superuser:
+        return True
+    return Procuracao.objects.filter(pk=parametros['pk'], vendedor_id=user.pk).exists()
+
+
+def contexto_procuracao(parametros):
+    return {
+        'procuracao': Procuracao.objects.get(pk=parametros['pk']),
+        'outorgados': Outorgado.objects.all().order_by('nome'),
+        'cidade': 'São José dos Pinhais',
+        'data_hoje': date.fromisoformat(parametros['data']),
+        'STATIC_URL': settings.STATIC_URL,
+    }
+
+
+def nome_arquivo_procuracao(parametros):
+    procuracao = Procuracao.objects.get(pk=parametros['pk'])
+    return f"procuracao-{slugify(procuracao.veiculo_placa)}-{slugify(procuracao.outorgante_nome)}.pdf"
+
+
+registrar_relatorio(
+    RELATORIO_PROCURACAO,
+    template='documentos/procuracao_pdf_template.html',
+    contexto=contexto_procuracao,
+    nome_arquivo=nome_arquivo_procuracao,
+    pode_acessar=pode_acessar_procuracao,
+    validade=None,
+    link_callback=link_callback,
+)
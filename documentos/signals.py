@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.relatorios_pdf import invalidar_relatorios
+
+from .models import Outorgado, Procuracao
+from .relatorios_pdf import RELATORIO_PROCURACAO
+
+
+@receiver(post_save, sender=Procuracao)
+@receiver(post_delete, sender=Procuracao)
+def invalidar_pdf_procuracao(sender, instance, **kwargs):
+    invalidar_relatorios(RELATORIO_PROCURACAO, pk=instance.pk)
+
+
+@receiver(post_save, sender=Outorgado)
+@receiver(post_delete, sender=Outorgado)
+def invalidar_pdfs_outorgados(sender, instance, **kwargs):
+    # Todos os outorgados saem em todas as procuracoes.
+    invalidar_relatorios(RELATORIO_PROCURACAO)
@@ -1,7 +1,13 @@
+from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import RelatorioPDF
+from core.relatorios_pdf import processar_relatorios_pendentes
 
 from .forms import CRLV_PDF_MAX_SIZE_MB, CRLVUploadForm
+from .models import Outorgado, Procuracao
 
 
 class CRLVUploadFormTests(TestCase):
@@ -28,3 +34,58 @@ class CRLVUploadFormTests(TestCase):
         form = CRLVUploadForm(files={'crlv_pdf': arquivo})
         self.assertFalse(form.is_valid())
         self.assertIn('crlv_pdf', form.errors)
+
+
+class ProcuracaoPDFTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin_procuracao', password='123456', email='p@teste.com')
+        Outorgado.objects.create(nome='Fulano de Tal', cpf='123.456.789-00')
+        self.procuracao = Procuracao.objects.create(
+            vendedor=self.admin,
+            outorgante_nome='Joao da Silva',
+            outorgante_documento='111.222.333-44',
+            veiculo_marca_modelo='FIAT/UNO',
+            veiculo_ano_fab='2015',
+            veiculo_ano_mod='2016',
+            veiculo_placa='ABC1D23',
+            veiculo_cor='Branca',
+            veiculo_renavam='12345678901',
+        )
+        self.url = reverse('procuracao_pdf', args=[self.procuracao.pk])
+        self.client.force_login(self.admin)
+
+    def tearDown(self):
+        for relatorio in RelatorioPDF.objects.all():
+            if relatorio.arquivo:
+                relatorio.arquivo.delete(save=False)
+
+    def test_pdf_pronto_e_reaproveitado_ate_a_procuracao_mudar(self):
+        self.client.get(self.url + '?target=inline')
+        processar_relatorios_pendentes()
+        relatorio = RelatorioPDF.objects.get(status=RelatorioPDF.Status.PRONTO)
+        self.assertEqual(relatorio.nome_arquivo, 'procuracao-abc1d23-joao-da-silva.pdf')
+
+        resposta = self.client.get(self.url + '?target=inline')
+        self.assertRedirects(
+            resposta,
+            reverse('relatorio_pdf_baixar', args=[relatorio.token]) + '?target=inline',
+            fetch_redirect_response=False,
+        )
+        download = self.client.get(resposta['Location'])
+        self.assertIn('inline; filename="procuracao-abc1d23-joao-da-silva.pdf"', download['Content-Disposition'])
+        download.close()
+
+        self.procuracao.veiculo_cor = 'Prata'
+        self.procuracao.save()
+
+        self.assertFalse(RelatorioPDF.objects.exists())
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(RelatorioPDF.objects.get().status, RelatorioPDF.Status.PENDENTE)
+
+    def test_alterar_outorgado_descarta_pdfs(self):
+        self.client.get(self.url)
+        processar_relatorios_pendentes()
+
+        Outorgado.objects.create(nome='Beltrano', cpf='987.654.321-00')
+
+        self.assertFalse(RelatorioPDF.objects.exists())
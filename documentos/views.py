@@ -10,15 +10,10 @@ from configuracoes.access import ModuleActionRequiredMixin, require_module_actio
 from django.views.decorators.http import require_POST
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from django.utils.text import slugify
-import os
-from django.conf import settings
-from urllib.parse import urlparse
-from django.contrib.staticfiles import finders
+from django.http import JsonResponse
 from django.contrib import messages
+from core.views import responder_relatorio_pdf
+from .relatorios_pdf import RELATORIO_PROCURACAO
 
 logger = logging.getLogger(__name__)
 
@@ -149,44 +144,6 @@ class ProcuracaoDeleteView(ModuleActionRequiredMixin, DeleteView):
             raise PermissionDenied("Você não tem permissão para excluir este documento.")
         return obj
 
-# --- FUNÇÃO link_callback (ATUALIZADA) ---
-def link_callback(uri, rel):
-    """
-    Converte um URI de HTML (como /static/images/logo.png ou http://.../static/...)
-    para um caminho absoluto no sistema de arquivos.
-    """
-    try:
-        # 1. Analisa a URL
-        parsed_uri = urlparse(uri)
-        
-        # 2. Obtém o caminho (ex: /static/images/detran_logo.png)
-        # Se for uma URL absoluta, isso remove o 'http://dominio.com'
-        path = parsed_uri.path
-        
-        # 3. Remove o STATIC_URL do início do caminho
-        # (ex: remove /static/ deixando 'images/detran_logo.png')
-        if path.startswith(settings.STATIC_URL):
-            path = path[len(settings.STATIC_URL):]
-        
-        # 4. Usa o 'finders' do Django para encontrar o caminho absoluto no sistema
-        # Isso procura em STATIC_ROOT e em todas as pastas 'static' dos apps
-        result = finders.find(path)
-        
-        # 5. Se não encontrar, tenta o caminho original (fallback)
-        if not result:
-            result = os.path.join(settings.STATIC_ROOT, path)
-
-        # 6. Verifica se o arquivo realmente existe
-        if not os.path.isfile(result):
-            logger.warning("link_callback: arquivo nao encontrado para URI=%s caminho=%s", uri, result)
-            return None
-
-        return result
-    except Exception as e:
-        logger.warning("Excecao no link_callback: %s - URI: %s", e, uri)
-        return None
-
-
 # --- View de Geração de PDF (ATUALIZADA) ---
 
 @require_module_action('documentos', 'visualizar')
@@ -197,42 +154,7 @@ def gerar_procuracao_pdf(request, pk):
     if not user.is_superuser and procuracao.vendedor != user:
         raise PermissionDenied("Você não tem permissão para gerar este PDF.")
 
-    template_path = 'documentos/procuracao_pdf_template.html'
-    
-    outorgados_list = Outorgado.objects.all().order_by('nome')
-    
-    context = {
-        'procuracao': procuracao,
-        'outorgados': outorgados_list,
-        'cidade': 'São José dos Pinhais', 
-        'data_hoje': timezone.now(),
-        'STATIC_URL': settings.STATIC_URL,
-    }
-    
-    template = get_template(template_path)
-    html = template.render(context)
-
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"procuracao-{slugify(procuracao.veiculo_placa)}-{slugify(procuracao.outorgante_nome)}.pdf"
-
-    # --- AQUI ESTÁ A MUDANÇA ---
-    # Verificamos se o usuário quer 'imprimir' (inline) ou 'baixar' (attachment)
-    target = request.GET.get('target')
-    if target == 'inline':
-        # Abre o PDF no navegador
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-    else:
-        # Força o download do PDF
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    # --- FIM DA MUDANÇA ---
-
-    pisa_status = pisa.CreatePDF(
-       html, 
-       dest=response, 
-       encoding='UTF-8',
-       link_callback=link_callback
-    )
-
-    if pisa_status.err:
-       return HttpResponse('Ocorreram erros ao gerar o PDF <pre>' + html + '</pre>')
-    return response
\ No newline at end of file
+    # O PDF e gerado pelo worker (documentos/relatorios_pdf.py) e reaproveitado ate a
+    # procuracao ou os outorgados mudarem; ?target=inline segue valendo no download.
+    parametros = {'pk': procuracao.pk, 'data': timezone.localdate().isoformat()}
+    return responder_relatorio_pdf(request, RELATORIO_PROCURACAO, parametros)
@@ -36,6 +36,9 @@ fi
 echo "Aplicando migracoes do banco de dados..."
 python manage.py migrate --noinput
 
+# Cria as tabelas do cache compartilhado (DatabaseCache), se ainda nao existirem
+python manage.py createcachetable
+
 # Coleta os arquivos estaticos
 echo "Coletando arquivos estaticos..."
 python manage.py collectstatic --noinput --clear
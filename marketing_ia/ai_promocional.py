@@ -4,15 +4,16 @@ import logging
 import re
 import time
 
-import requests
 from django.conf import settings
 
 from avaliacoes.ai_runtime import get_gemini_runtime
 from configuracoes.models import PROMPT_IMAGEM_PADRAO, PROMPT_IMAGEM_LEONARDO_PADRAO
 from configuracoes.resolver import obter_integracao
 
+from . import fotos_cache
 from . import image_overlay
 from . import leonardo_client
+from . import limites
 from . import openai_client
 
 logger = logging.getLogger(__name__)
@@ -85,11 +86,8 @@ def _dados_veiculo_para_prompt(anuncio):
 
 
 def baixar_foto(url, timeout=20):
-    """Baixa uma foto do anúncio (hospedada no CDN do site) e retorna (bytes, mime_type)."""
-    resposta = requests.get(url, timeout=timeout)
-    resposta.raise_for_status()
-    mime_type = resposta.headers.get('Content-Type', 'image/jpeg').split(';')[0]
-    return resposta.content, mime_type
+    """Foto do anúncio (hospedada no CDN do site) como (bytes, mime_type), pelo cache em disco (fotos_cache)."""
+    return fotos_cache.obter_foto(url, timeout=timeout)
 
 
 def gerar_legenda(anuncio, max_tentativas=3):
@@ -109,6 +107,7 @@ def gerar_legenda(anuncio, max_tentativas=3):
 
     for tentativa in range(1, max_tentativas + 1):
         try:
+            limites.aguardar_vez(limites.GEMINI)
             response = client.models.generate_content(
                 model=model_name,
                 contents=[{"text": _dados_veiculo_para_prompt(anuncio)}],
@@ -145,6 +144,7 @@ def gerar_chamada_ia(anuncio):
         return CHAMADA_FALLBACK
 
     try:
+        limites.aguardar_vez(limites.GEMINI)
         response = client.models.generate_content(
             model=model_name,
             contents=[{"text": _dados_veiculo_para_prompt(anuncio)}],
@@ -230,6 +230,7 @@ def _gerar_imagem_leonardo(anuncio, foto_bytes, mime_type):
     model_id = obter_integracao('leonardo_model_id') or leonardo_client.MODEL_ID_PADRAO
     prompt = obter_integracao('prompt_imagem_leonardo') or PROMPT_IMAGEM_LEONARDO_PADRAO
     try:
+        limites.aguardar_vez(limites.LEONARDO)
         imagem_bytes, mime_saida = leonardo_client.gerar_imagem_leonardo(
             prompt, foto_bytes, mime_type, api_key, model_id=model_id,
         )
@@ -252,6 +253,7 @@ def _gerar_imagem_openai(anuncio, foto_bytes, mime_type):
     quality = obter_integracao('openai_image_quality') or 'medium'
     prompt = obter_integracao('prompt_imagem') or PROMPT_IMAGEM_PADRAO
     try:
+        limites.aguardar_vez(limites.OPENAI)
         imagem_bytes, mime_saida = openai_client.gerar_imagem_openai(
             prompt, foto_bytes, mime_type, api_key, model_id=model_id, quality=quality,
         )
@@ -279,6 +281,7 @@ def _gerar_imagem_gemini(anuncio, foto_bytes, mime_type, max_tentativas=3):
 
     for tentativa in range(1, max_tentativas + 1):
         try:
+            limites.aguardar_vez(limites.GEMINI)
             response = client.models.generate_content(model=modelo, contents=contents)
             for candidate in response.candidates or []:
                 for part in candidate.content.parts or []:
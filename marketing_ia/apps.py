@@ -5,3 +5,6 @@ class MarketingIaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'marketing_ia'
     verbose_name = 'Marketing (IA)'
+
+    def ready(self):
+        import marketing_ia.signals  # noqa: F401
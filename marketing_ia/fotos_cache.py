@@ -0,0 +1,167 @@
+"""
+Cache em disco das fotos dos anúncios (baixar_foto).
+
+Post, prévia, combinado e o editor de layout baixavam a mesma foto do CDN do site
+a cada geração. Agora cada URL vira dois arquivos em MARKETING_FOTOS_CACHE_DIR:
+`<sha256 da url>.bin` (a foto) e `.json` (url, mime, sha256 do conteúdo, ETag,
+Last-Modified e quando foi validada pela última vez).
+
+- Foto validada há menos de MARKETING_FOTOS_CACHE_VALIDADE_HORAS sai do disco, sem
+  rede: regerar posts de um estoque que não mudou não baixa nada.
+- Passada a validade, a foto é revalidada com If-None-Match/If-Modified-Since (304 =
+  continua a do disco); sem ETag/Last-Modified, baixa de novo e compara o sha256.
+- Arquivo corrompido (sha256 não bate) conta como ausente.
+- O diretório fica limitado a MARKETING_FOTOS_CACHE_MB: passou disso, saem as fotos
+  usadas há mais tempo (LRU pelo mtime, renovado a cada leitura).
+
+Falha de disco nunca derruba o download: o cache só registra o aviso.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _sessao():
+    # requests.Session nao e garantidamente thread-safe: uma por thread.
+    if not hasattr(_local, 'sessao'):
+        _local.sessao = requests.Session()
+    return _local.sessao
+
+
+def _diretorio():
+    return Path(settings.MARKETING_FOTOS_CACHE_DIR)
+
+
+def _caminhos(url):
+    chave = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return _diretorio() / f'{chave}.bin', _diretorio() / f'{chave}.json'
+
+
+def _ler(url):
+    """Retorna (meta, conteudo) da foto em disco, ou (None, None) se não houver uma íntegra."""
+    caminho_foto, caminho_meta = _caminhos(url)
+    try:
+        meta = json.loads(caminho_meta.read_text(encoding='utf-8'))
+        conteudo = caminho_foto.read_bytes()
+    except (OSError, ValueError):
+        return None, None
+    if meta.get('url') != url or hashlib.sha256(conteudo).hexdigest() != meta.get('sha256'):
+        return None, None
+    return meta, conteudo
+
+
+def _escrever(caminho, dados):
+    # Escreve ao lado e troca de uma vez: leitor nunca ve arquivo pela metade.
+    temporario = caminho.with_name(f'{caminho.name}.{uuid.uuid4().hex}.tmp')
+    temporario.write_bytes(dados)
+    os.replace(temporario, caminho)
+
+
+def _gravar(url, meta, conteudo=None):
+    caminho_foto, caminho_meta = _caminhos(url)
+    try:
+        _diretorio().mkdir(parents=True, exist_ok=True)
+        if conteudo is not None:
+            _escrever(caminho_foto, conteudo)
+        else:
+            os.utime(caminho_foto)
+        _escrever(caminho_meta, json.dumps(meta).encode('utf-8'))
+    except OSError as exc:
+        logger.warning('Cache de fotos: falha ao gravar %s: %s', url, exc)
+        return
+    if conteudo is not None:
+        aplicar_limite()
+
+
+def _tocar(url):
+    try:
+        os.utime(_caminhos(url)[0])
+    except OSError:
+        pass
+
+
+def aplicar_limite():
+    """Apaga as fotos usadas há mais tempo até o diretório caber em MARKETING_FOTOS_CACHE_MB."""
+    limite = settings.MARKETING_FOTOS_CACHE_MB * 1024 * 1024
+    try:
+        fotos = [(entrada.stat(), entrada) for entrada in _diretorio().glob('*.bin')]
+    except OSError:
+        return 0
+    total = sum(stat.st_size for stat, _ in fotos)
+    apagadas = 0
+    for stat, caminho in sorted(fotos, key=lambda item: item[0].st_mtime):
+        if total <= limite:
+            break
+        for alvo in (caminho, caminho.with_suffix('.json')):
+            try:
+                alvo.unlink()
+            except FileNotFoundError:
+                pass
+        total -= stat.st_size
+        apagadas += 1
+    return apagadas
+
+
+def obter_foto(url, timeout=20):
+    """Retorna (bytes, mime_type) da foto, do disco quando possível."""
+    if settings.MARKETING_FOTOS_CACHE_MB <= 0:
+        return _baixar(url, timeout)[:2]
+
+    meta, conteudo = _ler(url)
+    agora = time.time()
+    if meta and agora - meta['validado_em'] < settings.MARKETING_FOTOS_CACHE_VALIDADE_HORAS * 3600:
+        _tocar(url)
+        return conteudo, meta['mime_type']
+
+    cabecalhos = {}
+    if meta and meta.get('etag'):
+        cabecalhos['If-None-Match'] = meta['etag']
+    if meta and meta.get('last_modified'):
+        cabecalhos['If-Modified-Since'] = meta['last_modified']
+    try:
+        novo, mime_type, resposta = _baixar(url, timeout, cabecalhos)
+    except requests.RequestException as exc:
+        if meta is None:
+            raise
+        logger.warning('Cache de fotos: revalidação de %s falhou, usando a cópia em disco: %s', url, exc)
+        _tocar(url)
+        return conteudo, meta['mime_type']
+
+    if novo is None:
+        # 304: a cópia do disco continua valendo.
+        _gravar(url, {**meta, 'validado_em': agora})
+        return conteudo, meta['mime_type']
+
+    novo_meta = {
+        'url': url,
+        'mime_type': mime_type,
+        'sha256': hashlib.sha256(novo).hexdigest(),
+        'etag': resposta.headers.get('ETag'),
+        'last_modified': resposta.headers.get('Last-Modified'),
+        'validado_em': agora,
+    }
+    mesma_foto = meta is not None and meta['sha256'] == novo_meta['sha256']
+    _gravar(url, novo_meta, conteudo=None if mesma_foto else novo)
+    return novo, mime_type
+
+
+def _baixar(url, timeout, cabecalhos=None):
+    """(bytes, mime_type, resposta); bytes None quando o servidor responde 304."""
+    resposta = _sessao().get(url, timeout=timeout, headers=cabecalhos or {})
+    if cabecalhos and resposta.status_code == 304:
+        return None, None, resposta
+    resposta.raise_for_status()
+    mime_type = resposta.headers.get('Content-Type', 'image/jpeg').split(';')[0]
+    return resposta.content, mime_type, resposta
@@ -11,14 +11,29 @@ Inspirado em padrões comuns de posts de revenda de veículos (faixa de
 info na parte de baixo, selo diagonal de oferta no canto, cartão
 arredondado central) — layouts recorrentes em templates do setor
 automotivo pra Instagram/Facebook.
+
+Cache de renderização em dois níveis (regerar um post ou mexer no editor de
+layout não refaz o trabalho pesado do Pillow):
+- fundo preparado (_preparar_foto/_foto_grade: blur + LANCZOS), num LRU por
+  processo chaveado pelo sha256 da foto e o tamanho — MARKETING_OVERLAY_CACHE_FUNDOS;
+- JPEG final, no cache próprio CACHES['renders_overlay'] (limite
+  MARKETING_OVERLAY_CACHE_MAX_ENTRIES, sem disputar espaço com o default), chaveado pelo sha256 da foto, template ou
+  elementos do layout, textos usados (chamada + CAMPOS_TEXTO do anúncio) e
+  resolução — MARKETING_OVERLAY_CACHE_SEGUNDOS. Mudou o desenho de um template?
+  Suba VERSAO_RENDER para não servir JPEG antigo do cache.
 """
+from collections import OrderedDict
+import hashlib
 import io
 import itertools
+import json
 import logging
 import math
 from functools import lru_cache
+import threading
 
 from django.conf import settings
+from django.core.cache import caches
 from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont, ImageOps
 
 logger = logging.getLogger(__name__)
@@ -164,6 +179,75 @@ def _preparar_foto(foto_bytes, tamanho_saida):
     return fundo
 
 
+# Sobe quando o desenho dos templates/grade/elementos mudar: invalida os JPEGs em cache.
+VERSAO_RENDER = 1
+
+# Alias em settings.CACHES dos JPEGs finais.
+CACHE_RENDERS = 'renders_overlay'
+
+# Campos do anúncio que aparecem na imagem (entram na chave do JPEG final).
+CAMPOS_TEXTO = ('marca', 'modelo', 'motorizacao', 'ano', 'preco', 'opcionais', 'veiculo_completo')
+
+
+class _LruImagens:
+    """LRU thread-safe de imagens já preparadas. As imagens são compartilhadas: quem
+    recebe uma não pode alterá-la (convert()/paste() em outra imagem não alteram)."""
+
+    def __init__(self):
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, preparar):
+        limite = settings.MARKETING_OVERLAY_CACHE_FUNDOS
+        if limite <= 0:
+            return preparar()
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+        imagem = preparar()
+        with self._lock:
+            self._itens[chave] = imagem
+            while len(self._itens) > limite:
+                self._itens.popitem(last=False)
+        return imagem
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+_fundos = _LruImagens()
+
+
+def _hash_foto(foto_bytes):
+    return hashlib.sha256(foto_bytes).hexdigest()
+
+
+def _fundo_preparado(foto_bytes, hash_foto, tamanho_saida):
+    return _fundos.obter(('fundo', hash_foto, tamanho_saida), lambda: _preparar_foto(foto_bytes, tamanho_saida))
+
+
+def _campos_texto(anuncio):
+    return [getattr(anuncio, campo, None) for campo in CAMPOS_TEXTO]
+
+
+def _renderizar_com_cache(partes_chave, renderizar):
+    """(bytes, mime_type) do JPEG final: do cache de renders se já foi montado com as mesmas partes."""
+    timeout = settings.MARKETING_OVERLAY_CACHE_SEGUNDOS
+    if timeout <= 0:
+        return renderizar()
+    conteudo = json.dumps([VERSAO_RENDER, *partes_chave], default=str, ensure_ascii=False, sort_keys=True)
+    chave = f'marketing_ia:overlay:{hashlib.sha256(conteudo.encode("utf-8")).hexdigest()}'
+    cache = caches[CACHE_RENDERS]
+    guardado = cache.get(chave)
+    if guardado is not None:
+        return guardado
+    resultado = renderizar()
+    cache.set(chave, resultado, timeout)
+    return resultado
+
+
 def _formatar_preco(preco):
     if not preco:
         return 'Consulte o valor'
@@ -757,9 +841,20 @@ def montar_imagem_layout(foto_bytes, anuncio, chamada, elementos, resolucao=None
     ficam por cima) com posição/tamanho em frações 0-1 do canvas. Um elemento
     com dado inválido é pulado (loga e segue pros próximos) em vez de derrubar
     a imagem inteira. Retorna (bytes, mime_type) ou levanta ImageOverlayError.
+
+    A chave do cache leva os próprios elementos (não o id do LayoutOverlay): salvar
+    o layout ou mexer nele no editor já gera outra chave.
     """
     tamanho_saida = RESOLUCOES.get(resolucao, RESOLUCOES[RESOLUCAO_PADRAO])
-    base = _preparar_foto(foto_bytes, tamanho_saida).convert('RGBA')
+    hash_foto = _hash_foto(foto_bytes)
+    return _renderizar_com_cache(
+        ['layout', hash_foto, elementos, tamanho_saida, chamada, _campos_texto(anuncio)],
+        lambda: _montar_imagem_layout(foto_bytes, hash_foto, anuncio, chamada, elementos, tamanho_saida),
+    )
+
+
+def _montar_imagem_layout(foto_bytes, hash_foto, anuncio, chamada, elementos, tamanho_saida):
+    base = _fundo_preparado(foto_bytes, hash_foto, tamanho_saida).convert('RGBA')
     largura, altura = base.size
 
     overlay = Image.new('RGBA', base.size, (0, 0, 0, 0))
@@ -814,6 +909,10 @@ def _foto_grade(foto_bytes, tamanho_celula):
     return ImageOps.fit(foto, tamanho_celula, method=Image.LANCZOS)
 
 
+def _foto_grade_preparada(foto_bytes, hash_foto, tamanho_celula):
+    return _fundos.obter(('grade', hash_foto, tamanho_celula), lambda: _foto_grade(foto_bytes, tamanho_celula))
+
+
 def _desenhar_legenda_celula(overlay, draw, anuncio, x, y, largura_celula, altura_celula):
     """Barra escura compacta no rodapé da própria célula com modelo + preço
     do veículo — rótulo individual por veículo (não um preço único agregado),
@@ -850,6 +949,15 @@ def montar_imagem_grid(fotos_bytes_lista, anuncios, chamada, resolucao=None):
         raise ImageOverlayError('É preciso exatamente 2 ou 4 veículos (com foto) pra montar a grade combinada.')
 
     tamanho_saida = RESOLUCOES.get(resolucao, RESOLUCOES[RESOLUCAO_PADRAO])
+    hashes_fotos = [_hash_foto(foto_bytes) for foto_bytes in fotos_bytes_lista]
+    return _renderizar_com_cache(
+        ['grade', hashes_fotos, tamanho_saida, chamada, [_campos_texto(anuncio) for anuncio in anuncios]],
+        lambda: _montar_imagem_grid(fotos_bytes_lista, hashes_fotos, anuncios, chamada, tamanho_saida),
+    )
+
+
+def _montar_imagem_grid(fotos_bytes_lista, hashes_fotos, anuncios, chamada, tamanho_saida):
+    quantidade = len(anuncios)
     largura, altura = tamanho_saida
 
     gutter = max(int(largura * 0.015), 4)
@@ -871,8 +979,8 @@ def montar_imagem_grid(fotos_bytes_lista, anuncios, chamada, resolucao=None):
     tamanho_celula = (celula_largura, celula_altura)
 
     base = Image.new('RGB', tamanho_saida, (20, 20, 24))
-    for foto_bytes, (x, y) in zip(fotos_bytes_lista, posicoes):
-        foto_celula = _foto_grade(foto_bytes, tamanho_celula)
+    for foto_bytes, hash_foto, (x, y) in zip(fotos_bytes_lista, hashes_fotos, posicoes):
+        foto_celula = _foto_grade_preparada(foto_bytes, hash_foto, tamanho_celula)
         base.paste(foto_celula, (x, y))
     base = base.convert('RGBA')
 
@@ -907,8 +1015,15 @@ def montar_imagem_overlay(foto_bytes, anuncio, chamada, template=None, resolucao
     """
     template = template if template in _TEMPLATES else TEMPLATE_PADRAO
     tamanho_saida = RESOLUCOES.get(resolucao, RESOLUCOES[RESOLUCAO_PADRAO])
+    hash_foto = _hash_foto(foto_bytes)
+    return _renderizar_com_cache(
+        ['overlay', hash_foto, template, tamanho_saida, chamada, _campos_texto(anuncio)],
+        lambda: _montar_imagem_overlay(foto_bytes, hash_foto, anuncio, chamada, template, tamanho_saida),
+    )
+
 
-    base = _preparar_foto(foto_bytes, tamanho_saida).convert('RGBA')
+def _montar_imagem_overlay(foto_bytes, hash_foto, anuncio, chamada, template, tamanho_saida):
+    base = _fundo_preparado(foto_bytes, hash_foto, tamanho_saida).convert('RGBA')
     largura, altura = base.size
 
     overlay = Image.new('RGBA', base.size, (0, 0, 0, 0))
@@ -0,0 +1,65 @@
+"""
+Limite de chamadas por provedor de IA (Gemini, OpenAI, Leonardo).
+
+A geração em lote chama os provedores de várias threads ao mesmo tempo; sem um
+freio, um lote grande estoura a cota de requisições por minuto da conta e as
+chamadas começam a voltar 429. Cada provedor tem um balde de fichas (token bucket)
+por processo, reabastecido a MARKETING_IA_LIMITE_<PROVEDOR>_RPM fichas por minuto:
+toda chamada pega uma ficha antes de sair e, sem ficha, espera a próxima.
+0 (ou ausente) = sem limite.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+GEMINI = 'GEMINI'
+OPENAI = 'OPENAI'
+LEONARDO = 'LEONARDO'
+
+
+class BaldeDeFichas:
+    """Token bucket thread-safe: `por_minuto` fichas por minuto, até `capacidade` acumuladas."""
+
+    def __init__(self, por_minuto, capacidade=1):
+        self.taxa = por_minuto / 60
+        self.capacidade = capacidade
+        self.fichas = capacidade
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self):
+        """Pega uma ficha (mesmo que ainda não exista) e retorna quantos segundos esperar por ela."""
+        with self._lock:
+            agora = time.monotonic()
+            self.fichas = min(self.capacidade, self.fichas + (agora - self.ultimo) * self.taxa)
+            self.ultimo = agora
+            self.fichas -= 1
+            return max(0.0, -self.fichas / self.taxa)
+
+    def aguardar(self):
+        espera = self.reservar()
+        if espera:
+            time.sleep(espera)
+        return espera
+
+
+_baldes = {}
+_lock = threading.Lock()
+
+
+def _balde(provedor):
+    por_minuto = getattr(settings, f'MARKETING_IA_LIMITE_{provedor}_RPM', 0) or 0
+    if por_minuto <= 0:
+        return None
+    chave = (provedor, por_minuto)
+    with _lock:
+        if chave not in _baldes:
+            _baldes[chave] = BaldeDeFichas(por_minuto)
+        return _baldes[chave]
+
+
+def aguardar_vez(provedor):
+    """Bloqueia até o provedor liberar mais uma chamada. Retorna os segundos esperados."""
+    balde = _balde(provedor)
+    return balde.aguardar() if balde else 0
@@ -2,7 +2,7 @@ from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
 
 from marketing_ia.models import VeiculoAnuncio
-from marketing_ia.services import GeracaoPostError, gerar_post_para_anuncio, sincronizar_estoque
+from marketing_ia.services import gerar_posts_em_lote, sincronizar_estoque
 
 User = get_user_model()
 
@@ -21,12 +21,16 @@ class Command(BaseCommand):
                              help='Filtra por tipo de veículo.')
         parser.add_argument('--limit', type=int, default=None,
                              help='Limita quantos anúncios coletar em detalhe no scraping.')
+        parser.add_argument('--completa', action='store_true',
+                             help='Raspa o detalhe de todos os anúncios, não só dos novos/com card alterado.')
         parser.add_argument('--somente-scraping', action='store_true',
                              help='Só coleta/atualiza os anúncios, sem gerar posts com IA.')
         parser.add_argument('--forcar-regeneracao', action='store_true',
                              help='Gera um novo post mesmo para anúncios que já têm um.')
         parser.add_argument('--limit-posts', type=int, default=None,
                              help='Limita quantos posts novos gerar com IA nesta execução (controla custo de API).')
+        parser.add_argument('--concorrencia', type=int, default=None,
+                             help='Anúncios gerados ao mesmo tempo (padrão: MARKETING_IA_LOTE_CONCORRENCIA).')
         parser.add_argument('--usuario', type=str, default=None,
                              help='Username a associar como gerado_por nos posts criados.')
 
@@ -36,10 +40,12 @@ class Command(BaseCommand):
             max_paginas=options['max_paginas'],
             tipo=options['tipo'],
             limit=options['limit'],
+            completa=options['completa'],
         )
         self.stdout.write(self.style.SUCCESS(
             f"{resultado['total']} anúncios coletados "
             f"({resultado['criados']} novo(s), {resultado['atualizados']} atualizado(s), "
+            f"{resultado['inalterados']} sem alteração, "
             f"{resultado['desativados']} saiu(íram) do estoque)."
         ))
 
@@ -66,15 +72,13 @@ class Command(BaseCommand):
 
         self.stdout.write(f'Gerando posts promocionais para {qs.count()} anúncio(s)...')
 
-        gerados, falhas = 0, 0
-        for anuncio in qs:
-            try:
-                gerar_post_para_anuncio(anuncio, usuario=usuario)
-            except GeracaoPostError as exc:
-                self.stdout.write(self.style.WARNING(f'[pula] {anuncio.titulo}: {exc}'))
-                falhas += 1
-                continue
-            gerados += 1
-            self.stdout.write(self.style.SUCCESS(f'[ok] {anuncio.titulo}'))
+        def mostrar_progresso(anuncio, erro):
+            if erro:
+                self.stdout.write(self.style.WARNING(f'[pula] {anuncio.titulo}: {erro}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'[ok] {anuncio.titulo}'))
 
+        gerados, falhas = gerar_posts_em_lote(
+            qs, usuario=usuario, concorrencia=options['concorrencia'], progress_cb=mostrar_progresso,
+        )
         self.stdout.write(self.style.SUCCESS(f'Concluído: {gerados} post(s) gerado(s), {falhas} falha(s).'))
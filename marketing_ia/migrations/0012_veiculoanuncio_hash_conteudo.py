@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing_ia', '0011_postcombinado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='veiculoanuncio',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing_ia', '0012_veiculoanuncio_hash_conteudo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='veiculoanuncio',
+            name='assinatura_listagem',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,59 @@
+import hashlib
+import mimetypes
+
+import crmspagi.storage_backends
+import marketing_ia.models
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+
+
+def mover_imagens_para_storage(apps, schema_editor):
+    # Uma previa por vez: cada linha carrega um JPEG inteiro.
+    PreviewPost = apps.get_model('marketing_ia', 'PreviewPost')
+    for preview_id in PreviewPost.objects.values_list('pk', flat=True):
+        preview = PreviewPost.objects.only('pk', 'imagem_bytes', 'imagem_mime_type').get(pk=preview_id)
+        conteudo = bytes(preview.imagem_bytes or b'')
+        extensao = mimetypes.guess_extension(preview.imagem_mime_type or '') or '.jpg'
+        preview.imagem.save(f'previa{extensao}', ContentFile(conteudo), save=False)
+        preview.imagem_sha256 = hashlib.sha256(conteudo).hexdigest()
+        preview.save(update_fields=['imagem', 'imagem_sha256'])
+
+
+def trazer_imagens_para_o_banco(apps, schema_editor):
+    PreviewPost = apps.get_model('marketing_ia', 'PreviewPost')
+    for preview in PreviewPost.objects.exclude(imagem='').only('pk', 'imagem'):
+        with preview.imagem.open('rb') as arquivo:
+            preview.imagem_bytes = arquivo.read()
+        preview.save(update_fields=['imagem_bytes'])
+        preview.imagem.delete(save=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketing_ia', '0013_veiculoanuncio_assinatura_listagem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='previewpost',
+            name='imagem',
+            field=models.FileField(default='', storage=crmspagi.storage_backends.previews_marketing_storage, upload_to=marketing_ia.models.get_preview_upload_path),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='previewpost',
+            name='imagem_sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='previewpost',
+            name='imagem_bytes',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(mover_imagens_para_storage, trazer_imagens_para_o_banco),
+        migrations.RemoveField(
+            model_name='previewpost',
+            name='imagem_bytes',
+        ),
+    ]
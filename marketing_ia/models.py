@@ -7,7 +7,8 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils import timezone
 
-from crmspagi.storage_backends import PublicMediaStorage
+from core.singleton import CachedSingletonMixin
+from crmspagi.storage_backends import PublicMediaStorage, previews_marketing_storage
 
 User = get_user_model()
 
@@ -24,6 +25,11 @@ def get_post_combinado_upload_path(instance, filename):
     return f"marketing_ia/combinados/{unique_filename}"
 
 
+def get_preview_upload_path(instance, filename):
+    ext = os.path.splitext(filename)[1] or '.jpg'
+    return f"marketing_ia/previews/{uuid.uuid4()}{ext}"
+
+
 class VeiculoAnuncio(models.Model):
     """Anúncio de veículo raspado do estoque público (spagimotors.com.br)."""
 
@@ -72,6 +78,12 @@ class VeiculoAnuncio(models.Model):
     fotos_urls = models.JSONField(default=list, blank=True, verbose_name='URLs das fotos em alta resolução')
 
     ativo = models.BooleanField(default=True, verbose_name='Ainda encontrado no estoque do site')
+    # sha256 dos campos raspados (services.hash_conteudo_anuncio): a sincronizacao so
+    # regrava o anuncio quando o conteudo do site muda.
+    hash_conteudo = models.CharField(max_length=64, blank=True, default='', editable=False)
+    # Impressao do card na listagem (preco, titulo, foto): na sincronizacao incremental
+    # a pagina de detalhe so e aberta de novo quando ela muda.
+    assinatura_listagem = models.CharField(max_length=64, blank=True, default='', editable=False)
     coletado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
@@ -248,15 +260,16 @@ class PostCombinado(models.Model):
 class PreviewPost(models.Model):
     """
     Prévia de um post gerado, aguardando confirmação do usuário antes de virar
-    um PostPromocional de verdade. A imagem fica em BinaryField (banco), não em
-    ImageField/S3: assim uma prévia descartada nunca cria lixo no MinIO, e o
-    conteúdo fica visível a qualquer worker do gunicorn (o cache padrão do
-    Django aqui é por processo, não seria confiável entre a requisição que gera
-    e a que confirma/descarta).
+    um PostPromocional de verdade. A imagem fica no storage (alias
+    "previews_marketing", fora de marketing_ia/posts/), não no banco: abrir a
+    prévia não traz o JPEG pelo ORM, e o navegador revalida pelo ETag
+    (imagem_sha256) sem baixar de novo. Descartar ou confirmar apaga o arquivo
+    junto (marketing_ia.signals), então prévia descartada não deixa lixo no MinIO.
     """
 
     anuncio = models.ForeignKey(VeiculoAnuncio, on_delete=models.CASCADE, related_name='previews')
-    imagem_bytes = models.BinaryField()
+    imagem = models.FileField(upload_to=get_preview_upload_path, storage=previews_marketing_storage)
+    imagem_sha256 = models.CharField(max_length=64, blank=True, default='', editable=False)
     imagem_mime_type = models.CharField(max_length=30, default='image/jpeg')
     legenda = models.TextField(blank=True, null=True)
     hashtags = models.CharField(max_length=500, blank=True, null=True)
@@ -275,7 +288,7 @@ class PreviewPost(models.Model):
         return f"Prévia {self.anuncio.titulo} (#{self.pk})"
 
 
-class SincronizacaoEstoque(models.Model):
+class SincronizacaoEstoque(CachedSingletonMixin, models.Model):
     """Registro (singleton) do status da última raspagem disparada pela tela do CRM."""
 
     STATUS_CHOICES = [
@@ -307,7 +320,7 @@ class SincronizacaoEstoque(models.Model):
 
     @classmethod
     def load(cls):
-        obj, _ = cls.objects.get_or_create(pk=1)
+        obj = cls.carregar_singleton()
         if obj.status == 'RODANDO' and obj.iniciado_em:
             if timezone.now() - obj.iniciado_em > timedelta(minutes=cls.TIMEOUT_MINUTOS):
                 obj.status = 'ERRO'
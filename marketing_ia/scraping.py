@@ -1,11 +1,44 @@
+"""
+Raspagem do estoque público (spagimotors.com.br).
+
+As páginas são sempre lidas como HTML pelo BeautifulSoup; o que muda é quem busca o
+HTML (MARKETING_SCRAPING_MODO):
+
+- "http": requests direto, sem navegador (rápido, para páginas que já vêm prontas do
+  servidor);
+- "selenium": um pool de Chromes headless, para quando o conteúdo depende de JS;
+- "auto" (padrão): tenta a listagem por HTTP e só cai para o Selenium se os cards não
+  vierem no HTML.
+
+Listagens e detalhes são buscados em paralelo (MARKETING_SCRAPING_CONCORRENCIA
+workers), com um intervalo mínimo entre requisições ao mesmo host
+(MARKETING_SCRAPING_INTERVALO_HOST) para não martelar o site.
+
+Raspagem incremental: cada card da listagem ganha uma assinatura (preço, título e
+foto); quem chama passa as assinaturas já conhecidas e só os anúncios novos ou com
+card diferente têm a página de detalhe aberta. No modo HTTP as páginas de detalhe
+ficam no cache próprio CACHES['paginas_estoque'] e são revalidadas com If-None-Match/If-Modified-Since
+quando o site manda ETag/Last-Modified (304 = usa o HTML guardado).
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+import hashlib
+import json
 import logging
 import os
+import queue
 import re
+import threading
 import time
 from decimal import Decimal, InvalidOperation
+from urllib.parse import urljoin, urlsplit
 
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.cache import caches
+import requests
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
@@ -20,6 +53,23 @@ SEARCH_URL = f'{BASE_URL}/search'
 ID_RE = re.compile(r'id-(\d+)/?$')
 PRECO_RE = re.compile(r'[^\d,]')
 
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+SELETOR_CARDS = '.card__wrapper .card'
+SELETOR_DETALHE = '.vehicle__title'
+
+# Alias em settings.CACHES: o HTML das páginas de detalhe não divide espaço com o cache default.
+CACHE_PAGINAS = 'paginas_estoque'
+
+
+class ErroRaspagem(Exception):
+    """Página sem o conteúdo esperado (ex: anúncio removido no meio da raspagem)."""
+
+
+# Falhas de uma página que só descartam aquele anúncio, sem derrubar a raspagem.
+ERROS_PAGINA = (ErroRaspagem, requests.RequestException, WebDriverException)
+
 
 def build_driver(headless=True):
     """
@@ -34,8 +84,7 @@ def build_driver(headless=True):
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument('--disable-gpu')
     options.add_argument('--window-size=1366,900')
-    options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                          '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+    options.add_argument(f'user-agent={USER_AGENT}')
 
     chrome_bin = os.getenv('CHROME_BIN')
     if chrome_bin:
@@ -47,8 +96,161 @@ def build_driver(headless=True):
     return webdriver.Chrome(service=service, options=options)
 
 
-def _texto(el):
-    return (el.text or '').strip()
+class IntervaloPorHost:
+    """Espaça as requisições ao mesmo host em pelo menos `intervalo` segundos, entre todas as threads."""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._proxima = {}
+
+    def aguardar(self, url):
+        if self.intervalo <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            agora = time.monotonic()
+            vez = max(agora, self._proxima.get(host, agora))
+            self._proxima[host] = vez + self.intervalo
+        if vez > agora:
+            time.sleep(vez - agora)
+
+
+class NavegadorHttp:
+    """Busca o HTML com requests (uma Session por thread)."""
+
+    def __init__(self, intervalo, timeout):
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _sessao(self):
+        sessao = getattr(self._local, 'sessao', None)
+        if sessao is None:
+            sessao = self._local.sessao = requests.Session()
+            sessao.headers['User-Agent'] = USER_AGENT
+        return sessao
+
+    def obter(self, url, seletor, condicional=False):
+        """
+        Retorna o BeautifulSoup da página, ou None se `seletor` não estiver nela.
+        Com `condicional`, usa/guarda a página no cache local e revalida pelo ETag/Last-Modified.
+        """
+        cache = caches[CACHE_PAGINAS]
+        chave = f'marketing_ia:pagina:{hashlib.sha1(url.encode()).hexdigest()}'
+        guardada = cache.get(chave) if condicional else None
+        cabecalhos = {}
+        if guardada:
+            if guardada.get('etag'):
+                cabecalhos['If-None-Match'] = guardada['etag']
+            if guardada.get('last_modified'):
+                cabecalhos['If-Modified-Since'] = guardada['last_modified']
+
+        self.intervalo.aguardar(url)
+        resposta = self._sessao().get(url, timeout=self.timeout, headers=cabecalhos)
+        if guardada and resposta.status_code == 304:
+            html = guardada['html']
+        else:
+            resposta.raise_for_status()
+            html = resposta.text
+            validadores = {
+                'etag': resposta.headers.get('ETag'),
+                'last_modified': resposta.headers.get('Last-Modified'),
+            }
+            if condicional and any(validadores.values()):
+                cache.set(chave, {**validadores, 'html': html}, settings.MARKETING_SCRAPING_CACHE_SEGUNDOS)
+
+        soup = BeautifulSoup(html, 'html.parser')
+        return soup if soup.select_one(seletor) else None
+
+    def fechar(self):
+        pass
+
+
+class NavegadorSelenium:
+    """Pool de até `tamanho` Chromes, criados sob demanda e reaproveitados entre páginas."""
+
+    def __init__(self, tamanho, intervalo, espera=8):
+        self.tamanho = tamanho
+        self.intervalo = intervalo
+        self.espera = espera
+        self._livres = queue.Queue()
+        self._todos = []
+        self._lock = threading.Lock()
+
+    def _pegar_driver(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._todos) < self.tamanho:
+                driver = build_driver()
+                self._todos.append(driver)
+                return driver
+        return self._livres.get()
+
+    def obter(self, url, seletor, condicional=False):
+        # O Chrome nao expoe os cabecalhos da resposta: sem requisicao condicional aqui.
+        driver = self._pegar_driver()
+        try:
+            self.intervalo.aguardar(url)
+            driver.get(url)
+            try:
+                WebDriverWait(driver, self.espera).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, seletor))
+                )
+            except TimeoutException:
+                return None
+            return BeautifulSoup(driver.page_source, 'html.parser')
+        finally:
+            self._livres.put(driver)
+
+    def fechar(self):
+        for driver in self._todos:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+
+def abrir_navegador(concorrencia, modo=None):
+    """Escolhe como buscar as páginas conforme MARKETING_SCRAPING_MODO (ver docstring do módulo)."""
+    modo = modo or settings.MARKETING_SCRAPING_MODO
+    intervalo = IntervaloPorHost(settings.MARKETING_SCRAPING_INTERVALO_HOST)
+    if modo == 'selenium':
+        return NavegadorSelenium(concorrencia, intervalo)
+
+    http = NavegadorHttp(intervalo, settings.MARKETING_SCRAPING_TIMEOUT)
+    if modo == 'http':
+        return http
+    try:
+        if http.obter(SEARCH_URL, SELETOR_CARDS) is not None:
+            return http
+        logger.info('Listagem sem cards no HTML; usando o Selenium.')
+    except requests.RequestException as exc:
+        logger.info('Listagem por HTTP falhou (%s); usando o Selenium.', exc)
+    return NavegadorSelenium(concorrencia, intervalo)
+
+
+def _texto(el, multilinha=False):
+    if el is None:
+        return ''
+    if multilinha:
+        linhas = (' '.join(linha.split()) for linha in el.get_text('\n').splitlines())
+        return '\n'.join(linha for linha in linhas if linha)
+    return ' '.join(el.get_text(' ').split())
+
+
+def _url_imagem(img, pagina_url):
+    # O site usa lazy-load: a URL real fica em `data-src` até o card aparecer na
+    # tela (o `src` pode ser um placeholder); só os cards já visíveis no
+    # carregamento vêm com o `src` preenchido.
+    for atributo in ('data-src', 'src'):
+        valor = (img.get(atributo) or '').strip()
+        if valor and not valor.startswith('data:'):
+            return urljoin(pagina_url, valor)
+    return None
 
 
 def _extrair_id_externo(url):
@@ -74,86 +276,71 @@ def _classificar_tipo(features_texto):
     return 'CARRO'
 
 
-def _extrair_cards_da_pagina_atual(driver):
-    itens = []
-    for card in driver.find_elements(By.CSS_SELECTOR, '.card__wrapper .card'):
-        try:
-            link_el = card.find_element(By.CSS_SELECTOR, 'a.card__content, a.card__figure')
-            url = link_el.get_attribute('href')
-            if not url or not _extrair_id_externo(url):
-                continue
+def assinatura_card(item):
+    """Impressão do card da listagem: muda quando o preço, o título ou a foto mudam."""
+    conteudo = json.dumps([str(item.get('preco')), item.get('titulo'), item.get('foto_url')], ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
 
-            titulo = _texto(card.find_element(By.CSS_SELECTOR, '.card__title'))
-            try:
-                preco_texto = _texto(card.find_element(By.CSS_SELECTOR, '.card__sell__value'))
-            except NoSuchElementException:
-                preco_texto = None
-            try:
-                features_texto = _texto(card.find_element(By.CSS_SELECTOR, '.card__features'))
-            except NoSuchElementException:
-                features_texto = ''
-            try:
-                img_el = card.find_element(By.CSS_SELECTOR, '.card__image')
-                # O site usa lazy-load: só os cards já visíveis na tela no momento
-                # do carregamento têm o atributo `src` preenchido — os demais só
-                # têm a URL real em `data-src`, até o usuário rolar a página.
-                foto_url = img_el.get_attribute('src') or img_el.get_attribute('data-src')
-            except NoSuchElementException:
-                foto_url = None
-
-            itens.append({
-                'url': url,
-                'titulo': titulo,
-                'preco': _parse_preco(preco_texto),
-                'tipo': _classificar_tipo(features_texto),
-                'foto_url': foto_url,
-            })
-        except NoSuchElementException:
+
+def _extrair_cards(soup, pagina_url):
+    itens = []
+    for card in soup.select(SELETOR_CARDS):
+        link_el = card.select_one('a.card__content, a.card__figure')
+        url = urljoin(pagina_url, link_el.get('href') or '') if link_el else None
+        if not url or not _extrair_id_externo(url):
             continue
+
+        img_el = card.select_one('.card__image')
+        item = {
+            'external_id': _extrair_id_externo(url),
+            'url': url,
+            'titulo': _texto(card.select_one('.card__title')),
+            'preco': _parse_preco(_texto(card.select_one('.card__sell__value')) or None),
+            'tipo': _classificar_tipo(_texto(card.select_one('.card__features'))),
+            'foto_url': _url_imagem(img_el, pagina_url) if img_el else None,
+        }
+        item['assinatura_listagem'] = assinatura_card(item)
+        itens.append(item)
     return itens
 
 
-def coletar_links_estoque(driver, max_paginas=None, espera=8):
+def _total_paginas(soup, itens_na_primeira):
     """
-    Percorre as páginas de /search e retorna uma lista de dicts básicos
-    (url, titulo, preco, tipo) — um por card de veículo encontrado.
+    Descobre a quantidade de páginas pelo contador nativo do site ("Exibindo 1 - 20
+    de N"), que sempre lista 20 itens por página.
+    """
+    m = re.search(r'de\s+(\d+)', _texto(soup.select_one('.pagination__quantity')))
+    if not m:
+        return 1
+    itens_por_pagina = itens_na_primeira or 20
+    return max(1, -(-int(m.group(1)) // itens_por_pagina))  # ceil
 
-    A quantidade de páginas é descoberta a partir do contador nativo do site
-    ("Exibindo 1 - 20 de N"), que sempre lista 20 itens por página.
+
+def coletar_links_estoque(navegador, max_paginas=None, pool=None):
     """
-    wait = WebDriverWait(driver, espera)
-    driver.get(SEARCH_URL)
-    try:
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '.card__wrapper .card')))
-    except TimeoutException:
+    Percorre as páginas de /search e retorna uma lista de dicts básicos
+    (external_id, url, titulo, preco, tipo, foto_url, assinatura_listagem) — um por
+    card de veículo encontrado.
+    A primeira página dá o total; as demais são buscadas em paralelo no `pool`.
+    """
+    primeira = navegador.obter(SEARCH_URL, SELETOR_CARDS)
+    if primeira is None:
         logger.info('Nenhum card encontrado em %s.', SEARCH_URL)
         return []
 
-    resultados = _extrair_cards_da_pagina_atual(driver)
-
-    total_itens = None
-    try:
-        texto_contador = _texto(driver.find_element(By.CSS_SELECTOR, '.pagination__quantity'))
-        m = re.search(r'de\s+(\d+)', texto_contador)
-        if m:
-            total_itens = int(m.group(1))
-    except NoSuchElementException:
-        pass
-
-    itens_por_pagina = len(resultados) or 20
-    total_paginas = 1
-    if total_itens:
-        total_paginas = max(1, -(-total_itens // itens_por_pagina))  # ceil
+    resultados = _extrair_cards(primeira, SEARCH_URL)
+    total_paginas = _total_paginas(primeira, len(resultados))
     if max_paginas:
         total_paginas = min(total_paginas, max_paginas)
 
-    for pagina in range(2, total_paginas + 1):
-        driver.get(f'{SEARCH_URL}/pagina.{pagina}')
-        try:
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '.card__wrapper .card')))
-        except TimeoutException:
+    urls = [f'{SEARCH_URL}/pagina.{pagina}' for pagina in range(2, total_paginas + 1)]
+    buscar = partial(navegador.obter, seletor=SELETOR_CARDS)
+    paginas = pool.map(buscar, urls) if pool else map(buscar, urls)
+    for url, soup in zip(urls, paginas):
+        if soup is None:
+            # Página vazia: o contador estava desatualizado, as próximas também vêm vazias.
             break
-        resultados.extend(_extrair_cards_da_pagina_atual(driver))
+        resultados.extend(_extrair_cards(soup, url))
 
     # Dedup por URL, preservando ordem.
     vistos = set()
@@ -169,9 +356,9 @@ def coletar_links_estoque(driver, max_paginas=None, espera=8):
 LABELS_MOTORIZACAO = ('Motor', 'Motorização', 'Motorizacao')
 
 
-def _campo_motorizacao(driver):
+def _campo_motorizacao(soup):
     for rotulo in LABELS_MOTORIZACAO:
-        valor = _campo_tecnico(driver, rotulo)
+        valor = _campo_tecnico(soup, rotulo)
         if valor:
             return valor
     return None
@@ -205,72 +392,43 @@ def _derivar_veiculo_completo(opcionais):
     return all(any(variacao in texto_junto for variacao in grupo) for grupo in PALAVRAS_VEICULO_COMPLETO)
 
 
-def _campo_tecnico(driver, rotulo):
+def _campo_tecnico(soup, rotulo):
     """Lê um par rótulo/valor dentro de .vehicle__technical__information."""
-    try:
-        blocos = driver.find_elements(By.CSS_SELECTOR, '.vehicle__technical__information')
-    except NoSuchElementException:
-        return None
     rotulo_upper = rotulo.upper()
-    for bloco in blocos:
-        try:
-            tipo = _texto(bloco.find_element(By.CSS_SELECTOR, '.vehicle__technical__information__type'))
-            if tipo.upper() == rotulo_upper:
-                return _texto(bloco.find_element(By.CSS_SELECTOR, '.vehicle__technical__information__value'))
-        except NoSuchElementException:
-            continue
+    for bloco in soup.select('.vehicle__technical__information'):
+        tipo = bloco.select_one('.vehicle__technical__information__type')
+        valor = bloco.select_one('.vehicle__technical__information__value')
+        if tipo is not None and valor is not None and _texto(tipo).upper() == rotulo_upper:
+            return _texto(valor)
     return None
 
 
-def extrair_detalhes_anuncio(driver, url, foto_url=None, espera=8):
+def extrair_detalhes_anuncio(navegador, url, foto_url=None):
     """
     Abre a página de detalhe de um anúncio e extrai os campos relevantes
     (specs, opcionais, descrição). A foto NÃO é lida do carrossel desta
-    página: o carrossel usa Glide.js e reaproveitamos a mesma sessão do
-    Selenium entre veículos, então o `data-src-hd` às vezes ainda reflete o
-    slide do veículo anterior quando lemos logo após o `driver.get()`,
+    página: o carrossel usa Glide.js e, no Selenium, o `data-src-hd` às vezes
+    ainda reflete o slide do veículo anterior aberto no mesmo Chrome,
     resultando em foto trocada. A miniatura já coletada na listagem
     (`foto_url`, vindo de `.card__image` em /search) é confiável e usada
     como foto principal.
     """
-    wait = WebDriverWait(driver, espera)
-    driver.get(url)
-    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '.vehicle__title')))
+    soup = navegador.obter(url, SELETOR_DETALHE, condicional=True)
+    if soup is None:
+        raise ErroRaspagem(f'{SELETOR_DETALHE} não encontrado na página.')
 
     external_id = _extrair_id_externo(url)
-    titulo = _texto(driver.find_element(By.CSS_SELECTOR, '.vehicle__title'))
+    titulo = _texto(soup.select_one(SELETOR_DETALHE))
 
-    try:
-        marca_modelo = _texto(driver.find_element(By.CSS_SELECTOR, '.vehicle__model'))
-    except NoSuchElementException:
-        marca_modelo = ''
+    marca_modelo = _texto(soup.select_one('.vehicle__model'))
     partes_marca_modelo = marca_modelo.split(maxsplit=1)
     marca = partes_marca_modelo[0].title() if partes_marca_modelo else None
     modelo = partes_marca_modelo[1].title() if len(partes_marca_modelo) > 1 else None
 
-    try:
-        preco = _parse_preco(_texto(driver.find_element(By.CSS_SELECTOR, '.vehicle__sell__value')))
-    except NoSuchElementException:
-        preco = None
-
-    try:
-        condicoes = [
-            _texto(el) for el in driver.find_elements(By.CSS_SELECTOR, '.vehicle__condition__text')
-        ]
-    except NoSuchElementException:
-        condicoes = []
-
-    try:
-        opcionais = [
-            _texto(el) for el in driver.find_elements(By.CSS_SELECTOR, '.vehicle__optionals__optional')
-        ]
-    except NoSuchElementException:
-        opcionais = []
-
-    try:
-        descricao = _texto(driver.find_element(By.CSS_SELECTOR, '.vehicle__details__content'))
-    except NoSuchElementException:
-        descricao = ''
+    preco = _parse_preco(_texto(soup.select_one('.vehicle__sell__value')) or None)
+    condicoes = [_texto(el) for el in soup.select('.vehicle__condition__text')]
+    opcionais = [_texto(el) for el in soup.select('.vehicle__optionals__optional')]
+    descricao = _texto(soup.select_one('.vehicle__details__content'), multilinha=True)
 
     fotos_urls = [foto_url] if foto_url else []
 
@@ -286,14 +444,14 @@ def extrair_detalhes_anuncio(driver, url, foto_url=None, espera=8):
         'modelo': modelo,
         'titulo': titulo,
         'preco': preco,
-        'ano': _campo_tecnico(driver, 'Ano'),
-        'km': _campo_tecnico(driver, 'KM'),
-        'cor': _campo_tecnico(driver, 'Cor'),
-        'cambio': _campo_tecnico(driver, 'Câmbio'),
-        'combustivel': _campo_tecnico(driver, 'Combustível'),
-        'carroceria': _campo_tecnico(driver, 'Carroceria'),
-        'portas': _campo_tecnico(driver, 'Portas'),
-        'motorizacao': _campo_motorizacao(driver),
+        'ano': _campo_tecnico(soup, 'Ano'),
+        'km': _campo_tecnico(soup, 'KM'),
+        'cor': _campo_tecnico(soup, 'Cor'),
+        'cambio': _campo_tecnico(soup, 'Câmbio'),
+        'combustivel': _campo_tecnico(soup, 'Combustível'),
+        'carroceria': _campo_tecnico(soup, 'Carroceria'),
+        'portas': _campo_tecnico(soup, 'Portas'),
+        'motorizacao': _campo_motorizacao(soup),
         'condicoes': condicoes,
         'ipva_pago': ipva_pago,
         'aceita_troca': aceita_troca,
@@ -305,38 +463,60 @@ def extrair_detalhes_anuncio(driver, url, foto_url=None, espera=8):
     }
 
 
-def scrape_estoque(max_paginas=None, tipo=None, limit=None, incluir_detalhes=True, progress_cb=None):
+def scrape_estoque(max_paginas=None, tipo=None, limit=None, incluir_detalhes=True, progress_cb=None,
+                   concorrencia=None, modo=None, assinaturas=None):
     """
     Orquestra o scraping completo: lista os cards do /search e, opcionalmente,
-    visita cada anúncio para extrair os detalhes completos.
+    visita cada anúncio para extrair os detalhes completos, com até
+    `concorrencia` páginas em paralelo (padrão: MARKETING_SCRAPING_CONCORRENCIA).
+
+    `assinaturas` ({external_id: assinatura_listagem} já conhecidas) liga o modo
+    incremental: anúncio cujo card não mudou não tem o detalhe aberto e volta só com
+    os dados do card e `inalterado=True`. Os demais voltam com os detalhes e a
+    `assinatura_listagem` do card.
 
     `progress_cb`, se informado, é chamado como progress_cb(indice, total, titulo)
     a cada anúncio processado — útil para logar progresso no management command.
+    As chamadas saem da thread de quem chamou, com `indice` de 1 a `total` (os
+    anúncios cujo detalhe é aberto), na ordem em que terminam; o retorno segue a
+    ordem da listagem.
     """
-    driver = build_driver()
+    concorrencia = max(1, concorrencia or settings.MARKETING_SCRAPING_CONCORRENCIA)
+    navegador = abrir_navegador(concorrencia, modo=modo)
     try:
-        links = coletar_links_estoque(driver, max_paginas=max_paginas)
-        if tipo:
-            links = [item for item in links if item['tipo'] == tipo]
-        if limit:
-            links = links[:limit]
-
-        if not incluir_detalhes:
-            return links
-
-        detalhados = []
-        total = len(links)
-        for indice, item in enumerate(links, start=1):
-            try:
-                detalhes = extrair_detalhes_anuncio(driver, item['url'], foto_url=item.get('foto_url'))
-                detalhados.append(detalhes)
-            except (TimeoutException, NoSuchElementException, WebDriverException) as exc:
-                logger.warning('Falha ao extrair detalhes de %s: %s', item['url'], exc)
-                continue
-            finally:
+        with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+            links = coletar_links_estoque(navegador, max_paginas=max_paginas, pool=pool)
+            if tipo:
+                links = [item for item in links if item['tipo'] == tipo]
+            if limit:
+                links = links[:limit]
+
+            if not incluir_detalhes:
+                return links
+
+            assinaturas = assinaturas or {}
+            resultados = [
+                {**item, 'inalterado': True}
+                if assinaturas.get(item['external_id']) == item['assinatura_listagem'] else None
+                for item in links
+            ]
+            futuros = {
+                pool.submit(extrair_detalhes_anuncio, navegador, item['url'], foto_url=item.get('foto_url')): posicao
+                for posicao, item in enumerate(links)
+                if resultados[posicao] is None
+            }
+            total = len(futuros)
+            for indice, futuro in enumerate(as_completed(futuros), start=1):
+                item = links[futuros[futuro]]
+                try:
+                    detalhes = futuro.result()
+                except ERROS_PAGINA as exc:
+                    logger.warning('Falha ao extrair detalhes de %s: %s', item['url'], exc)
+                else:
+                    detalhes['assinatura_listagem'] = item['assinatura_listagem']
+                    resultados[futuros[futuro]] = detalhes
                 if progress_cb:
                     progress_cb(indice, total, item.get('titulo'))
-                time.sleep(0.5)
-        return detalhados
+            return [resultado for resultado in resultados if resultado]
     finally:
-        driver.quit()
+        navegador.fechar()
@@ -1,11 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import json
 import mimetypes
 import random
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
 
 from . import image_overlay
 from .ai_promocional import baixar_foto, gerar_imagem_promocional, gerar_legenda
-from .models import PostCombinado, PostPromocional, PreviewPost, VeiculoAnuncio
+from .models import LoteGeracao, PostCombinado, PostPromocional, PreviewPost, VeiculoAnuncio
 from .scraping import scrape_estoque
 
 
@@ -13,65 +19,121 @@ class GeracaoPostError(Exception):
     """Erro esperado ao gerar um post promocional (sem foto, falha na IA, etc)."""
 
 
-def sincronizar_estoque(max_paginas=None, tipo=None, limit=None):
+# Campos de VeiculoAnuncio que vem da raspagem (entram no hash de conteudo).
+CAMPOS_SINCRONIZADOS = (
+    'url', 'tipo', 'marca', 'modelo', 'titulo', 'preco', 'ano', 'km', 'cor', 'cambio',
+    'combustivel', 'carroceria', 'portas', 'motorizacao', 'condicoes', 'ipva_pago',
+    'aceita_troca', 'veiculo_completo', 'opcionais', 'descricao', 'foto_principal_url', 'fotos_urls',
+)
+SINCRONIZACAO_LOTE = 500
+
+
+def hash_conteudo_anuncio(dados):
+    """sha256 dos campos raspados de um anúncio (mesmo conteúdo, mesmo hash)."""
+    conteudo = json.dumps([dados.get(campo) for campo in CAMPOS_SINCRONIZADOS], default=str, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def _campos_alterados(anuncios):
+    """
+    Campos raspados que mudaram em pelo menos um dos anúncios (comparando com o banco).
+    O bulk_update monta um CASE por campo e linha: mandar só esses corta o custo dele.
+    """
+    campos = set()
+    pks = [anuncio.pk for anuncio in anuncios]
+    atuais = {}
+    for inicio in range(0, len(pks), SINCRONIZACAO_LOTE):
+        atuais.update(
+            VeiculoAnuncio.objects.filter(pk__in=pks[inicio:inicio + SINCRONIZACAO_LOTE])
+            .only(*CAMPOS_SINCRONIZADOS).in_bulk()
+        )
+    for anuncio in anuncios:
+        atual = atuais.get(anuncio.pk)
+        for campo in CAMPOS_SINCRONIZADOS:
+            if atual is None or getattr(atual, campo) != getattr(anuncio, campo):
+                campos.add(campo)
+    return [campo for campo in CAMPOS_SINCRONIZADOS if campo in campos]
+
+
+def sincronizar_estoque(max_paginas=None, tipo=None, limit=None, completa=False):
     """
     Raspa o estoque público do site e sincroniza com VeiculoAnuncio.
-    Retorna um dict com contadores: criados, atualizados, desativados, total.
+    Retorna um dict com contadores: criados, atualizados, inalterados, desativados, total.
+
+    Poucas consultas, qualquer que seja o estoque: uma carrega (external_id, hash, ativo)
+    de todos os anúncios; só os novos e os com hash diferente (ou que voltaram ao estoque)
+    são gravados, em bulk_create/bulk_update, e os que sumiram saem num UPDATE só.
+
+    Incremental por padrão: a assinatura do card da listagem de cada anúncio fica em
+    `assinatura_listagem` e só os anúncios novos ou com card diferente têm a página de
+    detalhe raspada de novo. `completa=True` abre o detalhe de todos (mudanças que não
+    aparecem no card, como opcionais ou quilometragem).
     """
-    anuncios_raspados = scrape_estoque(max_paginas=max_paginas, tipo=tipo, limit=limit)
+    existentes = {
+        external_id: (pk, hash_conteudo, ativo, assinatura)
+        for external_id, pk, hash_conteudo, ativo, assinatura in VeiculoAnuncio.objects.values_list(
+            'external_id', 'pk', 'hash_conteudo', 'ativo', 'assinatura_listagem',
+        )
+    }
+    assinaturas = None
+    if not completa:
+        assinaturas = {external_id: atual[3] for external_id, atual in existentes.items() if atual[3]}
 
-    ids_encontrados = []
-    criados, atualizados = 0, 0
+    anuncios_raspados = scrape_estoque(max_paginas=max_paginas, tipo=tipo, limit=limit, assinaturas=assinaturas)
+
+    raspados = {}
     for dados in anuncios_raspados:
-        if not dados.get('external_id'):
+        if dados.get('external_id'):
+            raspados[dados['external_id']] = dados
+
+    agora = timezone.now()
+    novos, alterados, reativados = [], [], []
+    for external_id, dados in raspados.items():
+        atual = existentes.get(external_id)
+        if dados.get('inalterado'):
+            # Card igual ao da última raspagem: detalhe não foi aberto, conteúdo é o gravado.
+            if not atual[2]:
+                reativados.append(atual[0])
             continue
-        ids_encontrados.append(dados['external_id'])
-        _, foi_criado = VeiculoAnuncio.objects.update_or_create(
-            external_id=dados['external_id'],
-            defaults={
-                'url': dados['url'],
-                'tipo': dados['tipo'],
-                'marca': dados['marca'],
-                'modelo': dados['modelo'],
-                'titulo': dados['titulo'],
-                'preco': dados['preco'],
-                'ano': dados['ano'],
-                'km': dados['km'],
-                'cor': dados['cor'],
-                'cambio': dados['cambio'],
-                'combustivel': dados['combustivel'],
-                'carroceria': dados['carroceria'],
-                'portas': dados['portas'],
-                'motorizacao': dados['motorizacao'],
-                'condicoes': dados['condicoes'],
-                'ipva_pago': dados['ipva_pago'],
-                'aceita_troca': dados['aceita_troca'],
-                'veiculo_completo': dados['veiculo_completo'],
-                'opcionais': dados['opcionais'],
-                'descricao': dados['descricao'],
-                'foto_principal_url': dados['foto_principal_url'],
-                'fotos_urls': dados['fotos_urls'],
-                'ativo': True,
-            },
-        )
-        criados += int(foi_criado)
-        atualizados += int(not foi_criado)
+        campos = {campo: dados[campo] for campo in CAMPOS_SINCRONIZADOS}
+        hash_conteudo = hash_conteudo_anuncio(campos)
+        assinatura = dados.get('assinatura_listagem', '')
+        if atual is None:
+            novos.append(VeiculoAnuncio(
+                external_id=external_id, hash_conteudo=hash_conteudo, assinatura_listagem=assinatura,
+                ativo=True, **campos,
+            ))
+        elif atual[1] != hash_conteudo or not atual[2] or atual[3] != assinatura:
+            # bulk_update nao passa pelo auto_now: atualizado_em vai explicito.
+            alterados.append(VeiculoAnuncio(
+                pk=atual[0], external_id=external_id, hash_conteudo=hash_conteudo,
+                assinatura_listagem=assinatura, ativo=True, atualizado_em=agora, **campos,
+            ))
 
-    desativados = 0
     # Só reconcilia "saiu do estoque" quando a raspagem cobriu o catálogo inteiro
     # (sem limites de página/quantidade), senão marcaria como inativo por engano.
-    if ids_encontrados and not limit and not max_paginas:
-        desativados = (
-            VeiculoAnuncio.objects
-            .filter(ativo=True)
-            .exclude(external_id__in=ids_encontrados)
-            .update(ativo=False)
-        )
+    sumiram = []
+    if raspados and not limit and not max_paginas:
+        sumiram = [pk for external_id, (pk, _, ativo, _) in existentes.items() if ativo and external_id not in raspados]
+
+    with transaction.atomic():
+        VeiculoAnuncio.objects.bulk_create(novos, batch_size=SINCRONIZACAO_LOTE)
+        if alterados:
+            VeiculoAnuncio.objects.bulk_update(
+                alterados,
+                [*_campos_alterados(alterados), 'hash_conteudo', 'assinatura_listagem', 'ativo', 'atualizado_em'],
+                batch_size=SINCRONIZACAO_LOTE,
+            )
+        if reativados:
+            VeiculoAnuncio.objects.filter(pk__in=reativados).update(ativo=True, atualizado_em=agora)
+        desativados = VeiculoAnuncio.objects.filter(pk__in=sumiram).update(ativo=False) if sumiram else 0
 
+    atualizados = len(alterados) + len(reativados)
     return {
-        'total': len(ids_encontrados),
-        'criados': criados,
+        'total': len(raspados),
+        'criados': len(novos),
         'atualizados': atualizados,
+        'inalterados': len(raspados) - len(novos) - atualizados,
         'desativados': desativados,
     }
 
@@ -108,10 +170,14 @@ def gerar_post_para_anuncio(anuncio, usuario=None, lote=None, template_overlay=N
     todos"), que não passa por prévia manual item a item. Levanta
     GeracaoPostError com uma mensagem amigável em caso de falha esperada.
     """
-    imagem_bytes, imagem_mime, modelo_imagem, prompt_usado, legenda, hashtags, modelo_texto = (
-        _gerar_conteudo_promocional(anuncio, template_overlay=template_overlay, resolucao_overlay=resolucao_overlay)
+    conteudo = _gerar_conteudo_promocional(
+        anuncio, template_overlay=template_overlay, resolucao_overlay=resolucao_overlay,
     )
+    return _salvar_post(anuncio, conteudo, usuario=usuario, lote=lote)
+
 
+def _salvar_post(anuncio, conteudo, usuario=None, lote=None):
+    imagem_bytes, imagem_mime, modelo_imagem, prompt_usado, legenda, hashtags, modelo_texto = conteudo
     extensao = mimetypes.guess_extension(imagem_mime) or '.png'
     post = PostPromocional(
         anuncio=anuncio,
@@ -130,17 +196,17 @@ def gerar_post_para_anuncio(anuncio, usuario=None, lote=None, template_overlay=N
 
 def gerar_preview_post(anuncio, usuario=None, template_overlay=None, resolucao_overlay=None):
     """
-    Gera (foto com IA + legenda) e salva como PreviewPost (só no banco, sem
-    gravar no S3) para o usuário conferir antes de publicar de verdade.
-    Levanta GeracaoPostError em caso de falha esperada.
+    Gera (foto com IA + legenda) e salva como PreviewPost (imagem no storage de
+    prévias, fora de marketing_ia/posts/) para o usuário conferir antes de
+    publicar de verdade. Levanta GeracaoPostError em caso de falha esperada.
     """
     imagem_bytes, imagem_mime, modelo_imagem, prompt_usado, legenda, hashtags, modelo_texto = (
         _gerar_conteudo_promocional(anuncio, template_overlay=template_overlay, resolucao_overlay=resolucao_overlay)
     )
 
-    return PreviewPost.objects.create(
+    preview = PreviewPost(
         anuncio=anuncio,
-        imagem_bytes=imagem_bytes,
+        imagem_sha256=hashlib.sha256(imagem_bytes).hexdigest(),
         imagem_mime_type=imagem_mime,
         legenda=legenda,
         hashtags=hashtags or '',
@@ -149,11 +215,15 @@ def gerar_preview_post(anuncio, usuario=None, template_overlay=None, resolucao_o
         modelo_ia_texto=modelo_texto,
         gerado_por=usuario,
     )
+    extensao = mimetypes.guess_extension(imagem_mime) or '.jpg'
+    preview.imagem.save(f'previa{extensao}', ContentFile(imagem_bytes), save=False)
+    preview.save()
+    return preview
 
 
 def salvar_preview_como_post(preview, lote=None):
     """Confirma uma PreviewPost: grava a imagem no S3 como PostPromocional de
-    verdade e apaga a prévia (o banco não guarda as duas cópias)."""
+    verdade e apaga a prévia (o arquivo da prévia sai junto, ver marketing_ia.signals)."""
     extensao = mimetypes.guess_extension(preview.imagem_mime_type) or '.jpg'
     post = PostPromocional(
         anuncio=preview.anuncio,
@@ -165,28 +235,69 @@ def salvar_preview_como_post(preview, lote=None):
         modelo_ia_texto=preview.modelo_ia_texto,
         gerado_por=preview.gerado_por,
     )
-    post.imagem.save(f'post{extensao}', ContentFile(bytes(preview.imagem_bytes)), save=False)
+    with preview.imagem.open('rb') as arquivo:
+        post.imagem.save(f'post{extensao}', ContentFile(arquivo.read()), save=False)
     post.save()
     preview.delete()
     return post
 
 
-def gerar_posts_em_lote(anuncios, usuario=None, lote=None, template_overlay=None, resolucao_overlay=None):
+def _gerar_conteudo_em_thread(anuncio, template_overlay=None, resolucao_overlay=None):
+    try:
+        return _gerar_conteudo_promocional(
+            anuncio, template_overlay=template_overlay, resolucao_overlay=resolucao_overlay,
+        )
+    finally:
+        # Leituras de configuracao abrem uma conexao por thread do pool.
+        connection.close()
+
+
+def gerar_posts_em_lote(anuncios, usuario=None, lote=None, template_overlay=None, resolucao_overlay=None,
+                        concorrencia=None, progress_cb=None):
     """
     Gera um post para cada anúncio da lista, tolerando falhas individuais
     (sem foto, IA indisponível etc) sem interromper o restante do lote.
     Retorna (gerados, falhas).
+
+    Até `concorrencia` anúncios (padrão: MARKETING_IA_LOTE_CONCORRENCIA) são
+    gerados ao mesmo tempo — download da foto, imagem e legenda —, com as chamadas
+    a cada provedor freadas pelo limite de requisições por minuto dele
+    (marketing_ia.limites). O lote leva perto do teto de vazão dos provedores, não
+    a soma das latências. Gravar o post e o progresso do `lote` (total_gerado /
+    total_falhas, a cada anúncio) fica na thread de quem chamou, assim como
+    `progress_cb(anuncio, erro)` — erro é None quando o post foi gerado.
     """
+    anuncios = list(anuncios)
+    if not anuncios:
+        return 0, 0
+    concorrencia = max(1, concorrencia or settings.MARKETING_IA_LOTE_CONCORRENCIA)
+
     gerados, falhas = 0, 0
-    for anuncio in anuncios:
-        try:
-            gerar_post_para_anuncio(
-                anuncio, usuario=usuario, lote=lote,
+    pool = ThreadPoolExecutor(max_workers=min(concorrencia, len(anuncios)))
+    try:
+        futuros = {
+            pool.submit(
+                _gerar_conteudo_em_thread, anuncio,
                 template_overlay=template_overlay, resolucao_overlay=resolucao_overlay,
-            )
-            gerados += 1
-        except GeracaoPostError:
-            falhas += 1
+            ): anuncio
+            for anuncio in anuncios
+        }
+        for futuro in as_completed(futuros):
+            anuncio = futuros[futuro]
+            erro = None
+            try:
+                _salvar_post(anuncio, futuro.result(), usuario=usuario, lote=lote)
+                gerados += 1
+            except GeracaoPostError as exc:
+                erro = str(exc)
+                falhas += 1
+            if lote is not None:
+                LoteGeracao.objects.filter(pk=lote.pk).update(total_gerado=gerados, total_falhas=falhas)
+            if progress_cb:
+                progress_cb(anuncio, erro)
+    finally:
+        # Erro inesperado: nao deixa o resto do lote rodando depois que a funcao saiu.
+        pool.shutdown(cancel_futures=True)
     return gerados, falhas
 
 
@@ -257,13 +368,20 @@ def gerar_post_combinado(veiculos, criterio, usuario=None):
     if quantidade not in (2, 4):
         raise GeracaoPostError('É preciso exatamente 2 ou 4 veículos pra gerar um post combinado.')
 
-    fotos_bytes = []
+    urls_fotos = []
     for veiculo in veiculos:
         url_foto = veiculo.foto_principal_url or (veiculo.fotos_urls[0] if veiculo.fotos_urls else None)
         if not url_foto:
             raise GeracaoPostError(f'O veículo "{veiculo.titulo}" não tem foto para usar no combinado.')
+        urls_fotos.append(url_foto)
+
+    # As fotos do grupo são baixadas juntas (as que já estão no cache nem vão à rede).
+    with ThreadPoolExecutor(max_workers=quantidade) as pool:
+        downloads = [pool.submit(baixar_foto, url_foto) for url_foto in urls_fotos]
+    fotos_bytes = []
+    for veiculo, download in zip(veiculos, downloads):
         try:
-            foto_bytes, _ = baixar_foto(url_foto)
+            foto_bytes, _ = download.result()
         except Exception as exc:
             raise GeracaoPostError(f'Falha ao baixar a foto de "{veiculo.titulo}": {exc}') from exc
         fotos_bytes.append(foto_bytes)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from configuracoes.outbox import entrega_webhook_finalizada
+
+from .models import EnvioWebhook, PostPromocional, PreviewPost
+from .webhooks import ORIGEM_POST
+
+
+@receiver(entrega_webhook_finalizada)
+def registrar_envio_post(sender, entrega, **kwargs):
+    """Quando o worker termina a entrega de um post, grava o EnvioWebhook exibido na revisao."""
+    if entrega.origem != ORIGEM_POST or not PostPromocional.objects.filter(pk=entrega.origem_id).exists():
+        return
+    EnvioWebhook.objects.create(
+        post_id=entrega.origem_id,
+        webhook_id=entrega.webhook_id,
+        enviado_por_id=entrega.criado_por_id,
+        sucesso=entrega.status == entrega.Status.ENVIADO,
+        status_code=entrega.status_code,
+        erro=entrega.ultimo_erro or None,
+    )
+
+
+@receiver(post_delete, sender=PreviewPost)
+def apagar_imagem_preview(sender, instance, **kwargs):
+    """Previa confirmada, descartada ou apagada junto com o anuncio: o arquivo sai do storage."""
+    if instance.imagem:
+        instance.imagem.delete(save=False)
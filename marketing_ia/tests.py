@@ -1,27 +1,43 @@
 import base64
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import io
 import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
 from datetime import timedelta
 from decimal import Decimal
 from types import SimpleNamespace
+from unittest import skipUnless
 from unittest.mock import Mock, patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.files.base import ContentFile
 from django.core.management import call_command
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from PIL import Image
+import requests
 
 from . import ai_promocional
+from . import fotos_cache
 from . import image_overlay
 from . import leonardo_client
+from . import limites
 from . import openai_client
 from . import scraping
 from . import services
 from . import views
-from configuracoes.models import WebhookIntegracao
+from configuracoes.models import EntregaWebhook, WebhookIntegracao
+from configuracoes.outbox import processar_entregas_pendentes
 
 from .models import LayoutOverlay, LoteGeracao, PostCombinado, PostPromocional, PreviewPost, VeiculoAnuncio
 
@@ -332,8 +348,17 @@ def _anuncio_persistido(**overrides):
     return VeiculoAnuncio.objects.create(**dados)
 
 
+def _preview_com_imagem(anuncio, conteudo=b'bytes-da-imagem', **extras):
+    preview = PreviewPost(
+        anuncio=anuncio, imagem_sha256=hashlib.sha256(conteudo).hexdigest(), imagem_mime_type='image/jpeg', **extras,
+    )
+    preview.imagem.save('previa.jpg', ContentFile(conteudo), save=False)
+    preview.save()
+    return preview
+
+
 class PreviewPostServiceTests(TestCase):
-    """Prévia deve gravar só no banco (PreviewPost.imagem_bytes), nunca no S3,
+    """Prévia grava a imagem só no storage de prévias, nunca em marketing_ia/posts/,
     até ser explicitamente confirmada — é o requisito central do fluxo."""
 
     def setUp(self):
@@ -342,7 +367,7 @@ class PreviewPostServiceTests(TestCase):
     @patch('marketing_ia.services.gerar_legenda')
     @patch('marketing_ia.services.gerar_imagem_promocional')
     @patch('marketing_ia.services.baixar_foto')
-    def test_gerar_preview_post_nao_grava_no_storage(self, mock_baixar, mock_gerar_imagem, mock_legenda):
+    def test_gerar_preview_post_nao_grava_nos_posts(self, mock_baixar, mock_gerar_imagem, mock_legenda):
         mock_baixar.return_value = (b'foto-fake', 'image/jpeg')
         mock_gerar_imagem.return_value = (b'imagem-gerada', 'image/jpeg', 'overlay:pillow', 'prompt-x')
         mock_legenda.return_value = ('Legenda de teste', '#carro #oferta', 'gemini-2.5-flash')
@@ -351,7 +376,10 @@ class PreviewPostServiceTests(TestCase):
             preview = services.gerar_preview_post(self.anuncio, usuario=None)
             mock_save.assert_not_called()
 
-        self.assertEqual(bytes(preview.imagem_bytes), b'imagem-gerada')
+        with preview.imagem.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), b'imagem-gerada')
+        self.assertTrue(preview.imagem.name.startswith('marketing_ia/previews/'))
+        self.assertEqual(preview.imagem_sha256, hashlib.sha256(b'imagem-gerada').hexdigest())
         self.assertEqual(preview.legenda, 'Legenda de teste')
         self.assertEqual(PreviewPost.objects.count(), 1)
         self.assertEqual(PostPromocional.objects.count(), 0)
@@ -366,25 +394,312 @@ class PreviewPostServiceTests(TestCase):
         mock_baixar.assert_not_called()
 
     def test_confirmar_preview_grava_post_e_apaga_previa(self):
-        preview = PreviewPost.objects.create(
-            anuncio=self.anuncio,
-            imagem_bytes=b'imagem-gerada',
-            imagem_mime_type='image/jpeg',
-            legenda='Legenda de teste',
-            hashtags='#carro',
-            modelo_ia_imagem='overlay:pillow',
+        preview = _preview_com_imagem(
+            self.anuncio, b'imagem-gerada', legenda='Legenda de teste', hashtags='#carro', modelo_ia_imagem='overlay:pillow',
         )
+        storage, nome = preview.imagem.storage, preview.imagem.name
 
-        with patch('crmspagi.storage_backends.MinioMediaStorage._save', return_value='marketing_ia/posts/ext-1/post.jpg') as mock_save:
+        with patch('crmspagi.storage_backends.MinioMediaStorage._save', return_value='marketing_ia/posts/ext-1/post.jpg') as mock_save, \
+                patch('crmspagi.storage_backends.MinioMediaStorage.exists', return_value=False):
             post = services.salvar_preview_como_post(preview)
             mock_save.assert_called_once()
 
+        self.assertEqual(mock_save.call_args[0][1].read(), b'imagem-gerada')
+        self.assertFalse(storage.exists(nome))
         self.assertEqual(PostPromocional.objects.count(), 1)
         self.assertEqual(PreviewPost.objects.count(), 0)
         self.assertEqual(post.legenda, 'Legenda de teste')
         self.assertEqual(post.anuncio_id, self.anuncio.pk)
 
 
+class _ProvedoresFalsos:
+    """
+    Foto, imagem e legenda falsas com latência fixa, passando pelos limites de
+    verdade (marketing_ia.limites). Guarda quantas gerações correram juntas e o
+    instante de cada chamada de imagem.
+    """
+
+    def __init__(self, latencia_foto=0.0, latencia_imagem=0.0, latencia_legenda=0.0, provedor_imagem=limites.OPENAI):
+        self.latencia_foto = latencia_foto
+        self.latencia_imagem = latencia_imagem
+        self.latencia_legenda = latencia_legenda
+        self.provedor_imagem = provedor_imagem
+        self.chamadas_imagem = []
+        self.em_andamento = 0
+        self.pico = 0
+        self._lock = threading.Lock()
+
+    def baixar_foto(self, url, timeout=20):
+        with self._lock:
+            self.em_andamento += 1
+            self.pico = max(self.pico, self.em_andamento)
+        time.sleep(self.latencia_foto)
+        return b'foto', 'image/jpeg'
+
+    def gerar_imagem_promocional(self, anuncio, foto_bytes, mime_type, **kwargs):
+        limites.aguardar_vez(self.provedor_imagem)
+        self.chamadas_imagem.append(time.monotonic())
+        time.sleep(self.latencia_imagem)
+        return b'imagem', 'image/jpeg', 'falso', 'prompt'
+
+    def gerar_legenda(self, anuncio):
+        limites.aguardar_vez(limites.GEMINI)
+        time.sleep(self.latencia_legenda)
+        with self._lock:
+            self.em_andamento -= 1
+        return f'Legenda {anuncio.titulo}', '#oferta', 'gemini-falso'
+
+    def __enter__(self):
+        self._patches = [
+            patch('marketing_ia.services.baixar_foto', self.baixar_foto),
+            patch('marketing_ia.services.gerar_imagem_promocional', self.gerar_imagem_promocional),
+            patch('marketing_ia.services.gerar_legenda', self.gerar_legenda),
+            patch('crmspagi.storage_backends.MinioMediaStorage._save', side_effect=lambda nome, conteudo: nome),
+            patch('crmspagi.storage_backends.MinioMediaStorage.exists', return_value=False),
+        ]
+        for patcher in self._patches:
+            patcher.start()
+        return self
+
+    def __exit__(self, *exc):
+        for patcher in self._patches:
+            patcher.stop()
+
+
+class BaldeDeFichasTests(TestCase):
+    def test_espera_cresce_com_a_taxa(self):
+        balde = limites.BaldeDeFichas(por_minuto=120)
+
+        esperas = [balde.reservar() for _ in range(4)]
+
+        self.assertEqual(esperas[0], 0)
+        for esperado, espera in zip((0.5, 1.0, 1.5), esperas[1:]):
+            self.assertAlmostEqual(espera, esperado, delta=0.05)
+
+    @override_settings(MARKETING_IA_LIMITE_LEONARDO_RPM=0)
+    def test_limite_zero_nao_espera(self):
+        self.assertEqual([limites.aguardar_vez(limites.LEONARDO) for _ in range(50)], [0] * 50)
+
+
+class GerarPostsEmLoteTests(TestCase):
+    def setUp(self):
+        self.anuncios = [_anuncio_persistido(external_id=f'lote-{indice}', titulo=f'Carro {indice}') for indice in range(8)]
+        self.lote = LoteGeracao.objects.create(total_alvo=len(self.anuncios))
+
+    def test_gera_em_paralelo_e_atualiza_o_lote_a_cada_anuncio(self):
+        progresso = []
+
+        def registrar(anuncio, erro):
+            lote = LoteGeracao.objects.get(pk=self.lote.pk)
+            progresso.append((erro, lote.total_gerado + lote.total_falhas))
+
+        with _ProvedoresFalsos(latencia_imagem=0.2, latencia_legenda=0.1) as provedores:
+            inicio = time.perf_counter()
+            resultado = services.gerar_posts_em_lote(self.anuncios, lote=self.lote, concorrencia=4, progress_cb=registrar)
+            tempo = time.perf_counter() - inicio
+
+        self.assertEqual(resultado, (8, 0))
+        self.assertEqual(provedores.pico, 4)
+        # Em série seriam 8 x 0.3s.
+        self.assertLess(tempo, 1.2)
+        self.assertEqual(progresso, [(None, indice) for indice in range(1, 9)])
+        self.assertEqual(PostPromocional.objects.filter(lote=self.lote).count(), 8)
+        self.assertEqual(PostPromocional.objects.get(anuncio=self.anuncios[3]).legenda, 'Legenda Carro 3')
+
+    def test_falha_de_um_anuncio_nao_para_o_lote(self):
+        self.anuncios[2].fotos_urls = []
+        self.anuncios[2].foto_principal_url = ''
+        erros = []
+
+        with _ProvedoresFalsos():
+            resultado = services.gerar_posts_em_lote(
+                self.anuncios, lote=self.lote, progress_cb=lambda anuncio, erro: erro and erros.append(anuncio.pk),
+            )
+
+        self.assertEqual(resultado, (7, 1))
+        self.assertEqual(erros, [self.anuncios[2].pk])
+        self.lote.refresh_from_db()
+        self.assertEqual((self.lote.total_gerado, self.lote.total_falhas), (7, 1))
+
+    @override_settings(MARKETING_IA_LIMITE_OPENAI_RPM=600)
+    def test_respeita_o_limite_por_minuto_do_provedor(self):
+        with _ProvedoresFalsos() as provedores:
+            services.gerar_posts_em_lote(self.anuncios[:6], concorrencia=6)
+
+        instantes = sorted(provedores.chamadas_imagem)
+        intervalos = [depois - antes for antes, depois in zip(instantes, instantes[1:])]
+        # 600 por minuto = uma chamada a cada 0.1s.
+        self.assertGreaterEqual(min(intervalos), 0.09)
+
+    def test_erro_inesperado_interrompe_o_lote(self):
+        with _ProvedoresFalsos(), patch('marketing_ia.services.gerar_legenda', side_effect=RuntimeError('quebrou')):
+            with self.assertRaises(RuntimeError):
+                services.gerar_posts_em_lote(self.anuncios)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+@override_settings(MARKETING_IA_LIMITE_GEMINI_RPM=1200, MARKETING_IA_LIMITE_OPENAI_RPM=600)
+class GerarPostsEmLoteBenchmark(TestCase):
+    def test_tempo_do_lote_por_concorrencia(self):
+        anuncios = [_anuncio_persistido(external_id=f'lote-{indice}', titulo=f'Carro {indice}') for indice in range(40)]
+        linhas = []
+        for concorrencia in (1, 4, 8, 16):
+            with _ProvedoresFalsos(latencia_foto=0.02, latencia_imagem=0.2, latencia_legenda=0.1):
+                inicio = time.perf_counter()
+                self.assertEqual(services.gerar_posts_em_lote(anuncios, concorrencia=concorrencia), (40, 0))
+                linhas.append(f'{concorrencia} worker(s): {time.perf_counter() - inicio:.2f}s')
+        print(
+            "\n[benchmark] lote de 40 anuncios (foto 20ms, imagem 200ms, legenda 100ms; "
+            "teto OpenAI 10/s = 4.0s): " + '; '.join(linhas)
+        )
+
+
+class _CdnFotos(BaseHTTPRequestHandler):
+    """CDN de fotos local: /foto/N.jpg com ETag (se `com_etag`); `acessos` guarda (caminho, If-None-Match)."""
+    protocol_version = 'HTTP/1.1'
+    com_etag = True
+    latencia = 0
+    versao = {}
+    acessos = []
+
+    def do_GET(self):
+        self.acessos.append((self.path, self.headers.get('If-None-Match')))
+        if self.latencia:
+            time.sleep(self.latencia)
+        corpo = f'{self.path}:v{self.versao.get(self.path, 1)}'.encode() * 200
+        etag = f'"{hashlib.md5(corpo).hexdigest()}"'
+        if self.com_etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(corpo)))
+        if self.com_etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class FotosCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _CdnFotos)
+        cls.base_url = f'http://127.0.0.1:{cls.servidor.server_port}'
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = Path(diretorio.name)
+        configuracao = override_settings(
+            MARKETING_FOTOS_CACHE_DIR=diretorio.name, MARKETING_FOTOS_CACHE_MB=10, MARKETING_FOTOS_CACHE_VALIDADE_HORAS=24,
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        _CdnFotos.acessos = []
+        _CdnFotos.versao = {}
+
+    def _url(self, indice):
+        return f'{self.base_url}/foto/{indice}.jpg'
+
+    def test_foto_ja_baixada_nao_vai_a_rede(self):
+        primeira = ai_promocional.baixar_foto(self._url(1))
+        segunda = ai_promocional.baixar_foto(self._url(1))
+
+        self.assertEqual(primeira, segunda)
+        self.assertEqual(primeira[1], 'image/jpeg')
+        self.assertEqual(len(_CdnFotos.acessos), 1)
+
+    def test_vencida_e_revalidada_pelo_etag(self):
+        conteudo, _ = ai_promocional.baixar_foto(self._url(1))
+
+        with override_settings(MARKETING_FOTOS_CACHE_VALIDADE_HORAS=0):
+            self.assertEqual(ai_promocional.baixar_foto(self._url(1))[0], conteudo)
+            _CdnFotos.versao = {'/foto/1.jpg': 2}
+            trocada, _ = ai_promocional.baixar_foto(self._url(1))
+
+        self.assertNotEqual(trocada, conteudo)
+        self.assertIn(b'v2', trocada)
+        etags = [etag for _, etag in _CdnFotos.acessos]
+        self.assertIsNone(etags[0])
+        self.assertTrue(etags[1] and etags[1] == etags[2])
+        # Depois da troca, a nova já vale do disco.
+        self.assertEqual(ai_promocional.baixar_foto(self._url(1))[0], trocada)
+        self.assertEqual(len(_CdnFotos.acessos), 3)
+
+    def test_sem_etag_compara_o_conteudo(self):
+        with patch.object(_CdnFotos, 'com_etag', False), override_settings(MARKETING_FOTOS_CACHE_VALIDADE_HORAS=0):
+            ai_promocional.baixar_foto(self._url(1))
+            foto = next(self.diretorio.glob('*.bin'))
+            os.utime(foto, (1, 1))
+            ai_promocional.baixar_foto(self._url(1))
+
+        # Mesmo sha256: a foto não é regravada, só volta para o topo do LRU.
+        self.assertEqual(len(_CdnFotos.acessos), 2)
+        self.assertGreater(foto.stat().st_mtime, 1)
+
+    def test_arquivo_corrompido_e_baixado_de_novo(self):
+        conteudo, _ = ai_promocional.baixar_foto(self._url(1))
+        next(self.diretorio.glob('*.bin')).write_bytes(b'lixo')
+
+        self.assertEqual(ai_promocional.baixar_foto(self._url(1))[0], conteudo)
+        self.assertEqual(len(_CdnFotos.acessos), 2)
+
+    def test_cdn_fora_do_ar_usa_a_copia_em_disco(self):
+        conteudo, _ = ai_promocional.baixar_foto(self._url(1))
+
+        with override_settings(MARKETING_FOTOS_CACHE_VALIDADE_HORAS=0), \
+                patch.object(fotos_cache, '_baixar', side_effect=requests.ConnectionError('fora')), \
+                self.assertLogs('marketing_ia.fotos_cache', level='WARNING'):
+            self.assertEqual(ai_promocional.baixar_foto(self._url(1))[0], conteudo)
+
+    def test_limite_de_tamanho_apaga_as_menos_usadas(self):
+        for indice in range(3):
+            ai_promocional.baixar_foto(self._url(indice))
+        ai_promocional.baixar_foto(self._url(0))  # volta a 0 para o topo do LRU
+        tamanho = next(self.diretorio.glob('*.bin')).stat().st_size
+
+        with override_settings(MARKETING_FOTOS_CACHE_MB=(tamanho * 3 - 1) / (1024 * 1024)):
+            ai_promocional.baixar_foto(self._url(3))
+
+        self.assertEqual(len(list(self.diretorio.glob('*.bin'))), 2)
+        self.assertEqual(len(list(self.diretorio.glob('*.json'))), 2)
+        _CdnFotos.acessos = []
+        ai_promocional.baixar_foto(self._url(0))
+        ai_promocional.baixar_foto(self._url(3))
+        self.assertEqual(_CdnFotos.acessos, [])
+
+    def test_combinado_baixa_as_fotos_em_paralelo(self):
+        veiculos = [
+            _anuncio_persistido(external_id=f'combo-{indice}', foto_principal_url=self._url(indice), fotos_urls=[self._url(indice)])
+            for indice in range(4)
+        ]
+        with patch.object(_CdnFotos, 'latencia', 0.2), \
+                patch('marketing_ia.services.image_overlay.montar_imagem_grid', return_value=(b'grade', 'image/jpeg')), \
+                patch('crmspagi.storage_backends.MinioMediaStorage._save', side_effect=lambda nome, conteudo: nome), \
+                patch('crmspagi.storage_backends.MinioMediaStorage.exists', return_value=False):
+            inicio = time.perf_counter()
+            services.gerar_post_combinado(veiculos, 'MESMO_TIPO')
+            tempo = time.perf_counter() - inicio
+
+            self.assertLess(tempo, 0.6)
+            services.gerar_post_combinado(veiculos, 'MESMO_TIPO')
+
+        self.assertEqual(len(_CdnFotos.acessos), 4)
+
+
 class PreviewPostViewTests(TestCase):
     def setUp(self):
         self.anuncio = _anuncio_persistido()
@@ -416,32 +731,52 @@ class PreviewPostViewTests(TestCase):
         self.assertFalse(resp.json()['ok'])
 
     def test_preview_imagem_serve_os_bytes_gravados(self):
-        preview = PreviewPost.objects.create(
-            anuncio=self.anuncio, imagem_bytes=b'bytes-da-imagem', imagem_mime_type='image/jpeg',
-        )
+        preview = _preview_com_imagem(self.anuncio)
 
         resp = self.client.get(reverse('marketing_preview_imagem', args=[preview.pk]))
 
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(resp.content, b'bytes-da-imagem')
+        self.assertEqual(b''.join(resp.streaming_content), b'bytes-da-imagem')
         self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        self.assertEqual(resp['ETag'], f'"{preview.imagem_sha256}"')
+        self.assertIn('private', resp['Cache-Control'])
+        self.assertIn('max-age=', resp['Cache-Control'])
+
+    def test_preview_imagem_com_etag_igual_responde_304_sem_abrir_o_arquivo(self):
+        preview = _preview_com_imagem(self.anuncio)
+        url = reverse('marketing_preview_imagem', args=[preview.pk])
+
+        with patch('django.db.models.fields.files.FieldFile.open') as mock_open, \
+                CaptureQueriesContext(connection) as consultas:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{preview.imagem_sha256}"')
+
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b'')
+        self.assertEqual(resp['ETag'], f'"{preview.imagem_sha256}"')
+        self.assertIn('private', resp['Cache-Control'])
+        mock_open.assert_not_called()
+        consulta_previa = [q['sql'] for q in consultas.captured_queries if 'marketing_ia_previewpost' in q['sql']]
+        self.assertEqual(len(consulta_previa), 1)
+        self.assertNotIn('legenda', consulta_previa[0])
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH='"outra-versao"')
+        self.assertEqual(resp.status_code, 200)
 
     def test_descartar_preview_apaga_sem_criar_post(self):
-        preview = PreviewPost.objects.create(
-            anuncio=self.anuncio, imagem_bytes=b'bytes', imagem_mime_type='image/jpeg',
-        )
+        preview = _preview_com_imagem(self.anuncio)
+        storage, nome = preview.imagem.storage, preview.imagem.name
 
         self.client.post(reverse('marketing_descartar_preview', args=[preview.pk]))
 
         self.assertEqual(PreviewPost.objects.count(), 0)
         self.assertEqual(PostPromocional.objects.count(), 0)
+        self.assertFalse(storage.exists(nome))
 
     def test_confirmar_preview_grava_post_via_view(self):
-        preview = PreviewPost.objects.create(
-            anuncio=self.anuncio, imagem_bytes=b'bytes', imagem_mime_type='image/jpeg', legenda='Legenda',
-        )
+        preview = _preview_com_imagem(self.anuncio, legenda='Legenda')
 
-        with patch('crmspagi.storage_backends.MinioMediaStorage._save', return_value='marketing_ia/posts/ext-1/post.jpg'):
+        with patch('crmspagi.storage_backends.MinioMediaStorage._save', return_value='marketing_ia/posts/ext-1/post.jpg'), \
+                patch('crmspagi.storage_backends.MinioMediaStorage.exists', return_value=False):
             resp = self.client.post(reverse('marketing_confirmar_preview', args=[preview.pk]))
 
         self.assertEqual(resp.status_code, 302)
@@ -652,6 +987,131 @@ class MontarImagemLayoutTests(TestCase):
             self.assertEqual(resultado.size, tamanho)
 
 
+# Só o cache de renders ligado: o JPEG final não pode cair no default.
+_CACHE_LOCAL = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    image_overlay.CACHE_RENDERS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def _anuncio_overlay(**overrides):
+    dados = {'marca': 'Toyota', 'modelo': 'Corolla', 'ano': '2022', 'preco': Decimal('98500.00')}
+    dados.update(overrides)
+    return SimpleNamespace(**dados)
+
+
+@override_settings(CACHES=_CACHE_LOCAL)
+class CacheRenderOverlayTests(TestCase):
+    ELEMENTOS = [{'tipo': 'texto', 'campo': 'preco', 'x': 0.1, 'y': 0.8, 'largura': 0.6}]
+
+    def setUp(self):
+        caches[image_overlay.CACHE_RENDERS].clear()
+        image_overlay._fundos.limpar()
+        self.addCleanup(image_overlay._fundos.limpar)
+        self.foto = _foto_fake_bytes()
+        self.preparar = patch.object(image_overlay, '_preparar_foto', wraps=image_overlay._preparar_foto).start()
+        self.grade = patch.object(image_overlay, '_foto_grade', wraps=image_overlay._foto_grade).start()
+        self.overlay = patch.object(image_overlay, '_montar_imagem_overlay', wraps=image_overlay._montar_imagem_overlay).start()
+        self.addCleanup(patch.stopall)
+
+    def test_mesma_entrada_sai_do_cache_sem_renderizar(self):
+        primeiro = image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(), 'OFERTA')
+        segundo = image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(), 'OFERTA')
+
+        self.assertEqual(segundo, primeiro)
+        self.assertEqual(self.overlay.call_count, 1)
+        self.assertEqual(self.preparar.call_count, 1)
+
+    def test_texto_template_ou_resolucao_diferente_renderiza_de_novo_reaproveitando_o_fundo(self):
+        base = image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(), 'OFERTA')
+        outro_preco = image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(preco=Decimal('90000')), 'OFERTA')
+        outra_chamada = image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(), 'QUEIMA DE ESTOQUE')
+        outro_template = image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(), 'OFERTA', template='CARTAO_CENTRAL')
+
+        self.assertEqual(len({base[0], outro_preco[0], outra_chamada[0], outro_template[0]}), 4)
+        self.assertEqual(self.overlay.call_count, 4)
+        # Mesma foto e resolucao: blur/LANCZOS so na primeira.
+        self.assertEqual(self.preparar.call_count, 1)
+
+        image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(), 'OFERTA', resolucao='1080x1920')
+        self.assertEqual(self.preparar.call_count, 2)
+
+    def test_layout_editado_gera_outra_chave(self):
+        primeiro, _ = image_overlay.montar_imagem_layout(self.foto, _anuncio_overlay(), 'OFERTA', self.ELEMENTOS)
+        repetido, _ = image_overlay.montar_imagem_layout(self.foto, _anuncio_overlay(), 'OFERTA', list(self.ELEMENTOS))
+        editado, _ = image_overlay.montar_imagem_layout(
+            self.foto, _anuncio_overlay(), 'OFERTA', [{**self.ELEMENTOS[0], 'y': 0.1}],
+        )
+
+        self.assertEqual(repetido, primeiro)
+        self.assertNotEqual(editado, primeiro)
+        self.assertEqual(self.preparar.call_count, 1)
+
+    def test_grade_reaproveita_as_celulas(self):
+        fotos = [_foto_fake_bytes(), _foto_fake_bytes(largura=480, altura=640)]
+        anuncios = [_anuncio_overlay(), _anuncio_overlay(modelo='Yaris')]
+
+        primeiro, _ = image_overlay.montar_imagem_grid(fotos, anuncios, 'OFERTAS')
+        image_overlay.montar_imagem_grid(fotos, anuncios, 'OFERTAS')
+        outra_chamada, _ = image_overlay.montar_imagem_grid(fotos, anuncios, 'SO ESTA SEMANA')
+
+        self.assertNotEqual(outra_chamada, primeiro)
+        self.assertEqual(self.grade.call_count, 2)
+
+    def test_lru_de_fundos_descarta_o_mais_antigo(self):
+        fotos = [_foto_fake_bytes(largura=600 + indice) for indice in range(3)]
+        with override_settings(MARKETING_OVERLAY_CACHE_FUNDOS=2, MARKETING_OVERLAY_CACHE_SEGUNDOS=0):
+            for foto in fotos + [fotos[2], fotos[0]]:
+                image_overlay.montar_imagem_overlay(foto, _anuncio_overlay(), 'OFERTA')
+
+        # fotos[2] ainda estava no LRU; fotos[0] ja tinha saido.
+        self.assertEqual(self.preparar.call_count, 4)
+
+    @override_settings(MARKETING_OVERLAY_CACHE_FUNDOS=0, MARKETING_OVERLAY_CACHE_SEGUNDOS=0)
+    def test_cache_desligado_sempre_renderiza(self):
+        for _ in range(3):
+            image_overlay.montar_imagem_overlay(self.foto, _anuncio_overlay(), 'OFERTA')
+
+        self.assertEqual(self.preparar.call_count, 3)
+        self.assertEqual(self.overlay.call_count, 3)
+
+    def test_foto_invalida_nao_fica_em_cache(self):
+        for _ in range(2):
+            with self.assertRaises(image_overlay.ImageOverlayError):
+                image_overlay.montar_imagem_overlay(b'nao e imagem', _anuncio_overlay(), 'OFERTA')
+
+        self.assertEqual(self.preparar.call_count, 2)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+@override_settings(CACHES=_CACHE_LOCAL)
+class CacheRenderOverlayBenchmark(TestCase):
+    RENDERS = 20
+
+    def _medir(self, **config):
+        caches[image_overlay.CACHE_RENDERS].clear()
+        image_overlay._fundos.limpar()
+        foto = _foto_fake_bytes(largura=1600, altura=1200)
+        with override_settings(**config):
+            inicio = time.perf_counter()
+            for indice in range(self.RENDERS):
+                # Metade repete a entrada anterior (regerar/recarregar a previa), metade muda o preco.
+                preco = Decimal(90000 + indice // 2)
+                image_overlay.montar_imagem_overlay(foto, _anuncio_overlay(preco=preco), 'OFERTA')
+        return (time.perf_counter() - inicio) / self.RENDERS * 1000
+
+    def test_sem_cache_x_fundo_x_fundo_e_jpeg(self):
+        sem_cache = self._medir(MARKETING_OVERLAY_CACHE_FUNDOS=0, MARKETING_OVERLAY_CACHE_SEGUNDOS=0)
+        so_fundo = self._medir(MARKETING_OVERLAY_CACHE_SEGUNDOS=0)
+        completo = self._medir()
+
+        print(
+            f"\n[benchmark] {self.RENDERS} overlays 1080x1080 da mesma foto 1600x1200: "
+            f"sem cache {sem_cache:.1f}ms/render; fundo em cache {so_fundo:.1f}ms/render; "
+            f"fundo + JPEG em cache {completo:.1f}ms/render"
+        )
+
+
 class LayoutOverlayModelTests(TestCase):
     def test_chave_template_usa_prefixo_custom(self):
         layout = LayoutOverlay.objects.create(nome='Meu layout', elementos=[])
@@ -924,6 +1384,410 @@ class SincronizacaoTimeoutTests(TestCase):
         self.assertEqual(sync_recarregada.status, 'RODANDO')
 
 
+def _anuncio_raspado(indice, **extra):
+    dados = {
+        'external_id': f'EXT{indice}',
+        'url': f'https://www.spagimotors.com.br/veiculo/{indice}',
+        'tipo': 'CARRO',
+        'marca': 'Fiat',
+        'modelo': 'Argo',
+        'titulo': f'Fiat Argo {indice}',
+        'preco': Decimal('65000.00'),
+        'ano': '2022',
+        'km': '30.000',
+        'cor': 'Branco',
+        'cambio': 'Manual',
+        'combustivel': 'Flex',
+        'carroceria': 'Hatch',
+        'portas': '4',
+        'motorizacao': '1.0',
+        'condicoes': ['IPVA Pago'],
+        'ipva_pago': True,
+        'aceita_troca': False,
+        'veiculo_completo': True,
+        'opcionais': ['Ar condicionado'],
+        'descricao': 'Revisado.',
+        'foto_principal_url': f'https://img.exemplo.com/{indice}.jpg',
+        'fotos_urls': [f'https://img.exemplo.com/{indice}.jpg'],
+    }
+    dados.update(extra)
+    return dados
+
+
+class _SiteRevenda(BaseHTTPRequestHandler):
+    """
+    Site da revenda servido localmente: /search, /search/pagina.N e as páginas de
+    detalhe, com a mesma marcação do spagimotors.com.br. `latencia` simula o tempo de
+    resposta do servidor; `acessos` guarda (caminho, instante) de cada requisição e
+    `respostas` (caminho, status). `precos` troca o preço de anúncios ({indice: texto})
+    e `com_etag` faz as páginas de detalhe mandarem ETag e responderem 304.
+    """
+    total_anuncios = 45
+    por_pagina = 20
+    latencia = 0
+    sem_detalhe = set()
+    precos = {}
+    com_etag = False
+    acessos = []
+    respostas = []
+
+    def _card(self, indice):
+        return (
+            '<div class="card">'
+            f'<a class="card__content" href="/veiculo/fiat-argo-id-{indice}"></a>'
+            f'<h2 class="card__title">Fiat Argo {indice}</h2>'
+            f'<span class="card__sell__value">R$ {self.precos.get(indice, "65.000,00")}</span>'
+            '<span class="card__features">Hatch Flex</span>'
+            f'<img class="card__image" src="data:image/gif;base64,R0lGOD" data-src="/fotos/{indice}.jpg">'
+            '</div>'
+        )
+
+    def _listagem(self, pagina):
+        inicio = (pagina - 1) * self.por_pagina
+        cards = ''.join(self._card(indice) for indice in range(inicio, min(inicio + self.por_pagina, self.total_anuncios)))
+        return (
+            f'<html><body><div class="card__wrapper">{cards}</div>'
+            f'<p class="pagination__quantity">Exibindo {inicio + 1} - {inicio + self.por_pagina} de {self.total_anuncios}</p>'
+            '</body></html>'
+        )
+
+    def _detalhe(self, indice):
+        tecnico = ''.join(
+            '<div class="vehicle__technical__information">'
+            f'<span class="vehicle__technical__information__type">{rotulo}</span>'
+            f'<span class="vehicle__technical__information__value">{valor}</span></div>'
+            for rotulo, valor in (('Ano', '2022/2023'), ('KM', '30.000'), ('Câmbio', 'Manual'), ('Motor', '1.0'))
+        )
+        return (
+            f'<html><body><h1 class="vehicle__title">Fiat Argo {indice}</h1>'
+            f'<p class="vehicle__model">FIAT ARGO</p><p class="vehicle__sell__value">R$ {self.precos.get(indice, "64.900,00")}</p>'
+            f'{tecnico}<span class="vehicle__condition__text">IPVA Pago</span>'
+            '<li class="vehicle__optionals__optional">Ar condicionado</li>'
+            '<li class="vehicle__optionals__optional">Direção hidráulica</li>'
+            '<li class="vehicle__optionals__optional">Vidros elétricos</li>'
+            '<div class="vehicle__details__content">Revisado.\n  Único dono.</div></body></html>'
+        )
+
+    def do_GET(self):
+        self.acessos.append((self.path, time.monotonic()))
+        if self.latencia:
+            time.sleep(self.latencia)
+        corpo, status, etag = '', 404, None
+        if self.path == '/search':
+            corpo, status = self._listagem(1), 200
+        elif self.path.startswith('/search/pagina.'):
+            corpo, status = self._listagem(int(self.path.rsplit('.', 1)[1])), 200
+        elif self.path.startswith('/veiculo/'):
+            indice = int(self.path.rsplit('-', 1)[1])
+            if indice < self.total_anuncios and indice not in self.sem_detalhe:
+                corpo, status = self._detalhe(indice), 200
+                if self.com_etag:
+                    etag = f'"{hash(corpo) & 0xffffffff:x}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        corpo, status = '', 304
+        self.respostas.append((self.path, status))
+        corpo = corpo.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ComSiteRevenda:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _SiteRevenda)
+        cls.base_url = f'http://127.0.0.1:{cls.servidor.server_port}'
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _SiteRevenda.acessos = []
+        _SiteRevenda.respostas = []
+        patcher = patch.object(scraping, 'SEARCH_URL', f'{self.base_url}/search')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@override_settings(MARKETING_SCRAPING_INTERVALO_HOST=0, MARKETING_SCRAPING_MODO='http')
+class ScrapeEstoqueHttpTests(_ComSiteRevenda, TestCase):
+    def test_raspa_listagem_e_detalhes_em_paralelo(self):
+        progresso = []
+
+        anuncios = scraping.scrape_estoque(concorrencia=4, progress_cb=lambda *args: progresso.append(args))
+
+        self.assertEqual([anuncio['external_id'] for anuncio in anuncios], [str(indice) for indice in range(45)])
+        self.assertEqual([indice for indice, _, _ in progresso], list(range(1, 46)))
+        self.assertTrue(all(total == 45 for _, total, _ in progresso))
+        anuncio = anuncios[7]
+        self.assertEqual(anuncio['url'], f'{self.base_url}/veiculo/fiat-argo-id-7')
+        self.assertEqual(anuncio['titulo'], 'Fiat Argo 7')
+        self.assertEqual((anuncio['marca'], anuncio['modelo']), ('Fiat', 'Argo'))
+        self.assertEqual(anuncio['preco'], Decimal('64900.00'))
+        self.assertEqual((anuncio['ano'], anuncio['km'], anuncio['cambio']), ('2022/2023', '30.000', 'Manual'))
+        self.assertEqual(anuncio['motorizacao'], '1.0')
+        self.assertTrue(anuncio['ipva_pago'])
+        self.assertTrue(anuncio['veiculo_completo'])
+        self.assertEqual(anuncio['descricao'], 'Revisado.\nÚnico dono.')
+        # A foto vem do data-src (o src do card é o placeholder do lazy-load).
+        self.assertEqual(anuncio['fotos_urls'], [f'{self.base_url}/fotos/7.jpg'])
+
+    def test_limites_e_listagem_sem_detalhes(self):
+        links = scraping.scrape_estoque(max_paginas=2, incluir_detalhes=False)
+        self.assertEqual(len(links), 40)
+        self.assertEqual(links[0]['preco'], Decimal('65000.00'))
+
+        anuncios = scraping.scrape_estoque(limit=3)
+        self.assertEqual([anuncio['external_id'] for anuncio in anuncios], ['0', '1', '2'])
+        self.assertEqual(sum(path.startswith('/veiculo/') for path, _ in _SiteRevenda.acessos), 3)
+
+    def test_anuncio_que_falha_e_pulado(self):
+        with patch.object(_SiteRevenda, 'sem_detalhe', {3}), self.assertLogs('marketing_ia.scraping', level='WARNING'):
+            anuncios = scraping.scrape_estoque(limit=5)
+
+        self.assertEqual([anuncio['external_id'] for anuncio in anuncios], ['0', '1', '2', '4'])
+
+    @override_settings(MARKETING_SCRAPING_INTERVALO_HOST=0.05)
+    def test_intervalo_minimo_entre_requisicoes_ao_mesmo_host(self):
+        scraping.scrape_estoque(limit=8, concorrencia=8)
+
+        instantes = sorted(instante for _, instante in _SiteRevenda.acessos)
+        intervalos = [depois - antes for antes, depois in zip(instantes, instantes[1:])]
+        self.assertEqual(len(instantes), 11)
+        self.assertGreaterEqual(min(intervalos), 0.04)
+
+
+@override_settings(MARKETING_SCRAPING_INTERVALO_HOST=0)
+class AbrirNavegadorTests(_ComSiteRevenda, TestCase):
+    def test_auto_usa_http_quando_a_listagem_vem_no_html(self):
+        self.assertIsInstance(scraping.abrir_navegador(4, modo='auto'), scraping.NavegadorHttp)
+
+    def test_auto_cai_para_o_selenium_sem_cards_no_html(self):
+        with patch.object(_SiteRevenda, 'total_anuncios', 0):
+            navegador = scraping.abrir_navegador(4, modo='auto')
+
+        self.assertIsInstance(navegador, scraping.NavegadorSelenium)
+        self.assertEqual(navegador.tamanho, 4)
+
+
+def _detalhes_abertos():
+    return sorted(int(path.rsplit('-', 1)[1]) for path, _ in _SiteRevenda.acessos if path.startswith('/veiculo/'))
+
+
+@override_settings(MARKETING_SCRAPING_INTERVALO_HOST=0, MARKETING_SCRAPING_MODO='http')
+class RaspagemIncrementalTests(_ComSiteRevenda, TestCase):
+    def test_card_igual_nao_abre_o_detalhe(self):
+        cards = scraping.scrape_estoque(incluir_detalhes=False)
+        assinaturas = {card['external_id']: card['assinatura_listagem'] for card in cards}
+        progresso = []
+
+        with patch.object(_SiteRevenda, 'precos', {5: '61.000,00'}):
+            _SiteRevenda.acessos = []
+            anuncios = scraping.scrape_estoque(assinaturas=assinaturas, progress_cb=lambda *args: progresso.append(args))
+
+        self.assertEqual(_detalhes_abertos(), [5])
+        self.assertEqual(progresso, [(1, 1, 'Fiat Argo 5')])
+        self.assertEqual(len(anuncios), 45)
+        self.assertEqual(anuncios[5]['preco'], Decimal('61000.00'))
+        self.assertNotIn('inalterado', anuncios[5])
+        self.assertNotEqual(anuncios[5]['assinatura_listagem'], assinaturas['5'])
+        self.assertTrue(anuncios[4]['inalterado'])
+
+    def test_sincronizacao_de_rotina_so_raspa_o_delta(self):
+        primeira = services.sincronizar_estoque()
+        self.assertEqual(primeira['criados'], 45)
+        self.assertEqual(len(_detalhes_abertos()), 45)
+
+        _SiteRevenda.acessos = []
+        self.assertEqual(services.sincronizar_estoque()['inalterados'], 45)
+        self.assertEqual(_detalhes_abertos(), [])
+
+        _SiteRevenda.acessos = []
+        with patch.object(_SiteRevenda, 'precos', {7: '59.900,00'}), patch.object(_SiteRevenda, 'total_anuncios', 44):
+            resultado = services.sincronizar_estoque()
+
+        self.assertEqual(_detalhes_abertos(), [7])
+        self.assertEqual(resultado, {'total': 44, 'criados': 0, 'atualizados': 1, 'inalterados': 43, 'desativados': 1})
+        self.assertEqual(VeiculoAnuncio.objects.get(external_id='7').preco, Decimal('59900.00'))
+        self.assertFalse(VeiculoAnuncio.objects.get(external_id='44').ativo)
+
+        # O 7 volta ao preço antigo (card muda de novo) e o 44 volta ao estoque com o card de antes.
+        _SiteRevenda.acessos = []
+        resultado = services.sincronizar_estoque()
+        self.assertEqual(_detalhes_abertos(), [7])
+        self.assertEqual((resultado['atualizados'], resultado['inalterados']), (2, 43))
+        self.assertTrue(VeiculoAnuncio.objects.get(external_id='44').ativo)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        scraping.CACHE_PAGINAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+    def test_detalhe_guardado_e_revalidado_pelo_etag(self):
+        # Com o default desligado: as páginas só podem ter vindo do cache próprio.
+        caches[scraping.CACHE_PAGINAS].clear()
+        with patch.object(_SiteRevenda, 'com_etag', True):
+            services.sincronizar_estoque(limit=5)
+            _SiteRevenda.respostas = []
+            resultado = services.sincronizar_estoque(limit=5, completa=True)
+
+        detalhes = [status for path, status in _SiteRevenda.respostas if path.startswith('/veiculo/')]
+        self.assertEqual(detalhes, [304] * 5)
+        self.assertEqual(resultado['inalterados'], 5)
+
+    def test_sem_validadores_nao_guarda_a_pagina(self):
+        with patch('django.core.cache.backends.dummy.DummyCache.set') as guardar:
+            scraping.scrape_estoque(limit=2)
+        guardar.assert_not_called()
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+@override_settings(MARKETING_SCRAPING_INTERVALO_HOST=0, MARKETING_SCRAPING_MODO='http')
+class ScrapeEstoqueBenchmark(_ComSiteRevenda, TestCase):
+    def test_vazao_por_numero_de_workers(self):
+        linhas = []
+        with patch.object(_SiteRevenda, 'total_anuncios', 100), patch.object(_SiteRevenda, 'latencia', 0.05):
+            for concorrencia in (1, 2, 4, 8):
+                _SiteRevenda.acessos = []
+                inicio = time.perf_counter()
+                anuncios = scraping.scrape_estoque(concorrencia=concorrencia)
+                tempo = time.perf_counter() - inicio
+                self.assertEqual(len(anuncios), 100)
+                linhas.append(f'{concorrencia} worker(s): {tempo:.2f}s ({len(_SiteRevenda.acessos) / tempo:.0f} paginas/s)')
+        print("\n[benchmark] scrape_estoque (100 anuncios, 50ms por pagina): " + '; '.join(linhas))
+
+    def test_sincronizacao_completa_x_incremental(self):
+        with patch.object(_SiteRevenda, 'total_anuncios', 100), patch.object(_SiteRevenda, 'latencia', 0.05):
+            tempos = {}
+            for rotulo, kwargs in (('primeira', {}), ('completa', {'completa': True}), ('incremental', {})):
+                _SiteRevenda.acessos = []
+                inicio = time.perf_counter()
+                services.sincronizar_estoque(**kwargs)
+                tempos[rotulo] = (time.perf_counter() - inicio, len(_SiteRevenda.acessos))
+        print("\n[benchmark] sincronizar_estoque (100 anuncios, 50ms por pagina): " + '; '.join(
+            f'{rotulo}: {tempo:.2f}s / {paginas} paginas' for rotulo, (tempo, paginas) in tempos.items()
+        ))
+
+
+class SincronizarEstoqueTests(TestCase):
+    def _sincronizar(self, anuncios, **kwargs):
+        with patch('marketing_ia.services.scrape_estoque', return_value=anuncios):
+            return services.sincronizar_estoque(**kwargs)
+
+    def test_cria_atualiza_so_o_que_mudou_e_desativa_os_que_sumiram(self):
+        self._sincronizar([_anuncio_raspado(indice) for indice in range(4)])
+        intacto = VeiculoAnuncio.objects.get(external_id='EXT0')
+
+        resultado = self._sincronizar([
+            _anuncio_raspado(0),
+            _anuncio_raspado(1, preco=Decimal('59900.00')),
+            _anuncio_raspado(2),
+            _anuncio_raspado(9),
+        ])
+
+        self.assertEqual(resultado, {'total': 4, 'criados': 1, 'atualizados': 1, 'inalterados': 2, 'desativados': 1})
+        self.assertEqual(VeiculoAnuncio.objects.get(external_id='EXT1').preco, Decimal('59900.00'))
+        self.assertFalse(VeiculoAnuncio.objects.get(external_id='EXT3').ativo)
+        self.assertEqual(VeiculoAnuncio.objects.get(external_id='EXT0').atualizado_em, intacto.atualizado_em)
+
+    def test_anuncio_que_volta_ao_estoque_e_reativado(self):
+        self._sincronizar([_anuncio_raspado(0), _anuncio_raspado(1)])
+        self._sincronizar([_anuncio_raspado(0)])
+
+        resultado = self._sincronizar([_anuncio_raspado(0), _anuncio_raspado(1)])
+
+        self.assertEqual(resultado['atualizados'], 1)
+        self.assertTrue(VeiculoAnuncio.objects.get(external_id='EXT1').ativo)
+
+    def test_raspagem_parcial_nao_desativa(self):
+        self._sincronizar([_anuncio_raspado(0), _anuncio_raspado(1)])
+
+        resultado = self._sincronizar([_anuncio_raspado(0)], limit=1)
+
+        self.assertEqual(resultado['desativados'], 0)
+        self.assertTrue(VeiculoAnuncio.objects.get(external_id='EXT1').ativo)
+
+    def test_anuncio_antigo_sem_hash_e_regravado_uma_vez(self):
+        VeiculoAnuncio.objects.create(external_id='EXT0', url='https://antigo', titulo='Antigo')
+
+        self.assertEqual(self._sincronizar([_anuncio_raspado(0)])['atualizados'], 1)
+        self.assertEqual(self._sincronizar([_anuncio_raspado(0)])['inalterados'], 1)
+        self.assertEqual(VeiculoAnuncio.objects.get(external_id='EXT0').titulo, 'Fiat Argo 0')
+
+    def test_consultas_nao_dependem_de_um_por_anuncio(self):
+        anuncios = [_anuncio_raspado(indice) for indice in range(100)]
+        with CaptureQueriesContext(connection) as consultas:
+            self._sincronizar(anuncios)
+        self.assertLess(len(consultas), 15)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self._sincronizar(anuncios)
+        escritas = [q for q in consultas.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(escritas, [])
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class SincronizarEstoqueBenchmark(TestCase):
+    TOTAL = 2000
+
+    def _por_linha(self, anuncios):
+        # Caminho anterior: um update_or_create por anuncio.
+        for dados in anuncios:
+            campos = {campo: dados[campo] for campo in services.CAMPOS_SINCRONIZADOS}
+            VeiculoAnuncio.objects.update_or_create(external_id=dados['external_id'], defaults={**campos, 'ativo': True})
+
+    def _medir(self, funcao, anuncios):
+        # execute_wrapper em vez de CaptureQueriesContext, que guarda so as ultimas 9000.
+        consultas = []
+
+        def contar(execute, sql, params, many, context):
+            consultas.append(sql)
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contar):
+            funcao(anuncios)
+        return len(consultas), time.perf_counter() - inicio
+
+    def test_sincronizacao_de_2k_anuncios(self):
+        anuncios = [_anuncio_raspado(indice) for indice in range(self.TOTAL)]
+        # 10% com preco novo na segunda rodada.
+        alterados = [
+            _anuncio_raspado(indice, preco=Decimal('1.00')) if indice % 10 == 0 else _anuncio_raspado(indice)
+            for indice in range(self.TOTAL)
+        ]
+
+        def em_lote(dados):
+            with patch('marketing_ia.services.scrape_estoque', return_value=dados):
+                services.sincronizar_estoque()
+
+        antes_inicial = self._medir(self._por_linha, anuncios)
+        antes_alteracao = self._medir(self._por_linha, alterados)
+        VeiculoAnuncio.objects.all().delete()
+        depois_inicial = self._medir(em_lote, anuncios)
+        depois_alteracao = self._medir(em_lote, alterados)
+
+        self.assertEqual(VeiculoAnuncio.objects.filter(preco=Decimal('1.00')).count(), self.TOTAL // 10)
+        print(
+            f"\n[benchmark] sincronizar_estoque ({self.TOTAL} anuncios): "
+            f"carga inicial {antes_inicial[0]} consultas/{antes_inicial[1]:.2f}s -> "
+            f"{depois_inicial[0]} consultas/{depois_inicial[1]:.2f}s; "
+            f"ressincronizacao com 10% alterados {antes_alteracao[0]} consultas/{antes_alteracao[1]:.2f}s -> "
+            f"{depois_alteracao[0]} consultas/{depois_alteracao[1]:.2f}s"
+        )
+
+
 class CancelarSincronizacaoViewTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_superuser('admin_sync', 'admin_sync@teste.com', 'senha12345')
@@ -1029,12 +1893,11 @@ class TemplatesDatasComemorativasTests(TestCase):
 
 
 class EnviarLoteWebhookViewTests(TestCase):
-    """Envio em massa roda em background (thread), um post de cada vez com
-    pausa entre os disparos (INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS) — não
-    manda tudo de uma rajada só. Como o teste não tem tempo pra corrida com a
-    thread, a view só é testada quanto a disparar (mensagem + redirect) e a
-    função de background (_enviar_lote_webhook_em_background) é chamada
-    direto pra verificar o envio/contagem em si, com time.sleep mockado."""
+    """Envio em massa vai pro outbox de webhooks (configuracoes.EntregaWebhook),
+    um post de cada vez: as entregas ficam na fila do webhook (a seguinte só sai
+    quando a anterior termina) e cada uma fica disponível INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS
+    depois da anterior. O resultado vira um EnvioWebhook quando o worker termina a
+    entrega (marketing_ia.signals)."""
 
     def setUp(self):
         self.user = User.objects.create_superuser('admin_envio_lote', 'admin_envio_lote@teste.com', 'senha12345')
@@ -1051,72 +1914,91 @@ class EnviarLoteWebhookViewTests(TestCase):
         )
         self.webhook = WebhookIntegracao.objects.create(nome='Teste', slug='teste-envio-lote', url='https://exemplo.com/hook')
 
-    def test_view_dispara_em_background_e_avisa_o_usuario(self):
-        resp = self.client.post(
-            reverse('marketing_enviar_lote_webhook', args=[self.lote.pk]),
+    def _enviar_lote(self, lote=None):
+        return self.client.post(
+            reverse('marketing_enviar_lote_webhook', args=[(lote or self.lote).pk]),
             {'webhook_id': self.webhook.pk},
         )
+
+    def test_view_enfileira_em_background_e_avisa_o_usuario(self):
+        resp = self._enviar_lote()
         self.assertEqual(resp.status_code, 302)
         mensagens = [str(m) for m in get_messages(resp.wsgi_request)]
         self.assertTrue(any('segundo plano' in m and 'um de cada vez' in m for m in mensagens))
 
     def test_view_sem_posts_nao_dispara_e_avisa(self):
         lote_vazio = LoteGeracao.objects.create(status='CONCLUIDO', total_alvo=0, total_gerado=0)
-        resp = self.client.post(
-            reverse('marketing_enviar_lote_webhook', args=[lote_vazio.pk]),
-            {'webhook_id': self.webhook.pk},
-        )
+        resp = self._enviar_lote(lote_vazio)
         self.assertEqual(resp.status_code, 302)
         mensagens = [str(m) for m in get_messages(resp.wsgi_request)]
         self.assertTrue(any('Não há posts' in m for m in mensagens))
+        self.assertFalse(EntregaWebhook.objects.exists())
 
-    @patch('marketing_ia.views.time.sleep')
-    @patch('marketing_ia.views.enviar_post_webhook')
-    def test_envia_todos_os_posts_nao_descartados(self, mock_enviar, mock_sleep):
-        from .views import _enviar_lote_webhook_em_background
-
-        mock_enviar.return_value = {'sucesso': True, 'status_code': 200, 'erro': None}
-        _enviar_lote_webhook_em_background(self.lote.pk, self.webhook.pk, self.user.pk)
-
-        mock_enviar.assert_called_once_with(self.post1, self.webhook)
-        self.assertEqual(self.post1.envios.count(), 1)
-        self.assertTrue(self.post1.envios.first().sucesso)
-        self.assertEqual(self.post2.envios.count(), 0)
-        # só 1 post enviado — não deve pausar depois do último (nem antes dele).
-        mock_sleep.assert_not_called()
+    @patch('requests.post')
+    def test_enfileira_so_os_posts_nao_descartados_sem_enviar_no_request(self, mock_post):
+        self._enviar_lote()
 
-    @patch('marketing_ia.views.time.sleep')
-    @patch('marketing_ia.views.enviar_post_webhook')
-    def test_pausa_entre_um_disparo_e_outro_mas_nao_depois_do_ultimo(self, mock_enviar, mock_sleep):
-        from .views import _enviar_lote_webhook_em_background
+        mock_post.assert_not_called()
+        entrega = EntregaWebhook.objects.get()
+        self.assertEqual(entrega.origem_id, self.post1.pk)
+        self.assertEqual(entrega.url, 'https://exemplo.com/hook')
+        self.assertEqual(entrega.payload['post_id'], self.post1.pk)
+        self.assertEqual(entrega.criado_por, self.user)
 
+    def test_escalona_um_disparo_depois_do_outro(self):
         post3 = PostPromocional.objects.create(
             anuncio=_anuncio_persistido(external_id='lote-envio-3'), lote=self.lote,
             imagem='marketing_ia/posts/x/3.jpg', legenda='Legenda 3',
         )
-        mock_enviar.return_value = {'sucesso': True, 'status_code': 200, 'erro': None}
+        self._enviar_lote()
+
+        # post1 + post3 (post2 está descartado) = 2 entregas, separadas pelo intervalo.
+        primeira = EntregaWebhook.objects.get(origem_id=self.post1.pk)
+        segunda = EntregaWebhook.objects.get(origem_id=post3.pk)
+        self.assertEqual(
+            abs((segunda.disponivel_em - primeira.disponivel_em).total_seconds()),
+            views.INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS,
+        )
+        self.assertEqual(primeira.fila, segunda.fila)
+        self.assertTrue(primeira.fila)
+
+    @patch('configuracoes.outbox.requests.post')
+    def test_worker_atrasado_ainda_envia_um_post_por_vez(self, mock_post):
+        mock_post.return_value = Mock(status_code=200, text='ok')
+        for indice in range(3, 6):
+            PostPromocional.objects.create(
+                anuncio=_anuncio_persistido(external_id=f'lote-envio-{indice}'), lote=self.lote,
+                imagem=f'marketing_ia/posts/x/{indice}.jpg', legenda=f'Legenda {indice}',
+            )
+        self._enviar_lote()
+        EntregaWebhook.objects.update(disponivel_em=timezone.now())
+
+        self.assertEqual([processar_entregas_pendentes() for _ in range(5)], [1, 1, 1, 1, 0])
 
-        _enviar_lote_webhook_em_background(self.lote.pk, self.webhook.pk, self.user.pk)
+    @patch('configuracoes.outbox.requests.post')
+    def test_worker_registra_envio_do_post(self, mock_post):
+        mock_post.return_value = Mock(status_code=200, text='ok')
+        self._enviar_lote()
 
-        # post1 + post3 (post2 está descartado) = 2 envios -> 1 pausa entre eles.
-        self.assertEqual(mock_enviar.call_count, 2)
-        mock_sleep.assert_called_once_with(views.INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS)
-        self.assertEqual(post3.envios.count(), 1)
+        processar_entregas_pendentes()
 
-    @patch('marketing_ia.views.time.sleep')
-    @patch('marketing_ia.views.enviar_post_webhook')
-    def test_conta_falhas_separadamente(self, mock_enviar, mock_sleep):
-        from .views import _enviar_lote_webhook_em_background
+        self.assertEqual(self.post1.envios.count(), 1)
+        envio = self.post1.envios.first()
+        self.assertTrue(envio.sucesso)
+        self.assertEqual(envio.webhook, self.webhook)
+        self.assertEqual(envio.enviado_por, self.user)
+        self.assertEqual(self.post2.envios.count(), 0)
 
-        mock_enviar.return_value = {'sucesso': False, 'status_code': 500, 'erro': 'falhou'}
-        _enviar_lote_webhook_em_background(self.lote.pk, self.webhook.pk, self.user.pk)
+    @patch('configuracoes.outbox.requests.post')
+    def test_falha_definitiva_registra_envio_sem_sucesso(self, mock_post):
+        mock_post.return_value = Mock(status_code=400, text='payload invalido')
+        self._enviar_lote()
 
-        self.assertFalse(self.post1.envios.first().sucesso)
+        processar_entregas_pendentes()
 
-    def test_sem_posts_nao_quebra(self):
-        lote_vazio = LoteGeracao.objects.create(status='CONCLUIDO', total_alvo=0, total_gerado=0)
-        from .views import _enviar_lote_webhook_em_background
-        _enviar_lote_webhook_em_background(lote_vazio.pk, self.webhook.pk, self.user.pk)
+        envio = self.post1.envios.get()
+        self.assertFalse(envio.sucesso)
+        self.assertEqual(envio.status_code, 400)
 
 
 class EmojiPngColoridoTests(TestCase):
@@ -1472,9 +2354,8 @@ class CombinadosViewsTests(TestCase):
         mock_delete.assert_called_once_with('marketing_ia/combinados/x.jpg')
         self.assertFalse(PostCombinado.objects.filter(pk=post.pk).exists())
 
-    @patch('marketing_ia.views.enviar_post_combinado_webhook')
-    def test_enviar_webhook_view_chama_funcao_de_envio(self, mock_enviar):
-        mock_enviar.return_value = {'sucesso': True, 'status_code': 200, 'erro': None}
+    @patch('requests.post')
+    def test_enviar_webhook_view_enfileira_o_combinado(self, mock_post):
         post = PostCombinado.objects.create(
             quantidade=2, criterio='MESMO_TIPO', imagem='marketing_ia/combinados/x.jpg', legenda='L',
         )
@@ -1485,4 +2366,7 @@ class CombinadosViewsTests(TestCase):
             reverse('marketing_combinado_enviar_webhook', args=[post.pk]), {'webhook_id': webhook.pk},
         )
         self.assertEqual(resp.status_code, 302)
-        mock_enviar.assert_called_once_with(post, webhook)
+        mock_post.assert_not_called()
+        entrega = EntregaWebhook.objects.get(origem_id=post.pk)
+        self.assertEqual(entrega.payload['evento'], 'post_combinado')
+        self.assertEqual(len(entrega.payload['veiculos']), 2)
@@ -1,18 +1,20 @@
 import io
 import json
 import threading
-import time
+from datetime import timedelta
 from decimal import Decimal
 from types import SimpleNamespace
 
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db import connection
+from django.db import connection, transaction
 from django.db.models import Count
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.views.decorators.http import require_POST
 
 from configuracoes.access import require_module_action
@@ -21,18 +23,19 @@ from configuracoes.models import ConfiguracaoIntegracoes, WebhookIntegracao
 from . import image_overlay
 from .ai_promocional import baixar_foto
 from .models import (
-    EnvioWebhook, LayoutOverlay, LoteGeracao, PostCombinado, PostPromocional, PreviewPost, SincronizacaoEstoque,
+    LayoutOverlay, LoteGeracao, PostCombinado, PostPromocional, PreviewPost, SincronizacaoEstoque,
     VeiculoAnuncio,
 )
 from .services import (
     GeracaoPostError, gerar_post_combinado, gerar_posts_em_lote, gerar_preview_post,
     salvar_preview_como_post, sincronizar_estoque, sugerir_grupos_combinados,
 )
-from .webhooks import enviar_post_combinado_webhook, enviar_post_webhook
+from .webhooks import enfileirar_post_combinado_webhook, enfileirar_post_webhook
 
-# Espaço entre um disparo e outro no envio em massa (marketing_enviar_lote_webhook)
-# — um post de cada vez, não tudo de uma rajada só, pra não sobrecarregar/
-# atropelar o webhook receptor (ex: fluxo do n8n processando um de cada vez).
+# Espaço mínimo entre um disparo e outro no envio em massa (marketing_enviar_lote_webhook).
+# Quem garante "um de cada vez" é a fila do outbox (marketing_ia.webhooks.fila_do_webhook):
+# o post seguinte só sai depois que o anterior terminou; o disponivel_em escalonado
+# ainda dá esse respiro entre eles pro webhook receptor (ex: fluxo do n8n).
 INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS = 1.5
 
 
@@ -45,6 +48,7 @@ def _executar_sincronizacao_em_background(sync_id):
             resultado=(
                 f"{resultado['total']} anúncios no site — "
                 f"{resultado['criados']} novo(s), {resultado['atualizados']} atualizado(s), "
+                f"{resultado['inalterados']} sem alteração, "
                 f"{resultado['desativados']} saiu(íram) do estoque."
             ),
         )
@@ -55,6 +59,8 @@ def _executar_sincronizacao_em_background(sync_id):
             resultado=f'Falha na sincronização: {exc}',
         )
     finally:
+        # update() nao dispara post_save: invalida o cache do singleton na mao.
+        SincronizacaoEstoque.invalidar_cache_singleton()
         connection.close()
 
 
@@ -299,12 +305,27 @@ def gerar_preview(request, pk):
     })
 
 
+# A imagem de uma prévia nunca muda (gerar de novo cria outra prévia): o navegador pode
+# guardar e, passado o prazo, revalida pelo ETag (sha256 do conteúdo) com um 304.
+PREVIEW_IMAGEM_MAX_AGE = 24 * 3600
+
+
 @require_module_action('marketing_ia', 'visualizar')
 def preview_imagem(request, preview_id):
-    """Serve os bytes da imagem de uma prévia direto do banco (nunca vai pro S3
-    até ser confirmada)."""
-    preview = get_object_or_404(PreviewPost, pk=preview_id)
-    return HttpResponse(bytes(preview.imagem_bytes), content_type=preview.imagem_mime_type)
+    """Serve a imagem de uma prévia a partir do storage, em streaming, com ETag
+    forte e Cache-Control privado. If-None-Match igual responde 304 sem abrir o
+    arquivo: recarregar a prévia custa só uma consulta pequena ao banco."""
+    preview = get_object_or_404(
+        PreviewPost.objects.only('imagem', 'imagem_sha256', 'imagem_mime_type'), pk=preview_id,
+    )
+    etag = quote_etag(preview.imagem_sha256) if preview.imagem_sha256 else None
+    resposta = get_conditional_response(request, etag=etag)
+    if resposta is None:
+        resposta = FileResponse(preview.imagem.open('rb'), content_type=preview.imagem_mime_type)
+    if etag:
+        resposta['ETag'] = etag
+    patch_cache_control(resposta, private=True, max_age=PREVIEW_IMAGEM_MAX_AGE)
+    return resposta
 
 
 @require_module_action('marketing_ia', 'criar')
@@ -481,59 +502,34 @@ def descartar_lote(request, lote_id):
     return redirect('marketing_revisao_lote', lote_id=lote.pk)
 
 
-def _enviar_lote_webhook_em_background(lote_id, webhook_id, usuario_id):
-    """Dispara os posts do lote pro webhook um de cada vez, com uma pequena
-    pausa entre um envio e outro (INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS) —
-    evita mandar tudo de uma rajada só, que podia sobrecarregar/atropelar o
-    lado receptor (ex: workflow do n8n processando post por post). Roda em
-    background pra não segurar a requisição pelo tempo total de todos os
-    envios + pausas."""
-    webhook = WebhookIntegracao.objects.filter(pk=webhook_id).first()
-    if not webhook:
-        return
-    try:
-        posts = list(LoteGeracao.objects.get(pk=lote_id).posts.exclude(status='DESCARTADO'))
-        for indice, post in enumerate(posts):
-            resultado = enviar_post_webhook(post, webhook)
-            EnvioWebhook.objects.create(
-                post=post,
-                webhook=webhook,
-                enviado_por_id=usuario_id,
-                sucesso=resultado['sucesso'],
-                status_code=resultado['status_code'],
-                erro=resultado['erro'],
-            )
-            if indice < len(posts) - 1:
-                time.sleep(INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS)
-    finally:
-        connection.close()
-
-
 @require_module_action('marketing_ia', 'editar')
 @require_POST
 def enviar_lote_webhook(request, lote_id):
     """Envia TODOS os posts do lote (exceto os descartados) pro webhook
-    escolhido, um de cada vez (com pausa entre os disparos) em segundo
-    plano, em vez de precisar clicar 'Enviar' post por post — pensado pro
-    fluxo de 'gerar em massa e mandar tudo de uma vez'."""
+    escolhido, em vez de precisar clicar 'Enviar' post por post — pensado pro
+    fluxo de 'gerar em massa e mandar tudo de uma vez'. Os posts vão pro outbox
+    de webhooks na fila do webhook, então o worker processar_webhooks dispara um
+    de cada vez, na ordem, com pelo menos INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS
+    entre um e outro."""
     lote = get_object_or_404(LoteGeracao, pk=lote_id)
     webhook = get_object_or_404(WebhookIntegracao, pk=request.POST.get('webhook_id'), ativo=True)
 
-    total = lote.posts.exclude(status='DESCARTADO').count()
-    if not total:
+    posts = list(lote.posts.exclude(status='DESCARTADO'))
+    if not posts:
         messages.warning(request, 'Não há posts pra enviar neste lote (todos foram descartados).')
         return redirect('marketing_revisao_lote', lote_id=lote.pk)
 
-    thread = threading.Thread(
-        target=_enviar_lote_webhook_em_background,
-        args=(lote.pk, webhook.pk, request.user.pk),
-        daemon=True,
-    )
-    thread.start()
+    inicio = timezone.now()
+    with transaction.atomic():
+        for indice, post in enumerate(posts):
+            enfileirar_post_webhook(
+                post, webhook, usuario=request.user,
+                disponivel_em=inicio + timedelta(seconds=indice * INTERVALO_ENVIO_LOTE_WEBHOOK_SEGUNDOS),
+            )
 
     messages.success(
         request,
-        f'Envio de {total} post(s) pro webhook "{webhook.nome}" iniciado em segundo plano, um de cada vez.',
+        f'Envio de {len(posts)} post(s) pro webhook "{webhook.nome}" iniciado em segundo plano, um de cada vez.',
     )
     return redirect('marketing_revisao_lote', lote_id=lote.pk)
 
@@ -544,21 +540,12 @@ def enviar_post_webhook_view(request, pk):
     post = get_object_or_404(PostPromocional, pk=pk)
     webhook = get_object_or_404(WebhookIntegracao, pk=request.POST.get('webhook_id'), ativo=True)
 
-    resultado = enviar_post_webhook(post, webhook)
-    EnvioWebhook.objects.create(
-        post=post,
-        webhook=webhook,
-        enviado_por=request.user,
-        sucesso=resultado['sucesso'],
-        status_code=resultado['status_code'],
-        erro=resultado['erro'],
+    enfileirar_post_webhook(post, webhook, usuario=request.user)
+    messages.success(
+        request,
+        f'Post enviado para a fila do webhook "{webhook.nome}"; o resultado aparece no último envio.',
     )
 
-    if resultado['sucesso']:
-        messages.success(request, f'Post enviado para o webhook "{webhook.nome}".')
-    else:
-        messages.error(request, f'Falha ao enviar para "{webhook.nome}": {resultado["erro"]}')
-
     if post.lote_id:
         return redirect('marketing_revisao_lote', lote_id=post.lote_id)
     return redirect('marketing_veiculo_detail', pk=post.anuncio_id)
@@ -762,9 +749,6 @@ def descartar_combinado(request, pk):
 def enviar_combinado_webhook_view(request, pk):
     post = get_object_or_404(PostCombinado, pk=pk)
     webhook = get_object_or_404(WebhookIntegracao, pk=request.POST.get('webhook_id'), ativo=True)
-    resultado = enviar_post_combinado_webhook(post, webhook)
-    if resultado['sucesso']:
-        messages.success(request, f'Post combinado enviado para o webhook "{webhook.nome}".')
-    else:
-        messages.error(request, f'Falha ao enviar para "{webhook.nome}": {resultado["erro"]}')
+    enfileirar_post_combinado_webhook(post, webhook, usuario=request.user)
+    messages.success(request, f'Post combinado enviado para a fila do webhook "{webhook.nome}".')
     return redirect('marketing_combinados_list')
@@ -1,11 +1,11 @@
-import logging
-
-import requests
-
-logger = logging.getLogger(__name__)
+from configuracoes.outbox import enfileirar_entrega
 
 WEBHOOK_TIMEOUT_SECONDS = 8
 
+# Valores de EntregaWebhook.origem usados pelo marketing_ia.
+ORIGEM_POST = 'marketing_ia.post'
+ORIGEM_COMBINADO = 'marketing_ia.combinado'
+
 
 def montar_payload(post):
     anuncio = post.anuncio
@@ -26,21 +26,29 @@ def montar_payload(post):
     }
 
 
-def enviar_post_webhook(post, webhook):
+def fila_do_webhook(webhook):
+    """Posts pro mesmo webhook saem um de cada vez (o fluxo do n8n processa um por vez)."""
+    return f'marketing:{webhook.pk}'
+
+
+def enfileirar_post_webhook(post, webhook, usuario=None, disponivel_em=None):
     """
-    Envia o post (link da imagem no S3/MinIO + legenda) para a URL do webhook.
-    Retorna um dict {'sucesso': bool, 'status_code': int|None, 'erro': str|None}
-    — nunca levanta exceção, para o caller sempre poder registrar o resultado.
+    Coloca o post (link da imagem no S3/MinIO + legenda) no outbox de webhooks
+    (configuracoes.EntregaWebhook); o worker processar_webhooks faz o POST com retry
+    e, ao terminar, registra o EnvioWebhook do post (ver marketing_ia.signals).
     """
-    payload = montar_payload(post)
-    try:
-        response = requests.post(webhook.url, json=payload, timeout=WEBHOOK_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        return {'sucesso': True, 'status_code': response.status_code, 'erro': None}
-    except requests.exceptions.RequestException as exc:
-        status_code = getattr(getattr(exc, 'response', None), 'status_code', None)
-        logger.warning('Falha ao enviar post %s para webhook %s: %s', post.pk, webhook.pk, exc)
-        return {'sucesso': False, 'status_code': status_code, 'erro': str(exc)[:255]}
+    return enfileirar_entrega(
+        webhook.url,
+        montar_payload(post),
+        timeout=WEBHOOK_TIMEOUT_SECONDS,
+        servico=webhook.slug,
+        webhook=webhook,
+        origem=ORIGEM_POST,
+        origem_id=post.pk,
+        criado_por=usuario,
+        disponivel_em=disponivel_em,
+        fila=fila_do_webhook(webhook),
+    )
 
 
 def montar_payload_combinado(post):
@@ -66,15 +74,17 @@ def montar_payload_combinado(post):
     }
 
 
-def enviar_post_combinado_webhook(post, webhook):
-    """Mesma lógica de enviar_post_webhook, só que pro payload com a lista de
+def enfileirar_post_combinado_webhook(post, webhook, usuario=None):
+    """Mesma lógica de enfileirar_post_webhook, só que pro payload com a lista de
     veículos do combinado em vez de um único 'veiculo'."""
-    payload = montar_payload_combinado(post)
-    try:
-        response = requests.post(webhook.url, json=payload, timeout=WEBHOOK_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        return {'sucesso': True, 'status_code': response.status_code, 'erro': None}
-    except requests.exceptions.RequestException as exc:
-        status_code = getattr(getattr(exc, 'response', None), 'status_code', None)
-        logger.warning('Falha ao enviar combinado %s para webhook %s: %s', post.pk, webhook.pk, exc)
-        return {'sucesso': False, 'status_code': status_code, 'erro': str(exc)[:255]}
+    return enfileirar_entrega(
+        webhook.url,
+        montar_payload_combinado(post),
+        timeout=WEBHOOK_TIMEOUT_SECONDS,
+        servico=webhook.slug,
+        webhook=webhook,
+        origem=ORIGEM_COMBINADO,
+        origem_id=post.pk,
+        criado_por=usuario,
+        fila=fila_do_webhook(webhook),
+    )
@@ -1,8 +1,8 @@
-from .models import Notificacao
+from .utils import contar_nao_lidas
 
 def unread_notifications_context(request):
     user = getattr(request, 'user', None)
     if user and user.is_authenticated:
-        unread_count = Notificacao.objects.filter(usuario=user, lida=False).count()
-        return {'unread_notifications_count': unread_count}
+        # Uma linha pela PK (ContadorNotificacoes) em vez de COUNT nas notificacoes.
+        return {'unread_notifications_count': contar_nao_lidas(user)}
     return {}
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 from notificacoes.models import Notificacao
+from notificacoes.utils import criar_notificacoes_em_massa
 from usuarios.models import Profile
 
 class Command(BaseCommand):
@@ -19,32 +20,24 @@ class Command(BaseCommand):
             last_login__lt=periodo_inatividade,
             is_superuser=False,
             is_staff=False
-        )
-
-        if not usuarios_inativos.exists():
-            self.stdout.write(self.style.SUCCESS('Nenhum usuário inativo encontrado.'))
-            return
+        ).values_list('id', 'username', 'last_login')
 
         # Encontra todos os administradores do sistema
-        admins = User.objects.filter(profile__nivel_acesso=Profile.NivelAcesso.ADMIN)
+        admins = list(User.objects.filter(profile__nivel_acesso=Profile.NivelAcesso.ADMIN).values_list('id', flat=True))
 
-        if not admins.exists():
+        if not admins:
             self.stdout.write(self.style.WARNING('Nenhum administrador encontrado para notificar.'))
             return
 
-        # Para cada usuário inativo, cria uma notificação para cada administrador
-        for usuario in usuarios_inativos:
-            mensagem = f"Alerta de Inatividade: O usuário '{usuario.username}' não acessa o sistema há mais de 3 dias."
-            
-            for admin in admins:
-                # 'get_or_create' é usado para evitar criar notificações duplicadas.
-                # Se uma notificação idêntica para o mesmo admin já existir, nada acontece.
-                notificacao, criada = Notificacao.objects.get_or_create(
-                    usuario=admin,
-                    mensagem=mensagem,
-                    defaults={'lida': False} # Só define 'lida=False' se estiver criando
-                )
-                if criada:
-                    self.stdout.write(f"Notificação criada para '{admin.username}' sobre '{usuario.username}'.")
-
-        self.stdout.write(self.style.SUCCESS('Verificação de inatividade concluída.'))
\ No newline at end of file
+        def alertas():
+            # Um alerta por (usuario inativo, admin); o dia do ultimo login entra na chave,
+            # entao cada periodo de inatividade gera um alerta so, por mais que o job rode.
+            for usuario_id, username, last_login in usuarios_inativos.iterator(chunk_size=2000):
+                mensagem = f"Alerta de Inatividade: O usuário '{username}' não acessa o sistema há mais de 3 dias."
+                dia = timezone.localtime(last_login).date()
+                for admin_id in admins:
+                    yield Notificacao(usuario_id=admin_id, mensagem=mensagem, referencia_id=usuario_id, dia=dia)
+
+        criadas = criar_notificacoes_em_massa(Notificacao.Tipo.USUARIO_INATIVO, alertas())
+
+        self.stdout.write(self.style.SUCCESS(f'Verificação de inatividade concluída: {criadas} notificação(ões) criada(s).'))
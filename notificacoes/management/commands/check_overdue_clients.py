@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from configuracoes.models import ConfiguracaoIntegracoes
 from notificacoes.models import Notificacao
+from notificacoes.utils import criar_notificacoes_em_massa
 from clientes.models import Cliente
 from usuarios.models import Profile
 
@@ -19,37 +20,34 @@ class Command(BaseCommand):
         # Encontra clientes com contato atrasado que não estão finalizados
         clientes_atrasados = Cliente.objects.filter(
             data_proximo_contato__lte=timezone.now()
-        ).exclude(status_negociacao=Cliente.StatusNegociacao.FINALIZADO)
-
-        if not clientes_atrasados.exists():
-            self.stdout.write(self.style.SUCCESS('Nenhum cliente com contato atrasado encontrado.'))
-            return
+        ).exclude(
+            status_negociacao=Cliente.StatusNegociacao.FINALIZADO
+        ).values_list('id', 'nome_cliente', 'vendedor_id', 'data_proximo_contato')
 
         # Busca todos os administradores
-        admins = User.objects.filter(profile__nivel_acesso=Profile.NivelAcesso.ADMIN)
-
-        for cliente in clientes_atrasados:
-            vendedor = cliente.vendedor
-            mensagem = f"Contato Atrasado: O cliente '{cliente.nome_cliente}' precisa de atenção. Próximo contato era em {cliente.data_proximo_contato.strftime('%d/%m/%Y')}."
-
-            # 1. Notifica o vendedor responsável pelo cliente
-            if vendedor:
-                Notificacao.objects.get_or_create(
-                    usuario=vendedor,
-                    mensagem=mensagem,
-                    defaults={'lida': False}
-                )
-                self.stdout.write(f"Notificação criada para o vendedor '{vendedor.username}' sobre o cliente '{cliente.nome_cliente}'.")
-
-            # 2. Notifica todos os administradores
-            for admin in admins:
-                # Evita duplicidade se o vendedor já for um admin
-                if not vendedor or vendedor.id != admin.id:
-                    Notificacao.objects.get_or_create(
-                        usuario=admin,
-                        mensagem=f"Alerta geral: {mensagem}", # Mensagem pode ser diferenciada para o admin
-                        defaults={'lida': False}
-                    )
-                    self.stdout.write(f"Notificação criada para o admin '{admin.username}' sobre o cliente '{cliente.nome_cliente}'.")
-
-        self.stdout.write(self.style.SUCCESS('Verificação de contatos atrasados concluída.'))
\ No newline at end of file
+        admins = list(User.objects.filter(profile__nivel_acesso=Profile.NivelAcesso.ADMIN).values_list('id', flat=True))
+
+        def alertas():
+            # A chave (tipo, cliente, usuario, dia do proximo contato) faz cada atraso
+            # gerar um alerta so, mesmo com o job rodando todo dia.
+            for cliente_id, nome_cliente, vendedor_id, proximo_contato in clientes_atrasados.iterator(chunk_size=2000):
+                dia = timezone.localtime(proximo_contato).date()
+                mensagem = f"Contato Atrasado: O cliente '{nome_cliente}' precisa de atenção. Próximo contato era em {dia.strftime('%d/%m/%Y')}."
+
+                # 1. Notifica o vendedor responsável pelo cliente
+                if vendedor_id:
+                    yield Notificacao(usuario_id=vendedor_id, mensagem=mensagem, referencia_id=cliente_id, dia=dia)
+
+                # 2. Notifica todos os administradores (menos o proprio vendedor, se ele for admin)
+                for admin_id in admins:
+                    if admin_id != vendedor_id:
+                        yield Notificacao(
+                            usuario_id=admin_id,
+                            mensagem=f"Alerta geral: {mensagem}",
+                            referencia_id=cliente_id,
+                            dia=dia,
+                        )
+
+        criadas = criar_notificacoes_em_massa(Notificacao.Tipo.CONTATO_ATRASADO, alertas())
+
+        self.stdout.write(self.style.SUCCESS(f'Verificação de contatos atrasados concluída: {criadas} notificação(ões) criada(s).'))
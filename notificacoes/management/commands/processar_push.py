@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notificacoes.push import limpar_envios_antigos, processar_envios_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia os pushes web pendentes (EnvioPush), em paralelo e com retry, e remove as '
+        'inscricoes expiradas. Sem opcoes processa o que estiver vencido e sai; com '
+        '--duracao/--loop continua consultando a fila. Varios workers podem rodar ao mesmo '
+        'tempo (SKIP LOCKED).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Roda ate ser interrompido.')
+        parser.add_argument(
+            '--duracao', type=float, default=0,
+            help='Continua consultando a fila por N segundos (ex: 55 no cron de minuto em minuto).',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help='Pausa em segundos quando a fila esta vazia (padrao: 1).',
+        )
+        parser.add_argument('--lote', type=int, default=None, help='Envios reivindicados por ciclo.')
+        parser.add_argument('--concorrencia', type=int, default=None, help='Envios simultaneos por ciclo.')
+
+    def handle(self, *args, **options):
+        apagados = limpar_envios_antigos()
+        if apagados:
+            self.stdout.write(f'{apagados} envio(s) de push antigo(s) removido(s).')
+
+        fim = time.monotonic() + options['duracao']
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                processadas = processar_envios_pendentes(options['lote'], options['concorrencia'])
+                total += processadas
+                if processadas:
+                    continue
+                if not options['loop'] and time.monotonic() >= fim:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        # Roda a cada minuto no cron: so escreve no log quando houve trabalho.
+        if total or options['verbosity'] > 1:
+            self.stdout.write(self.style.SUCCESS(f'Concluido: {total} push(es) processado(s).'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificacoes', '0002_notificacao_url'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='dia',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='referencia_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='tipo',
+            field=models.CharField(blank=True, choices=[('USUARIO_INATIVO', 'Usuário inativo'), ('CONTATO_ATRASADO', 'Contato atrasado')], default='', max_length=30),
+        ),
+        migrations.AddConstraint(
+            model_name='notificacao',
+            constraint=models.UniqueConstraint(condition=models.Q(('tipo', ''), _negated=True), fields=('tipo', 'referencia_id', 'usuario', 'dia'), name='notificacao_alerta_unico'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def preencher_contadores(apps, schema_editor):
+    Notificacao = apps.get_model('notificacoes', 'Notificacao')
+    ContadorNotificacoes = apps.get_model('notificacoes', 'ContadorNotificacoes')
+    totais = (
+        Notificacao.objects.filter(lida=False)
+        .values('usuario_id').annotate(total=Count('id')).order_by()
+    )
+    ContadorNotificacoes.objects.bulk_create(
+        [ContadorNotificacoes(usuario_id=linha['usuario_id'], nao_lidas=linha['total']) for linha in totais],
+        batch_size=1000,
+    )
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('notificacoes', '0003_notificacao_alertas_em_massa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorNotificacoes',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contador_notificacoes', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('nao_lidas', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['usuario', '-data_criacao'], name='notificacao_usuario_data'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('lida', False)), fields=['usuario'], name='notificacao_nao_lidas'),
+        ),
+        migrations.RunPython(preencher_contadores, noop_reverse),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificacoes', '0004_contador_nao_lidas'),
+        ('webpush', '0005_auto_20230614_1529'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioPush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(default=dict)),
+                ('ttl', models.PositiveIntegerField(default=1000)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=10)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('max_tentativas', models.PositiveSmallIntegerField(default=5)),
+                ('disponivel_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reservado_ate', models.DateTimeField(blank=True, null=True)),
+                ('reserva', models.CharField(blank=True, editable=False, max_length=32)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('ultimo_erro', models.CharField(blank=True, max_length=255)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+                ('inscricao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios_push', to='webpush.subscriptioninfo')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios_push', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Envio de Push',
+                'verbose_name_plural': 'Envios de Push',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'disponivel_em'], name='enviopush_fila_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,116 @@
+import re
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q
+from django.utils import timezone
+
+LOTE = 1000
+
+# Mensagens gravadas por check_inactivity/check_overdue_clients antes da chave
+# (tipo, referencia_id, usuario, dia). A data do atraso saia em UTC (strftime direto).
+INATIVIDADE_RE = re.compile(
+    r"^Alerta de Inatividade: O usuário '(?P<username>.+)' não acessa o sistema há mais de 3 dias\.$"
+)
+ATRASO_RE = re.compile(
+    r"^(?:Alerta geral: )?Contato Atrasado: O cliente '(?P<nome>.+)' precisa de atenção\. "
+    r"Próximo contato era em (?P<data>\d{2}/\d{2}/\d{4})\.$"
+)
+
+
+def _inativos(User, usernames):
+    return {
+        username: (usuario_id, last_login)
+        for usuario_id, username, last_login in User.objects.filter(username__in=usernames)
+        .values_list('id', 'username', 'last_login')
+    }
+
+
+def _atrasados(Cliente, nomes):
+    atrasados = {}
+    for cliente_id, nome, proximo_contato in (
+        Cliente.objects.filter(nome_cliente__in=nomes)
+        .order_by('pk').values_list('id', 'nome_cliente', 'data_proximo_contato')
+    ):
+        # Homonimos com a mesma data: fica o primeiro (o outro pode ganhar um alerta a mais).
+        chave = (nome, proximo_contato.strftime('%d/%m/%Y'))
+        atrasados.setdefault(chave, (cliente_id, timezone.localtime(proximo_contato).date()))
+    return atrasados
+
+
+def marcar_alertas_antigos(apps, schema_editor):
+    """
+    Preenche tipo/referencia_id/dia dos alertas antigos que ainda valem para o evento
+    atual (mesmo periodo de inatividade, mesmo proximo contato), para o primeiro
+    check_inactivity/check_overdue_clients depois do deploy nao repetir o alerta.
+    Alerta de um evento que ja mudou fica sem tipo: o job gera o alerta novo normalmente.
+    """
+    Notificacao = apps.get_model('notificacoes', 'Notificacao')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Cliente = apps.get_model('clientes', 'Cliente')
+
+    antigos = Notificacao.objects.filter(tipo='').filter(
+        Q(mensagem__startswith='Alerta de Inatividade: ')
+        | Q(mensagem__startswith='Contato Atrasado: ')
+        | Q(mensagem__startswith='Alerta geral: Contato Atrasado: ')
+    ).only('pk', 'usuario_id', 'mensagem', 'data_criacao').order_by('pk')
+    vistas = set()
+    ultimo = 0
+    while True:
+        # Paginado por pk: o UPDATE tira as linhas do filtro (tipo='') durante a leitura.
+        lote = list(antigos.filter(pk__gt=ultimo)[:LOTE])
+        if not lote:
+            break
+        ultimo = lote[-1].pk
+
+        casos = [(n, INATIVIDADE_RE.match(n.mensagem), ATRASO_RE.match(n.mensagem)) for n in lote]
+        inativos = _inativos(User, {inativo['username'] for _, inativo, _ in casos if inativo})
+        atrasados = _atrasados(Cliente, {atraso['nome'] for _, _, atraso in casos if atraso})
+
+        marcadas = []
+        for notificacao, inativo, atraso in casos:
+            if inativo:
+                usuario = inativos.get(inativo['username'])
+                # Logou depois do alerta: o alerta era de outro periodo de inatividade.
+                if not usuario or not usuario[1] or usuario[1] > notificacao.data_criacao:
+                    continue
+                tipo, referencia_id, dia = 'USUARIO_INATIVO', usuario[0], timezone.localtime(usuario[1]).date()
+            elif atraso:
+                cliente = atrasados.get((atraso['nome'], atraso['data']))
+                if not cliente:
+                    continue
+                tipo, (referencia_id, dia) = 'CONTATO_ATRASADO', cliente
+            else:
+                continue
+            chave = (tipo, referencia_id, notificacao.usuario_id, dia)
+            if chave in vistas:
+                continue
+            vistas.add(chave)
+            notificacao.tipo, notificacao.referencia_id, notificacao.dia = tipo, referencia_id, dia
+            marcadas.append(notificacao)
+
+        # O job pode ter rodado depois da 0003: nao colide com alertas que ja tem a chave.
+        existentes = set(
+            Notificacao.objects.exclude(tipo='')
+            .filter(referencia_id__in={n.referencia_id for n in marcadas})
+            .values_list('tipo', 'referencia_id', 'usuario_id', 'dia')
+        )
+        marcadas = [n for n in marcadas if (n.tipo, n.referencia_id, n.usuario_id, n.dia) not in existentes]
+        Notificacao.objects.bulk_update(marcadas, ['tipo', 'referencia_id', 'dia'], batch_size=LOTE)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0014_cliente_whatsapp_normalizado'),
+        ('notificacoes', '0005_enviopush'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(marcar_alertas_antigos, noop_reverse),
+    ]
@@ -1,15 +1,96 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Notificacao(models.Model):
+    class Tipo(models.TextChoices):
+        # Alertas gerados em massa pelos jobs agendados; notificacoes avulsas ficam sem tipo.
+        USUARIO_INATIVO = 'USUARIO_INATIVO', 'Usuário inativo'
+        CONTATO_ATRASADO = 'CONTATO_ATRASADO', 'Contato atrasado'
+
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notificacoes')
     mensagem = models.CharField(max_length=255)
     url = models.CharField(max_length=500, blank=True, null=True)
     lida = models.BooleanField(default=False)
     data_criacao = models.DateTimeField(auto_now_add=True)
+    # Chave de deduplicacao dos alertas em massa (tipo, referencia, usuario, dia):
+    # referencia_id e o id do objeto do alerta (cliente no atrasado, usuario no inativo)
+    # e dia e a data do evento (proximo contato, ultimo login).
+    tipo = models.CharField(max_length=30, choices=Tipo.choices, blank=True, default='')
+    referencia_id = models.PositiveBigIntegerField(null=True, blank=True)
+    dia = models.DateField(null=True, blank=True)
 
     def __str__(self):
         return f"Notificação para {self.usuario.username}: {self.mensagem}"
 
     class Meta:
-        ordering = ['-data_criacao']
\ No newline at end of file
+        ordering = ['-data_criacao']
+        indexes = [
+            # Lista e dropdown do sino: notificacoes do usuario, mais recentes primeiro.
+            models.Index(fields=['usuario', '-data_criacao'], name='notificacao_usuario_data'),
+            # Contagem/marcacao das nao lidas (so as nao lidas entram no indice).
+            models.Index(fields=['usuario'], condition=models.Q(lida=False), name='notificacao_nao_lidas'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo', 'referencia_id', 'usuario', 'dia'],
+                condition=~models.Q(tipo=''),
+                name='notificacao_alerta_unico',
+            ),
+        ]
+
+
+class ContadorNotificacoes(models.Model):
+    """
+    Total de notificacoes nao lidas por usuario, lido pelo badge do sino em toda pagina.
+    Mantido pelas funcoes de notificacoes.utils (criar, marcar como lida, apagar);
+    quem alterar Notificacao por fora delas chama recalcular_nao_lidas.
+    """
+    usuario = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='contador_notificacoes',
+    )
+    nao_lidas = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.nao_lidas} não lida(s)"
+
+
+class EnvioPush(models.Model):
+    """Fila do push web: notificar_usuario(s) so grava uma linha por inscricao do usuario
+    (na transacao do chamador) e o worker `manage.py processar_push` envia, em paralelo e
+    com retry. Inscricoes que o servico de push da como mortas (404/410) sao apagadas."""
+
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Pendente'
+        ENVIANDO = 'ENVIANDO', 'Enviando'
+        ENVIADO = 'ENVIADO', 'Enviado'
+        FALHOU = 'FALHOU', 'Falhou'
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='envios_push')
+    inscricao = models.ForeignKey('webpush.SubscriptionInfo', on_delete=models.CASCADE, related_name='envios_push')
+    payload = models.JSONField(default=dict)
+    ttl = models.PositiveIntegerField(default=1000)
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    max_tentativas = models.PositiveSmallIntegerField(default=5)
+    disponivel_em = models.DateTimeField(default=timezone.now)
+    reservado_ate = models.DateTimeField(null=True, blank=True)
+    reserva = models.CharField(max_length=32, blank=True, editable=False)
+
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    ultimo_erro = models.CharField(max_length=255, blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Envio de Push"
+        verbose_name_plural = "Envios de Push"
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'disponivel_em'], name='enviopush_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"Push {self.pk} para {self.usuario_id} ({self.get_status_display()})"
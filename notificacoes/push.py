@@ -0,0 +1,230 @@
+"""
+Fila do push web (notificacoes.EnvioPush).
+
+notificar_usuario/notificar_usuarios so gravam uma linha por inscricao de cada
+destinatario (`enfileirar_push`: duas consultas, qualquer que seja o numero de
+usuarios); o envio acontece no worker `manage.py processar_push`, fora do request.
+Como no outbox de webhooks (configuracoes.outbox), o worker reivindica um lote com
+SELECT ... FOR UPDATE SKIP LOCKED (ou UPDATE condicional no SQLite), envia numa
+ThreadPoolExecutor e reagenda as falhas transitorias com backoff exponencial.
+A reserva cobre o pior caso do lote (todos os envios esgotando PUSH_TIMEOUT) e o
+resultado so e gravado se o envio ainda for deste worker.
+
+Inscricoes que o servico de push responde como mortas (404/410) sao apagadas de uma
+vez no fim do ciclo, levando junto os envios pendentes para elas.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import logging
+import math
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from pywebpush import WebPushException, webpush
+from webpush.models import PushInformation, SubscriptionInfo
+
+from .models import EnvioPush
+
+logger = logging.getLogger(__name__)
+
+ICONE_PADRAO = "/static/images/logo-spagi-192x192.png"
+
+# Respostas do servico de push que significam inscricao expirada/cancelada.
+_STATUS_INSCRICAO_MORTA = {404, 410}
+# 4xx que valem retry; os demais indicam payload/inscricao invalidos e falham de vez.
+_STATUS_4XX_TRANSITORIOS = {408, 425, 429}
+
+
+def montar_payload(mensagem, url=None, titulo="Nova notificação"):
+    return {
+        "head": titulo,
+        "body": mensagem,
+        "icon": ICONE_PADRAO,
+        "url": url or "/notificacoes/",
+    }
+
+
+def enfileirar_push(usuarios, payload, ttl=1000):
+    """Grava um envio por inscricao dos usuarios (objetos ou ids). Retorna quantos entraram na fila."""
+    usuario_ids = {getattr(usuario, 'pk', usuario) for usuario in usuarios}
+    if not usuario_ids:
+        return 0
+    inscricoes = (
+        PushInformation.objects.filter(user_id__in=usuario_ids)
+        .values_list('user_id', 'subscription_id')
+        .distinct()
+    )
+    envios = EnvioPush.objects.bulk_create(
+        [
+            EnvioPush(
+                usuario_id=usuario_id,
+                inscricao_id=inscricao_id,
+                payload=payload,
+                ttl=ttl,
+                max_tentativas=settings.PUSH_MAX_TENTATIVAS,
+            )
+            for usuario_id, inscricao_id in inscricoes
+        ],
+        batch_size=1000,
+    )
+    return len(envios)
+
+
+def calcular_backoff(tentativas):
+    """Segundos ate a proxima tentativa: base * 2^(n-1), limitado a PUSH_BACKOFF_MAX."""
+    base = settings.PUSH_BACKOFF_BASE
+    return min(base * (2 ** max(tentativas - 1, 0)), settings.PUSH_BACKOFF_MAX)
+
+
+def _filtro_elegiveis(agora):
+    return (
+        Q(status=EnvioPush.Status.PENDENTE, disponivel_em__lte=agora)
+        | Q(status=EnvioPush.Status.ENVIANDO, reservado_ate__lt=agora)
+    )
+
+
+def segundos_de_reserva(limite, concorrencia):
+    """
+    Validade da reserva de um lote: PUSH_RESERVA_SEGUNDOS ou, se for maior, o pior caso de
+    `limite` envios em `concorrencia` threads com todos esgotando o PUSH_TIMEOUT.
+    """
+    rodadas = math.ceil(limite / max(concorrencia, 1))
+    # O timeout do requests vale para conectar e para ler: ate 2x por envio.
+    return max(settings.PUSH_RESERVA_SEGUNDOS, rodadas * settings.PUSH_TIMEOUT * 2 + 30)
+
+
+def reivindicar_envios(limite, concorrencia=None):
+    """Marca ate `limite` envios vencidos como ENVIANDO para este worker e os retorna (com a inscricao)."""
+    concorrencia = concorrencia or settings.PUSH_CONCORRENCIA
+    agora = timezone.now()
+    reserva = uuid.uuid4().hex
+    filtro = _filtro_elegiveis(agora)
+
+    with transaction.atomic():
+        candidatos = EnvioPush.objects.filter(filtro).order_by('disponivel_em', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            candidatos = candidatos.select_for_update(skip_locked=True)
+        ids = list(candidatos.values_list('pk', flat=True)[:limite])
+        if not ids:
+            return []
+        EnvioPush.objects.filter(filtro, pk__in=ids).update(
+            status=EnvioPush.Status.ENVIANDO,
+            reserva=reserva,
+            reservado_ate=agora + timedelta(seconds=segundos_de_reserva(limite, concorrencia)),
+            tentativas=F('tentativas') + 1,
+        )
+    return list(
+        EnvioPush.objects.filter(reserva=reserva, status=EnvioPush.Status.ENVIANDO).select_related('inscricao')
+    )
+
+
+def _dados_vapid():
+    webpush_settings = getattr(settings, 'WEBPUSH_SETTINGS', {})
+    chave_privada = webpush_settings.get('VAPID_PRIVATE_KEY')
+    if not chave_privada:
+        return {}
+    return {
+        'vapid_private_key': chave_privada,
+        'vapid_claims': {"sub": f"mailto:{webpush_settings.get('VAPID_ADMIN_EMAIL')}"},
+    }
+
+
+def _enviar(envio):
+    """Criptografa e envia um push (roda nas threads do pool, sem tocar no banco). Retorna (status_code, erro)."""
+    inscricao = envio.inscricao
+    try:
+        resposta = webpush(
+            subscription_info={
+                "endpoint": inscricao.endpoint,
+                "keys": {"p256dh": inscricao.p256dh, "auth": inscricao.auth},
+            },
+            data=json.dumps(envio.payload),
+            ttl=envio.ttl,
+            timeout=settings.PUSH_TIMEOUT,
+            **_dados_vapid(),
+        )
+    except WebPushException as exc:
+        status_code = exc.response.status_code if exc.response is not None else None
+        return status_code, str(exc)
+    except Exception as exc:
+        # Rede fora, timeout, inscricao com chaves invalidas...
+        return None, str(exc) or exc.__class__.__name__
+    return resposta.status_code, ''
+
+
+def _registrar_resultado(envio, status_code, erro):
+    """Grava o resultado so se o envio ainda for deste worker (reserva vencida = outro worker o pegou)."""
+    agora = timezone.now()
+    campos = {
+        'status_code': status_code,
+        'ultimo_erro': (erro or '')[:255],
+        'reserva': '',
+        'reservado_ate': None,
+    }
+
+    definitivo = status_code is not None and 400 <= status_code < 500 and status_code not in _STATUS_4XX_TRANSITORIOS
+    if not erro:
+        campos.update(status=EnvioPush.Status.ENVIADO, enviado_em=agora)
+    elif definitivo or envio.tentativas >= envio.max_tentativas:
+        campos['status'] = EnvioPush.Status.FALHOU
+    else:
+        campos.update(
+            status=EnvioPush.Status.PENDENTE,
+            disponivel_em=agora + timedelta(seconds=calcular_backoff(envio.tentativas)),
+        )
+
+    gravou = EnvioPush.objects.filter(pk=envio.pk, reserva=envio.reserva).update(**campos)
+    if not gravou:
+        logger.info("Push %s: reserva vencida, resultado descartado (outro worker ficou com o envio).", envio.pk)
+        return False
+    if campos['status'] == EnvioPush.Status.FALHOU:
+        logger.warning("Push %s para o usuario %s falhou de vez: %s", envio.pk, envio.usuario_id, erro)
+    elif campos['status'] == EnvioPush.Status.PENDENTE:
+        logger.info("Push %s para o usuario %s reagendado: %s", envio.pk, envio.usuario_id, erro)
+    return True
+
+
+def remover_inscricoes_mortas(inscricao_ids):
+    """Apaga as inscricoes (e, em cascata, PushInformation e envios pendentes delas). Retorna quantas."""
+    inscricao_ids = set(inscricao_ids)
+    if not inscricao_ids:
+        return 0
+    SubscriptionInfo.objects.filter(pk__in=inscricao_ids).delete()
+    logger.info("%s inscricao(oes) de push expirada(s) removida(s).", len(inscricao_ids))
+    return len(inscricao_ids)
+
+
+def processar_envios_pendentes(limite=None, concorrencia=None):
+    """Um ciclo do worker: reivindica, envia em paralelo e grava o resultado. Retorna quantos processou."""
+    limite = limite or settings.PUSH_LOTE
+    concorrencia = concorrencia or settings.PUSH_CONCORRENCIA
+
+    envios = reivindicar_envios(limite, concorrencia)
+    if not envios:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=min(concorrencia, len(envios))) as pool:
+        resultados = list(pool.map(_enviar, envios))
+
+    mortas = set()
+    for envio, (status_code, erro) in zip(envios, resultados):
+        if status_code in _STATUS_INSCRICAO_MORTA:
+            mortas.add(envio.inscricao_id)
+            continue
+        _registrar_resultado(envio, status_code, erro)
+    remover_inscricoes_mortas(mortas)
+    return len(envios)
+
+
+def limpar_envios_antigos(dias=None):
+    """Apaga envios ja concluidos (ENVIADO ou FALHOU) ha mais de `dias` (PUSH_RETENCAO_DIAS)."""
+    dias = settings.PUSH_RETENCAO_DIAS if dias is None else dias
+    limite = timezone.now() - timedelta(days=dias)
+    apagados, _ = EnvioPush.objects.filter(
+        status__in=[EnvioPush.Status.ENVIADO, EnvioPush.Status.FALHOU], criado_em__lt=limite,
+    ).delete()
+    return apagados
@@ -5,7 +5,7 @@ from django.dispatch import receiver
 from django.contrib.auth.models import User
 from clientes.models import Cliente
 from usuarios.models import Profile
-from .utils import notificar_usuario
+from .utils import notificar_usuarios
 
 logger = logging.getLogger(__name__)
 
@@ -18,5 +18,4 @@ def criar_notificacao_novo_lead(sender, instance, created, **kwargs):
         admins = User.objects.filter(profile__nivel_acesso=Profile.NivelAcesso.ADMIN)
         mensagem = f"Novo lead cadastrado: {instance.nome_cliente}."
 
-        for admin in admins:
-            notificar_usuario(admin, mensagem, url="/notificacoes/", titulo="Novo Lead Recebido!")
\ No newline at end of file
+        notificar_usuarios(admins, mensagem, url="/notificacoes/", titulo="Novo Lead Recebido!")
\ No newline at end of file
@@ -1,15 +1,42 @@
+import base64
 from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from io import StringIO
+import os
+import threading
+import time
+from unittest import skipUnless
 from unittest.mock import patch
 
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.apps import apps as django_apps
 from django.contrib.auth.models import User
 from django.core.management import call_command
-from django.test import TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
+from webpush.models import PushInformation, SubscriptionInfo
 
 from clientes.models import Cliente
 from configuracoes.models import ConfiguracaoIntegracoes
 
-from .models import Notificacao
+from .context_processors import unread_notifications_context
+from .models import ContadorNotificacoes, EnvioPush, Notificacao
+from . import push
+from .push import processar_envios_pendentes, reivindicar_envios, segundos_de_reserva
+from .utils import (
+    apagar_notificacoes,
+    contar_nao_lidas,
+    criar_notificacoes_em_massa,
+    marcar_como_lidas,
+    notificar_usuario,
+    notificar_usuarios,
+    recalcular_nao_lidas,
+)
 from .whatsapp import notificar_whatsapp_usuario
 
 
@@ -92,3 +119,493 @@ class CheckOverdueClientsCommandTests(TestCase):
 
     def test_ativado_por_padrao(self):
         self.assertTrue(ConfiguracaoIntegracoes.get_solo().notificar_leads_atrasados)
+
+    def test_rodar_de_novo_nao_duplica(self):
+        call_command('check_overdue_clients', stdout=StringIO())
+        call_command('check_overdue_clients', stdout=StringIO())
+
+        self.assertEqual(Notificacao.objects.filter(tipo=Notificacao.Tipo.CONTATO_ATRASADO).count(), 2)
+
+    def test_novo_atraso_do_mesmo_cliente_gera_novo_alerta(self):
+        call_command('check_overdue_clients', stdout=StringIO())
+        Cliente.objects.filter(pk=self.cliente.pk).update(data_proximo_contato=timezone.now() - timedelta(hours=1))
+
+        call_command('check_overdue_clients', stdout=StringIO())
+
+        self.assertEqual(Notificacao.objects.filter(usuario=self.vendedor, referencia_id=self.cliente.pk).count(), 2)
+
+    def test_vendedor_admin_recebe_um_alerta_so(self):
+        Cliente.objects.filter(pk=self.cliente.pk).update(vendedor=self.admin)
+
+        call_command('check_overdue_clients', stdout=StringIO())
+
+        alertas = Notificacao.objects.filter(usuario=self.admin, tipo=Notificacao.Tipo.CONTATO_ATRASADO)
+        self.assertEqual(alertas.count(), 1)
+        self.assertTrue(alertas.get().mensagem.startswith('Contato Atrasado'))
+
+    def test_consultas_nao_crescem_com_os_clientes(self):
+        def contar_consultas():
+            Notificacao.objects.all().delete()
+            with CaptureQueriesContext(connection) as consultas:
+                call_command('check_overdue_clients', stdout=StringIO())
+            return len(consultas)
+
+        contar_consultas()  # cria o singleton de configuracao
+        poucos = contar_consultas()
+        for indice in range(20):
+            cliente = Cliente.objects.create(
+                vendedor=self.vendedor,
+                nome_cliente=f'Cliente {indice}',
+                whatsapp=f'4199999{indice:04d}',
+                tipo_contato=Cliente.TipoContato.MENSAGEM,
+                proximo_passo=Cliente.ProximoPasso.MENSAGEM,
+            )
+            Cliente.objects.filter(pk=cliente.pk).update(data_proximo_contato=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(contar_consultas(), poucos)
+        self.assertEqual(Notificacao.objects.filter(tipo=Notificacao.Tipo.CONTATO_ATRASADO).count(), 42)
+
+
+class CheckInactivityCommandTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin_inatividade', password='123456')
+        self.admin.profile.nivel_acesso = self.admin.profile.NivelAcesso.ADMIN
+        self.admin.profile.save()
+        self.inativo = User.objects.create_user(username='vendedor_inativo', password='123456')
+        User.objects.filter(pk=self.inativo.pk).update(last_login=timezone.now() - timedelta(days=5))
+
+    def test_um_alerta_por_periodo_de_inatividade(self):
+        call_command('check_inactivity', stdout=StringIO())
+        call_command('check_inactivity', stdout=StringIO())
+        self.assertEqual(Notificacao.objects.filter(usuario=self.admin, referencia_id=self.inativo.pk).count(), 1)
+
+        # Voltou a logar e sumiu de novo: novo alerta.
+        User.objects.filter(pk=self.inativo.pk).update(last_login=timezone.now() - timedelta(days=4))
+        call_command('check_inactivity', stdout=StringIO())
+
+        self.assertEqual(Notificacao.objects.filter(usuario=self.admin, referencia_id=self.inativo.pk).count(), 2)
+
+
+class MarcarAlertasAntigosMigrationTests(TestCase):
+    """Alertas gravados antes da chave (tipo, referencia_id, usuario, dia) nao podem
+    ser repetidos pelo primeiro job depois do deploy (migration 0006)."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin_legado', password='123456')
+        self.admin.profile.nivel_acesso = self.admin.profile.NivelAcesso.ADMIN
+        self.admin.profile.save()
+        self.vendedor = User.objects.create_user(username='vendedor_legado', password='123456')
+        User.objects.filter(pk=self.vendedor.pk).update(last_login=timezone.now() - timedelta(days=5))
+        self.cliente = Cliente.objects.create(
+            vendedor=self.vendedor,
+            nome_cliente='Cliente Legado',
+            whatsapp='41999991111',
+            tipo_contato=Cliente.TipoContato.MENSAGEM,
+            proximo_passo=Cliente.ProximoPasso.MENSAGEM,
+        )
+        self.proximo_contato = timezone.now() - timedelta(days=1)
+        Cliente.objects.filter(pk=self.cliente.pk).update(data_proximo_contato=self.proximo_contato)
+        Notificacao.objects.all().delete()  # aviso de novo lead
+
+    def _migrar(self):
+        migracao = import_module('notificacoes.migrations.0006_marcar_alertas_antigos')
+        migracao.marcar_alertas_antigos(django_apps, None)
+
+    def _alertas_antigos(self, proximo_contato):
+        # Mesmo texto que os jobs gravavam antes (data do atraso em UTC).
+        atraso = (
+            f"Contato Atrasado: O cliente 'Cliente Legado' precisa de atenção. "
+            f"Próximo contato era em {proximo_contato.strftime('%d/%m/%Y')}."
+        )
+        Notificacao.objects.create(usuario=self.vendedor, mensagem=atraso)
+        Notificacao.objects.create(usuario=self.admin, mensagem=f"Alerta geral: {atraso}")
+        Notificacao.objects.create(
+            usuario=self.admin,
+            mensagem="Alerta de Inatividade: O usuário 'vendedor_legado' não acessa o sistema há mais de 3 dias.",
+        )
+
+    def test_primeiro_job_depois_do_deploy_nao_repete_os_alertas(self):
+        self._alertas_antigos(self.proximo_contato)
+
+        self._migrar()
+        call_command('check_overdue_clients', stdout=StringIO())
+        call_command('check_inactivity', stdout=StringIO())
+
+        self.assertEqual(Notificacao.objects.count(), 3)
+        self.assertEqual(
+            set(Notificacao.objects.values_list('tipo', 'referencia_id')),
+            {
+                (Notificacao.Tipo.CONTATO_ATRASADO, self.cliente.pk),
+                (Notificacao.Tipo.USUARIO_INATIVO, self.vendedor.pk),
+            },
+        )
+
+    def test_alerta_de_evento_que_ja_mudou_continua_sem_tipo(self):
+        self._alertas_antigos(self.proximo_contato - timedelta(days=10))
+        # Logou depois do alerta antigo e sumiu de novo.
+        Notificacao.objects.update(data_criacao=timezone.now() - timedelta(days=20))
+
+        self._migrar()
+        call_command('check_overdue_clients', stdout=StringIO())
+        call_command('check_inactivity', stdout=StringIO())
+
+        self.assertEqual(Notificacao.objects.filter(tipo='').count(), 3)
+        self.assertEqual(Notificacao.objects.exclude(tipo='').count(), 3)
+
+
+def _chaves_inscricao():
+    """p256dh/auth validos (base64url) para o pywebpush conseguir criptografar o payload."""
+    chave = ec.generate_private_key(ec.SECP256R1())
+    publica = chave.public_key().public_bytes(serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+    return base64.urlsafe_b64encode(publica).decode().rstrip('='), base64.urlsafe_b64encode(os.urandom(16)).decode().rstrip('=')
+
+
+def _inscrever(usuario, endpoint):
+    p256dh, auth = _chaves_inscricao()
+    inscricao = SubscriptionInfo.objects.create(browser='chrome', endpoint=endpoint, p256dh=p256dh, auth=auth)
+    PushInformation.objects.create(user=usuario, subscription=inscricao)
+    return inscricao
+
+
+class NotificarUsuariosTests(TestCase):
+    def _criar_admins(self, quantidade, prefixo):
+        admins = []
+        for indice in range(quantidade):
+            admin = User.objects.create_user(username=f'{prefixo}_{indice}', password='123456')
+            admin.profile.nivel_acesso = admin.profile.NivelAcesso.ADMIN
+            admin.profile.save()
+            _inscrever(admin, f'https://push.exemplo.com/{prefixo}/{indice}')
+            admins.append(admin)
+        return admins
+
+    def _salvar_lead(self, vendedor, nome):
+        with CaptureQueriesContext(connection) as consultas:
+            Cliente.objects.create(
+                vendedor=vendedor,
+                nome_cliente=nome,
+                whatsapp='41988887777',
+                tipo_contato=Cliente.TipoContato.MENSAGEM,
+                proximo_passo=Cliente.ProximoPasso.MENSAGEM,
+            )
+        return consultas.captured_queries
+
+    def test_novo_lead_custa_o_mesmo_com_mais_admins(self):
+        vendedor = User.objects.create_user(username='vendedor_lead', password='123456')
+        self._criar_admins(1, 'admin_lead_a')
+        self._salvar_lead(vendedor, 'Lead Aquecimento')
+        um_admin = len(self._salvar_lead(vendedor, 'Lead Um'))
+
+        self._criar_admins(9, 'admin_lead_b')
+        self._salvar_lead(vendedor, 'Lead Aquecimento 2')
+        consultas = self._salvar_lead(vendedor, 'Lead Dez')
+
+        self.assertEqual(len(consultas), um_admin)
+        inserts = [q for q in consultas if q['sql'].startswith('INSERT INTO "notificacoes_notificacao"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notificacao.objects.filter(mensagem='Novo lead cadastrado: Lead Dez.').count(), 10)
+        envios = EnvioPush.objects.filter(payload__body='Novo lead cadastrado: Lead Dez.')
+        self.assertEqual(envios.count(), 10)
+        self.assertEqual(envios.first().payload['head'], 'Novo Lead Recebido!')
+
+    def test_usuario_sem_inscricao_nao_enfileira(self):
+        user = User.objects.create_user(username='sem_inscricao', password='123456')
+
+        notificar_usuario(user, 'Aviso')
+
+        self.assertEqual(Notificacao.objects.filter(usuario=user).count(), 1)
+        self.assertFalse(EnvioPush.objects.exists())
+
+
+class _EndpointPush(BaseHTTPRequestHandler):
+    """Servico de push falso: responde pelo caminho (/ok, /expirada, /instavel) e guarda o que recebeu."""
+    recebidos = []
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.recebidos.append((self.path, self.headers.get('TTL'), corpo))
+        self.send_response({'ok': 201, 'expirada': 410, 'instavel': 503}[self.path.split('/')[1]])
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ProcessarPushTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _EndpointPush)
+        cls.base_url = f'http://127.0.0.1:{cls.servidor.server_port}'
+        cls.thread = threading.Thread(target=cls.servidor.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _EndpointPush.recebidos.clear()
+        self.user = User.objects.create_user(username='usuario_push', password='123456')
+
+    def test_worker_entrega_no_endpoint(self):
+        _inscrever(self.user, f'{self.base_url}/ok/celular')
+        _inscrever(self.user, f'{self.base_url}/ok/notebook')
+
+        notificar_usuario(self.user, 'Venda aprovada', url='/vendas/')
+        self.assertEqual(_EndpointPush.recebidos, [])
+
+        self.assertEqual(processar_envios_pendentes(), 2)
+
+        self.assertEqual(sorted(path for path, _, _ in _EndpointPush.recebidos), ['/ok/celular', '/ok/notebook'])
+        self.assertTrue(all(ttl == '1000' and corpo for _, ttl, corpo in _EndpointPush.recebidos))
+        self.assertEqual(EnvioPush.objects.filter(status=EnvioPush.Status.ENVIADO, status_code=201).count(), 2)
+
+    def test_inscricao_expirada_e_removida(self):
+        viva = _inscrever(self.user, f'{self.base_url}/ok/celular')
+        outro = User.objects.create_user(username='outro_push', password='123456')
+        for indice in range(3):
+            _inscrever(outro, f'{self.base_url}/expirada/{indice}')
+
+        notificar_usuarios([self.user, outro], 'Aviso geral')
+        with self.assertLogs('notificacoes.push', level='INFO'):
+            call_command('processar_push', stdout=StringIO())
+
+        self.assertEqual(list(SubscriptionInfo.objects.values_list('pk', flat=True)), [viva.pk])
+        self.assertFalse(PushInformation.objects.filter(user=outro).exists())
+        self.assertEqual(list(EnvioPush.objects.values_list('status', flat=True)), [EnvioPush.Status.ENVIADO])
+
+    @override_settings(PUSH_BACKOFF_BASE=30, PUSH_MAX_TENTATIVAS=2)
+    def test_falha_transitoria_reagenda_e_depois_desiste(self):
+        _inscrever(self.user, f'{self.base_url}/instavel/celular')
+        notificar_usuario(self.user, 'Aviso')
+
+        with self.assertLogs('notificacoes.push', level='INFO'):
+            processar_envios_pendentes()
+        envio = EnvioPush.objects.get()
+        self.assertEqual(envio.status, EnvioPush.Status.PENDENTE)
+        self.assertEqual(envio.status_code, 503)
+        self.assertGreater(envio.disponivel_em, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(processar_envios_pendentes(), 0)
+
+        EnvioPush.objects.update(disponivel_em=timezone.now())
+        with self.assertLogs('notificacoes.push', level='WARNING'):
+            processar_envios_pendentes()
+
+        envio.refresh_from_db()
+        self.assertEqual(envio.status, EnvioPush.Status.FALHOU)
+        self.assertEqual(envio.tentativas, 2)
+        self.assertEqual(len(_EndpointPush.recebidos), 2)
+
+    def test_endpoint_fora_do_ar_reagenda(self):
+        servidor = ThreadingHTTPServer(('127.0.0.1', 0), _EndpointPush)
+        porta = servidor.server_port
+        servidor.server_close()
+        _inscrever(self.user, f'http://127.0.0.1:{porta}/ok/celular')
+        notificar_usuario(self.user, 'Aviso')
+
+        with self.assertLogs('notificacoes.push', level='INFO'):
+            processar_envios_pendentes()
+
+        envio = EnvioPush.objects.get()
+        self.assertEqual(envio.status, EnvioPush.Status.PENDENTE)
+        self.assertIsNone(envio.status_code)
+        self.assertTrue(envio.ultimo_erro)
+
+    @override_settings(PUSH_RESERVA_SEGUNDOS=120, PUSH_TIMEOUT=10)
+    def test_reserva_cobre_o_pior_caso_do_lote(self):
+        # 100 envios em 8 threads: 13 rodadas, cada envio podendo levar 2x o timeout.
+        self.assertGreater(segundos_de_reserva(100, 8), 13 * 10 * 2)
+        self.assertEqual(segundos_de_reserva(4, 8), 120)
+
+        _inscrever(self.user, f'{self.base_url}/ok/celular')
+        notificar_usuario(self.user, 'Aviso')
+        antes = timezone.now()
+        envio, = reivindicar_envios(100, 8)
+        self.assertGreaterEqual(envio.reservado_ate, antes + timedelta(seconds=segundos_de_reserva(100, 8)))
+
+    def test_worker_com_reserva_vencida_nao_sobrescreve_o_resultado(self):
+        _inscrever(self.user, f'{self.base_url}/ok/celular')
+        notificar_usuario(self.user, 'Aviso')
+        atrasado, = reivindicar_envios(10)
+        EnvioPush.objects.update(reservado_ate=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(processar_envios_pendentes(), 1)
+
+        # O primeiro worker termina depois: o 503 dele nao volta o envio para a fila.
+        with self.assertLogs('notificacoes.push', level='INFO'):
+            self.assertFalse(push._registrar_resultado(atrasado, 503, 'Service Unavailable'))
+
+        envio = EnvioPush.objects.get()
+        self.assertEqual(envio.status, EnvioPush.Status.ENVIADO)
+        self.assertEqual(envio.status_code, 201)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class CheckOverdueClientsBenchmark(TestCase):
+    TOTAL_CLIENTES = 50_000
+    TOTAL_ADMINS = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        vendedor = User.objects.create_user(username='vendedor_benchmark_atrasados', password='123456')
+        for indice in range(cls.TOTAL_ADMINS):
+            admin = User.objects.create_user(username=f'admin_benchmark_atrasados_{indice}', password='123456')
+            admin.profile.nivel_acesso = admin.profile.NivelAcesso.ADMIN
+            admin.profile.save()
+        ontem = timezone.now() - timedelta(days=1)
+        Cliente.objects.bulk_create(
+            [
+                Cliente(
+                    vendedor=vendedor,
+                    nome_cliente=f'Cliente {indice}',
+                    whatsapp=f'41{indice:09d}',
+                    whatsapp_normalizado=f'41{indice:09d}',
+                    data_proximo_contato=ontem,
+                    tipo_contato=Cliente.TipoContato.MENSAGEM,
+                    proximo_passo=Cliente.ProximoPasso.MENSAGEM,
+                )
+                for indice in range(cls.TOTAL_CLIENTES)
+            ],
+            batch_size=5000,
+        )
+
+    def test_fan_out_de_50k_clientes(self):
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('check_overdue_clients', stdout=StringIO())
+        primeira = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        call_command('check_overdue_clients', stdout=StringIO())
+        segunda = time.perf_counter() - inicio
+
+        esperado = self.TOTAL_CLIENTES * (self.TOTAL_ADMINS + 1)
+        self.assertEqual(Notificacao.objects.filter(tipo=Notificacao.Tipo.CONTATO_ATRASADO).count(), esperado)
+        print(
+            f"\n[benchmark] check_overdue_clients ({self.TOTAL_CLIENTES} clientes x {self.TOTAL_ADMINS} admins): "
+            f"{primeira:.1f}s na primeira execucao ({len(consultas)} consultas), {segunda:.1f}s na segunda"
+        )
+
+
+class ContadorNaoLidasTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='usuario_contador', password='123456')
+        self.outro = User.objects.create_user(username='outro_contador', password='123456')
+
+    def assertContador(self, usuario, esperado):
+        self.assertEqual(ContadorNotificacoes.objects.get(pk=usuario.pk).nao_lidas, esperado)
+        self.assertEqual(Notificacao.objects.filter(usuario=usuario, lida=False).count(), esperado)
+
+    def test_criar_marcar_e_apagar_mantem_o_contador(self):
+        for indice in range(3):
+            notificar_usuario(self.user, f'Aviso {indice}')
+        notificar_usuarios([self.user, self.outro], 'Aviso geral')
+        self.assertContador(self.user, 4)
+        self.assertContador(self.outro, 1)
+
+        primeira = Notificacao.objects.filter(usuario=self.user).last()
+        self.assertEqual(marcar_como_lidas(self.user, ids=[primeira.pk]), 1)
+        self.assertEqual(marcar_como_lidas(self.user, ids=[primeira.pk]), 0)
+        self.assertContador(self.user, 3)
+
+        apagar_notificacoes(self.user, ids=[Notificacao.objects.filter(usuario=self.user, lida=False).first().pk])
+        self.assertContador(self.user, 2)
+
+        marcar_como_lidas(self.user)
+        self.assertContador(self.user, 0)
+        self.assertContador(self.outro, 1)
+
+    def test_alertas_em_massa_recalculam_o_contador(self):
+        notificar_usuario(self.user, 'Aviso avulso')
+        hoje = timezone.localdate()
+        alertas = lambda: (
+            Notificacao(usuario_id=usuario.pk, mensagem='Alerta', referencia_id=1, dia=hoje)
+            for usuario in (self.user, self.outro)
+        )
+
+        criar_notificacoes_em_massa(Notificacao.Tipo.CONTATO_ATRASADO, alertas())
+        criar_notificacoes_em_massa(Notificacao.Tipo.CONTATO_ATRASADO, alertas())
+
+        self.assertContador(self.user, 2)
+        self.assertContador(self.outro, 1)
+
+    def test_recalcular_corrige_contador_fora_de_sincronia(self):
+        self.assertEqual(contar_nao_lidas(self.user), 0)
+        notificar_usuario(self.user, 'Aviso')
+        Notificacao.objects.create(usuario=self.user, mensagem='Criada por fora dos utils')
+        self.assertEqual(contar_nao_lidas(self.user), 1)
+
+        recalcular_nao_lidas([self.user.pk])
+
+        self.assertContador(self.user, 2)
+
+    def test_context_processor_le_o_contador_com_uma_consulta(self):
+        notificar_usuario(self.user, 'Aviso')
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        with self.assertNumQueries(1):
+            contexto = unread_notifications_context(request)
+
+        self.assertEqual(contexto, {'unread_notifications_count': 1})
+
+    def test_views_atualizam_o_badge(self):
+        notificar_usuario(self.user, 'Aviso 1')
+        notificar_usuario(self.user, 'Aviso 2')
+        self.client.force_login(self.user)
+
+        resposta = self.client.get(reverse('notificacoes_dropdown'))
+        self.assertEqual(resposta.json()['count'], 2)
+
+        notificacao = Notificacao.objects.filter(usuario=self.user).first()
+        self.client.post(reverse('marcar_lida_notificacao', args=[notificacao.pk]))
+        self.assertEqual(self.client.get(reverse('notificacoes_dropdown')).json()['count'], 1)
+
+        self.client.post(reverse('deletar_todas_notificacoes'))
+        self.assertContador(self.user, 0)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class ContadorNaoLidasBenchmark(TestCase):
+    TOTAL_NOTIFICACOES = 1_000_000
+    TOTAL_USUARIOS = 100
+    RENDERIZACOES = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        usuarios = [
+            User.objects.create_user(username=f'usuario_benchmark_sino_{indice}', password='123456')
+            for indice in range(cls.TOTAL_USUARIOS)
+        ]
+        cls.user = usuarios[0]
+        por_usuario = cls.TOTAL_NOTIFICACOES // cls.TOTAL_USUARIOS
+        for usuario in usuarios:
+            Notificacao.objects.bulk_create(
+                [
+                    Notificacao(usuario=usuario, mensagem=f'Aviso {indice}', lida=indice % 5 != 0)
+                    for indice in range(por_usuario)
+                ],
+                batch_size=5000,
+            )
+        recalcular_nao_lidas(usuario.pk for usuario in usuarios)
+
+    def test_custo_do_badge_por_renderizacao(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        inicio = time.perf_counter()
+        for _ in range(self.RENDERIZACOES):
+            antes = Notificacao.objects.filter(usuario=self.user, lida=False).count()
+        tempo_count = (time.perf_counter() - inicio) / self.RENDERIZACOES
+
+        inicio = time.perf_counter()
+        for _ in range(self.RENDERIZACOES):
+            depois = unread_notifications_context(request)['unread_notifications_count']
+        tempo_contador = (time.perf_counter() - inicio) / self.RENDERIZACOES
+
+        self.assertEqual(antes, depois)
+        print(
+            f"\n[benchmark] badge de nao lidas ({self.TOTAL_NOTIFICACOES} notificacoes, {antes} nao lidas do usuario): "
+            f"COUNT {tempo_count * 1000:.2f}ms vs contador {tempo_contador * 1000:.2f}ms por renderizacao"
+        )
@@ -1,25 +1,125 @@
-import logging
+from itertools import islice
 
-import webpush
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
 
-from .models import Notificacao
+from .models import ContadorNotificacoes, Notificacao
+from .push import enfileirar_push, montar_payload
 
-logger = logging.getLogger(__name__)
+# Linhas por INSERT nas notificacoes em massa.
+NOTIFICACOES_LOTE = 1000
+
+
+def enviar_push(usuario, mensagem, url=None, titulo="Nova notificação"):
+    """Coloca o push web do usuario na fila (EnvioPush); quem envia e o worker processar_push."""
+    enfileirar_push([usuario], montar_payload(mensagem, url=url, titulo=titulo))
 
 
 def notificar_usuario(usuario, mensagem, url=None, titulo="Nova notificação"):
-    """Cria uma notificação in-app e tenta enviar push web para o usuário."""
+    """Cria uma notificação in-app e enfileira o push web para o usuário."""
     Notificacao.objects.create(usuario=usuario, mensagem=mensagem, url=url or '')
+    _somar_nao_lidas([usuario.pk], 1)
+    enviar_push(usuario, mensagem, url=url, titulo=titulo)
+
+
+def notificar_usuarios(usuarios, mensagem, url=None, titulo="Nova notificação"):
+    """
+    Mesma notificacao para varios usuarios com custo fixo: um INSERT das notificacoes,
+    um UPDATE dos contadores e o push de todos enfileirado de uma vez.
+    """
+    usuarios = list(usuarios)
+    Notificacao.objects.bulk_create(
+        [Notificacao(usuario=usuario, mensagem=mensagem, url=url or '') for usuario in usuarios],
+        batch_size=NOTIFICACOES_LOTE,
+    )
+    _somar_nao_lidas([usuario.pk for usuario in usuarios], 1)
+    enfileirar_push(usuarios, montar_payload(mensagem, url=url, titulo=titulo))
+
+
+def criar_notificacoes_em_massa(tipo, notificacoes, lote=NOTIFICACOES_LOTE):
+    """
+    Grava alertas de um `tipo` (Notificacao.Tipo) em lotes de INSERT, sem push. Cada
+    notificacao precisa de usuario, referencia_id e dia: o indice unico
+    (tipo, referencia_id, usuario, dia) descarta as que ja existem, entao o job pode
+    rodar de novo (ou em paralelo) sem duplicar. Retorna quantas foram criadas.
+    """
+    antes = Notificacao.objects.filter(tipo=tipo).count()
+    usuarios = set()
+    notificacoes = iter(notificacoes)
+    while True:
+        bloco = list(islice(notificacoes, lote))
+        if not bloco:
+            break
+        for notificacao in bloco:
+            notificacao.tipo = tipo
+            notificacao.mensagem = notificacao.mensagem[:255]
+            usuarios.add(notificacao.usuario_id)
+        Notificacao.objects.bulk_create(bloco, ignore_conflicts=True)
+    criadas = Notificacao.objects.filter(tipo=tipo).count() - antes
+    if criadas:
+        # Com ignore_conflicts nao da para saber quais linhas entraram: recalcula.
+        recalcular_nao_lidas(usuarios)
+    return criadas
+
+
+def recalcular_nao_lidas(usuario_ids):
+    """Regrava o contador de nao lidas dos usuarios a partir da tabela. Retorna {usuario_id: total}."""
+    usuario_ids = list(set(usuario_ids))
+    totais = {}
+    for inicio in range(0, len(usuario_ids), NOTIFICACOES_LOTE):
+        ids = usuario_ids[inicio:inicio + NOTIFICACOES_LOTE]
+        contagem = dict(
+            Notificacao.objects.filter(usuario_id__in=ids, lida=False)
+            .values('usuario_id').annotate(total=Count('id')).order_by()
+            .values_list('usuario_id', 'total')
+        )
+        ContadorNotificacoes.objects.bulk_create(
+            [ContadorNotificacoes(usuario_id=usuario_id, nao_lidas=contagem.get(usuario_id, 0)) for usuario_id in ids],
+            update_conflicts=True,
+            unique_fields=['usuario'],
+            update_fields=['nao_lidas'],
+        )
+        totais.update({usuario_id: contagem.get(usuario_id, 0) for usuario_id in ids})
+    return totais
+
+
+def _somar_nao_lidas(usuario_ids, quantidade):
+    usuario_ids = set(usuario_ids)
+    if not usuario_ids or not quantidade:
+        return
+    atualizados = ContadorNotificacoes.objects.filter(usuario_id__in=usuario_ids).update(
+        nao_lidas=Greatest(F('nao_lidas') + quantidade, Value(0)),
+    )
+    if atualizados < len(usuario_ids):
+        # Algum usuario ainda sem linha de contador: regrava a partir da tabela.
+        recalcular_nao_lidas(usuario_ids)
+
+
+def contar_nao_lidas(usuario):
+    """
+    Nao lidas do usuario pelo contador (uma linha pela PK), sem COUNT na tabela. Sem linha
+    = nenhuma notificacao nao lida: toda criacao passa por _somar_nao_lidas/recalcular_nao_lidas.
+    """
+    total = ContadorNotificacoes.objects.filter(pk=usuario.pk).values_list('nao_lidas', flat=True).first()
+    return total or 0
+
+
+def marcar_como_lidas(usuario, ids=None):
+    """Marca como lidas as notificacoes do usuario (todas ou so `ids`). Retorna quantas mudaram."""
+    notificacoes = Notificacao.objects.filter(usuario=usuario, lida=False)
+    if ids is not None:
+        notificacoes = notificacoes.filter(pk__in=ids)
+    marcadas = notificacoes.update(lida=True)
+    _somar_nao_lidas([usuario.pk], -marcadas)
+    return marcadas
+
 
-    try:
-        payload = {
-            "head": titulo,
-            "body": mensagem,
-            "icon": "/static/images/logo-spagi-192x192.png",
-            "url": url or "/notificacoes/",
-        }
-        webpush.send_user_notification(user=usuario, payload=payload, ttl=1000)
-    except Exception as e:
-        # Usuário pode não ter nenhum dispositivo inscrito em push; a notificação
-        # in-app já foi salva, então isso não deve interromper o fluxo do chamador.
-        logger.warning("Erro ao enviar Push Notification para %s: %s", usuario.username, e)
+def apagar_notificacoes(usuario, ids=None):
+    """Apaga as notificacoes do usuario (todas ou so `ids`). Retorna quantas foram apagadas."""
+    notificacoes = Notificacao.objects.filter(usuario=usuario)
+    if ids is not None:
+        notificacoes = notificacoes.filter(pk__in=ids)
+    apagadas, _ = notificacoes.delete()
+    if apagadas:
+        recalcular_nao_lidas([usuario.pk])
+    return apagadas
@@ -11,13 +11,14 @@ from django.views.decorators.http import require_POST
 from webpush.models import PushInformation
 
 from .models import Notificacao
+from .utils import apagar_notificacoes, contar_nao_lidas, marcar_como_lidas
 
 logger = logging.getLogger(__name__)
 
 
 @login_required
 def lista_notificacoes(request):
-    Notificacao.objects.filter(usuario=request.user, lida=False).update(lida=True)
+    marcar_como_lidas(request.user)
     notificacoes = Notificacao.objects.filter(usuario=request.user)
     return render(request, 'notificacoes/lista_notificacoes.html', {'notificacoes': notificacoes})
 
@@ -26,7 +27,7 @@ def lista_notificacoes(request):
 def notificacoes_dropdown(request):
     """Preview das últimas notificações para o sino da navbar (não marca como lida)."""
     notificacoes = Notificacao.objects.filter(usuario=request.user)[:8]
-    count = Notificacao.objects.filter(usuario=request.user, lida=False).count()
+    count = contar_nao_lidas(request.user)
     items = [
         {
             'id': n.id,
@@ -43,14 +44,14 @@ def notificacoes_dropdown(request):
 @login_required
 @require_POST
 def marcar_lida_notificacao(request, notificacao_id):
-    Notificacao.objects.filter(id=notificacao_id, usuario=request.user).update(lida=True)
+    marcar_como_lidas(request.user, ids=[notificacao_id])
     return JsonResponse({'ok': True})
 
 
 @login_required
 def deletar_notificacao(request, notificacao_id):
     notificacao = get_object_or_404(Notificacao, id=notificacao_id, usuario=request.user)
-    notificacao.delete()
+    apagar_notificacoes(request.user, ids=[notificacao.pk])
     messages.success(request, 'Notificacao removida.')
     return redirect('lista_notificacoes')
 
@@ -58,7 +59,7 @@ def deletar_notificacao(request, notificacao_id):
 @login_required
 def deletar_todas_notificacoes(request):
     if request.method == 'POST':
-        Notificacao.objects.filter(usuario=request.user).delete()
+        apagar_notificacoes(request.user)
         messages.success(request, 'Todas as notificacoes foram removidas com sucesso.')
     return redirect('lista_notificacoes')
 
@@ -0,0 +1,252 @@
+var staticCacheName = "django-pwa-v" + new Date().getTime();
+var filesToCache = [
+    '/static/manifest.json',
+    '/static/manifest.tv.json',
+    '/static/images/logo-spagi.png',
+    '/static/images/logo-spagi-192x192.png',
+    '/static/images/logo-spagi-512x512.png',
+    '/static/widgets/spagi-tv-template.json',
+    '/static/widgets/spagi-tv-data.json'
+];
+
+const shouldBypassCache = request => {
+    const url = new URL(request.url);
+    return (
+        url.pathname.startsWith('/tv-video/')
+        || url.pathname.includes('/tv_videos/')
+        || url.pathname.endsWith('/manifest.json')
+        || url.pathname.endsWith('/manifest.tv.json')
+        || request.destination === 'video'
+    );
+};
+
+// Função para atualizar o cache
+const updateCache = () => {
+    return caches.open(staticCacheName).then(cache => {
+        return Promise.allSettled(filesToCache.map(url => cache.add(url)));
+    });
+};
+
+// Cache on install
+self.addEventListener("install", event => {
+    this.skipWaiting();
+    event.waitUntil(
+        caches.open(staticCacheName)
+            .then(cache => {
+                return Promise.allSettled(filesToCache.map(url => cache.add(url)));
+            })
+    )
+});
+
+// Clear cache on activate
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        Promise.all([
+            self.clients.claim(),
+            updateSpagiTvWidgets(),
+            caches.keys().then(cacheNames => {
+                return Promise.all(
+                    cacheNames
+                        .filter(cacheName => (cacheName.startsWith("django-pwa-")))
+                        .filter(cacheName => (cacheName !== staticCacheName))
+                        .map(cacheName => caches.delete(cacheName))
+                );
+            })
+        ])
+    );
+});
+
+// Serve from Cache
+self.addEventListener("fetch", event => {
+    if (shouldBypassCache(event.request)) {
+        event.respondWith(fetch(event.request));
+        return;
+    }
+
+    event.respondWith(
+        caches.match(event.request)
+            .then(response => {
+                return response || fetch(event.request);
+            })
+            .catch(() => {
+                return caches.match('/static/images/logo-spagi.png');
+            })
+    )
+});
+
+// Evento: Periodic Sync (para atualizar o cache)
+self.addEventListener('periodicsync', (event) => {
+    if (event.tag === 'update-cache-daily') {
+        console.log('Periodic Sync: Atualizando cache...');
+        event.waitUntil(updateCache());
+    }
+});
+
+// Evento: Background Sync (para enviar dados offline)
+self.addEventListener('sync', (event) => {
+    if (event.tag === 'sync-new-client') {
+        console.log('Sync: Tentando enviar clientes offline...');
+        event.waitUntil(sendOfflineClients());
+    }
+    // NOTA: Você pode adicionar mais tags aqui, ex: 'sync-new-avaliacao'
+});
+
+async function sendOfflineClients() {
+    if (typeof idbKeyval === 'undefined') {
+        console.warn('idb-keyval nao carregado; sync offline ignorado.');
+        return;
+    }
+
+    let outbox = (await idbKeyval.get('client-outbox')) || [];
+    if (outbox.length === 0) {
+        return;
+    }
+
+    console.log(`Sync: Enviando ${outbox.length} clientes...`);
+
+    const sendPromises = outbox.map(clientEntry => {
+        const formData = new FormData();
+        
+        // Remonta o FormData a partir do objeto salvo
+        for (const key in clientEntry.data) {
+            formData.append(key, clientEntry.data[key]);
+        }
+        
+        // Adiciona o CSRF token que salvamos
+        formData.append('csrfmiddlewaretoken', clientEntry.csrfToken);
+
+        // Envia para a URL de criação do Django
+        return fetch('/cliente/novo/', {
+            method: 'POST',
+            body: formData
+            // Não defina Content-Type, o browser faz isso por nós com FormData
+        }).then(response => {
+            if (response.ok) {
+                console.log('Sync: Cliente enviado com sucesso:', clientEntry.data.nome_cliente);
+                // Retorna o item para que possamos removê-lo do outbox
+                return clientEntry;
+            } else {
+                console.error('Sync: Falha ao enviar cliente. Status:', response.status);
+                // Retorna null para manter o item no outbox
+                return null;
+            }
+        }).catch(err => {
+            console.error('Sync: Erro de rede ao enviar cliente.', err);
+            // Retorna null para manter o item no outbox
+            return null;
+        });
+    });
+
+    try {
+        const results = await Promise.all(sendPromises);
+        
+        // Filtra o outbox, mantendo apenas os que falharam (null)
+        const successfulItems = results.filter(result => result !== null);
+        
+        if (successfulItems.length > 0) {
+            // Remove os itens bem-sucedidos do outbox
+            let currentOutbox = (await idbKeyval.get('client-outbox')) || [];
+            const successfulIds = new Set(successfulItems.map(item => item.id)); // Assumindo que temos um ID
+            
+            // Recriamos o outbox apenas com os itens que falharam
+            const newOutbox = currentOutbox.filter(item => !successfulIds.has(item.id));
+            await idbKeyval.set('client-outbox', newOutbox);
+
+            if (newOutbox.length === 0) {
+                console.log('Sync: Todos os clientes offline foram enviados.');
+            } else {
+                console.log(`Sync: ${newOutbox.length} clientes falharam e permanecem no outbox.`);
+            }
+        }
+    } catch (error) {
+        console.error('Sync: Erro ao processar resultados do outbox.', error);
+    }
+}
+
+
+// --- NOVO: Listener para PUSH NOTIFICATIONS ---
+self.addEventListener('push', (event) => {
+    console.log('Push recebido!');
+    let data = {};
+    if (event.data) {
+        try {
+            data = event.data.json();
+        } catch (e) {
+            data = { head: 'Notificação', body: event.data.text() };
+        }
+    }
+
+    const title = data.head || "Nova Notificação";
+    const options = {
+        body: data.body || "Você tem uma nova atualização.",
+        icon: data.icon || "/static/images/logo-spagi-192x192.png",
+        badge: data.badge || "/static/images/logo-spagi-192x192.png",
+        data: {
+            url: data.url || '/'
+        }
+    };
+
+    event.waitUntil(self.registration.showNotification(title, options));
+});
+
+// --- NOVO: Listener para CLIQUE NA NOTIFICAÇÃO ---
+self.addEventListener('notificationclick', (event) => {
+    event.notification.close();
+
+    const urlToOpen = event.notification.data.url || '/';
+    
+    event.waitUntil(
+        clients.matchAll({
+            type: 'window',
+            includeUncontrolled: true
+        }).then((clientList) => {
+            // Se o PWA já estiver aberto, foca nele
+            if (clientList.length > 0) {
+                let client = clientList[0];
+                for (let i = 0; i < clientList.length; i++) {
+                    if (clientList[i].focused) {
+                        client = clientList[i];
+                    }
+                }
+                return client.focus().then(c => c.navigate(urlToOpen));
+            }
+            // Se o PWA não estiver aberto, abre uma nova janela
+            return clients.openWindow(urlToOpen);
+        })
+    );
+});
+
+async function renderSpagiTvWidget(widget) {
+    if (!self.widgets || !widget || !widget.definition) {
+        return;
+    }
+
+    const template = await (await fetch(widget.definition.msAcTemplate)).text();
+    const data = await (await fetch(widget.definition.data)).text();
+    await self.widgets.updateByTag(widget.definition.tag, { template, data });
+}
+
+async function updateSpagiTvWidgets() {
+    if (!self.widgets) {
+        return;
+    }
+
+    const widget = await self.widgets.getByTag('spagi-tv-now');
+    if (widget) {
+        await renderSpagiTvWidget(widget);
+    }
+}
+
+self.addEventListener('widgetinstall', event => {
+    event.waitUntil(renderSpagiTvWidget(event.widget));
+});
+
+self.addEventListener('widgetresume', event => {
+    event.waitUntil(renderSpagiTvWidget(event.widget));
+});
+
+self.addEventListener('widgetclick', event => {
+    event.waitUntil(clients.openWindow('/tv-video/'));
+});
+
+
@@ -1,5 +1,9 @@
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from configuracoes.models import ModuloSistema, PermissaoModulo
 from usuarios.permissions import has_module_access
@@ -34,3 +38,61 @@ class HasModuleAccessTests(TestCase):
     def test_modulo_desconhecido_nega_acesso(self):
         user = User.objects.create_user(username='vendedor_modulo_invalido', password='123456')
         self.assertFalse(has_module_access(user, 'modulo_que_nao_existe'))
+
+
+# Mesmo backend de producao: cada leitura do django_cache entra na contagem de queries.
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}})
+class MatrizPermissoesCacheTests(TestCase):
+    TABELAS_PERMISSAO = ('configuracoes_permissaomodulo', 'configuracoes_modulosistema')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('createcachetable', verbosity=0)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='vendedor_cache_perm', password='123456')
+        self.permissao = PermissaoModulo.objects.create(
+            user=self.user, modulo=ModuloSistema.objects.get(slug='clientes'), pode_visualizar=True,
+        )
+        self.client.force_login(self.user)
+
+    def _queries_de_permissao(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return [
+            q['sql'] for q in contexto.captured_queries
+            if any(tabela in q['sql'] for tabela in self.TABELAS_PERMISSAO)
+        ]
+
+    def test_pagina_autenticada_nao_consulta_permissoes_depois_do_aquecimento(self):
+        self.assertTrue(self._queries_de_permissao('/clientes/'))
+
+        self.assertEqual(self._queries_de_permissao('/clientes/'), [])
+
+    def test_request_aquecido_le_o_cache_uma_vez_so(self):
+        self.client.get('/clientes/')
+
+        # sessao, usuario, profile, versao das permissoes (a unica leitura do django_cache),
+        # 2 contadores de clientes, notificacoes, banner e o savepoint/UPDATE/release da sessao.
+        with self.assertNumQueries(11):
+            self.assertEqual(self.client.get('/clientes/').status_code, 200)
+
+    def test_alteracao_de_permissao_invalida_o_cache(self):
+        self.assertEqual(self.client.get('/clientes/').status_code, 200)
+
+        self.permissao.pode_visualizar = False
+        self.permissao.save()
+
+        self.assertFalse(has_module_access(self.user, 'clientes'))
+        self.assertRedirects(self.client.get('/clientes/'), '/', fetch_redirect_response=False)
+
+    def test_novo_modulo_invalida_o_cache(self):
+        self.assertFalse(has_module_access(self.user, 'modulo_novo'))
+
+        modulo = ModuloSistema.objects.create(slug='modulo_novo', nome='Modulo Novo')
+        PermissaoModulo.objects.create(user=self.user, modulo=modulo, pode_visualizar=True)
+
+        self.assertTrue(has_module_access(self.user, 'modulo_novo'))
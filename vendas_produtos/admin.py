@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import VendaProduto, FechamentoMensal, ParametrosComissao
+from .models import VendaProduto, FechamentoMensal, ParametrosComissao, ResultadoIACache
 
 @admin.register(ParametrosComissao)
 class ParametrosComissaoAdmin(admin.ModelAdmin):
@@ -25,3 +25,13 @@ class VendaProdutoAdmin(admin.ModelAdmin):
 class FechamentoMensalAdmin(admin.ModelAdmin):
     list_display = ('mes', 'ano', 'responsavel', 'data_fechamento')
     list_filter = ('ano',)
+
+@admin.register(ResultadoIACache)
+class ResultadoIACacheAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'modelo', 'arquivo_sha256', 'acertos', 'criado_em', 'ultimo_uso_em', 'expira_em')
+    list_filter = ('tipo', 'modelo')
+    search_fields = ('arquivo_sha256',)
+    readonly_fields = ('chave', 'tipo', 'modelo', 'arquivo_sha256', 'resultado', 'acertos', 'criado_em', 'ultimo_uso_em', 'expira_em')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,156 @@
+"""
+Chamada ao Gemini com cache persistente do resultado (vendas_produtos.ResultadoIACache).
+
+A chave e o SHA-256 dos bytes do arquivo + modelo + versao do prompt (hash das
+instrucoes enviadas) + mime type. Reenviar/revalidar o mesmo arquivo vira uma
+consulta no banco em vez de uma chamada de varios segundos; trocar o modelo no
+Admin ou editar o prompt invalida naturalmente as entradas antigas.
+
+Cada resultado vale IA_CACHE_VALIDADE_DIAS (quem chama pode passar uma validade
+menor, como a extracao de RG/CNH); vencido, a proxima chamada vai a IA de novo e
+`limpar_resultados_expirados` (manage.py limpar_cache_ia) apaga as linhas.
+"""
+import base64
+import hashlib
+import json
+import logging
+import mimetypes
+import re
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from avaliacoes.ai_runtime import get_gemini_runtime
+
+from .models import ResultadoIACache
+
+logger = logging.getLogger(__name__)
+
+_MAX_TENTATIVAS = 3
+
+
+def ler_arquivo(arquivo):
+    """Le os bytes de um FieldFile/UploadedFile."""
+    arquivo.open('rb')
+    try:
+        return arquivo.read()
+    finally:
+        arquivo.close()
+
+
+def calcular_chave(tipo, modelo, prompt, mime_type, arquivo_sha256):
+    versao_prompt = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    base = '|'.join((tipo, modelo, versao_prompt, mime_type, arquivo_sha256))
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+
+def _buscar(chave):
+    item = (
+        ResultadoIACache.objects.filter(chave=chave, expira_em__gt=timezone.now())
+        .only('pk', 'resultado')
+        .first()
+    )
+    if item is None:
+        return None
+    ResultadoIACache.objects.filter(pk=item.pk).update(acertos=F('acertos') + 1, ultimo_uso_em=timezone.now())
+    return item.resultado
+
+
+def _gravar(chave, tipo, modelo, arquivo_sha256, resultado, validade):
+    agora = timezone.now()
+    try:
+        # Savepoint: dois requests com o mesmo arquivo podem gravar ao mesmo tempo.
+        with transaction.atomic():
+            # Vencido e ainda nao limpo: da lugar ao resultado novo (a chave e unica).
+            ResultadoIACache.objects.filter(chave=chave).exclude(expira_em__gt=agora).delete()
+            ResultadoIACache.objects.create(
+                chave=chave, tipo=tipo, modelo=modelo, arquivo_sha256=arquivo_sha256, resultado=resultado,
+                expira_em=agora + validade,
+            )
+    except IntegrityError:
+        pass
+    except Exception as e:
+        logger.warning("Falha ao gravar cache da IA (%s): %s", tipo, e)
+
+
+def _gerar_conteudo(gemini_client, model_name, prompt, system_instruction, mime_type, file_bytes):
+    data_base64 = base64.b64encode(file_bytes).decode('utf-8')
+    for attempt in range(1, _MAX_TENTATIVAS + 1):
+        try:
+            return gemini_client.models.generate_content(
+                model=model_name,
+                contents=[
+                    {"text": prompt},
+                    {
+                        "inline_data": {
+                            "mime_type": mime_type,
+                            "data": data_base64,
+                        }
+                    },
+                ],
+                config={
+                    "system_instruction": system_instruction,
+                    "response_mime_type": "application/json",
+                },
+            )
+        except Exception as e:
+            error_upper = str(e).upper()
+            is_transient = (
+                '503' in error_upper
+                or 'UNAVAILABLE' in error_upper
+                or 'HIGH DEMAND' in error_upper
+            )
+            if is_transient and attempt < _MAX_TENTATIVAS:
+                time.sleep(attempt)
+                continue
+            raise
+    return None
+
+
+def limpar_resultados_expirados():
+    """Apaga os resultados vencidos (inclusive os gravados antes de existir validade)."""
+    apagados, _ = ResultadoIACache.objects.exclude(expira_em__gt=timezone.now()).delete()
+    return apagados
+
+
+def analisar_arquivo_com_cache(tipo, arquivo, prompt, system_instruction, interpretar, validade=None):
+    """
+    Envia `arquivo` ao Gemini e devolve `interpretar(dict_json)`, reaproveitando o
+    resultado de uma chamada anterior com os mesmos bytes/modelo/prompt.
+    `validade` (timedelta) limita por quanto tempo o resultado e reaproveitado
+    (padrao: IA_CACHE_VALIDADE_DIAS).
+    Retorna None se a IA estiver indisponivel ou der erro (erros nao vao para o cache).
+    """
+    if validade is None:
+        validade = timedelta(days=settings.IA_CACHE_VALIDADE_DIAS)
+    gemini_client, model_name, config_error = get_gemini_runtime()
+    if config_error or not gemini_client:
+        logger.warning("Gemini indisponível (%s): %s", tipo, config_error)
+        return None
+
+    try:
+        file_bytes = ler_arquivo(arquivo)
+        mime_type = mimetypes.guess_type(arquivo.name)[0] or 'image/jpeg'
+        arquivo_sha256 = hashlib.sha256(file_bytes).hexdigest()
+        chave = calcular_chave(tipo, model_name, f"{system_instruction}\n{prompt}", mime_type, arquivo_sha256)
+
+        em_cache = _buscar(chave)
+        if em_cache is not None:
+            return em_cache
+
+        response = _gerar_conteudo(gemini_client, model_name, prompt, system_instruction, mime_type, file_bytes)
+        if not response:
+            return None
+
+        cleaned_json = re.sub(r'```json\s*|\s*```', '', response.text or '', flags=re.DOTALL).strip()
+        resultado = interpretar(json.loads(cleaned_json))
+    except Exception as e:
+        logger.warning("Erro na análise com Gemini (%s): %s", tipo, e)
+        return None
+
+    _gravar(chave, tipo, model_name, arquivo_sha256, resultado, validade)
+    return resultado
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from vendas_produtos.ai_cache import limpar_resultados_expirados
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga os resultados de IA em cache (ResultadoIACache) que ja venceram '
+        '(IA_CACHE_VALIDADE_DIAS / IA_CACHE_VALIDADE_DOCUMENTOS_DIAS).'
+    )
+
+    def handle(self, *args, **options):
+        apagados = limpar_resultados_expirados()
+        self.stdout.write(self.style.SUCCESS(f'{apagados} resultado(s) de IA vencido(s) removido(s).'))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from vendas_produtos.validacao_comprovante import processar_validacoes_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Valida pela IA os comprovantes enfileirados no upload das vendas. Sem opcoes '
+        'processa o que estiver na fila e sai; com --duracao/--loop continua consultando. '
+        'Varios workers podem rodar ao mesmo tempo (SKIP LOCKED).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Roda ate ser interrompido.')
+        parser.add_argument(
+            '--duracao', type=float, default=0,
+            help='Continua consultando a fila por N segundos (ex: 55 no cron de minuto em minuto).',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Pausa em segundos quando a fila esta vazia (padrao: 2).',
+        )
+        parser.add_argument('--lote', type=int, default=None, help='Vendas reivindicadas por ciclo.')
+
+    def handle(self, *args, **options):
+        fim = time.monotonic() + options['duracao']
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                processadas = processar_validacoes_pendentes(options['lote'])
+                total += processadas
+                if processadas:
+                    continue
+                if not options['loop'] and time.monotonic() >= fim:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        if total or options['verbosity'] > 1:
+            self.stdout.write(self.style.SUCCESS(f'Concluido: {total} comprovante(s) processado(s).'))
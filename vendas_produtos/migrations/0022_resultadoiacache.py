@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendas_produtos', '0021_vendaproduto_comprovante_ia_observacao_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultadoIACache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64, unique=True)),
+                ('tipo', models.CharField(max_length=40, verbose_name='Tipo de análise')),
+                ('modelo', models.CharField(max_length=100, verbose_name='Modelo')),
+                ('arquivo_sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 do arquivo')),
+                ('resultado', models.JSONField(verbose_name='Resultado')),
+                ('acertos', models.PositiveIntegerField(default=0, verbose_name='Reaproveitamentos')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_uso_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Resultado de IA (cache)',
+                'verbose_name_plural': 'Resultados de IA (cache)',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendas_produtos', '0022_resultadoiacache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vendaproduto',
+            name='comprovante_ia_disponivel_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='vendaproduto',
+            name='comprovante_ia_reservado_ate',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='vendaproduto',
+            name='comprovante_ia_tentativas',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='vendaproduto',
+            name='comprovante_status_ia',
+            field=models.CharField(choices=[('NAO_VERIFICADO', 'Não verificado'), ('PENDENTE', 'Aguardando IA'), ('PROCESSANDO', 'Em análise (IA)'), ('VALIDO', 'Válido (IA)'), ('INVALIDO', 'Inválido (IA)'), ('MANUAL', 'Validado Manualmente')], default='NAO_VERIFICADO', max_length=20, verbose_name='Status da Validação (IA)'),
+        ),
+        migrations.AddIndex(
+            model_name='vendaproduto',
+            index=models.Index(fields=['comprovante_status_ia', 'comprovante_ia_disponivel_em'], name='venda_fila_comprovante_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:12
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def preencher_expira_em(apps, schema_editor):
+    # Linhas antigas vencem contando da criacao; as ja vencidas saem no proximo limpar_cache_ia.
+    ResultadoIACache = apps.get_model('vendas_produtos', 'ResultadoIACache')
+    documentos = ResultadoIACache.objects.filter(tipo='extracao_cliente')
+    documentos.update(expira_em=F('criado_em') + timedelta(days=settings.IA_CACHE_VALIDADE_DOCUMENTOS_DIAS))
+    ResultadoIACache.objects.filter(expira_em__isnull=True).update(
+        expira_em=F('criado_em') + timedelta(days=settings.IA_CACHE_VALIDADE_DIAS),
+    )
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendas_produtos', '0023_validacao_comprovante_em_fila'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resultadoiacache',
+            name='expira_em',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Expira em'),
+        ),
+        migrations.RunPython(preencher_expira_em, noop_reverse),
+    ]
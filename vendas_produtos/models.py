@@ -6,6 +6,7 @@ from decimal import Decimal
 import os
 import uuid
 
+from core.singleton import CachedSingletonMixin
 from crmspagi.storage_backends import PublicMediaStorage
 
 User = get_user_model()
@@ -23,7 +24,7 @@ def get_apolice_upload_path(instance, filename):
     return f"vendas_produtos/apolices/{folder}/{unique_filename}"
 
 # === CONFIGURAÇÃO DE COMISSÕES (PAINEL ADMIN) ===
-class ParametrosComissao(models.Model):
+class ParametrosComissao(CachedSingletonMixin, models.Model):
     # Carros
     comissao_carro_padrao = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('500.00'), verbose_name="Comissão Carro (Padrão)")
     comissao_carro_desconto = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('200.00'), verbose_name="Comissão Carro (c/ Desconto)")
@@ -58,8 +59,7 @@ class ParametrosComissao(models.Model):
 
     @classmethod
     def get_solo(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
+        return cls.carregar_singleton()
 
 # === MODELO: FECHAMENTO MENSAL ===
 class FechamentoMensal(models.Model):
@@ -162,6 +162,8 @@ class VendaProduto(models.Model):
 
     COMPROVANTE_IA_CHOICES = [
         ('NAO_VERIFICADO', 'Não verificado'),
+        ('PENDENTE', 'Aguardando IA'),
+        ('PROCESSANDO', 'Em análise (IA)'),
         ('VALIDO', 'Válido (IA)'),
         ('INVALIDO', 'Inválido (IA)'),
         ('MANUAL', 'Validado Manualmente'),
@@ -173,6 +175,10 @@ class VendaProduto(models.Model):
         verbose_name="Status da Validação (IA)"
     )
     comprovante_ia_observacao = models.TextField(blank=True, null=True, verbose_name="Observação da IA")
+    # Fila da validacao em segundo plano (validacao_comprovante.py / processar_validacoes_comprovante).
+    comprovante_ia_tentativas = models.PositiveSmallIntegerField(default=0, editable=False)
+    comprovante_ia_disponivel_em = models.DateTimeField(null=True, blank=True, editable=False)
+    comprovante_ia_reservado_ate = models.DateTimeField(null=True, blank=True, editable=False)
     comprovante_validado_manual_por = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -220,6 +226,12 @@ class VendaProduto(models.Model):
         verbose_name = "Venda de Produto/Serviço"
         verbose_name_plural = "Vendas de Produtos"
         ordering = ['-data_venda', '-data_criacao']
+        indexes = [
+            models.Index(
+                fields=['comprovante_status_ia', 'comprovante_ia_disponivel_em'],
+                name='venda_fila_comprovante_idx',
+            ),
+        ]
 
     def clean(self):
         hoje = timezone.now().date()
@@ -374,3 +386,29 @@ class VendaProduto(models.Model):
         if self.pgto_credito > 0: metodos.append(f"Crédito ({self.pgto_credito})")
         if self.pgto_financiamento > 0: metodos.append(f"Finan ({self.pgto_financiamento})")
         return ", ".join(metodos)
+
+
+# === CACHE DE RESPOSTAS DA IA (GEMINI) ===
+class ResultadoIACache(models.Model):
+    """
+    Resposta ja interpretada do Gemini para um arquivo. A chave junta o SHA-256 dos
+    bytes do arquivo com o modelo e a versao do prompt (ver ai_cache.py): o mesmo
+    comprovante/documento reenviado nao volta para a IA. Depois de `expira_em` o
+    resultado nao e mais usado e o `manage.py limpar_cache_ia` apaga a linha.
+    """
+    chave = models.CharField(max_length=64, unique=True)
+    tipo = models.CharField(max_length=40, verbose_name="Tipo de análise")
+    modelo = models.CharField(max_length=100, verbose_name="Modelo")
+    arquivo_sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256 do arquivo")
+    resultado = models.JSONField(verbose_name="Resultado")
+    acertos = models.PositiveIntegerField(default=0, verbose_name="Reaproveitamentos")
+    criado_em = models.DateTimeField(auto_now_add=True)
+    ultimo_uso_em = models.DateTimeField(null=True, blank=True)
+    expira_em = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="Expira em")
+
+    class Meta:
+        verbose_name = "Resultado de IA (cache)"
+        verbose_name_plural = "Resultados de IA (cache)"
+
+    def __str__(self):
+        return f"{self.tipo} {self.arquivo_sha256[:12]} ({self.modelo})"
@@ -0,0 +1,146 @@
+"""
+Montagem do relatorio de comissoes (VendaProdutoRelatorioView).
+
+Antes cada vendedor do periodo custava varias consultas (o usuario, o perfil, dois
+aggregates, as vendas como titular, como ajudante e, para gerente, as da equipe),
+fora as FKs lidas pelo template. Agora o custo e fixo: um aggregate com os totais,
+uma consulta com as vendas do periodo (ja com vendedor/ajudante/perfil) e uma com os
+usuarios do relatorio; os blocos de titular, ajuda e gerencia saem dessas linhas.
+"""
+from collections import defaultdict
+import copy
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+
+COMISSAO_GERENTE_POR_TIPO = {
+    'VENDA_VEICULO': Decimal('150.00'),
+    'VENDA_MOTO': Decimal('80.00'),
+}
+
+
+def totais_do_periodo(qs_base):
+    totais = qs_base.aggregate(
+        lucro_loja=Sum('lucro_loja'),
+        comissao_vendedor=Sum('comissao_vendedor'),
+        comissao_ajudante=Sum('comissao_ajudante'),
+        valor_venda=Sum('valor_venda'),
+        quantidade=Count('id'),
+    )
+    return {
+        'total_geral_loja': totais['lucro_loja'] or 0,
+        'total_geral_comissao': (totais['comissao_vendedor'] or 0) + (totais['comissao_ajudante'] or 0),
+        'total_geral_bruto': totais['valor_venda'] or 0,
+        'qtd_vendas': totais['quantidade'],
+    }
+
+
+def _nivel_acesso(user):
+    try:
+        return user.profile.nivel_acesso
+    except Exception:
+        return None
+
+
+def _entra_na_comissao_de_gerencia(venda):
+    """Venda de veiculo/moto aprovada de um vendedor comum (ADMIN/GERENTE/superuser ficam de fora)."""
+    return (
+        venda.status == 'APROVADO'
+        and venda.tipo_produto in COMISSAO_GERENTE_POR_TIPO
+        and not venda.vendedor.is_superuser
+        and _nivel_acesso(venda.vendedor) not in ('ADMIN', 'GERENTE')
+    )
+
+
+def _chave_exibicao_venda(venda, vendedor_id):
+    papel = 'GERENCIA'
+    if not getattr(venda, 'is_comissao_gerente', False):
+        papel = 'AJUDA' if venda.vendedor_ajudante_id == vendedor_id else 'TITULAR'
+    return (
+        venda.data_venda,
+        venda.tipo_produto,
+        (venda.cliente_nome or '').strip().lower(),
+        (venda.placa or '').strip().upper(),
+        (venda.modelo_veiculo or '').strip().lower(),
+        Decimal(venda.valor_venda or 0),
+        papel,
+    )
+
+
+def _bloco_do_vendedor(vendedor, como_titular, como_ajudante, vendas_equipe):
+    vid = vendedor.pk
+    titular = como_titular.get(vid, [])
+    ids_vendas = {venda.pk for venda in titular}
+    ajuda = [venda for venda in como_ajudante.get(vid, []) if venda.pk not in ids_vendas]
+    ids_vendas.update(venda.pk for venda in ajuda)
+    todas_vendas = titular + ajuda
+
+    # Se for EXCLUSIVAMENTE GERENTE, entra a comissao sobre as vendas da equipe.
+    if _nivel_acesso(vendedor) == 'GERENTE':
+        for venda in vendas_equipe:
+            if venda.pk in ids_vendas:
+                continue
+            # Copia: a mesma venda aparece sem a marca de gerencia no bloco do titular.
+            venda_gerencia = copy.copy(venda)
+            venda_gerencia.is_comissao_gerente = True
+            venda_gerencia.valor_comissao_gerente = COMISSAO_GERENTE_POR_TIPO[venda.tipo_produto]
+            todas_vendas.append(venda_gerencia)
+            ids_vendas.add(venda.pk)
+
+    todas_vendas.sort(key=lambda venda: venda.data_venda)
+
+    # Blindagem final: remove duplicidades por chave de exibicao
+    # (casos de dados repetidos/inconsistentes no periodo).
+    vendas_unicas = []
+    chaves_vendas = set()
+    total = Decimal('0.00')
+    for venda in todas_vendas:
+        chave = _chave_exibicao_venda(venda, vid)
+        if chave in chaves_vendas:
+            continue
+        chaves_vendas.add(chave)
+        vendas_unicas.append(venda)
+
+        if getattr(venda, 'is_comissao_gerente', False):
+            total += venda.valor_comissao_gerente or Decimal('0.00')
+        elif venda.vendedor_ajudante_id == vid:
+            total += venda.comissao_ajudante or Decimal('0.00')
+        else:
+            total += venda.comissao_vendedor or Decimal('0.00')
+
+    return {'vendedor': vendedor, 'vendas': vendas_unicas, 'total_comissao': total}
+
+
+def montar_relatorio_comissoes(qs_base, vendedor_id=None, incluir_usuario=None):
+    """
+    Retorna (blocos, vendedores): um bloco por vendedor com vendas no periodo (titular,
+    ajuda ou gerencia), ordenados pelo nome, e os usuarios do filtro do relatorio.
+    `incluir_usuario` entra mesmo sem vendas proprias (gestor logado).
+    """
+    vendas = list(qs_base.select_related('vendedor__profile', 'vendedor_ajudante'))
+
+    if vendedor_id:
+        ids = {vendedor_id}
+    else:
+        ids = {venda.vendedor_id for venda in vendas}
+        ids.update(venda.vendedor_ajudante_id for venda in vendas if venda.vendedor_ajudante_id)
+        if incluir_usuario is not None:
+            ids.add(incluir_usuario.pk)
+
+    vendedores = list(User.objects.filter(pk__in=ids).select_related('profile').order_by('username'))
+
+    como_titular, como_ajudante = defaultdict(list), defaultdict(list)
+    for venda in vendas:
+        como_titular[venda.vendedor_id].append(venda)
+        if venda.vendedor_ajudante_id:
+            como_ajudante[venda.vendedor_ajudante_id].append(venda)
+    vendas_equipe = [venda for venda in vendas if _entra_na_comissao_de_gerencia(venda)]
+
+    blocos = []
+    for vendedor in vendedores:
+        bloco = _bloco_do_vendedor(vendedor, como_titular, como_ajudante, vendas_equipe)
+        if bloco['vendas']:
+            blocos.append(bloco)
+    blocos.sort(key=lambda bloco: bloco['vendedor'].get_full_name() or bloco['vendedor'].username)
+    return blocos, vendedores
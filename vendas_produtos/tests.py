@@ -1,11 +1,33 @@
+import os
+import time
+from datetime import timedelta
+from io import StringIO
 from decimal import Decimal
+from types import SimpleNamespace
+from unittest import skipUnless
 from unittest.mock import patch
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import ParametrosComissao, VendaProduto
+from configuracoes.models import ModuloSistema, PermissaoModulo
+from notificacoes.models import Notificacao
+
+from .ai_extracao import extrair_dados_cliente_com_gemini
+from .ai_validacao import validar_comprovante_com_gemini
+from .models import ParametrosComissao, ResultadoIACache, VendaProduto
+from .validacao_comprovante import (
+    enfileirar_validacao_comprovante,
+    processar_validacao,
+    processar_validacoes_pendentes,
+    reivindicar_validacoes,
+)
 
 
 class ComissaoVendaProdutoTests(TestCase):
@@ -169,3 +191,370 @@ class RejeitarVendaWhatsappTests(TestCase):
         mock_enviar.assert_called_once()
         args, _ = mock_enviar.call_args
         self.assertEqual(args[1]['telefone'], '41977776666')
+
+
+class _FakeModels:
+    def __init__(self, texto, latencia):
+        self.texto = texto
+        self.latencia = latencia
+        self.chamadas = 0
+
+    def generate_content(self, **kwargs):
+        self.chamadas += 1
+        time.sleep(self.latencia)
+        return SimpleNamespace(text=self.texto)
+
+
+class _FakeGemini:
+    def __init__(self, texto='{"valido": true, "motivo": "Pix legível"}', latencia=0):
+        self.models = _FakeModels(texto, latencia)
+
+
+class CacheIAComprovanteTests(TestCase):
+    def _arquivo(self, conteudo=b'comprovante-pix', nome='comprovante.png'):
+        return SimpleUploadedFile(nome, conteudo, content_type='image/png')
+
+    def _runtime(self, cliente, modelo='gemini-teste'):
+        return patch('vendas_produtos.ai_cache.get_gemini_runtime', return_value=(cliente, modelo, None))
+
+    def test_mesmo_arquivo_nao_chama_a_ia_de_novo(self):
+        cliente = _FakeGemini(latencia=0.2)
+        with self._runtime(cliente):
+            inicio = time.perf_counter()
+            primeiro = validar_comprovante_com_gemini(self._arquivo())
+            tempo_miss = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            segundo = validar_comprovante_com_gemini(self._arquivo())
+            tempo_hit = time.perf_counter() - inicio
+
+        self.assertEqual(primeiro, {'valido': True, 'motivo': 'Pix legível'})
+        self.assertEqual(segundo, primeiro)
+        self.assertEqual(cliente.models.chamadas, 1)
+        self.assertLess(tempo_hit, tempo_miss / 4)
+        self.assertEqual(ResultadoIACache.objects.get().acertos, 1)
+
+    def test_bytes_modelo_ou_prompt_diferentes_sao_miss(self):
+        cliente = _FakeGemini()
+        with self._runtime(cliente):
+            validar_comprovante_com_gemini(self._arquivo())
+            validar_comprovante_com_gemini(self._arquivo(b'outro-comprovante'))
+        with self._runtime(cliente, modelo='gemini-novo'):
+            validar_comprovante_com_gemini(self._arquivo())
+        with self._runtime(cliente), patch('vendas_produtos.ai_validacao.SYSTEM_INSTRUCTION', 'prompt v2'):
+            validar_comprovante_com_gemini(self._arquivo())
+
+        self.assertEqual(cliente.models.chamadas, 4)
+        self.assertEqual(ResultadoIACache.objects.count(), 4)
+
+    def test_validacao_e_extracao_nao_compartilham_resultado(self):
+        cliente = _FakeGemini(texto='{"valido": true, "motivo": "ok", "nome": "Fulano"}')
+        with self._runtime(cliente):
+            validar_comprovante_com_gemini(self._arquivo())
+            dados = extrair_dados_cliente_com_gemini(self._arquivo())
+
+        self.assertEqual(cliente.models.chamadas, 2)
+        self.assertEqual(dados['nome'], 'Fulano')
+
+    def test_resposta_invalida_nao_vai_para_o_cache(self):
+        cliente = _FakeGemini(texto='isso nao e json')
+        with self._runtime(cliente):
+            self.assertIsNone(validar_comprovante_com_gemini(self._arquivo()))
+            self.assertIsNone(validar_comprovante_com_gemini(self._arquivo()))
+
+        self.assertEqual(cliente.models.chamadas, 2)
+        self.assertFalse(ResultadoIACache.objects.exists())
+
+    def test_ia_desativada_nao_usa_o_cache(self):
+        cliente = _FakeGemini()
+        with self._runtime(cliente):
+            validar_comprovante_com_gemini(self._arquivo())
+        with patch('vendas_produtos.ai_cache.get_gemini_runtime', return_value=(None, None, 'desativada')):
+            self.assertIsNone(validar_comprovante_com_gemini(self._arquivo()))
+
+    @override_settings(IA_CACHE_VALIDADE_DIAS=30, IA_CACHE_VALIDADE_DOCUMENTOS_DIAS=7)
+    def test_documento_de_identificacao_vence_antes_do_comprovante(self):
+        cliente = _FakeGemini(texto='{"valido": true, "motivo": "ok", "nome": "Fulano"}')
+        with self._runtime(cliente):
+            validar_comprovante_com_gemini(self._arquivo())
+            extrair_dados_cliente_com_gemini(self._arquivo())
+
+        agora = timezone.now()
+        comprovante = ResultadoIACache.objects.get(tipo='validacao_comprovante')
+        documento = ResultadoIACache.objects.get(tipo='extracao_cliente')
+        self.assertAlmostEqual((comprovante.expira_em - agora).days, 29, delta=1)
+        self.assertAlmostEqual((documento.expira_em - agora).days, 6, delta=1)
+
+    def test_resultado_vencido_volta_para_a_ia_e_e_renovado(self):
+        cliente = _FakeGemini()
+        with self._runtime(cliente):
+            validar_comprovante_com_gemini(self._arquivo())
+            ResultadoIACache.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+            validar_comprovante_com_gemini(self._arquivo())
+            validar_comprovante_com_gemini(self._arquivo())
+
+        self.assertEqual(cliente.models.chamadas, 2)
+        renovado = ResultadoIACache.objects.get()
+        self.assertGreater(renovado.expira_em, timezone.now())
+        self.assertEqual(renovado.acertos, 1)
+
+    def test_limpar_cache_ia_apaga_so_os_vencidos(self):
+        cliente = _FakeGemini()
+        with self._runtime(cliente):
+            validar_comprovante_com_gemini(self._arquivo())
+            validar_comprovante_com_gemini(self._arquivo(b'outro-comprovante'))
+            validar_comprovante_com_gemini(self._arquivo(b'sem-validade'))
+        vencido, valido, sem_validade = ResultadoIACache.objects.order_by('pk')
+        ResultadoIACache.objects.filter(pk=vencido.pk).update(expira_em=timezone.now() - timedelta(days=1))
+        ResultadoIACache.objects.filter(pk=sem_validade.pk).update(expira_em=None)
+
+        call_command('limpar_cache_ia', stdout=StringIO())
+
+        self.assertEqual(list(ResultadoIACache.objects.values_list('pk', flat=True)), [valido.pk])
+
+
+@patch('vendas_produtos.validacao_comprovante.validar_comprovante_com_gemini')
+class ValidacaoComprovanteEmSegundoPlanoTests(TestCase):
+    def setUp(self):
+        self.vendedor = User.objects.create_user(username='vendedor_fila_ia', password='123456')
+        self.modulo_vendas = ModuloSistema.objects.get(slug='vendas')
+        PermissaoModulo.objects.create(user=self.vendedor, modulo=self.modulo_vendas, pode_visualizar=True)
+        self.gerente = User.objects.create_superuser(username='gerente_fila_ia', password='123456', email='g@teste.com')
+        self.venda = VendaProduto.objects.create(
+            vendedor=self.vendedor,
+            cliente_nome='Cliente Fila',
+            placa='FIL0001',
+            modelo_veiculo='Onix',
+            tipo_produto='VENDA_VEICULO',
+            valor_venda=Decimal('50000.00'),
+            custo_base=Decimal('40000.00'),
+        )
+        # O worker nao le o arquivo (a IA esta mockada); basta ter um nome.
+        VendaProduto.objects.filter(pk=self.venda.pk).update(comprovante='vendas_produtos/comprovantes/geral/pix.png')
+        self.venda.refresh_from_db()
+        enfileirar_validacao_comprovante(self.venda)
+
+    def test_enfileirar_nao_chama_a_ia(self, mock_validar):
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.comprovante_status_ia, 'PENDENTE')
+        mock_validar.assert_not_called()
+
+    def test_worker_grava_resultado_valido(self, mock_validar):
+        mock_validar.return_value = {'valido': True, 'motivo': 'Pix legível'}
+
+        self.assertEqual(processar_validacoes_pendentes(), 1)
+
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.comprovante_status_ia, 'VALIDO')
+        self.assertEqual(self.venda.comprovante_ia_observacao, 'Pix legível')
+        self.assertIsNone(self.venda.comprovante_ia_reservado_ate)
+        self.assertEqual(processar_validacoes_pendentes(), 0)
+
+    def test_invalido_notifica_vendedor_e_gestores(self, mock_validar):
+        mock_validar.return_value = {'valido': False, 'motivo': 'Ilegível'}
+
+        processar_validacoes_pendentes()
+
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.comprovante_status_ia, 'INVALIDO')
+        notificados = set(Notificacao.objects.values_list('usuario__username', flat=True))
+        self.assertEqual(notificados, {'vendedor_fila_ia', 'gerente_fila_ia'})
+
+    @override_settings(VALIDACAO_COMPROVANTE_MAX_TENTATIVAS=2)
+    def test_ia_indisponivel_reagenda_e_desiste_apos_max_tentativas(self, mock_validar):
+        mock_validar.return_value = None
+
+        processar_validacoes_pendentes()
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.comprovante_status_ia, 'PENDENTE')
+        self.assertGreater(self.venda.comprovante_ia_disponivel_em, timezone.now())
+        # Ainda no backoff: nada a fazer agora.
+        self.assertEqual(processar_validacoes_pendentes(), 0)
+
+        VendaProduto.objects.filter(pk=self.venda.pk).update(comprovante_ia_disponivel_em=timezone.now())
+        processar_validacoes_pendentes()
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.comprovante_status_ia, 'NAO_VERIFICADO')
+        self.assertEqual(mock_validar.call_count, 2)
+
+    def test_reserva_expirada_volta_para_a_fila(self, mock_validar):
+        mock_validar.return_value = {'valido': True, 'motivo': 'ok'}
+        self.assertEqual(len(reivindicar_validacoes(10)), 1)
+        # Worker "morreu": enquanto a reserva vale, ninguem pega de novo.
+        self.assertEqual(reivindicar_validacoes(10), [])
+
+        VendaProduto.objects.filter(pk=self.venda.pk).update(comprovante_ia_reservado_ate=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(processar_validacoes_pendentes(), 1)
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.comprovante_status_ia, 'VALIDO')
+
+    def test_novo_upload_durante_a_analise_descarta_resultado_antigo(self, mock_validar):
+        [reivindicada] = reivindicar_validacoes(10)
+        enfileirar_validacao_comprovante(self.venda)
+        mock_validar.return_value = {'valido': False, 'motivo': 'arquivo antigo'}
+
+        processar_validacao(reivindicada)
+
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.comprovante_status_ia, 'PENDENTE')
+        self.assertFalse(Notificacao.objects.exists())
+
+    def test_endpoint_de_status(self, mock_validar):
+        url = reverse('venda_produto_status_comprovante_ia', kwargs={'pk': self.venda.pk})
+        self.client.force_login(self.vendedor)
+
+        dados = self.client.get(url).json()
+        self.assertEqual(dados['status'], 'PENDENTE')
+        self.assertTrue(dados['em_andamento'])
+
+        mock_validar.return_value = {'valido': True, 'motivo': 'ok'}
+        processar_validacoes_pendentes()
+        dados = self.client.get(url).json()
+        self.assertEqual(dados['status'], 'VALIDO')
+        self.assertFalse(dados['em_andamento'])
+
+    def test_endpoint_de_status_respeita_acesso(self, mock_validar):
+        outro = User.objects.create_user(username='outro_vendedor_fila', password='123456')
+        PermissaoModulo.objects.create(user=outro, modulo=self.modulo_vendas, pode_visualizar=True)
+        self.client.force_login(outro)
+
+        resposta = self.client.get(reverse('venda_produto_status_comprovante_ia', kwargs={'pk': self.venda.pk}))
+
+        self.assertEqual(resposta.status_code, 404)
+
+
+def _venda_relatorio(vendedor, **kwargs):
+    # Nome distinto por venda: o relatorio descarta linhas repetidas pela chave de exibicao.
+    dados = {
+        'vendedor': vendedor,
+        'cliente_nome': f'Cliente Relatorio {VendaProduto.objects.count()}',
+        'placa': 'REL1A23',
+        'tipo_produto': 'VENDA_VEICULO',
+        'status': 'APROVADO',
+        'data_venda': timezone.localdate(),
+        'valor_venda': Decimal('50000.00'),
+        'comissao_vendedor': Decimal('500.00'),
+    }
+    dados.update(kwargs)
+    # bulk_create nao passa pelo save(): as comissoes ficam exatamente as informadas.
+    return VendaProduto.objects.bulk_create([VendaProduto(**dados)])[0]
+
+
+class RelatorioComissoesTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin_relatorio_vendas', password='123456', email='v@teste.com')
+        self.gerente = User.objects.create_user(username='gerente_relatorio', password='123456', first_name='Gerente')
+        self.gerente.profile.nivel_acesso = 'GERENTE'
+        self.gerente.profile.save()
+        self.ana = User.objects.create_user(username='ana_relatorio', password='123456', first_name='Ana')
+        self.bia = User.objects.create_user(username='bia_relatorio', password='123456', first_name='Bia')
+        self.client.force_login(self.admin)
+
+    def _relatorio(self, **params):
+        resposta = self.client.get(reverse('venda_produto_relatorio'), params)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.context
+
+    def _bloco(self, context, user):
+        return next(item for item in context['relatorio_vendedores'] if item['vendedor'] == user)
+
+    def test_titular_ajudante_e_comissao_de_gerencia(self):
+        carro = _venda_relatorio(self.ana, vendedor_ajudante=self.bia, comissao_vendedor=Decimal('300.00'), comissao_ajudante=Decimal('200.00'))
+        moto = _venda_relatorio(self.bia, tipo_produto='VENDA_MOTO', comissao_vendedor=Decimal('100.00'))
+        _venda_relatorio(self.bia, tipo_produto='GARANTIA', comissao_vendedor=Decimal('50.00'))
+        _venda_relatorio(self.ana, status='PENDENTE', comissao_vendedor=Decimal('10.00'))
+        propria = _venda_relatorio(self.gerente, tipo_produto='GARANTIA', comissao_vendedor=Decimal('20.00'))
+
+        context = self._relatorio()
+
+        self.assertEqual(context['qtd_vendas'], 5)
+        self.assertEqual(context['total_geral_comissao'], Decimal('680.00'))
+        self.assertEqual(self._bloco(context, self.ana)['total_comissao'], Decimal('310.00'))
+        self.assertEqual(self._bloco(context, self.bia)['total_comissao'], Decimal('350.00'))
+
+        gerente = self._bloco(context, self.gerente)
+        self.assertEqual({venda.pk for venda in gerente['vendas']}, {propria.pk, carro.pk, moto.pk})
+        self.assertEqual(gerente['total_comissao'], Decimal('250.00'))
+        # A marca de comissao de gerencia nao vaza para o bloco do titular.
+        venda_ana = next(venda for venda in self._bloco(context, self.ana)['vendas'] if venda.pk == carro.pk)
+        self.assertFalse(getattr(venda_ana, 'is_comissao_gerente', False))
+        self.assertContains(self.client.get(reverse('venda_produto_relatorio')), 'Split com Ana')
+
+    def test_filtro_por_vendedor(self):
+        _venda_relatorio(self.ana, vendedor_ajudante=self.bia, comissao_ajudante=Decimal('200.00'))
+        _venda_relatorio(self.ana)
+
+        context = self._relatorio(vendedor=self.bia.pk)
+
+        self.assertEqual(context['qtd_vendas'], 1)
+        self.assertEqual([item['vendedor'] for item in context['relatorio_vendedores']], [self.bia])
+        self.assertEqual(context['relatorio_vendedores'][0]['total_comissao'], Decimal('200.00'))
+
+    def test_consultas_nao_crescem_com_a_equipe(self):
+        def contar_consultas():
+            with CaptureQueriesContext(connection) as consultas:
+                self._relatorio()
+            return len(consultas)
+
+        _venda_relatorio(self.ana, vendedor_ajudante=self.bia)
+        poucos = contar_consultas()
+        for indice in range(10):
+            vendedor = User.objects.create_user(username=f'extra_relatorio_{indice}', password='123456')
+            _venda_relatorio(vendedor, vendedor_ajudante=self.ana)
+
+        self.assertEqual(contar_consultas(), poucos)
+
+
+@skipUnless(os.getenv('RUN_BENCHMARKS'), 'Benchmark: defina RUN_BENCHMARKS=1 para rodar.')
+class RelatorioComissoesBenchmark(TestCase):
+    TOTAL_VENDEDORES = 50
+    TOTAL_VENDAS = 5000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin_bench_relatorio', password='123456', email='b@teste.com')
+        vendedores = [
+            User.objects.create_user(username=f'vendedor_bench_{indice}', password='123456')
+            for indice in range(cls.TOTAL_VENDEDORES)
+        ]
+        for gerente in vendedores[:2]:
+            gerente.profile.nivel_acesso = 'GERENTE'
+            gerente.profile.save()
+        hoje = timezone.localdate()
+        tipos = ['VENDA_VEICULO', 'VENDA_MOTO', 'GARANTIA', 'REFINANCIAMENTO']
+        VendaProduto.objects.bulk_create(
+            [
+                VendaProduto(
+                    vendedor=vendedores[indice % cls.TOTAL_VENDEDORES],
+                    vendedor_ajudante=vendedores[(indice + 7) % cls.TOTAL_VENDEDORES] if indice % 5 == 0 else None,
+                    cliente_nome=f'Cliente {indice}',
+                    placa=f'BEN{indice:04d}',
+                    tipo_produto=tipos[indice % len(tipos)],
+                    status='APROVADO' if indice % 3 else 'PENDENTE',
+                    data_venda=hoje.replace(day=1) + timedelta(days=indice % 28),
+                    valor_venda=Decimal('1000.00'),
+                    comissao_vendedor=Decimal('100.00'),
+                    comissao_ajudante=Decimal('50.00') if indice % 5 == 0 else Decimal('0.00'),
+                )
+                for indice in range(cls.TOTAL_VENDAS)
+            ],
+            batch_size=1000,
+        )
+
+    def test_relatorio_com_50_vendedores_e_5k_vendas(self):
+        self.client.force_login(self.admin)
+        url = reverse('venda_produto_relatorio')
+        self.client.get(url)
+
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+        self.assertEqual(resposta.status_code, 200)
+        print(
+            f"\n[benchmark] relatorio de comissoes ({self.TOTAL_VENDEDORES} vendedores, "
+            f"{self.TOTAL_VENDAS} vendas): {len(consultas)} consultas, {duracao_ms:.0f} ms"
+        )
+        self.assertLess(len(consultas), 20)
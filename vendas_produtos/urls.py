@@ -12,6 +12,7 @@ from .views import (
     rejeitar_venda_produto,
     validar_comprovante_manual,
     validar_comprovante_preview,
+    status_comprovante_ia,
     VendaIAWizardView,
     venda_ia_extrair_cliente,
     venda_ia_extrair_veiculo,
@@ -35,6 +36,7 @@ urlpatterns = [
     path('<int:pk>/ajustar-custo/', ajustar_custo_veiculo, name='venda_produto_adjust_cost'),
     path('<int:pk>/rejeitar/', rejeitar_venda_produto, name='venda_produto_reject'),
     path('<int:pk>/validar-comprovante-manual/', validar_comprovante_manual, name='venda_produto_validar_comprovante_manual'),
+    path('<int:pk>/comprovante/status-ia/', status_comprovante_ia, name='venda_produto_status_comprovante_ia'),
     path('fechamento/', toggle_fechamento_mes, name='venda_produto_fechamento'),
     path('configuracao/comissao/', ConfiguracaoComissaoView.as_view(), name='configuracao_comissao'),
 ]
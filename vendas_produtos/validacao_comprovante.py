@@ -0,0 +1,150 @@
+"""
+Validacao do comprovante pela IA fora do request.
+
+O upload so marca a venda como PENDENTE (`enfileirar_validacao_comprovante`); o
+worker `manage.py processar_validacoes_comprovante` reivindica as pendentes com
+SELECT ... FOR UPDATE SKIP LOCKED (no SQLite, com UPDATE condicional), chama o
+Gemini e grava VALIDO/INVALIDO. A tela acompanha pelo endpoint de status.
+
+Uma venda reivindicada fica PROCESSANDO ate `comprovante_ia_reservado_ate`: se o
+worker morrer no meio, ela volta para a fila quando a reserva expira. Se a IA
+estiver indisponivel, a venda e reagendada; esgotadas as tentativas, fica
+NAO_VERIFICADO (mesmo comportamento de antes, quando a chamada falhava no request).
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from notificacoes.utils import notificar_usuario
+
+from .ai_validacao import validar_comprovante_com_gemini
+from .models import VendaProduto
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+STATUS_EM_ANDAMENTO = ('PENDENTE', 'PROCESSANDO')
+
+
+def gestores_financeiros(exclude_user=None):
+    qs = User.objects.filter(Q(is_superuser=True) | Q(profile__nivel_acesso__in=['ADMIN', 'GERENTE'])).distinct()
+    if exclude_user:
+        qs = qs.exclude(pk=exclude_user.pk)
+    return qs
+
+
+def enfileirar_validacao_comprovante(venda):
+    """Coloca o comprovante da venda na fila da IA (substitui qualquer validacao anterior)."""
+    campos = {
+        'comprovante_status_ia': 'PENDENTE',
+        'comprovante_ia_observacao': None,
+        'comprovante_ia_tentativas': 0,
+        'comprovante_ia_disponivel_em': timezone.now(),
+        'comprovante_ia_reservado_ate': None,
+    }
+    # update() direto: save() recalcularia as comissoes da venda a toa.
+    VendaProduto.objects.filter(pk=venda.pk).update(**campos)
+    for campo, valor in campos.items():
+        setattr(venda, campo, valor)
+
+
+def _filtro_elegiveis(agora):
+    return (
+        Q(comprovante_status_ia='PENDENTE', comprovante_ia_disponivel_em__lte=agora)
+        | Q(comprovante_status_ia='PROCESSANDO', comprovante_ia_reservado_ate__lt=agora)
+    )
+
+
+def reivindicar_validacoes(limite):
+    """Marca ate `limite` vendas da fila como PROCESSANDO para este worker e as retorna."""
+    agora = timezone.now()
+    reservado_ate = agora + timedelta(seconds=settings.VALIDACAO_COMPROVANTE_RESERVA_SEGUNDOS)
+    filtro = _filtro_elegiveis(agora)
+
+    with transaction.atomic():
+        candidatas = VendaProduto.objects.filter(filtro).order_by('comprovante_ia_disponivel_em', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            candidatas = candidatas.select_for_update(skip_locked=True)
+        ids = list(candidatas.values_list('pk', flat=True)[:limite])
+        if not ids:
+            return []
+        VendaProduto.objects.filter(filtro, pk__in=ids).update(
+            comprovante_status_ia='PROCESSANDO',
+            comprovante_ia_reservado_ate=reservado_ate,
+            comprovante_ia_tentativas=F('comprovante_ia_tentativas') + 1,
+        )
+    return list(
+        VendaProduto.objects.select_related('vendedor').filter(
+            pk__in=ids, comprovante_status_ia='PROCESSANDO', comprovante_ia_reservado_ate=reservado_ate,
+        )
+    )
+
+
+def _gravar(venda, **campos):
+    """Grava o resultado so se a venda ainda for deste worker (um novo upload reenfileira)."""
+    gravou = VendaProduto.objects.filter(
+        pk=venda.pk,
+        comprovante_status_ia='PROCESSANDO',
+        comprovante_ia_reservado_ate=venda.comprovante_ia_reservado_ate,
+    ).update(comprovante_ia_reservado_ate=None, **campos)
+    return bool(gravou)
+
+
+def _notificar_invalido(venda, motivo):
+    notificar_usuario(
+        venda.vendedor,
+        f"⚠️ Comprovante de {venda.cliente_nome} sinalizado como inválido pela IA: {motivo}. "
+        "A venda segue registrada; um gestor pode validar manualmente o comprovante.",
+        url=reverse('venda_produto_list'),
+        titulo="Comprovante Suspeito",
+    )
+    for gestor in gestores_financeiros(exclude_user=venda.vendedor):
+        notificar_usuario(
+            gestor,
+            f"Comprovante de {venda.cliente_nome} sinalizado como suspeito pela IA: {motivo}",
+            url=reverse('venda_produto_list'),
+            titulo="Comprovante Suspeito",
+        )
+
+
+def processar_validacao(venda):
+    """Valida o comprovante de uma venda ja reivindicada e grava o resultado."""
+    resultado = validar_comprovante_com_gemini(venda.comprovante) if venda.comprovante else None
+
+    if resultado is None:
+        if venda.comprovante and venda.comprovante_ia_tentativas < settings.VALIDACAO_COMPROVANTE_MAX_TENTATIVAS:
+            espera = settings.VALIDACAO_COMPROVANTE_BACKOFF * venda.comprovante_ia_tentativas
+            _gravar(
+                venda,
+                comprovante_status_ia='PENDENTE',
+                comprovante_ia_disponivel_em=timezone.now() + timedelta(seconds=espera),
+            )
+        else:
+            _gravar(venda, comprovante_status_ia='NAO_VERIFICADO')
+        return
+
+    status = 'VALIDO' if resultado['valido'] else 'INVALIDO'
+    if _gravar(venda, comprovante_status_ia=status, comprovante_ia_observacao=resultado['motivo']) and status == 'INVALIDO':
+        try:
+            _notificar_invalido(venda, resultado['motivo'])
+        except Exception:
+            logger.exception("Falha ao notificar comprovante suspeito (venda %s).", venda.pk)
+
+
+def processar_validacoes_pendentes(limite=None):
+    """Um ciclo do worker. Retorna quantas vendas processou."""
+    vendas = reivindicar_validacoes(limite or settings.VALIDACAO_COMPROVANTE_LOTE)
+    for venda in vendas:
+        try:
+            processar_validacao(venda)
+        except Exception:
+            # A reserva expira e a venda volta para a fila.
+            logger.exception("Erro ao validar comprovante da venda %s.", venda.pk)
+    return len(vendas)
@@ -18,6 +18,8 @@ from .models import VendaProduto, FechamentoMensal, ParametrosComissao
 from .forms import VendaProdutoForm, ParametrosComissaoForm
 from .ai_validacao import validar_comprovante_com_gemini
 from .ai_extracao import extrair_dados_cliente_com_gemini
+from .relatorio_comissoes import montar_relatorio_comissoes, totais_do_periodo
+from .validacao_comprovante import STATUS_EM_ANDAMENTO, enfileirar_validacao_comprovante, gestores_financeiros
 from documentos.pdf_utils import extract_crlv_data_with_gemini
 from notificacoes.utils import notificar_usuario
 from notificacoes.whatsapp import notificar_whatsapp_venda_rejeitada
@@ -45,12 +47,6 @@ def _vendas_acessiveis(user):
         return VendaProduto.objects.all()
     return VendaProduto.objects.filter(Q(vendedor=user) | Q(vendedor_ajudante=user))
 
-def _gestores_financeiros(exclude_user=None):
-    qs = User.objects.filter(Q(is_superuser=True) | Q(profile__nivel_acesso__in=['ADMIN', 'GERENTE'])).distinct()
-    if exclude_user:
-        qs = qs.exclude(pk=exclude_user.pk)
-    return qs
-
 def _parse_decimal_br(valor_str):
     if not valor_str:
         return None
@@ -61,28 +57,12 @@ def _parse_decimal_br(valor_str):
         return None
 
 def _validar_comprovante_upload(venda, request):
-    resultado = validar_comprovante_com_gemini(venda.comprovante)
-    if resultado is None:
-        return
-
-    if resultado['valido']:
-        venda.comprovante_status_ia = 'VALIDO'
-    else:
-        venda.comprovante_status_ia = 'INVALIDO'
-        messages.warning(
-            request,
-            f"⚠️ Comprovante sinalizado como inválido pela IA: {resultado['motivo']}. "
-            "A venda foi registrada normalmente; um gestor pode validar manualmente o comprovante."
-        )
-        for gestor in _gestores_financeiros(exclude_user=venda.vendedor):
-            notificar_usuario(
-                gestor,
-                f"Comprovante de {venda.cliente_nome} sinalizado como suspeito pela IA: {resultado['motivo']}",
-                url=reverse('venda_produto_list'),
-                titulo="Comprovante Suspeito",
-            )
-    venda.comprovante_ia_observacao = resultado['motivo']
-    venda.save(update_fields=['comprovante_status_ia', 'comprovante_ia_observacao'])
+    # A IA roda no worker (processar_validacoes_comprovante); o request so enfileira.
+    enfileirar_validacao_comprovante(venda)
+    messages.info(
+        request,
+        "Comprovante recebido. A validação pela IA roda em segundo plano; o resultado aparece na lista de vendas."
+    )
 
 @login_required
 @require_POST
@@ -309,7 +289,7 @@ class VendaProdutoCreateView(ModuleActionRequiredMixin, CreateView):
         else:
             messages.success(self.request, "Lançamento registrado com sucesso!")
 
-        for gestor in _gestores_financeiros(exclude_user=main_venda.vendedor):
+        for gestor in gestores_financeiros(exclude_user=main_venda.vendedor):
             notificar_usuario(
                 gestor,
                 f"Nova venda de {main_venda.cliente_nome} registrada por "
@@ -539,127 +519,20 @@ class VendaProdutoRelatorioView(LoginRequiredMixin, TemplateView):
             qs_base = qs_base.filter(Q(vendedor_id=vid) | Q(vendedor_ajudante_id=vid))
 
         # --- TOTAIS GERAIS ---
-        context['total_geral_loja'] = qs_base.aggregate(Sum('lucro_loja'))['lucro_loja__sum'] or 0
-        
-        total_comissao_titular = qs_base.aggregate(Sum('comissao_vendedor'))['comissao_vendedor__sum'] or 0
-        total_comissao_ajudante = qs_base.aggregate(Sum('comissao_ajudante'))['comissao_ajudante__sum'] or 0
-        context['total_geral_comissao'] = total_comissao_titular + total_comissao_ajudante
+        context.update(totais_do_periodo(qs_base))
 
-        context['total_geral_bruto'] = qs_base.aggregate(Sum('valor_venda'))['valor_venda__sum'] or 0
-        context['qtd_vendas'] = qs_base.count()
-
-        # --- LÓGICA DE AGRUPAMENTO POR VENDEDOR ---
-        if vendedor_id_filter:
-            ids_para_processar = [int(vendedor_id_filter)]
-        else:
-            ids_titulares = set(qs_base.values_list('vendedor', flat=True))
-            ids_ajudantes = set(qs_base.values_list('vendedor_ajudante', flat=True))
-            ids_para_processar = list(ids_titulares | ids_ajudantes)
-            if None in ids_para_processar: ids_para_processar.remove(None)
-        
+        # --- AGRUPAMENTO POR VENDEDOR (titular, ajuda e comissao de gerencia) ---
         # Adiciona o próprio usuário logado se ele for admin/gerente e não tiver vendas
-        if not vendedor_id_filter:
-            if self.request.user.id not in ids_para_processar and _is_gestor_financeiro(self.request.user):
-                ids_para_processar.append(self.request.user.id)
-
-        relatorio_vendedores = []
-        
-        def _chave_exibicao_venda(venda, vendedor_id):
-            papel = 'GERENCIA'
-            if not getattr(venda, 'is_comissao_gerente', False):
-                papel = 'AJUDA' if venda.vendedor_ajudante_id == vendedor_id else 'TITULAR'
-            return (
-                venda.data_venda,
-                venda.tipo_produto,
-                (venda.cliente_nome or '').strip().lower(),
-                (venda.placa or '').strip().upper(),
-                (venda.modelo_veiculo or '').strip().lower(),
-                Decimal(venda.valor_venda or 0),
-                papel,
-            )
-        
-        for vid in ids_para_processar:
-            vendedor_obj = User.objects.filter(pk=vid).first()
-            if vendedor_obj:
-                # 1. Vendas como Titular
-                vendas_titular = qs_base.filter(vendedor_id=vid)
-                soma_titular = vendas_titular.aggregate(Sum('comissao_vendedor'))['comissao_vendedor__sum'] or 0
-                
-                # 2. Vendas como Ajudante
-                vendas_ajudante = qs_base.filter(vendedor_ajudante_id=vid)
-                soma_ajudante = vendas_ajudante.aggregate(Sum('comissao_ajudante'))['comissao_ajudante__sum'] or 0
-                
-                # Evita duplicidade no mesmo bloco do vendedor.
-                todas_vendas = list(vendas_titular)
-                ids_vendas = {v.id for v in todas_vendas}
-                for v in vendas_ajudante:
-                    if v.id not in ids_vendas:
-                        todas_vendas.append(v)
-                        ids_vendas.add(v.id)
-                
-                total_geral = Decimal('0.00')
-
-                # 3. Se for EXCLUSIVAMENTE GERENTE, busca vendas da equipe (ADMIN fica de fora)
-                is_gerente_row = False
-                try:
-                    if vendedor_obj.profile.nivel_acesso == 'GERENTE':
-                        is_gerente_row = True
-                except: pass
-
-                if is_gerente_row:
-                    vendas_equipe = (
-                        qs_base.filter(
-                            status='APROVADO',
-                            tipo_produto__in=['VENDA_VEICULO', 'VENDA_MOTO']
-                        )
-                        .exclude(Q(vendedor=vendedor_obj) | Q(vendedor_ajudante=vendedor_obj))
-                        .exclude(vendedor__is_superuser=True)
-                        .exclude(vendedor__profile__nivel_acesso__in=['ADMIN', 'GERENTE'])
-                    )
-                    
-                    for v in vendas_equipe:
-                        if v.id in ids_vendas:
-                            continue
-                        v.is_comissao_gerente = True
-                        if v.tipo_produto == 'VENDA_VEICULO':
-                            v.valor_comissao_gerente = Decimal('150.00')
-                        else:
-                            v.valor_comissao_gerente = Decimal('80.00')
-                        
-                        todas_vendas.append(v)
-                        ids_vendas.add(v.id)
-
-                # Ordena tudo por data
-                todas_vendas.sort(key=lambda x: x.data_venda)
-
-                # Blindagem final: remove duplicidades por chave de exibição
-                # (casos de dados repetidos/inconsistentes no período).
-                vendas_unicas = []
-                chaves_vendas = set()
-                for venda in todas_vendas:
-                    chave = _chave_exibicao_venda(venda, vid)
-                    if chave in chaves_vendas:
-                        continue
-                    chaves_vendas.add(chave)
-                    vendas_unicas.append(venda)
-
-                    if getattr(venda, 'is_comissao_gerente', False):
-                        total_geral += getattr(venda, 'valor_comissao_gerente', Decimal('0.00')) or Decimal('0.00')
-                    elif venda.vendedor_ajudante_id == vid:
-                        total_geral += venda.comissao_ajudante or Decimal('0.00')
-                    else:
-                        total_geral += venda.comissao_vendedor or Decimal('0.00')
-
-                if vendas_unicas:
-                    relatorio_vendedores.append({
-                        'vendedor': vendedor_obj,
-                        'vendas': vendas_unicas,
-                        'total_comissao': total_geral
-                    })
-        
-        relatorio_vendedores.sort(key=lambda x: x['vendedor'].get_full_name() or x['vendedor'].username)
+        incluir_usuario = None
+        if not vendedor_id_filter and _is_gestor_financeiro(self.request.user):
+            incluir_usuario = self.request.user
+        relatorio_vendedores, vendedores = montar_relatorio_comissoes(
+            qs_base,
+            vendedor_id=int(vendedor_id_filter) if vendedor_id_filter else None,
+            incluir_usuario=incluir_usuario,
+        )
         context['relatorio_vendedores'] = relatorio_vendedores
-        context['lista_vendedores'] = User.objects.filter(id__in=ids_para_processar).order_by('username')
+        context['lista_vendedores'] = vendedores
         context['vendedor_selecionado'] = int(vendedor_id_filter) if vendedor_id_filter else None
         context['periodo_inicio'] = data_inicio
         context['periodo_fim'] = data_fim
@@ -811,6 +684,20 @@ def validar_comprovante_manual(request, pk):
     messages.success(request, "Comprovante validado manualmente.")
     return redirect('venda_produto_list')
 
+@login_required
+def status_comprovante_ia(request, pk):
+    """Polling da tela: situacao da validacao do comprovante pela IA (uma query, sem chamar a IA)."""
+    venda = get_object_or_404(
+        _vendas_acessiveis(request.user).only('pk', 'comprovante_status_ia', 'comprovante_ia_observacao'),
+        pk=pk,
+    )
+    return JsonResponse({
+        'status': venda.comprovante_status_ia,
+        'status_display': venda.get_comprovante_status_ia_display(),
+        'observacao': venda.comprovante_ia_observacao or '',
+        'em_andamento': venda.comprovante_status_ia in STATUS_EM_ANDAMENTO,
+    })
+
 @login_required
 @require_POST
 def toggle_fechamento_mes(request):